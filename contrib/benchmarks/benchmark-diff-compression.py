@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""Benchmark the compression methods for stored diffs.
+
+This compares the stored size and decode time of each method in
+:py:mod:`reviewboard.diffviewer.compression` across a corpus of real
+per-file diffs. By default, the corpus is taken from the history of the
+Review Board tree this is run from. A directory of diff files can be passed
+instead.
+
+When the zstandard module is installed, a dictionary is trained on half of
+the corpus to benchmark dictionary compression.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchutils import rb_dir, run_benchmark, setup_django
+
+setup_django()
+
+from django.conf import settings
+
+from reviewboard.diffviewer.compression import get_codec, zstandard
+from reviewboard.diffviewer.models import RawFileDiffData
+from reviewboard.scmtools.git import GitDiffParser
+
+
+def load_corpus(path=None):
+    """Load a list of per-file diffs."""
+    if path:
+        diffs = []
+
+        for filename in sorted(os.listdir(path)):
+            with open(os.path.join(path, filename), 'rb') as fp:
+                diffs.append(fp.read())
+    else:
+        diffs = [
+            subprocess.check_output(['git', 'log', '-p', '-n', '1000',
+                                     '--format=', '--no-color'],
+                                    cwd=rb_dir)
+        ]
+
+    return [
+        f.data
+        for diff in diffs
+        for f in GitDiffParser(diff).parse()
+        if f.data
+    ]
+
+
+def train_dictionary(samples):
+    """Train a dictionary and configure it for use."""
+    fd, path = tempfile.mkstemp()
+
+    with os.fdopen(fd, 'wb') as fp:
+        fp.write(zstandard.train_dictionary(112640, samples).as_bytes())
+
+    settings.DIFF_ZSTD_DICTIONARY_FILE = path
+
+    return path
+
+
+def main():
+    corpus = load_corpus(*sys.argv[1:2])
+    raw_size = sum(len(data) for data in corpus)
+
+    print('%d diffs, %d bytes' % (len(corpus), raw_size))
+
+    codes = [RawFileDiffData.COMPRESSION_BZIP2,
+             RawFileDiffData.COMPRESSION_ZLIB]
+    dictionary_path = None
+
+    if zstandard is not None:
+        codes.append(RawFileDiffData.COMPRESSION_ZSTD)
+        codes.append(RawFileDiffData.COMPRESSION_ZSTD_DICT)
+        dictionary_path = train_dictionary(corpus[::2])
+
+    try:
+        for code in codes:
+            codec = get_codec(code)
+
+            start = time.time()
+            compressed = [codec.compress(data) for data in corpus]
+            compress_time = time.time() - start
+
+            stored_size = sum(
+                min(len(data), len(compressed_data))
+                for data, compressed_data in zip(corpus, compressed))
+
+            print('%s:' % codec.name)
+            print('%-60s %12.3f ms' % ('  compress', compress_time * 1000))
+            run_benchmark('  decode',
+                          lambda: [codec.decompress(data)
+                                   for data in compressed],
+                          repeat=3)
+            print('%-60s %12d (%0.1f%%)'
+                  % ('  stored bytes', stored_size,
+                     stored_size * 100.0 / raw_size))
+    finally:
+        if dictionary_path:
+            os.unlink(dictionary_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""Benchmark parsing of large diffs.
+
+This parses synthetic diffs of various sizes using the Git, Subversion,
+Perforce and Mercurial diff parsers. Each is timed both with the current
+parser and with per-line concatenation of the file content, which is how
+the parsers used to build up :py:attr:`File.data
+<reviewboard.diffviewer.parser.File.data>`.
+"""
+
+from __future__ import print_function, unicode_literals
+
+from benchutils import print_speedup, run_benchmark, setup_django
+
+setup_django()
+
+from reviewboard.diffviewer.parser import File
+from reviewboard.scmtools.git import GitDiffParser
+from reviewboard.scmtools.hg import HgDiffParser
+from reviewboard.scmtools.perforce import PerforceDiffParser
+from reviewboard.scmtools.svn import SVNDiffParser
+
+
+def build_hunks(num_lines):
+    """Build the body of a diff adding and removing lines."""
+    lines = [b'@@ -1,%d +1,%d @@\n' % (num_lines, num_lines)]
+
+    for i in range(num_lines // 2):
+        lines.append(b'-old line %d\n' % i)
+        lines.append(b'+new line %d\n' % i)
+
+    return b''.join(lines)
+
+
+def build_git_diff(num_files, num_lines):
+    hunks = build_hunks(num_lines)
+
+    return b''.join(
+        b'diff --git a/file%d b/file%d\n'
+        b'index 1234567..89abcde 100644\n'
+        b'--- a/file%d\n'
+        b'+++ b/file%d\n'
+        % (i, i, i, i) + hunks
+        for i in range(num_files))
+
+
+def build_svn_diff(num_files, num_lines):
+    hunks = build_hunks(num_lines)
+
+    return b''.join(
+        b'Index: file%d\n'
+        b'%s\n'
+        b'--- file%d\t(revision 123)\n'
+        b'+++ file%d\t(working copy)\n'
+        % (i, b'=' * 67, i, i) + hunks
+        for i in range(num_files))
+
+
+def build_perforce_diff(num_files, num_lines):
+    hunks = build_hunks(num_lines)
+
+    return b''.join(
+        b'--- //depot/file%d\t//depot/file%d#1\n'
+        b'+++ //depot/file%d\t2015/01/01 00:00:00\n'
+        % (i, i, i) + hunks
+        for i in range(num_files))
+
+
+def build_hg_diff(num_files, num_lines):
+    hunks = build_hunks(num_lines)
+
+    return b''.join(
+        b'diff -r 1234567890ab -r ba0987654321 file%d\n'
+        b'--- a/file%d\tThu Jan 01 00:00:00 2015 +0000\n'
+        b'+++ b/file%d\tThu Jan 01 00:00:00 2015 +0000\n'
+        % (i, i, i) + hunks
+        for i in range(num_files))
+
+
+def concat_data(self, data):
+    """Append data to a file the way the parsers used to."""
+    if self.data is None:
+        self.data = data
+    else:
+        self.data = self.data + data
+
+
+def parse(parser_cls, diff):
+    return parser_cls(diff).parse()
+
+
+def main():
+    append_data = File.append_data
+
+    for name, parser_cls, build_diff in (
+            ('git', GitDiffParser, build_git_diff),
+            ('svn', SVNDiffParser, build_svn_diff),
+            ('perforce', PerforceDiffParser, build_perforce_diff),
+            ('hg', HgDiffParser, build_hg_diff)):
+        for num_files, num_lines in ((100, 100),
+                                     (1, 50000),
+                                     (1, 100000)):
+            diff = build_diff(num_files, num_lines)
+            print('%s: %d file(s), %d lines per file, %d bytes:'
+                  % (name, num_files, num_lines, len(diff)))
+
+            File.append_data = concat_data
+
+            try:
+                expected = [f.data for f in parse(parser_cls, diff)]
+                baseline = run_benchmark('  concatenation',
+                                         lambda: parse(parser_cls, diff),
+                                         repeat=3)
+            finally:
+                File.append_data = append_data
+
+            assert [f.data for f in parse(parser_cls, diff)] == expected
+
+            result = run_benchmark('  chunked',
+                                   lambda: parse(parser_cls, diff),
+                                   repeat=3)
+            print_speedup(baseline, result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""Benchmark pooled git cat-file lookups against one process per lookup.
+
+This creates a temporary Git repository containing a number of blobs, and
+then fetches all of them (and checks for their existence) through
+:py:class:`reviewboard.scmtools.git.GitClient`, both through the shared
+``git cat-file --batch`` pool and by starting a process for each lookup.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import shutil
+import subprocess
+import tempfile
+
+from benchutils import print_speedup, run_benchmark, setup_django
+
+setup_django()
+
+from reviewboard.scmtools.git import GitClient, get_cat_file_pool
+
+
+NUM_BLOBS = 300
+
+
+def create_repository(path):
+    """Create a bare repository with NUM_BLOBS blobs, returning their SHA1s.
+    """
+    subprocess.check_call(['git', 'init', '-q', '--bare', path])
+    blobs_dir = tempfile.mkdtemp()
+
+    try:
+        filenames = []
+
+        for i in range(NUM_BLOBS):
+            filename = os.path.join(blobs_dir, 'file%d' % i)
+            filenames.append(filename)
+
+            with open(filename, 'wb') as fp:
+                fp.write(b'This is line %d\n' % i * (i + 1))
+
+        p = subprocess.Popen(['git', '--git-dir=%s' % path, 'hash-object',
+                              '-w', '--stdin-paths'],
+                             stdin=subprocess.PIPE,
+                             stdout=subprocess.PIPE)
+        stdout = p.communicate('\n'.join(filenames).encode('utf-8'))[0]
+
+        return stdout.decode('utf-8').split()
+    finally:
+        shutil.rmtree(blobs_dir)
+
+
+def fetch_forked(client, sha1s):
+    for sha1 in sha1s:
+        p = client._run_git(['--git-dir=%s' % client.git_dir, 'cat-file',
+                             'blob', sha1])
+        p.stdout.read()
+        p.stderr.read()
+        p.wait()
+
+
+def check_forked(client, sha1s):
+    for sha1 in sha1s:
+        p = client._run_git(['--git-dir=%s' % client.git_dir, 'cat-file',
+                             '-t', sha1])
+        p.stdout.read()
+        p.stderr.read()
+        p.wait()
+
+
+def fetch_pooled(client, sha1s):
+    for sha1 in sha1s:
+        client.get_file('', sha1)
+
+
+def check_pooled(client, sha1s):
+    for sha1 in sha1s:
+        client.get_file_exists('', sha1)
+
+
+def main():
+    repo_dir = tempfile.mkdtemp()
+
+    try:
+        sha1s = create_repository(repo_dir)
+        client = GitClient(repo_dir)
+
+        print('Fetching %d blobs:' % len(sha1s))
+        baseline = run_benchmark('  process per blob',
+                                 lambda: fetch_forked(client, sha1s))
+        result = run_benchmark('  pooled git cat-file --batch',
+                               lambda: fetch_pooled(client, sha1s))
+        print_speedup(baseline, result)
+
+        print('Checking existence of %d blobs:' % len(sha1s))
+        baseline = run_benchmark('  process per blob',
+                                 lambda: check_forked(client, sha1s))
+        result = run_benchmark('  pooled git cat-file --batch-check',
+                               lambda: check_pooled(client, sha1s))
+        print_speedup(baseline, result)
+
+        get_cat_file_pool(client.git_dir).close()
+    finally:
+        shutil.rmtree(repo_dir)
+
+
+if __name__ == '__main__':
+    main()
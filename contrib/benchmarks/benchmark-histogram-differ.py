@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""Benchmark the histogram differ against the Myers differ.
+
+This diffs the source files of the diffviewer and its test data against
+edited copies of themselves. The edits move, rewrite, insert and remove
+blocks of lines, like real changes do.
+
+For each differ, this reports the time taken, the number of lines shown as
+changed, and the number of inserted and deleted lines that move detection
+has to consider.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import glob
+import os
+import random
+
+from benchutils import print_speedup, rb_dir, run_benchmark, setup_django
+
+setup_django()
+
+from reviewboard.diffviewer.differ import DiffCompatVersion, get_differ
+
+
+def load_files():
+    """Load the files to diff, as lists of lines."""
+    patterns = [
+        os.path.join(rb_dir, 'reviewboard', 'diffviewer', '*.py'),
+        os.path.join(rb_dir, 'reviewboard', 'scmtools', 'testdata', '*.diff'),
+    ]
+    files = []
+
+    for pattern in patterns:
+        for filename in sorted(glob.glob(pattern)):
+            with open(filename, 'rb') as fp:
+                lines = fp.read().decode('utf-8', 'replace').splitlines(True)
+
+            if lines:
+                files.append(lines)
+
+    return files
+
+
+def edit_file(rng, lines, num_edits):
+    """Return a copy of a file with blocks of lines edited."""
+    lines = list(lines)
+
+    for i in range(num_edits):
+        pos = rng.randrange(len(lines) + 1)
+        size = rng.randrange(1, 20)
+        op = rng.randrange(4)
+
+        if op == 0:
+            # Move a block elsewhere.
+            block = lines[pos:pos + size]
+            del lines[pos:pos + size]
+            new_pos = rng.randrange(len(lines) + 1)
+            lines[new_pos:new_pos] = block
+        elif op == 1:
+            # Rewrite a block.
+            lines[pos:pos + size] = [
+                '    new_value_%d = %d\n' % (i, rng.randrange(1000))
+                for j in range(size)
+            ]
+        elif op == 2:
+            # Insert a copy of a block from elsewhere.
+            src = rng.randrange(len(lines) + 1)
+            lines[pos:pos] = lines[src:src + size]
+        else:
+            del lines[pos:pos + size]
+
+    return lines
+
+
+def diff_all(pairs, compat_version):
+    return [
+        list(get_differ(a, b, compat_version=compat_version).get_opcodes())
+        for a, b in pairs
+    ]
+
+
+def count_lines(all_opcodes):
+    """Count the changed lines, and the lines that are move candidates."""
+    changed = 0
+    move_candidates = 0
+
+    for opcodes in all_opcodes:
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag != 'equal':
+                changed += max(i2 - i1, j2 - j1)
+
+            if tag == 'insert':
+                move_candidates += j2 - j1
+            elif tag == 'delete':
+                move_candidates += i2 - i1
+
+    return changed, move_candidates
+
+
+def main():
+    rng = random.Random(0)
+    files = load_files()
+
+    for num_edits in (5, 50):
+        pairs = [
+            (lines, edit_file(rng, lines, num_edits))
+            for lines in files
+        ]
+
+        print('%d files, %d edits per file:' % (len(pairs), num_edits))
+
+        times = []
+
+        for name, compat_version in (
+                ('Myers', DiffCompatVersion.MYERS_SMS_COST_BAIL),
+                ('Histogram', DiffCompatVersion.HISTOGRAM)):
+            times.append(run_benchmark(
+                '  %s' % name,
+                lambda: diff_all(pairs, compat_version),
+                repeat=3))
+            changed, move_candidates = count_lines(
+                diff_all(pairs, compat_version))
+            print('%-60s %12d' % ('    changed lines', changed))
+            print('%-60s %12d' % ('    insert/delete lines', move_candidates))
+
+        print_speedup(*times)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""Benchmark move detection on diffs with large moved blocks.
+
+This generates opcodes with move information for files where blocks of
+functions have been moved, at increasing sizes. Each function contains
+lines that repeat throughout the file, like ``return None`` and blank
+lines, which are the worst case for matching inserted lines to removed
+lines.
+
+Opcodes are taken from a fixed list rather than computed by a differ, so
+only move detection is timed. The time per moved line should stay roughly
+constant as the size grows. Each result is checked to make sure the whole
+block was detected as a move.
+"""
+
+from __future__ import print_function, unicode_literals
+
+from benchutils import run_benchmark, setup_django
+
+setup_django()
+
+from reviewboard.diffviewer.opcode_generator import get_diff_opcode_generator
+
+
+class FixedOpcodesDiffer(object):
+    """A stand-in for a differ that returns pre-computed opcodes."""
+
+    def __init__(self, a, b, opcodes):
+        self.a = a
+        self.b = b
+        self.opcodes = opcodes
+
+    def get_opcodes(self):
+        return iter(self.opcodes)
+
+
+def build_functions(num_lines):
+    lines = []
+    i = 0
+
+    while len(lines) < num_lines:
+        lines += ['def func_%d(self):' % i]
+        lines += ['    value_%d = compute(%d)' % (j, i) for j in range(5)]
+        lines += ['    return None', '']
+        i += 1
+
+    return lines
+
+
+def build_block_move(num_lines):
+    """Build a diff moving one large block to the end of the file."""
+    moved = build_functions(num_lines)
+    unchanged = ['unchanged_line_%d = True' % i for i in range(100)]
+    a = moved + unchanged
+    b = unchanged + moved
+
+    return FixedOpcodesDiffer(a, b, [
+        ('delete', 0, len(moved), 0, 0),
+        ('equal', len(moved), len(a), 0, len(unchanged)),
+        ('insert', len(a), len(a), len(unchanged), len(b)),
+    ])
+
+
+def check_moves(differ, num_moved):
+    """Check that the moved lines were detected."""
+    moved_from = {}
+
+    for opcode in get_diff_opcode_generator(differ):
+        moved_from.update(opcode[-1].get('moved-from', {}))
+
+    # The trailing blank line of a move is not included.
+    assert len(moved_from) == num_moved - 1, \
+        'Expected %d moved lines, got %d' % (num_moved - 1, len(moved_from))
+
+
+def main():
+    for num_lines in (1000, 2000, 4000, 8000, 16000):
+        differ = build_block_move(num_lines)
+        num_moved = len(differ.a) - 100
+
+        check_moves(differ, num_moved)
+
+        result = run_benchmark(
+            'Move of %d lines' % num_moved,
+            lambda: list(get_diff_opcode_generator(differ)),
+            repeat=3)
+        print('%-60s %12.3f us' % ('  per moved line',
+                                   result * 1000000 / num_moved))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""Benchmark the Myers differs.
+
+This diffs synthetic files of various sizes and amounts of change using
+both :py:class:`~reviewboard.diffviewer.myersdiff.MyersDiffer` and
+:py:class:`~reviewboard.diffviewer.fastmyersdiff.FastMyersDiffer`, checking
+that both produce the same opcodes.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import random
+
+from benchutils import print_speedup, run_benchmark, setup_django
+
+setup_django()
+
+from reviewboard.diffviewer.differ import DiffCompatVersion
+from reviewboard.diffviewer.fastmyersdiff import FastMyersDiffer
+from reviewboard.diffviewer.myersdiff import MyersDiffer
+
+
+def build_files(num_lines, vocab_size, num_edits):
+    """Build a file and a randomly-edited copy of it.
+
+    Lines are drawn from a vocabulary of the given size. Smaller
+    vocabularies repeat more lines, which is harder to diff.
+    """
+    rng = random.Random(num_lines + vocab_size + num_edits)
+
+    def make_line():
+        return '    line %d\n' % rng.randrange(vocab_size)
+
+    a = [make_line() for i in range(num_lines)]
+    b = list(a)
+
+    for i in range(num_edits):
+        pos = rng.randrange(len(b) + 1)
+        size = rng.randrange(1, 30)
+        op = rng.randrange(3)
+
+        if op == 0:
+            b[pos:pos + size] = [make_line() for j in range(size)]
+        elif op == 1:
+            b[pos:pos] = [make_line() for j in range(size)]
+        else:
+            del b[pos:pos + size]
+
+    return a, b
+
+
+def diff(differ_cls, a, b):
+    return list(differ_cls(
+        a, b,
+        compat_version=DiffCompatVersion.DEFAULT).get_opcodes())
+
+
+def main():
+    for num_lines, vocab_size, num_edits in ((20000, 1000000, 100),
+                                             (20000, 1000000, 1000),
+                                             (20000, 1000, 100),
+                                             (5000, 20, 200)):
+        a, b = build_files(num_lines, vocab_size, num_edits)
+
+        assert diff(MyersDiffer, a, b) == diff(FastMyersDiffer, a, b)
+
+        print('%d lines, %d distinct, %d edits:'
+              % (num_lines, vocab_size, num_edits))
+        baseline = run_benchmark('  MyersDiffer',
+                                 lambda: diff(MyersDiffer, a, b),
+                                 repeat=3)
+        result = run_benchmark('  FastMyersDiffer',
+                               lambda: diff(FastMyersDiffer, a, b),
+                               repeat=3)
+        print_speedup(baseline, result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""Benchmark in-process patching against the patch executable.
+
+This applies synthetic diffs of various sizes using both
+:py:func:`reviewboard.diffviewer.patcher.apply_patch` and the `patch`
+subprocess path used as a fallback by
+:py:func:`reviewboard.diffviewer.diffutils.patch`.
+"""
+
+from __future__ import print_function, unicode_literals
+
+from benchutils import print_speedup, run_benchmark, setup_django
+
+setup_django()
+
+from reviewboard.diffviewer.diffutils import _patch_with_tool
+from reviewboard.diffviewer.patcher import apply_patch
+
+
+def build_test_data(num_lines, num_hunks, offset=0):
+    """Build a file and a diff changing lines throughout it.
+
+    The file will have ``offset`` extra lines at the start, forcing every
+    hunk to be located at an offset from where the diff says it should be.
+    """
+    lines = [b'line %d\n' % i for i in range(num_lines)]
+    step = max(num_lines // (num_hunks + 1), 7)
+    diff = [b'--- file\n', b'+++ file\n']
+    new_offset = 0
+
+    for i in range(step, num_lines - 3, step)[:num_hunks]:
+        diff.append(b'@@ -%d,7 +%d,8 @@\n' % (i - 2, i - 2 + new_offset))
+        diff += [b' ' + line for line in lines[i - 3:i]]
+        diff.append(b'-' + lines[i])
+        diff.append(b'+' + lines[i].upper())
+        diff.append(b'+inserted\n')
+        diff += [b' ' + line for line in lines[i + 1:i + 4]]
+        new_offset += 1
+
+    data = b''.join([b'offset\n'] * offset + lines)
+
+    return b''.join(diff), data
+
+
+def main():
+    for num_lines, num_hunks, offset in ((100, 2, 0),
+                                         (5000, 10, 0),
+                                         (5000, 10, 25),
+                                         (50000, 200, 0)):
+        diff, data = build_test_data(num_lines, num_hunks, offset)
+        assert apply_patch(diff, data) == _patch_with_tool(diff, data, 'file')
+
+        print('%d lines, %d hunks, offset %d:'
+              % (num_lines, num_hunks, offset))
+        baseline = run_benchmark('  patch executable',
+                                 lambda: _patch_with_tool(diff, data, 'file'))
+        result = run_benchmark('  in-process',
+                               lambda: apply_patch(diff, data))
+        print_speedup(baseline, result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Helpers shared by the benchmark scripts."""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+import timeit
+
+
+scripts_dir = os.path.abspath(os.path.dirname(__file__))
+rb_dir = os.path.abspath(os.path.join(scripts_dir, '..', '..'))
+
+
+def setup_django():
+    """Set up the environment needed to import Review Board modules."""
+    sys.path.insert(0, rb_dir)
+    sys.path.insert(0, os.path.join(rb_dir, 'contrib', 'internal', 'conf'))
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'reviewboard.settings')
+
+
+def run_benchmark(name, func, repeat=5, number=1):
+    """Time a function and print the best result.
+
+    Args:
+        name (unicode):
+            The name of the benchmark to display.
+
+        func (callable):
+            The function to time.
+
+        repeat (int, optional):
+            The number of timing runs to perform.
+
+        number (int, optional):
+            The number of calls to make per timing run.
+
+    Returns:
+        float:
+        The best time for a single call, in seconds.
+    """
+    best = min(timeit.repeat(func, repeat=repeat, number=number)) / number
+    print('%-60s %12.3f ms' % (name, best * 1000))
+
+    return best
+
+
+def print_speedup(baseline, result):
+    """Print the speedup of a result over a baseline time."""
+    if result:
+        print('%-60s %11.1fx' % ('  speedup', baseline / result))
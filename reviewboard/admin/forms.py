@@ -804,6 +804,17 @@ class DiffSettingsForm(SiteSettingsForm):
                     'to disable size restrictions.'),
         widget=forms.TextInput(attrs={'size': '15'}))
 
+    diffviewer_diff_algorithm = forms.ChoiceField(
+        label=_('Diff algorithm'),
+        choices=(
+            ('myers', _('Myers')),
+            ('histogram', _('Histogram')),
+        ),
+        help_text=_('The algorithm used to compute differences for newly '
+                    'uploaded diffs. Histogram is faster on files with many '
+                    'unique lines, and often keeps moved and rewritten '
+                    'blocks together. Existing diffs are not affected.'))
+
     def load(self):
         """Load the form."""
         super(DiffSettingsForm, self).load()
@@ -838,6 +849,7 @@ class DiffSettingsForm(SiteSettingsForm):
                 ),
                 'classes': ('wide',),
                 'fields': ('diffviewer_max_diff_size',
+                           'diffviewer_diff_algorithm',
                            'diffviewer_context_num_lines',
                            'diffviewer_paginate_by',
                            'diffviewer_paginate_orphans')
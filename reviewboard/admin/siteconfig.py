@@ -139,6 +139,7 @@ defaults.update({
     'company': '',
     'default_use_rich_text': True,
     'diffviewer_context_num_lines': 5,
+    'diffviewer_diff_algorithm': 'myers',
     'diffviewer_include_space_patterns': [],
     'diffviewer_max_diff_size': 0,
     'diffviewer_paginate_by': 20,
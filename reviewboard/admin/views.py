@@ -23,6 +23,7 @@ from reviewboard.admin.support import get_support_url, serialize_support_data
 from reviewboard.admin.widgets import (dynamic_activity_data,
                                        primary_widgets,
                                        secondary_widgets)
+from reviewboard.diffviewer.chunk_cache import get_chunk_cache
 from reviewboard.ssh.client import SSHClient
 from reviewboard.ssh.utils import humanize_key
 
@@ -105,7 +106,8 @@ def cache_stats(request, template_name="admin/cache_stats.html"):
     """Display statistics on the cache.
 
     This includes such pieces of information as memory used, cache misses, and
-    uptime.
+    uptime, along with the use of the diff chunk cache by the process serving
+    the request.
     """
     cache_stats = get_cache_stats()
     cache_info = settings.CACHES[DEFAULT_FORWARD_CACHE_ALIAS]
@@ -113,6 +115,7 @@ def cache_stats(request, template_name="admin/cache_stats.html"):
     return render_to_response(template_name, RequestContext(request, {
         'cache_hosts': cache_stats,
         'cache_backend': cache_info['BACKEND'],
+        'diff_chunk_cache_stats': get_chunk_cache().get_stats(),
         'title': _("Server Cache"),
         'root_path': settings.SITE_ROOT + "admin/db/"
     }))
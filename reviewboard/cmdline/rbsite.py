@@ -51,6 +51,7 @@ class Dependencies(object):
     sqlite_modules = ["pysqlite2", "sqlite3"]
     mysql_modules = ["MySQLdb"]
     postgresql_modules = ["psycopg2"]
+    zstandard_modules = ["zstandard"]
 
     cache_dependency_info = {
         'required': False,
@@ -60,6 +61,14 @@ class Dependencies(object):
         ],
     }
 
+    compression_dependency_info = {
+        'required': False,
+        'title': 'Diff Compression',
+        'dependencies': [
+            ("Zstandard", zstandard_modules),
+        ],
+    }
+
     db_dependency_info = {
         'required': True,
         'title': 'Databases',
@@ -90,6 +99,11 @@ class Dependencies(object):
         """Return whether sqlite is supported."""
         return cls.has_modules(cls.sqlite_modules)
 
+    @classmethod
+    def get_support_zstandard(cls):
+        """Return whether Zstandard compression is supported."""
+        return cls.has_modules(cls.zstandard_modules)
+
     @classmethod
     def get_missing(cls):
         """Return any missing dependencies.
@@ -102,6 +116,7 @@ class Dependencies(object):
         missing_groups = []
 
         for dep_info in [cls.cache_dependency_info,
+                         cls.compression_dependency_info,
                          cls.db_dependency_info]:
             missing_deps = []
 
@@ -1728,6 +1743,7 @@ class UpgradeCommand(Command):
                   "\n"
                   "Resetting in-database caches.")
             site.run_manage_command("fixreviewcounts")
+            site.run_manage_command("backfill-comment-review-ids")
 
         site.encrypt_passwords()
 
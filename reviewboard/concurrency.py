@@ -0,0 +1,288 @@
+"""Utilities for running blocking operations concurrently."""
+
+from __future__ import unicode_literals
+
+import bisect
+import logging
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from django.conf import settings
+from django.db import connection
+
+
+_background_task_queue = None
+_background_task_queue_lock = threading.Lock()
+
+
+def map_concurrently(func, items, max_workers):
+    """Call a function for each item, using a bounded pool of threads.
+
+    This is intended for operations that spend most of their time waiting
+    on something else, such as HTTP requests to a hosting service or
+    commands run against a repository. If there's only one item, or only
+    one worker allowed, the items are processed in the calling thread.
+
+    Any database connections opened by the worker threads are closed once
+    they're done, since nothing else would clean them up.
+
+    Args:
+        func (callable):
+            The function to call. It takes a single item as an argument.
+
+        items (list):
+            The items to process.
+
+        max_workers (int):
+            The maximum number of threads to use.
+
+    Returns:
+        list:
+        The results of each call, in the same order as ``items``.
+
+    Raises:
+        Exception:
+            Any exception raised by ``func`` will be re-raised in the
+            calling thread.
+    """
+    items = list(items)
+    num_workers = min(max_workers, len(items))
+
+    if num_workers <= 1:
+        return [func(item) for item in items]
+
+    def _run(item):
+        try:
+            return func(item)
+        finally:
+            connection.close()
+
+    pool = ThreadPool(num_workers)
+
+    try:
+        return pool.map(_run, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+class BackgroundTaskQueue(object):
+    """A queue of functions to call in a pool of background threads.
+
+    Tasks are run in order of priority, and then in the order they were
+    added. Each task can belong to a group, such as the repository it
+    talks to, with a limit on how many tasks from that group can run at
+    once. Tasks that would exceed their group's limit wait while other
+    tasks run.
+
+    The threads are started when the first task is added, and are daemon
+    threads, so pending tasks are dropped when the process exits.
+    """
+
+    def __init__(self, num_workers):
+        """Initialize the queue.
+
+        Args:
+            num_workers (int):
+                The number of threads to run tasks in.
+        """
+        self.num_workers = num_workers
+
+        self._tasks = []
+        self._group_counts = {}
+        self._num_running = 0
+        self._next_id = 0
+        self._threads = []
+        self._cond = threading.Condition()
+
+    def add(self, func, args=(), kwargs=None, priority=0, group=None,
+            group_limit=None):
+        """Add a function to call.
+
+        Args:
+            func (callable):
+                The function to call.
+
+            args (tuple, optional):
+                Positional arguments to pass to the function.
+
+            kwargs (dict, optional):
+                Keyword arguments to pass to the function.
+
+            priority (object, optional):
+                The priority of the task. Tasks with lower values are run
+                first. Any values that can be compared with each other,
+                such as tuples, can be used.
+
+            group (object, optional):
+                The group the task belongs to.
+
+            group_limit (int, optional):
+                The most tasks in ``group`` that can run at once.
+        """
+        with self._cond:
+            bisect.insort(self._tasks, (priority, self._next_id, {
+                'func': func,
+                'args': args,
+                'kwargs': kwargs or {},
+                'group': group,
+                'group_limit': group_limit,
+            }))
+            self._next_id += 1
+
+            while len(self._threads) < self.num_workers:
+                thread = threading.Thread(target=self._run_worker)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+            self._cond.notify()
+
+    def join(self, timeout=None):
+        """Wait for all queued tasks to finish.
+
+        Args:
+            timeout (float, optional):
+                The most time to wait, in seconds.
+
+        Returns:
+            bool:
+            Whether all tasks finished.
+        """
+        if timeout is not None:
+            end_time = time.time() + timeout
+
+        with self._cond:
+            while self._tasks or self._num_running:
+                if timeout is None:
+                    self._cond.wait()
+                else:
+                    remaining = end_time - time.time()
+
+                    if remaining <= 0:
+                        return False
+
+                    self._cond.wait(remaining)
+
+        return True
+
+    def _pop_task(self):
+        """Remove and return the next task that can be run.
+
+        This must be called with the lock held.
+
+        Returns:
+            dict:
+            The task, or ``None`` if there are no tasks that can run.
+        """
+        for i, (priority, task_id, task) in enumerate(self._tasks):
+            group = task['group']
+
+            if (group is None or
+                task['group_limit'] is None or
+                self._group_counts.get(group, 0) < task['group_limit']):
+                del self._tasks[i]
+
+                return task
+
+        return None
+
+    def _run_worker(self):
+        """Run tasks from the queue, forever."""
+        while True:
+            with self._cond:
+                task = self._pop_task()
+
+                while task is None:
+                    self._cond.wait()
+                    task = self._pop_task()
+
+                group = task['group']
+                self._num_running += 1
+
+                if group is not None:
+                    self._group_counts[group] = \
+                        self._group_counts.get(group, 0) + 1
+
+            try:
+                task['func'](*task['args'], **task['kwargs'])
+            except Exception as e:
+                logging.exception('Unexpected error running background task '
+                                  '%r: %s',
+                                  task['func'], e)
+            finally:
+                connection.close()
+
+                with self._cond:
+                    self._num_running -= 1
+
+                    if group is not None:
+                        self._group_counts[group] -= 1
+
+                        if self._group_counts[group] == 0:
+                            del self._group_counts[group]
+
+                    # Wake up all waiting threads, since tasks that were
+                    # blocked on the group (and join()) may now proceed.
+                    self._cond.notify_all()
+
+
+def get_background_task_queue():
+    """Return the shared queue for background tasks.
+
+    The queue runs tasks in ``settings.BACKGROUND_TASK_WORKERS`` threads
+    in each process.
+
+    Returns:
+        BackgroundTaskQueue:
+        The queue.
+    """
+    global _background_task_queue
+
+    with _background_task_queue_lock:
+        if _background_task_queue is None:
+            _background_task_queue = BackgroundTaskQueue(
+                getattr(settings, 'BACKGROUND_TASK_WORKERS', 2))
+
+    return _background_task_queue
+
+
+def queue_background_task(func, args=(), kwargs=None, priority=0,
+                          group=None, group_limit=None):
+    """Queue a function to call in a background thread.
+
+    This is intended for work that speeds up later requests, such as
+    precomputing data for a newly uploaded diff, and that the caller doesn't
+    need to wait for. Tasks are run by the shared
+    :py:class:`BackgroundTaskQueue`. See :py:meth:`BackgroundTaskQueue.add`
+    for the arguments.
+
+    Since the work is optional, nothing is run if
+    ``settings.RUN_BACKGROUND_TASKS`` is ``False``. Any exceptions raised
+    by the function are logged.
+    """
+    if getattr(settings, 'RUN_BACKGROUND_TASKS', True):
+        get_background_task_queue().add(func, args, kwargs,
+                                        priority=priority,
+                                        group=group,
+                                        group_limit=group_limit)
+
+
+def run_in_background(func, *args, **kwargs):
+    """Call a function in a background thread.
+
+    This is a shortcut for :py:func:`queue_background_task` with the default
+    priority and no group.
+
+    Args:
+        func (callable):
+            The function to call.
+
+        *args (tuple):
+            Positional arguments to pass to the function.
+
+        **kwargs (dict):
+            Keyword arguments to pass to the function.
+    """
+    queue_background_task(func, args, kwargs)
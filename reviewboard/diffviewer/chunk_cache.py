@@ -0,0 +1,650 @@
+"""Tiered storage for the chunks generated for diffs.
+
+Generated chunks are stored in up to three tiers, checked in order:
+
+1. A bounded, least-recently-used store in each process's memory.
+2. The main cache (usually memcached), shared between processes.
+3. A directory on disk, if ``settings.DIFF_CHUNK_CACHE_DIR`` is set. This
+   keeps chunks around when they've been evicted from the main cache, until
+   they expire or the oldest are removed to stay within
+   ``settings.DIFF_CHUNK_CACHE_DIR_MAX_SIZE``.
+
+Each chunk is pickled and compressed separately (see
+:py:mod:`reviewboard.diffviewer.compression`), and split into parts small
+enough for memcached. This means a single chunk can be loaded without
+loading the rest, which is all that's needed when expanding a collapsed
+chunk in the diff viewer.
+
+The main cache holds a small manifest for each file's chunks, with a token
+identifying the version stored. Chunks in a process's memory are only used
+if their token matches the manifest, so they're dropped whenever the main
+cache is cleared or the chunks are stored again by another process.
+"""
+
+from __future__ import unicode_literals
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.six.moves import cPickle as pickle
+from django.utils.six.moves import range
+from djblets.cache.backend import CACHE_CHUNK_SIZE, make_cache_key
+
+from reviewboard.concurrency import run_in_background
+from reviewboard.diffviewer.compression import choose_codec, get_codec
+
+
+class ChunkCache(object):
+    """Tiered storage for the chunks generated for diffs.
+
+    Chunks are stored and looked up by the same keys used to cache them in
+    the past, such as the ones built by
+    :py:func:`~reviewboard.diffviewer.chunk_generator.make_chunks_cache_key`.
+
+    Hits and misses for each tier are counted for the life of the process.
+    See :py:meth:`get_stats`.
+    """
+
+    #: The version of the stored data.
+    #:
+    #: This must be incremented whenever the stored format changes.
+    VERSION = 1
+
+    #: The most often, in seconds, old chunks are removed from disk.
+    DISK_PURGE_INTERVAL = 10 * 60
+
+    def __init__(self, local_max_size=None, disk_dir=None,
+                 disk_max_size=None):
+        """Initialize the cache.
+
+        Args:
+            local_max_size (int, optional):
+                The most bytes of compressed chunks to keep in memory.
+                Defaults to ``settings.DIFF_CHUNK_CACHE_LOCAL_SIZE``.
+
+            disk_dir (unicode, optional):
+                The directory to store chunks in on disk. Defaults to
+                ``settings.DIFF_CHUNK_CACHE_DIR``.
+
+            disk_max_size (int, optional):
+                The most bytes of chunks to keep on disk. Defaults to
+                ``settings.DIFF_CHUNK_CACHE_DIR_MAX_SIZE``.
+        """
+        if local_max_size is None:
+            local_max_size = settings.DIFF_CHUNK_CACHE_LOCAL_SIZE
+
+        if disk_dir is None:
+            disk_dir = settings.DIFF_CHUNK_CACHE_DIR
+
+        if disk_max_size is None:
+            disk_max_size = settings.DIFF_CHUNK_CACHE_DIR_MAX_SIZE
+
+        self.local_max_size = local_max_size
+        self.disk_dir = disk_dir
+        self.disk_max_size = disk_max_size
+
+        self._lock = threading.Lock()
+        self._local = OrderedDict()
+        self._local_size = 0
+        self._last_disk_purge = None
+        self._stats = {
+            'local': {'hits': 0, 'misses': 0},
+            'shared': {'hits': 0, 'misses': 0},
+            'disk': {'hits': 0, 'misses': 0},
+        }
+
+    def get_chunks(self, key, generate_func, chunk_index=None):
+        """Return the chunks stored for a key, generating them if needed.
+
+        If a chunk index is provided and the chunks are already stored,
+        only that chunk is loaded. The rest are returned as summaries,
+        containing the ``index``, ``change``, ``collapsable`` and
+        ``numlines`` of each chunk and the ``whitespace_chunk`` flag of its
+        ``meta``, but no ``lines``.
+
+        Args:
+            key (unicode):
+                The key for the chunks.
+
+            generate_func (callable):
+                A function returning the chunks, if they aren't stored.
+
+            chunk_index (int, optional):
+                The index of the only chunk that needs to be loaded.
+
+        Returns:
+            list of dict:
+            The list of chunks.
+        """
+        entry = self._get_entry(key, chunk_index)
+
+        if entry is not None:
+            try:
+                return self._load_chunks(entry, chunk_index)
+            except Exception as e:
+                # This may happen if the data was compressed with a
+                # dictionary that's no longer available.
+                logging.warning('Unable to load stored diff chunks for '
+                                '%s: %s',
+                                key, e)
+
+        chunks = list(generate_func())
+        self.set_chunks(key, chunks)
+
+        return chunks
+
+    def set_chunks(self, key, chunks):
+        """Store the chunks for a key in all tiers.
+
+        Args:
+            key (unicode):
+                The key for the chunks.
+
+            chunks (list of dict):
+                The chunks to store.
+        """
+        entry = {
+            'token': uuid.uuid4().hex,
+            'summaries': [
+                {
+                    'index': chunk['index'],
+                    'change': chunk['change'],
+                    'collapsable': chunk['collapsable'],
+                    'numlines': chunk['numlines'],
+                    'meta': {
+                        'whitespace_chunk':
+                            chunk['meta'].get('whitespace_chunk', False),
+                    },
+                }
+                for chunk in chunks
+            ],
+            'chunks': [
+                self._encode_chunk(chunk)
+                for chunk in chunks
+            ],
+        }
+
+        self._set_local_entry(key, entry)
+        self._set_shared_entry(key, entry)
+        self._set_disk_entry(key, entry)
+
+    def get_cached_keys(self, keys):
+        """Return which of the given keys have chunks stored.
+
+        This doesn't count towards the hits and misses for any tier.
+
+        Args:
+            keys (list of unicode):
+                The keys to check.
+
+        Returns:
+            set of unicode:
+            The keys that have chunks stored.
+        """
+        manifest_keys = dict(
+            (self._make_shared_key(key), key)
+            for key in keys
+        )
+        cached_keys = set(
+            manifest_keys[manifest_key]
+            for manifest_key in cache.get_many(list(manifest_keys))
+        )
+
+        if self.disk_dir:
+            for key in keys:
+                if (key not in cached_keys and
+                        self._read_disk_manifest(key) is not None):
+                    cached_keys.add(key)
+
+        return cached_keys
+
+    def get_stats(self):
+        """Return statistics on the use of the cache in this process.
+
+        Returns:
+            dict:
+            A dictionary with ``local``, ``shared`` and ``disk`` keys, each
+            containing the ``hits`` and ``misses`` for that tier. The
+            ``local`` tier also contains the number of ``entries``, and the
+            ``size`` and ``max_size`` of the stored data, in bytes. The
+            ``disk`` tier also contains whether it's ``enabled``.
+        """
+        with self._lock:
+            stats = dict(
+                (tier, dict(tier_stats))
+                for tier, tier_stats in self._stats.items()
+            )
+            stats['local'].update({
+                'entries': len(self._local),
+                'size': self._local_size,
+                'max_size': self.local_max_size,
+            })
+
+        stats['disk']['enabled'] = bool(self.disk_dir)
+
+        return stats
+
+    def purge_disk(self):
+        """Remove old chunks from disk.
+
+        Entries older than ``settings.CACHE_EXPIRATION_TIME`` are removed.
+        If the rest take up more than :py:attr:`disk_max_size` bytes, the
+        oldest are removed until they fit.
+
+        This is called in the background every
+        :py:attr:`DISK_PURGE_INTERVAL` seconds while chunks are being
+        stored on disk.
+
+        Returns:
+            int:
+            The number of entries removed.
+        """
+        if not self.disk_dir:
+            return 0
+
+        version_path = os.path.join(self.disk_dir, 'v%s' % self.VERSION)
+        min_mtime = time.time() - settings.CACHE_EXPIRATION_TIME
+        entries = []
+        total_size = 0
+        num_removed = 0
+
+        try:
+            prefixes = os.listdir(version_path)
+        except OSError:
+            return 0
+
+        for prefix in prefixes:
+            prefix_path = os.path.join(version_path, prefix)
+
+            try:
+                names = os.listdir(prefix_path)
+            except OSError:
+                continue
+
+            for name in names:
+                path = os.path.join(prefix_path, name)
+
+                try:
+                    filenames = os.listdir(path)
+
+                    if 'manifest' in filenames:
+                        mtime = os.path.getmtime(
+                            os.path.join(path, 'manifest'))
+                    else:
+                        # This is still being written, or was left behind
+                        # by a process that stopped while writing it.
+                        mtime = os.path.getmtime(path)
+
+                    size = sum(
+                        os.path.getsize(os.path.join(path, filename))
+                        for filename in filenames
+                    )
+                except OSError:
+                    # This was removed by another process.
+                    continue
+
+                if mtime < min_mtime:
+                    shutil.rmtree(path, ignore_errors=True)
+                    num_removed += 1
+                elif 'manifest' in filenames:
+                    entries.append((mtime, size, path))
+                    total_size += size
+
+        if self.disk_max_size is not None and total_size > self.disk_max_size:
+            entries.sort()
+
+            for mtime, size, path in entries:
+                if total_size <= self.disk_max_size:
+                    break
+
+                shutil.rmtree(path, ignore_errors=True)
+                total_size -= size
+                num_removed += 1
+
+        return num_removed
+
+    def clear_local(self):
+        """Remove all chunks stored in this process's memory."""
+        with self._lock:
+            self._local.clear()
+            self._local_size = 0
+
+    def _get_entry(self, key, chunk_index):
+        """Return the stored entry for a key from the first tier with it.
+
+        If the entry comes from the main cache and a chunk index is
+        provided, only that chunk's data will be included.
+        """
+        manifest = cache.get(self._make_shared_key(key))
+
+        with self._lock:
+            entry = self._local.pop(key, None)
+
+            if entry is not None:
+                if (manifest is not None and
+                        entry['token'] == manifest['token']):
+                    # Move this to the most recently used end.
+                    self._local[key] = entry
+                    self._stats['local']['hits'] += 1
+
+                    return entry
+
+                self._local_size -= entry['size']
+
+            self._stats['local']['misses'] += 1
+
+        if manifest is not None:
+            entry = self._get_shared_entry(key, manifest, chunk_index)
+
+            if entry is not None:
+                self._record('shared', True)
+
+                if chunk_index is None:
+                    self._set_local_entry(key, entry)
+
+                return entry
+
+        self._record('shared', False)
+
+        if self.disk_dir:
+            entry = self._get_disk_entry(key)
+            self._record('disk', entry is not None)
+
+            if entry is not None:
+                self._set_local_entry(key, entry)
+                self._set_shared_entry(key, entry)
+
+                return entry
+
+        return None
+
+    def _load_chunks(self, entry, chunk_index):
+        """Return the chunks from a stored entry.
+
+        If a chunk index is provided, only that chunk will be loaded, and
+        the rest will be summaries.
+        """
+        if chunk_index is None:
+            return [
+                self._decode_chunk(data)
+                for data in entry['chunks']
+            ]
+
+        chunks = [
+            dict(summary, meta=dict(summary['meta']))
+            for summary in entry['summaries']
+        ]
+
+        if 0 <= chunk_index < len(chunks):
+            chunks[chunk_index] = \
+                self._decode_chunk(entry['chunks'][chunk_index])
+
+        return chunks
+
+    def _encode_chunk(self, chunk):
+        """Return a chunk pickled and compressed, for storage."""
+        data = pickle.dumps(chunk, pickle.HIGHEST_PROTOCOL)
+        codec = choose_codec(len(data))
+
+        return codec.code.encode('ascii') + codec.compress(data)
+
+    def _decode_chunk(self, data):
+        """Return a chunk from its stored form."""
+        codec = get_codec(data[:1].decode('ascii'))
+
+        if codec is None or not codec.is_available():
+            raise ValueError('Unsupported compression method "%s"'
+                             % data[:1])
+
+        return pickle.loads(codec.decompress(data[1:]))
+
+    def _record(self, tier, hit):
+        """Record a hit or miss for a tier."""
+        with self._lock:
+            if hit:
+                self._stats[tier]['hits'] += 1
+            else:
+                self._stats[tier]['misses'] += 1
+
+    def _set_local_entry(self, key, entry):
+        """Store an entry in this process's memory.
+
+        The least recently used entries are removed to make room. Entries
+        too large to ever fit aren't stored.
+        """
+        size = sum(len(data) for data in entry['chunks'])
+
+        if size > self.local_max_size:
+            return
+
+        local_entry = dict(entry, size=size)
+
+        with self._lock:
+            old_entry = self._local.pop(key, None)
+
+            if old_entry is not None:
+                self._local_size -= old_entry['size']
+
+            while (self._local and
+                   self._local_size + size > self.local_max_size):
+                self._local_size -= self._local.popitem(last=False)[1]['size']
+
+            self._local[key] = local_entry
+            self._local_size += size
+
+    def _make_shared_key(self, key, *parts):
+        """Return a key in the main cache for part of an entry."""
+        return make_cache_key('-'.join(
+            ['diff-chunks-v%s' % self.VERSION, key] +
+            ['%s' % part for part in parts]))
+
+    def _get_shared_entry(self, key, manifest, chunk_index):
+        """Return an entry from the main cache.
+
+        If a chunk index is provided, only that chunk's data will be
+        included. If any of the data is missing, this returns None.
+        """
+        num_parts = manifest['num_parts']
+
+        if chunk_index is None:
+            indexes = range(len(num_parts))
+        elif 0 <= chunk_index < len(num_parts):
+            indexes = [chunk_index]
+        else:
+            indexes = []
+
+        part_keys = [
+            self._make_shared_key(key, i, j)
+            for i in indexes
+            for j in range(num_parts[i])
+        ]
+        parts = cache.get_many(part_keys)
+
+        if len(parts) != len(part_keys):
+            return None
+
+        chunks = [None] * len(num_parts)
+
+        for i in indexes:
+            chunks[i] = b''.join(
+                parts[self._make_shared_key(key, i, j)]
+                for j in range(num_parts[i])
+            )
+
+        return {
+            'token': manifest['token'],
+            'summaries': manifest['summaries'],
+            'chunks': chunks,
+        }
+
+    def _set_shared_entry(self, key, entry):
+        """Store an entry in the main cache.
+
+        Each chunk is split into parts small enough for memcached. The
+        manifest is stored last, so that it's only found once all the parts
+        are in place.
+        """
+        parts = {}
+        num_parts = []
+
+        for i, data in enumerate(entry['chunks']):
+            chunk_num_parts = max(1, -(-len(data) // CACHE_CHUNK_SIZE))
+            num_parts.append(chunk_num_parts)
+
+            for j in range(chunk_num_parts):
+                parts[self._make_shared_key(key, i, j)] = \
+                    data[j * CACHE_CHUNK_SIZE:(j + 1) * CACHE_CHUNK_SIZE]
+
+        try:
+            cache.set_many(parts, settings.CACHE_EXPIRATION_TIME)
+            cache.set(self._make_shared_key(key),
+                      {
+                          'token': entry['token'],
+                          'summaries': entry['summaries'],
+                          'num_parts': num_parts,
+                      },
+                      settings.CACHE_EXPIRATION_TIME)
+        except Exception as e:
+            logging.warning('Unable to store diff chunks for %s in the '
+                            'cache: %s',
+                            key, e)
+
+    def _get_disk_path(self, key):
+        """Return the directory on disk for an entry.
+
+        This is based on the entry's key in the main cache, so that sites
+        sharing a directory don't share entries.
+        """
+        key_hash = hashlib.sha1(self._make_shared_key(key)).hexdigest()
+
+        return os.path.join(self.disk_dir, 'v%s' % self.VERSION,
+                            key_hash[:2], key_hash)
+
+    def _read_disk_manifest(self, key):
+        """Return the manifest for an entry on disk.
+
+        Entries older than ``settings.CACHE_EXPIRATION_TIME`` are treated
+        as missing. If the entry is missing, this returns None.
+        """
+        path = os.path.join(self._get_disk_path(key), 'manifest')
+
+        try:
+            if (time.time() - os.path.getmtime(path) >
+                    settings.CACHE_EXPIRATION_TIME):
+                return None
+
+            with open(path, 'rb') as fp:
+                return pickle.load(fp)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def _get_disk_entry(self, key):
+        """Return an entry from disk, or None if it's missing."""
+        manifest = self._read_disk_manifest(key)
+
+        if manifest is None:
+            return None
+
+        path = self._get_disk_path(key)
+        chunks = []
+
+        try:
+            for i in range(len(manifest['summaries'])):
+                with open(os.path.join(path, '%d' % i), 'rb') as fp:
+                    chunks.append(fp.read())
+        except (IOError, OSError):
+            return None
+
+        return {
+            'token': manifest['token'],
+            'summaries': manifest['summaries'],
+            'chunks': chunks,
+        }
+
+    def _set_disk_entry(self, key, entry):
+        """Store an entry on disk, if enabled.
+
+        The entry is written to a temporary directory that's then moved into
+        place, so that partially-written entries are never read.
+        """
+        if not self.disk_dir:
+            return
+
+        path = self._get_disk_path(key)
+        parent_path = os.path.dirname(path)
+        temp_path = None
+
+        try:
+            if not os.path.exists(parent_path):
+                os.makedirs(parent_path)
+
+            temp_path = tempfile.mkdtemp(dir=parent_path)
+
+            for i, data in enumerate(entry['chunks']):
+                with open(os.path.join(temp_path, '%d' % i), 'wb') as fp:
+                    fp.write(data)
+
+            with open(os.path.join(temp_path, 'manifest'), 'wb') as fp:
+                pickle.dump(
+                    {
+                        'token': entry['token'],
+                        'summaries': entry['summaries'],
+                    },
+                    fp, pickle.HIGHEST_PROTOCOL)
+
+            if os.path.exists(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+            os.rename(temp_path, path)
+            self._schedule_disk_purge()
+        except (IOError, OSError) as e:
+            # Another process may have stored the same entry at the same
+            # time. Either way, the chunks can still be generated again.
+            logging.warning('Unable to store diff chunks for %s in %s: %s',
+                            key, path, e)
+
+            if temp_path:
+                shutil.rmtree(temp_path, ignore_errors=True)
+
+    def _schedule_disk_purge(self):
+        """Remove old chunks from disk in the background, if it's time to."""
+        now = time.time()
+
+        with self._lock:
+            if (self._last_disk_purge is not None and
+                    now - self._last_disk_purge < self.DISK_PURGE_INTERVAL):
+                return
+
+            self._last_disk_purge = now
+
+        run_in_background(self.purge_disk)
+
+
+_chunk_cache = None
+_chunk_cache_lock = threading.Lock()
+
+
+def get_chunk_cache():
+    """Return the chunk cache used by this process.
+
+    Returns:
+        ChunkCache:
+        The chunk cache.
+    """
+    global _chunk_cache
+
+    if _chunk_cache is None:
+        with _chunk_cache_lock:
+            if _chunk_cache is None:
+                _chunk_cache = ChunkCache()
+
+    return _chunk_cache
@@ -4,6 +4,7 @@ import fnmatch
 import functools
 import hashlib
 import re
+from collections import OrderedDict
 
 from django.utils import six
 from django.utils.html import escape
@@ -13,10 +14,12 @@ from django.utils.translation import get_language
 from djblets.log import log_timed
 from djblets.cache.backend import cache_memoize
 from djblets.siteconfig.models import SiteConfiguration
-from pygments import highlight
+import pygments
+from pygments import format as format_tokens, highlight
 from pygments.lexers import guess_lexer_for_filename
 from pygments.formatters import HtmlFormatter
 
+from reviewboard.diffviewer.chunk_cache import get_chunk_cache
 from reviewboard.diffviewer.differ import DiffCompatVersion, get_differ
 from reviewboard.diffviewer.diffutils import (get_line_changed_regions,
                                               get_original_file,
@@ -73,6 +76,10 @@ class RawDiffChunkGenerator(object):
     # Default tab size used in browsers.
     TAB_SIZE = DiffOpcodeGenerator.TAB_SIZE
 
+    # Files with at least this many lines only have the lines in expanded
+    # chunks syntax-highlighted when generating chunks.
+    HIGHLIGHT_REGIONS_MIN_LINES = 1000
+
     def __init__(self, old, new, orig_filename, modified_filename,
                  enable_syntax_highlighting=True, encoding_list=None,
                  diff_compat=DiffCompatVersion.DEFAULT):
@@ -90,21 +97,29 @@ class RawDiffChunkGenerator(object):
         self._last_header_index = [0, 0]
         self._chunk_index = 0
 
+        # File contents loaded again for highlighting chunks, by SHA1.
+        self._highlight_sources = {}
+
     def get_opcode_generator(self):
         """Return the DiffOpcodeGenerator used to generate diff opcodes."""
         return get_diff_opcode_generator(self.differ)
 
-    def get_chunks(self, cache_key=None):
+    def get_chunks(self, cache_key=None, chunk_index=None):
         """Return the chunks for the given diff information.
 
         If a cache key is provided and there are chunks already computed in the
         cache, they will be yielded. Otherwise, new chunks will be generated,
         stored in cache (given a cache key), and yielded.
+
+        If a chunk index is provided and the chunks are cached, only that
+        chunk will have its lines loaded. The others will be summaries
+        without lines. See :py:meth:`ChunkCache.get_chunks
+        <reviewboard.diffviewer.chunk_cache.ChunkCache.get_chunks>`.
         """
         if cache_key:
-            chunks = cache_memoize(cache_key,
-                                   lambda: list(self.get_chunks_uncached()),
-                                   large_data=True)
+            chunks = get_chunk_cache().get_chunks(cache_key,
+                                                  self.get_chunks_uncached,
+                                                  chunk_index=chunk_index)
         else:
             chunks = self.get_chunks_uncached()
 
@@ -113,9 +128,15 @@ class RawDiffChunkGenerator(object):
 
     def get_chunks_uncached(self):
         """Yield the list of chunks, bypassing the cache."""
-        for chunk in self.generate_chunks(self.old, self.new):
+        old, new = self._get_sources()
+
+        for chunk in self.generate_chunks(old, new):
             yield chunk
 
+    def _get_sources(self):
+        """Return the original and modified files to diff."""
+        return self.old, self.new
+
     def generate_chunks(self, old, new):
         """Generate chunks for the difference between two strings.
 
@@ -148,6 +169,9 @@ class RawDiffChunkGenerator(object):
         a_num_lines = len(a)
         b_num_lines = len(b)
 
+        lexer_a = None
+        lexer_b = None
+
         if is_lists:
             markup_a = a
             markup_b = b
@@ -161,14 +185,33 @@ class RawDiffChunkGenerator(object):
                 dest_file = \
                     self.normalize_path_for_display(self.modified_filename)
 
+                # Large files only have the lines that will be shown
+                # highlighted up front. See highlight_chunks(). Lexers treat
+                # a lone carriage return as a newline, so files containing
+                # them are highlighted in full, in order to line up the
+                # highlighted lines.
+                highlight_regions = (
+                    max(a_num_lines, b_num_lines) >=
+                    self.HIGHLIGHT_REGIONS_MIN_LINES and
+                    old.count('\r') == old.count('\r\n') and
+                    new.count('\r') == new.count('\r\n'))
+
                 try:
                     # TODO: Try to figure out the right lexer for these files
                     #       once instead of twice.
                     if not source_file.endswith(self.STYLED_EXT_BLACKLIST):
-                        markup_a = self._apply_pygments(old or '', source_file)
+                        if highlight_regions:
+                            lexer_a = self._get_lexer(old or '', source_file)
+                        else:
+                            markup_a = self._apply_pygments(old or '',
+                                                            source_file)
 
                     if not dest_file.endswith(self.STYLED_EXT_BLACKLIST):
-                        markup_b = self._apply_pygments(new or '', dest_file)
+                        if highlight_regions:
+                            lexer_b = self._get_lexer(new or '', dest_file)
+                        else:
+                            markup_b = self._apply_pygments(new or '',
+                                                            dest_file)
                 except:
                     pass
 
@@ -191,10 +234,33 @@ class RawDiffChunkGenerator(object):
         self.differ.add_interesting_lines_for_headers(self.orig_filename)
 
         context_num_lines = siteconfig.get("diffviewer_context_num_lines")
-        collapse_threshold = 2 * context_num_lines + 3
 
         line_num = 1
         opcodes_generator = self.get_opcode_generator()
+        pending_highlight = None
+
+        if lexer_a or lexer_b:
+            # Only the lines in chunks that are shown expanded are
+            # highlighted now. The rest are highlighted if and when their
+            # chunks are expanded.
+            opcodes_generator = list(opcodes_generator)
+            ranges_a, ranges_b = self._get_visible_line_ranges(
+                opcodes_generator, a_num_lines, b_num_lines,
+                context_num_lines)
+            pending_highlight = {
+                'old': None,
+                'new': None,
+            }
+
+            for key, data, filename, lexer, markup, ranges in (
+                    ('old', old, source_file, lexer_a, markup_a, ranges_a),
+                    ('new', new, dest_file, lexer_b, markup_b, ranges_b)):
+                if lexer:
+                    self._highlight_regions(data, lexer, ranges, markup)
+                    pending_highlight[key] = {
+                        'filename': filename,
+                        'sha1': self._store_highlight_source(data),
+                    }
 
         counts = {
             'equal': 0,
@@ -215,23 +281,20 @@ class RawDiffChunkGenerator(object):
 
             counts[tag] += num_lines
 
-            if tag == 'equal' and num_lines > collapse_threshold:
-                last_range_start = num_lines - context_num_lines
+            chunk_ranges = self._get_chunk_ranges(
+                tag, num_lines, line_num == 1,
+                i2 == a_num_lines and j2 == b_num_lines,
+                context_num_lines)
 
-                if line_num == 1:
-                    yield self._new_chunk(lines, 0, last_range_start, True)
-                    yield self._new_chunk(lines, last_range_start, num_lines)
-                else:
-                    yield self._new_chunk(lines, 0, context_num_lines)
-
-                    if i2 == a_num_lines and j2 == b_num_lines:
-                        yield self._new_chunk(lines, context_num_lines,
-                                              num_lines, True)
-                    else:
-                        yield self._new_chunk(lines, context_num_lines,
-                                              last_range_start, True)
-                        yield self._new_chunk(lines, last_range_start,
-                                              num_lines)
+            if len(chunk_ranges) > 1:
+                for start, end, collapsable in chunk_ranges:
+                    chunk = self._new_chunk(lines, start, end, collapsable)
+
+                    if collapsable and pending_highlight:
+                        self._set_pending_highlight(chunk, pending_highlight,
+                                                    meta)
+
+                    yield chunk
             else:
                 yield self._new_chunk(lines, 0, num_lines, False, tag, meta)
 
@@ -239,6 +302,97 @@ class RawDiffChunkGenerator(object):
 
         self.counts = counts
 
+    def highlight_chunk(self, chunk):
+        """Syntax-highlight the lines of a collapsed chunk.
+
+        See :py:meth:`highlight_chunks`.
+        """
+        self.highlight_chunks([chunk])
+
+    def highlight_chunks(self, chunks):
+        """Syntax-highlight the lines of collapsed chunks.
+
+        When generating chunks for large files, lines in collapsed chunks
+        aren't syntax-highlighted, and the chunks are marked as pending.
+        This highlights the lines in such chunks (or in ranges of lines
+        taken from them) in place, once they need to be shown.
+
+        Each file is only lexed once for all the given chunks, so all the
+        chunks that are about to be shown should be passed at once.
+
+        Chunks that aren't pending are left alone. If the file's content is
+        no longer available in the cache, it's loaded again.
+        """
+        pending_chunks = [
+            chunk
+            for chunk in chunks
+            if chunk.get('meta', {}).get('pending_highlight') and
+            chunk['lines']
+        ]
+
+        for key, line_num_index, markup_index in (('old', 1, 2),
+                                                  ('new', 4, 5)):
+            file_chunks = OrderedDict()
+
+            for chunk in pending_chunks:
+                info = chunk['meta']['pending_highlight'][key]
+
+                if info:
+                    file_chunks.setdefault(
+                        (info['sha1'], info['filename']), []).append(chunk)
+
+            for (sha1, filename), chunks_to_highlight in \
+                    six.iteritems(file_chunks):
+                data = self._get_highlight_source(sha1)
+
+                if data is None:
+                    data = self._load_highlight_source(key, sha1)
+
+                    if data is None:
+                        continue
+
+                try:
+                    regions_markup = self._highlight_ranges(
+                        data,
+                        self._get_lexer(data, filename),
+                        [
+                            (chunk['lines'][0][line_num_index] - 1,
+                             chunk['lines'][-1][line_num_index])
+                            for chunk in chunks_to_highlight
+                        ])
+                except:
+                    continue
+
+                for chunk, region_markup in zip(chunks_to_highlight,
+                                                regions_markup):
+                    if region_markup is not None:
+                        self._set_highlighted_lines(chunk, key, markup_index,
+                                                    region_markup)
+
+    def _set_highlighted_lines(self, chunk, key, markup_index,
+                               region_markup):
+        """Sets the highlighted lines for one side of a pending chunk.
+
+        Any indentation changes on the lines are shown again.
+        """
+        indentation_changes = \
+            chunk['meta']['pending_highlight'].get('indentation_changes', {})
+
+        for line, markup in zip(chunk['lines'], region_markup):
+            indentation_change = \
+                indentation_changes.get('%d-%d' % (line[1], line[4]))
+
+            if indentation_change:
+                old_markup, new_markup = self._highlight_indentation(
+                    markup, markup, *indentation_change)
+
+                if key == 'old':
+                    markup = old_markup
+                else:
+                    markup = new_markup
+
+            line[markup_index] = mark_safe(markup)
+
     def normalize_source_string(self, s):
         """Normalize a source string of text to use for the diff.
 
@@ -629,15 +783,239 @@ class RawDiffChunkGenerator(object):
         """Applies Pygments syntax-highlighting to a file's contents.
 
         The resulting HTML will be returned as a list of lines.
+
+        Highlighted lines are cached based on the content and the lexer
+        used, so that files with the same content in other diffs,
+        interdiffs or review requests don't need to be highlighted again.
         """
+        lexer = self._get_lexer(data, filename)
+
+        return cache_memoize(make_highlight_cache_key(data, lexer),
+                             lambda: self._highlight_lines(data, lexer),
+                             large_data=True)
+
+    def _highlight_lines(self, data, lexer):
+        """Highlights a file's contents with the given lexer.
+
+        The resulting HTML will be returned as a list of lines.
+        """
+        return split_line_endings(
+            highlight(data, lexer, NoWrapperHtmlFormatter()))
+
+    def _get_lexer(self, data, filename):
+        """Returns the Pygments lexer to use for a file's contents."""
         lexer = guess_lexer_for_filename(filename,
                                          data,
                                          stripnl=False,
                                          encoding='utf-8')
         lexer.add_filter('codetagify')
 
-        return split_line_endings(
-            highlight(data, lexer, NoWrapperHtmlFormatter()))
+        return lexer
+
+    def _get_chunk_ranges(self, tag, num_lines, is_first, is_last,
+                          context_num_lines):
+        """Returns the ranges of lines in an opcode to build chunks from.
+
+        Long runs of equal lines are split up, so that everything but the
+        lines of context around the changes can be collapsed.
+
+        This returns a list of (start, end, collapsable) tuples, relative
+        to the start of the opcode.
+        """
+        if tag != 'equal' or num_lines <= 2 * context_num_lines + 3:
+            return [(0, num_lines, False)]
+
+        last_range_start = num_lines - context_num_lines
+
+        if is_first:
+            return [
+                (0, last_range_start, True),
+                (last_range_start, num_lines, False),
+            ]
+        elif is_last:
+            return [
+                (0, context_num_lines, False),
+                (context_num_lines, num_lines, True),
+            ]
+        else:
+            return [
+                (0, context_num_lines, False),
+                (context_num_lines, last_range_start, True),
+                (last_range_start, num_lines, False),
+            ]
+
+    def _get_visible_line_ranges(self, opcodes, a_num_lines, b_num_lines,
+                                 context_num_lines):
+        """Returns the ranges of lines that will be in expanded chunks.
+
+        This returns a tuple of lists of (start, end) tuples of 0-based
+        line indexes in the original and modified files.
+        """
+        ranges_a = []
+        ranges_b = []
+        line_num = 1
+
+        for tag, i1, i2, j1, j2, meta in opcodes:
+            num_lines = max(i2 - i1, j2 - j1)
+
+            for start, end, collapsable in self._get_chunk_ranges(
+                    tag, num_lines, line_num == 1,
+                    i2 == a_num_lines and j2 == b_num_lines,
+                    context_num_lines):
+                if not collapsable:
+                    ranges_a.append((min(i1 + start, i2), min(i1 + end, i2)))
+                    ranges_b.append((min(j1 + start, j2), min(j1 + end, j2)))
+
+            line_num += num_lines
+
+        return ranges_a, ranges_b
+
+    def _highlight_regions(self, data, lexer, ranges, markup):
+        """Syntax-highlights ranges of lines in a file.
+
+        The highlighted lines replace the lines in ``markup``. See
+        :py:meth:`_highlight_ranges`.
+        """
+        for (start, end), region_markup in zip(
+                ranges, self._highlight_ranges(data, lexer, ranges)):
+            if region_markup is not None:
+                markup[start:end] = region_markup
+
+    def _highlight_ranges(self, data, lexer, ranges):
+        """Syntax-highlights ranges of lines in a file.
+
+        The file is lexed from the start, so that each line is highlighted
+        exactly as it would be when highlighting the whole file. Lexing stops
+        after the last range, and only the lines in the ranges are formatted.
+
+        This returns a list with the resulting HTML for each range, as a list
+        of lines (or None if the lines couldn't be matched up with the
+        original lines).
+        """
+        max_line_num = max([end for start, end in ranges] or [0])
+        line_tokens = {}
+        line_num = 0
+
+        if max_line_num > 0:
+            for ttype, value in lexer.get_tokens(data):
+                # Split up tokens spanning several lines, so that each line
+                # gets its own part.
+                parts = value.split('\n')
+
+                for part in parts[:-1]:
+                    line_tokens.setdefault(line_num, []).append(
+                        (ttype, part + '\n'))
+                    line_num += 1
+
+                if parts[-1]:
+                    line_tokens.setdefault(line_num, []).append(
+                        (ttype, parts[-1]))
+
+                if line_num >= max_line_num:
+                    break
+
+        formatter = NoWrapperHtmlFormatter()
+        results = []
+
+        for start, end in ranges:
+            tokens = []
+
+            for i in range(start, end):
+                tokens += line_tokens.get(i, [])
+
+            region_markup = self.NEWLINES_RE.split(
+                format_tokens(tokens, formatter))[:end - start]
+
+            if len(region_markup) == end - start:
+                results.append(region_markup)
+            else:
+                # The lines couldn't be matched up with the original lines.
+                results.append(None)
+
+        return results
+
+    def _set_pending_highlight(self, chunk, pending_highlight, meta):
+        """Marks a collapsed chunk as needing syntax highlighting.
+
+        This records what :py:meth:`highlight_chunks` needs in order to
+        highlight the chunk later, including any indentation changes that
+        will need to be shown on its lines again.
+        """
+        pending_highlight = dict(pending_highlight)
+        indentation_changes = meta.get('indentation_changes')
+
+        if indentation_changes:
+            chunk_indentation_changes = {}
+
+            for line in chunk['lines']:
+                line_pair = '%d-%d' % (line[1], line[4])
+
+                if line_pair in indentation_changes:
+                    chunk_indentation_changes[line_pair] = \
+                        indentation_changes[line_pair]
+
+            if chunk_indentation_changes:
+                pending_highlight['indentation_changes'] = \
+                    chunk_indentation_changes
+
+        chunk['meta']['pending_highlight'] = pending_highlight
+
+    def _store_highlight_source(self, data):
+        """Stores a file's contents for highlighting chunks later.
+
+        The contents are stored in the cache based on their SHA1, which is
+        returned.
+        """
+        sha1 = hashlib.sha1(data.encode('utf-8')).hexdigest()
+        cache_memoize(make_highlight_source_cache_key(sha1),
+                      lambda: data,
+                      large_data=True)
+
+        return sha1
+
+    def _load_highlight_source(self, key, sha1):
+        """Loads a file's contents again for highlighting chunks.
+
+        This is used when the contents stored by
+        :py:meth:`_store_highlight_source` are no longer in the cache. The
+        file is loaded again and stored, so that chunks aren't left unstyled.
+
+        If the file's contents have changed, this returns None.
+        """
+        if sha1 not in self._highlight_sources:
+            old, new = self._get_sources()
+
+            if key == 'old':
+                source = old
+            else:
+                source = new
+
+            data = None
+
+            if source is not None and not isinstance(source, list):
+                source = self.normalize_source_string(source)[0]
+
+                if self._store_highlight_source(source) == sha1:
+                    data = source
+
+            self._highlight_sources[sha1] = data
+
+        return self._highlight_sources[sha1]
+
+    def _get_highlight_source(self, sha1):
+        """Returns a file's contents stored for highlighting chunks.
+
+        If the contents are no longer in the cache, this returns None.
+        """
+        def _get_missing_source():
+            raise KeyError(sha1)
+
+        try:
+            return cache_memoize(make_highlight_source_cache_key(sha1),
+                                 _get_missing_source,
+                                 large_data=True)
+        except KeyError:
+            return None
 
 
 class DiffChunkGenerator(RawDiffChunkGenerator):
@@ -702,22 +1080,9 @@ class DiffChunkGenerator(RawDiffChunkGenerator):
 
     def make_cache_key(self):
         """Create a cache key for any generated chunks."""
-        key = 'diff-sidebyside-'
-
-        if self.enable_syntax_highlighting:
-            key += 'hl-'
-
-        if not self.force_interdiff:
-            key += six.text_type(self.filediff.pk)
-        elif self.interfilediff:
-            key += 'interdiff-%s-%s' % (self.filediff.pk,
-                                        self.interfilediff.pk)
-        else:
-            key += 'interdiff-%s-none' % self.filediff.pk
-
-        key += '-%s' % get_language()
-
-        return key
+        return make_chunks_cache_key(self.filediff, self.interfilediff,
+                                     self.force_interdiff,
+                                     self.enable_syntax_highlighting)
 
     def get_opcode_generator(self):
         """Return the DiffOpcodeGenerator used to generate diff opcodes."""
@@ -730,7 +1095,7 @@ class DiffChunkGenerator(RawDiffChunkGenerator):
 
         return get_diff_opcode_generator(self.differ, diff, interdiff)
 
-    def get_chunks(self):
+    def get_chunks(self, chunk_index=None):
         """Return the chunks for the given diff information.
 
         If the file is binary or is an added or deleted 0-length file, or if
@@ -740,6 +1105,10 @@ class DiffChunkGenerator(RawDiffChunkGenerator):
         If there are chunks already computed in the cache, they will be
         yielded. Otherwise, new chunks will be generated, stored in cache,
         and yielded.
+
+        If a chunk index is provided and the chunks are cached, only that
+        chunk will have its lines loaded. The others will be summaries
+        without lines.
         """
         counts = self.filediff.get_line_counts()
 
@@ -751,41 +1120,22 @@ class DiffChunkGenerator(RawDiffChunkGenerator):
              counts['raw_delete_count'] == 0)):
             raise StopIteration
 
+        if (self.interfilediff and
+            self.filediff.patched_sha1 is not None and
+            self.filediff.patched_sha1 == self.interfilediff.patched_sha1):
+            # Both revisions of the file are identical, so there's nothing
+            # to show, and no need to fetch or patch the files.
+            raise StopIteration
+
         cache_key = self.make_cache_key()
 
-        for chunk in super(DiffChunkGenerator, self).get_chunks(cache_key):
+        for chunk in super(DiffChunkGenerator, self).get_chunks(
+                cache_key, chunk_index=chunk_index):
             yield chunk
 
     def get_chunks_uncached(self):
         """Yield the list of chunks, bypassing the cache."""
-        old = get_original_file(self.filediff, self.request,
-                                self.encoding_list)
-        new = get_patched_file(old, self.filediff, self.request)
-
-        if self.filediff.orig_sha1 is None:
-            self.filediff.extra_data.update({
-                'orig_sha1': self._get_checksum(old),
-                'patched_sha1': self._get_checksum(new),
-            })
-            self.filediff.save(update_fields=['extra_data'])
-
-        if self.interfilediff:
-            old = new
-            interdiff_orig = get_original_file(self.interfilediff,
-                                               self.request,
-                                               self.encoding_list)
-            new = get_patched_file(interdiff_orig, self.interfilediff,
-                                   self.request)
-
-            if self.interfilediff.orig_sha1 is None:
-                self.interfilediff.extra_data.update({
-                    'orig_sha1': self._get_checksum(interdiff_orig),
-                    'patched_sha1': self._get_checksum(new),
-                })
-                self.interfilediff.save(update_fields=['extra_data'])
-        elif self.force_interdiff:
-            # Basically, revert the change.
-            old, new = new, old
+        old, new = self._get_sources()
 
         if self.interfilediff:
             log_timer = log_timed(
@@ -818,6 +1168,42 @@ class DiffChunkGenerator(RawDiffChunkGenerator):
                 total_line_count=(insert_count + delete_count +
                                   replace_count + equal_count))
 
+    def _get_sources(self):
+        """Return the original and modified files to diff.
+
+        The files are fetched from the repository and patched.
+        """
+        old = get_original_file(self.filediff, self.request,
+                                self.encoding_list)
+        new = get_patched_file(old, self.filediff, self.request)
+
+        if self.filediff.orig_sha1 is None:
+            self.filediff.extra_data.update({
+                'orig_sha1': self._get_checksum(old),
+                'patched_sha1': self._get_checksum(new),
+            })
+            self.filediff.save(update_fields=['extra_data'])
+
+        if self.interfilediff:
+            old = new
+            interdiff_orig = get_original_file(self.interfilediff,
+                                               self.request,
+                                               self.encoding_list)
+            new = get_patched_file(interdiff_orig, self.interfilediff,
+                                   self.request)
+
+            if self.interfilediff.orig_sha1 is None:
+                self.interfilediff.extra_data.update({
+                    'orig_sha1': self._get_checksum(interdiff_orig),
+                    'patched_sha1': self._get_checksum(new),
+                })
+                self.interfilediff.save(update_fields=['extra_data'])
+        elif self.force_interdiff:
+            # Basically, revert the change.
+            old, new = new, old
+
+        return old, new
+
     def normalize_path_for_display(self, filename):
         return self.tool.normalize_path_for_display(filename)
 
@@ -858,6 +1244,92 @@ def compute_chunk_last_header(lines, numlines, meta, last_header=None):
 
 _generator = DiffChunkGenerator
 
+#: The version of the highlighted markup stored in cache.
+#:
+#: This must be incremented whenever the markup produced for a file changes,
+#: in order to invalidate what was previously stored.
+HIGHLIGHT_CACHE_VERSION = 1
+
+
+def make_highlight_cache_key(data, lexer):
+    """Return the cache key for the highlighted lines of a file.
+
+    The key is based on the file's content rather than where it came from,
+    so files with the same content share highlighted lines no matter which
+    diffs they're shown in.
+
+    Args:
+        data (unicode):
+            The normalized content of the file.
+
+        lexer (pygments.lexer.Lexer):
+            The lexer used to highlight the file.
+
+    Returns:
+        unicode:
+        The cache key for the highlighted lines.
+    """
+    return 'diff-highlight-v%s-%s-%s-%s' % (
+        HIGHLIGHT_CACHE_VERSION,
+        pygments.__version__,
+        lexer.__class__.__name__,
+        hashlib.sha1(data.encode('utf-8')).hexdigest())
+
+
+def make_highlight_source_cache_key(sha1):
+    """Return the cache key for a file's contents stored for highlighting.
+
+    Args:
+        sha1 (unicode):
+            The SHA1 of the normalized content of the file.
+
+    Returns:
+        unicode:
+        The cache key for the file's contents.
+    """
+    return 'diff-highlight-source-%s' % sha1
+
+
+def make_chunks_cache_key(filediff, interfilediff=None, force_interdiff=False,
+                          enable_syntax_highlighting=True):
+    """Return the cache key for the chunks generated for a file.
+
+    This is the key used by :py:class:`DiffChunkGenerator`, and allows
+    callers to check for cached chunks without building a generator.
+
+    Args:
+        filediff (reviewboard.diffviewer.models.FileDiff):
+            The FileDiff the chunks are generated for.
+
+        interfilediff (reviewboard.diffviewer.models.FileDiff, optional):
+            The FileDiff on the other end of an interdiff range.
+
+        force_interdiff (bool, optional):
+            Whether the chunks are for an interdiff.
+
+        enable_syntax_highlighting (bool, optional):
+            Whether the chunks are syntax-highlighted.
+
+    Returns:
+        unicode:
+        The cache key for the chunks.
+    """
+    key = 'diff-sidebyside-'
+
+    if enable_syntax_highlighting:
+        key += 'hl-'
+
+    if not force_interdiff:
+        key += six.text_type(filediff.pk)
+    elif interfilediff:
+        key += 'interdiff-%s-%s' % (filediff.pk, interfilediff.pk)
+    else:
+        key += 'interdiff-%s-none' % filediff.pk
+
+    key += '-%s' % get_language()
+
+    return key
+
 
 def get_diff_chunk_generator_class():
     """Returns the DiffChunkGenerator class used for generating chunks."""
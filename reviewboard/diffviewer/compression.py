@@ -0,0 +1,453 @@
+"""Compression methods for stored diff content.
+
+Each method is identified by the single-character code stored in
+:py:attr:`RawFileDiffData.compression
+<reviewboard.diffviewer.models.RawFileDiffData.compression>`. Stored content
+can be decompressed with any method that's available, and new content is
+compressed with the best one enabled (see :py:func:`choose_codec`).
+
+Zstandard compression requires the :py:mod:`zstandard` module, and is only
+used for new content if ``settings.DIFF_COMPRESSION_USE_ZSTD`` is enabled.
+Every server sharing the database and cache needs the module to read that
+content, so it's not used just because the module is installed. A shared
+dictionary, trained on existing diffs through the :command:`reencode-diffs`
+management command, can be used to better compress small diffs by pointing
+``settings.DIFF_ZSTD_DICTIONARY_FILE`` at the file. When replacing it with a
+newly trained one, the old file should be listed in
+``settings.DIFF_ZSTD_OLD_DICTIONARY_FILES``, so that diffs compressed with it
+can still be read.
+"""
+
+from __future__ import unicode_literals
+
+import bz2
+import logging
+import zlib
+
+from django.conf import settings
+from django.utils.six.moves import range
+
+from reviewboard.diffviewer.errors import MissingCompressionDictionaryError
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class CompressionCodec(object):
+    """Base class for a method of compressing diff content.
+
+    Attributes:
+        code (unicode):
+            The code stored alongside content compressed with this method.
+
+        name (unicode):
+            The name of the method, for display.
+    """
+
+    code = None
+    name = None
+
+    #: The amount of compressed content to decompress at a time.
+    #:
+    #: This is used by :py:meth:`iter_decompress`.
+    decompress_chunk_size = 64 * 1024
+
+    def is_available(self):
+        """Return whether this method can be used.
+
+        Returns:
+            bool:
+            Whether any required modules or data are available.
+        """
+        return True
+
+    def can_decompress(self):
+        """Return whether content compressed with this method can be read.
+
+        By default, this is the same as :py:meth:`is_available`.
+
+        Returns:
+            bool:
+            Whether content compressed with this method can be decompressed.
+        """
+        return self.is_available()
+
+    def compress(self, data):
+        """Compress content.
+
+        Args:
+            data (bytes):
+                The content to compress.
+
+        Returns:
+            bytes:
+            The compressed content.
+        """
+        raise NotImplementedError
+
+    def decompress(self, data):
+        """Decompress content.
+
+        Args:
+            data (bytes):
+                The compressed content.
+
+        Returns:
+            bytes:
+            The original content.
+        """
+        raise NotImplementedError
+
+    def iter_decompress(self, data, chunk_size=None):
+        """Decompress content incrementally.
+
+        The compressed content is fed to the decompressor a piece at a time,
+        so that the original content never has to be held in memory all at
+        once.
+
+        Args:
+            data (bytes):
+                The compressed content.
+
+            chunk_size (int, optional):
+                The amount of compressed content to decompress at a time.
+                Defaults to :py:attr:`decompress_chunk_size`.
+
+        Yields:
+            bytes:
+            Each piece of the original content.
+        """
+        decompressor = self.get_decompressor(data)
+
+        if decompressor is None:
+            yield self.decompress(data)
+            return
+
+        chunk_size = chunk_size or self.decompress_chunk_size
+
+        for i in range(0, len(data), chunk_size):
+            content = decompressor.decompress(data[i:i + chunk_size])
+
+            if content:
+                yield content
+
+        if hasattr(decompressor, 'flush'):
+            content = decompressor.flush()
+
+            if content:
+                yield content
+
+    def get_decompressor(self, data):
+        """Return an object for decompressing content incrementally.
+
+        The object must have a ``decompress`` method taking each piece of
+        compressed content, and may have a ``flush`` method returning any
+        remaining content at the end.
+
+        Args:
+            data (bytes):
+                The compressed content that will be decompressed.
+
+        Returns:
+            object:
+            The decompressor, or ``None`` if content can only be decompressed
+            all at once.
+        """
+        return None
+
+
+class Bzip2Codec(CompressionCodec):
+    """Compression using bzip2.
+
+    This was the only method available in the past. It compresses well, but
+    is slow to both compress and decompress, so it's only used to read
+    existing content.
+    """
+
+    code = 'B'
+    name = 'bzip2'
+
+    def compress(self, data):
+        return bz2.compress(data, 9)
+
+    def decompress(self, data):
+        return bz2.decompress(data)
+
+    def get_decompressor(self, data):
+        return bz2.BZ2Decompressor()
+
+
+class ZlibCodec(CompressionCodec):
+    """Compression using zlib.
+
+    This is always available, and is much faster than bzip2 at the cost of
+    a slightly larger result.
+    """
+
+    code = 'Z'
+    name = 'zlib'
+
+    def compress(self, data):
+        return zlib.compress(data, 6)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+    def get_decompressor(self, data):
+        return zlib.decompressobj()
+
+
+class ZstdCodec(CompressionCodec):
+    """Compression using Zstandard.
+
+    This compresses about as well as bzip2 while decompressing faster than
+    zlib.
+    """
+
+    code = 'S'
+    name = 'zstd'
+
+    #: The compression level to use.
+    level = 9
+
+    def is_available(self):
+        return zstandard is not None
+
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def decompress(self, data):
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    def get_decompressor(self, data):
+        return zstandard.ZstdDecompressor().decompressobj()
+
+
+class ZstdDictionaryCodec(ZstdCodec):
+    """Compression using Zstandard with a shared dictionary.
+
+    New content is compressed with the dictionary loaded from the file in
+    ``settings.DIFF_ZSTD_DICTIONARY_FILE``. Content compressed with a
+    dictionary can only be decompressed with the same dictionary, so the
+    file must be kept as long as content compressed with it exists.
+
+    Dictionaries are identified by the ID Zstandard stores in both the
+    dictionary and the compressed content. Content compressed with a
+    dictionary that has since been replaced can be read as long as the old
+    file is listed in ``settings.DIFF_ZSTD_OLD_DICTIONARY_FILES``.
+    """
+
+    code = 'D'
+    name = 'zstd (dictionary)'
+
+    #: The largest content to compress using the dictionary.
+    #:
+    #: Beyond this, the content itself provides enough history that the
+    #: dictionary no longer helps.
+    max_size = 64 * 1024
+
+    def __init__(self):
+        self._dictionary = None
+        self._dictionaries = {}
+        self._dictionary_paths = None
+
+    def is_available(self):
+        return self.get_dictionary() is not None
+
+    def can_decompress(self):
+        # Whether the dictionary for a particular piece of content is
+        # available is checked when decompressing it.
+        return zstandard is not None
+
+    def get_dictionary(self):
+        """Return the shared dictionary for new content, if one is configured.
+
+        Returns:
+            zstandard.ZstdCompressionDict:
+            The dictionary, or ``None`` if it isn't configured or can't be
+            loaded.
+        """
+        self._load_dictionaries()
+
+        return self._dictionary
+
+    def get_dictionary_by_id(self, dict_id):
+        """Return the configured dictionary with the given ID.
+
+        Args:
+            dict_id (int):
+                The ID of the dictionary.
+
+        Returns:
+            zstandard.ZstdCompressionDict:
+            The dictionary, or ``None`` if no configured dictionary has that
+            ID.
+        """
+        self._load_dictionaries()
+
+        return self._dictionaries.get(dict_id)
+
+    def get_dict_id(self, data):
+        """Return the ID of the dictionary content was compressed with.
+
+        Args:
+            data (bytes):
+                The compressed content.
+
+        Returns:
+            int:
+            The ID of the dictionary.
+        """
+        return zstandard.get_frame_parameters(data).dict_id
+
+    def _load_dictionaries(self):
+        """Load the configured dictionaries, if they've changed."""
+        path = getattr(settings, 'DIFF_ZSTD_DICTIONARY_FILE', None)
+        old_paths = tuple(getattr(settings, 'DIFF_ZSTD_OLD_DICTIONARY_FILES',
+                                  []))
+
+        if zstandard is None or (path, old_paths) == self._dictionary_paths:
+            return
+
+        self._dictionary = None
+        self._dictionaries = {}
+
+        for old_path in old_paths:
+            dictionary = self._load_dictionary(old_path)
+
+            if dictionary is not None:
+                self._dictionaries[dictionary.dict_id()] = dictionary
+
+        if path:
+            dictionary = self._load_dictionary(path)
+
+            if dictionary is not None:
+                # Preparing the dictionary is expensive, so it's done once
+                # up front instead of for every diff.
+                dictionary.precompute_compress(level=self.level)
+
+                self._dictionary = dictionary
+                self._dictionaries[dictionary.dict_id()] = dictionary
+
+        self._dictionary_paths = (path, old_paths)
+
+    def _load_dictionary(self, path):
+        """Load a dictionary from a file.
+
+        Args:
+            path (unicode):
+                The path to the dictionary.
+
+        Returns:
+            zstandard.ZstdCompressionDict:
+            The dictionary, or ``None`` if it couldn't be loaded.
+        """
+        try:
+            with open(path, 'rb') as fp:
+                return zstandard.ZstdCompressionDict(fp.read())
+        except (IOError, zstandard.ZstdError) as e:
+            logging.error('Unable to load the diff compression '
+                          'dictionary "%s": %s',
+                          path, e)
+            return None
+
+    def compress(self, data):
+        return zstandard.ZstdCompressor(
+            level=self.level,
+            dict_data=self.get_dictionary()).compress(data)
+
+    def decompress(self, data):
+        return self._get_zstd_decompressor(data).decompress(data)
+
+    def get_decompressor(self, data):
+        return self._get_zstd_decompressor(data).decompressobj()
+
+    def _get_zstd_decompressor(self, data):
+        """Return a decompressor using the dictionary for the content.
+
+        Args:
+            data (bytes):
+                The compressed content.
+
+        Returns:
+            zstandard.ZstdDecompressor:
+            The decompressor.
+
+        Raises:
+            reviewboard.diffviewer.errors.MissingCompressionDictionaryError:
+                The dictionary the content was compressed with isn't
+                configured.
+        """
+        dict_id = self.get_dict_id(data)
+        dictionary = self.get_dictionary_by_id(dict_id)
+
+        if dictionary is None:
+            raise MissingCompressionDictionaryError(dict_id)
+
+        return zstandard.ZstdDecompressor(dict_data=dictionary)
+
+
+_codecs = {}
+
+
+def register_codec(codec):
+    """Register a compression method.
+
+    Args:
+        codec (CompressionCodec):
+            The compression method to register.
+    """
+    _codecs[codec.code] = codec
+
+
+def get_codec(code):
+    """Return the compression method with the given code.
+
+    Args:
+        code (unicode):
+            The code for the compression method.
+
+    Returns:
+        CompressionCodec:
+        The compression method, or ``None`` if there isn't one registered
+        with that code.
+    """
+    return _codecs.get(code)
+
+
+def choose_codec(size):
+    """Return the best enabled method for compressing content.
+
+    If ``settings.DIFF_COMPRESSION_USE_ZSTD`` is enabled and the
+    :py:mod:`zstandard` module is available, small content is compressed
+    using a shared Zstandard dictionary, if one is configured, and other
+    content with Zstandard. Otherwise, zlib is used.
+
+    Args:
+        size (int):
+            The size of the content to compress.
+
+    Returns:
+        CompressionCodec:
+        The compression method to use.
+    """
+    if not settings.DIFF_COMPRESSION_USE_ZSTD:
+        return _codecs[ZlibCodec.code]
+
+    zstd_dict_codec = _codecs[ZstdDictionaryCodec.code]
+
+    if size <= zstd_dict_codec.max_size and zstd_dict_codec.is_available():
+        return zstd_dict_codec
+
+    zstd_codec = _codecs[ZstdCodec.code]
+
+    if zstd_codec.is_available():
+        return zstd_codec
+
+    return _codecs[ZlibCodec.code]
+
+
+for _codec_cls in (Bzip2Codec, ZlibCodec, ZstdCodec, ZstdDictionaryCodec):
+    register_codec(_codec_cls())
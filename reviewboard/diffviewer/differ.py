@@ -2,6 +2,9 @@ from __future__ import unicode_literals
 
 import os
 
+from django.conf import settings
+from djblets.siteconfig.models import SiteConfiguration
+
 from reviewboard.diffviewer.errors import DiffCompatError
 from reviewboard.diffviewer.filetypes import (HEADER_REGEXES,
                                               HEADER_REGEX_ALIASES)
@@ -20,10 +23,21 @@ class DiffCompatVersion(object):
     # (prevents very long diff times for certain files)
     MYERS_SMS_COST_BAIL = 2
 
+    # Histogram differ, falling back on the Myers differ (with bailing on
+    # a too high SMS cost) for regions without unique lines.
+    HISTOGRAM = 3
+
     DEFAULT = MYERS_SMS_COST_BAIL
 
     MYERS_VERSIONS = (MYERS, MYERS_SMS_COST_BAIL)
 
+    # The diff algorithms that can be chosen for new diffs in the site
+    # settings, mapped to their compatibility versions.
+    ALGORITHMS = {
+        'myers': MYERS_SMS_COST_BAIL,
+        'histogram': HISTOGRAM,
+    }
+
 
 class Differ(object):
     """Base class for differs."""
@@ -91,12 +105,27 @@ def get_differ(a, b, ignore_space=False,
     By default, this will return the MyersDiffer. Older differs can be used
     by specifying a compat_version, but this is only for *really* ancient
     diffs, currently.
+
+    Newer diffs may instead use the HistogramDiffer, if it was the diff
+    algorithm chosen in the site settings when they were uploaded (see
+    get_default_compat_version).
+
+    For Myers diffs, the accelerated FastMyersDiffer is used unless
+    ``settings.DIFF_USE_FAST_MYERS_DIFFER`` is ``False``. Both produce the
+    same results.
     """
     cls = None
 
     if compat_version in DiffCompatVersion.MYERS_VERSIONS:
-        from reviewboard.diffviewer.myersdiff import MyersDiffer
-        cls = MyersDiffer
+        if getattr(settings, 'DIFF_USE_FAST_MYERS_DIFFER', True):
+            from reviewboard.diffviewer.fastmyersdiff import FastMyersDiffer
+            cls = FastMyersDiffer
+        else:
+            from reviewboard.diffviewer.myersdiff import MyersDiffer
+            cls = MyersDiffer
+    elif compat_version == DiffCompatVersion.HISTOGRAM:
+        from reviewboard.diffviewer.histogramdiff import HistogramDiffer
+        cls = HistogramDiffer
     elif compat_version == DiffCompatVersion.SMDIFFER:
         from reviewboard.diffviewer.smdiff import SMDiffer
         cls = SMDiffer
@@ -106,3 +135,19 @@ def get_differ(a, b, ignore_space=False,
             compat_version)
 
     return cls(a, b, ignore_space, compat_version=compat_version)
+
+
+def get_default_compat_version():
+    """Return the compatibility version to use for new diffs.
+
+    This is based on the diff algorithm chosen in the site settings.
+
+    Returns:
+        int:
+        The compatibility version to store for new diffs.
+    """
+    siteconfig = SiteConfiguration.objects.get_current()
+
+    return DiffCompatVersion.ALGORITHMS.get(
+        siteconfig.get('diffviewer_diff_algorithm'),
+        DiffCompatVersion.DEFAULT)
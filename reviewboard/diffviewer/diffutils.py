@@ -1,5 +1,6 @@
 from __future__ import unicode_literals
 
+import hashlib
 import logging
 import os
 import re
@@ -10,10 +11,13 @@ from difflib import SequenceMatcher
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils import six
 from django.utils.translation import ugettext as _
+from djblets.cache.backend import cache_memoize
 from djblets.log import log_timed
 from djblets.siteconfig.models import SiteConfiguration
 from djblets.util.contextmanagers import controlled_subprocess
 
+from reviewboard.diffviewer.errors import PatchRejectedError
+from reviewboard.diffviewer.patcher import apply_patch
 from reviewboard.scmtools.core import PRE_CREATION, HEAD
 
 
@@ -118,9 +122,13 @@ def split_line_endings(data):
 
 
 def patch(diff, file, filename, request=None):
-    """Apply a diff to a file.  Delegates out to `patch` because noone
-       except Larry Wall knows how to patch."""
+    """Apply a diff to a file.
 
+    The diff is applied in-process whenever possible. If any of the hunks
+    can't be applied that way (or the diff isn't a unified diff), this will
+    fall back on delegating out to `patch`, because noone except Larry Wall
+    knows how to patch.
+    """
     log_timer = log_timed("Patching file %s" % filename,
                           request=request)
 
@@ -128,16 +136,40 @@ def patch(diff, file, filename, request=None):
         # Someone uploaded an unchanged file. Return the one we're patching.
         return file
 
+    file = convert_line_endings(file)
+    diff = convert_line_endings(diff)
+
+    try:
+        data = apply_patch(diff, file)
+    except PatchRejectedError as e:
+        logging.debug('Unable to apply the diff for %s in-process (%s). '
+                      'Falling back to patch.',
+                      filename, e, request=request)
+
+        try:
+            data = _patch_with_tool(diff, file, filename)
+        except Exception:
+            log_timer.done()
+            raise
+
+    log_timer.done()
+
+    return data
+
+
+def _patch_with_tool(diff, file, filename):
+    """Apply a diff to a file using the `patch` executable.
+
+    The diff and file must already have normalized line endings.
+    """
     # Prepare the temporary directory if none is available
     tempdir = tempfile.mkdtemp(prefix='reviewboard.')
 
     (fd, oldfile) = tempfile.mkstemp(dir=tempdir)
     f = os.fdopen(fd, "w+b")
-    f.write(convert_line_endings(file))
+    f.write(file)
     f.close()
 
-    diff = convert_line_endings(diff)
-
     newfile = '%s-new' % oldfile
 
     process = subprocess.Popen(['patch', '-o', newfile, oldfile],
@@ -153,8 +185,6 @@ def patch(diff, file, filename, request=None):
         with open("%s.diff" % absolute_path, 'w') as f:
             f.write(diff)
 
-        log_timer.done()
-
         # FIXME: This doesn't provide any useful error report on why the patch
         # failed to apply, which makes it hard to debug.  We might also want to
         # have it clean up if DEBUG=False
@@ -176,8 +206,6 @@ def patch(diff, file, filename, request=None):
     os.unlink(newfile)
     os.rmdir(tempdir)
 
-    log_timer.done()
-
     return data
 
 
@@ -233,6 +261,74 @@ def get_patched_file(buffer, filediff, request):
     return patch(diff, buffer, filediff.dest_file, request)
 
 
+def update_filediff_checksums(filediff, request=None):
+    """Compute and store the SHA1s of a FileDiff's original and patched files.
+
+    These are normally computed when the file's diff chunks are first
+    generated. Computing them ahead of time lets interdiffs skip files that
+    are identical after patching without fetching or patching anything.
+
+    Binary files, files without a source revision, and files that already
+    have their SHA1s stored are skipped.
+
+    Args:
+        filediff (reviewboard.diffviewer.models.FileDiff):
+            The FileDiff to compute the SHA1s for.
+
+        request (django.http.HttpRequest, optional):
+            The HTTP request from the client, if any.
+
+    Returns:
+        bool:
+            Whether the SHA1s were computed and stored.
+    """
+    if (filediff.binary or
+        filediff.source_revision == '' or
+        filediff.orig_sha1 is not None):
+        return False
+
+    encoding_list = filediff.diffset.repository.get_encoding_list()
+
+    try:
+        orig = get_original_file(filediff, request, encoding_list)
+        patched = get_patched_file(orig, filediff, request)
+    except Exception as e:
+        logging.warning('Unable to compute the original and patched SHA1s '
+                        'for FileDiff %s: %s',
+                        filediff.pk, e)
+        return False
+
+    filediff.extra_data.update({
+        'orig_sha1': hashlib.sha1(orig).hexdigest(),
+        'patched_sha1': hashlib.sha1(patched).hexdigest(),
+    })
+    filediff.save(update_fields=['extra_data'])
+
+    return True
+
+
+def update_diffset_checksums(diffset_id):
+    """Compute and store the SHA1s of all files in a DiffSet.
+
+    This is run in the background after a diff is uploaded. See
+    :py:func:`update_filediff_checksums`.
+
+    Args:
+        diffset_id (int):
+            The ID of the DiffSet.
+    """
+    from reviewboard.diffviewer.models import FileDiff
+
+    filediffs = (
+        FileDiff.objects
+        .filter(diffset=diffset_id)
+        .select_related('diffset', 'diffset__repository')
+    )
+
+    for filediff in filediffs:
+        update_filediff_checksums(filediff)
+
+
 def get_revision_str(revision):
     if revision == HEAD:
         return "HEAD"
@@ -251,12 +347,15 @@ def get_diff_files(diffset, filediff=None, interdiffset=None, request=None):
     such as the index, original/modified names, revisions, associated
     filediffs/diffsets, and so on.
 
+    Which files are shown, and in what order, is stored in a manifest in the
+    cache (see :py:func:`get_diff_files_manifest`), so the work of matching
+    up and sorting the files only happens once per diff. Looking up a single
+    file only needs to load that file's FileDiffs.
+
     This can be used along with populate_diff_chunks to build a full list
     containing all diff chunks used for rendering a side-by-side diff.
     """
     if filediff:
-        filediffs = [filediff]
-
         if interdiffset:
             log_timer = log_timed("Generating diff file info for "
                                   "interdiffset ids %s-%s, filediff %s" %
@@ -268,8 +367,6 @@ def get_diff_files(diffset, filediff=None, interdiffset=None, request=None):
                                   (diffset.id, filediff.id),
                                   request=request)
     else:
-        filediffs = diffset.files.select_related().all()
-
         if interdiffset:
             log_timer = log_timed("Generating diff file info for "
                                   "interdiffset ids %s-%s" %
@@ -280,6 +377,163 @@ def get_diff_files(diffset, filediff=None, interdiffset=None, request=None):
                                   "diffset id %s" % diffset.id,
                                   request=request)
 
+    manifest = get_diff_files_manifest(diffset, interdiffset)
+
+    if filediff:
+        position = manifest['positions'].get(filediff.pk)
+
+        if position is None:
+            entries = []
+        else:
+            entries = [manifest['files'][position]]
+
+        filediffs = {
+            filediff.pk: filediff,
+        }
+        interfilediff_ids = [
+            interfilediff_id
+            for (filediff_id, interfilediff_id, force_interdiff, index,
+                 depot_filename, dest_filename) in entries
+            if interfilediff_id is not None
+        ]
+
+        if interfilediff_ids:
+            filediffs.update(
+                (interfilediff.pk, interfilediff)
+                for interfilediff in interdiffset.files.filter(
+                    pk__in=interfilediff_ids)
+            )
+    else:
+        entries = manifest['files']
+        filediffs = dict(
+            (temp_filediff.pk, temp_filediff)
+            for temp_filediff in diffset.files.select_related().all()
+        )
+
+        if interdiffset:
+            filediffs.update(
+                (interfilediff.pk, interfilediff)
+                for interfilediff in interdiffset.files.all()
+            )
+
+    files = []
+
+    for (filediff_id, interfilediff_id, force_interdiff, index,
+         depot_filename, dest_filename) in entries:
+        filediff = filediffs[filediff_id]
+
+        if interfilediff_id is None:
+            interfilediff = None
+        else:
+            interfilediff = filediffs[interfilediff_id]
+
+        newfile = filediff.is_new
+
+        if interdiffset:
+            source_revision = _("Diff Revision %s") % diffset.revision
+
+            if not interfilediff and force_interdiff:
+                dest_revision = (_("Diff Revision %s - File Reverted") %
+                                 interdiffset.revision)
+            else:
+                dest_revision = _("Diff Revision %s") % interdiffset.revision
+        else:
+            source_revision = get_revision_str(filediff.source_revision)
+
+            if newfile:
+                dest_revision = _("New File")
+            else:
+                dest_revision = _("New Change")
+
+        f = {
+            'depot_filename': depot_filename,
+            'dest_filename': dest_filename,
+            'revision': source_revision,
+            'dest_revision': dest_revision,
+            'filediff': filediff,
+            'interfilediff': interfilediff,
+            'force_interdiff': force_interdiff,
+            'binary': filediff.binary,
+            'deleted': filediff.deleted,
+            'moved': filediff.moved,
+            'copied': filediff.copied,
+            'moved_or_copied': filediff.moved or filediff.copied,
+            'newfile': newfile,
+            'index': index,
+            'chunks_loaded': False,
+            'is_new_file': (newfile and not interfilediff and
+                            not filediff.parent_diff),
+        }
+
+        if force_interdiff:
+            f['force_interdiff_revision'] = interdiffset.revision
+
+        files.append(f)
+
+    log_timer.done()
+
+    return files
+
+
+def get_diff_files_manifest(diffset, interdiffset=None):
+    """Return the manifest of files shown for a diff or interdiff.
+
+    The manifest lists the files that :py:func:`get_diff_files` will show,
+    in the order they're shown. Since diffs don't change once they've been
+    uploaded, this is computed once and then stored in the cache.
+
+    For interdiffs, files that are identical in both revisions are left out
+    of the manifest. A file found to be identical only after the manifest
+    was computed is still listed, and will be shown without any changes.
+
+    Args:
+        diffset (reviewboard.diffviewer.models.DiffSet):
+            The diffset containing the files.
+
+        interdiffset (reviewboard.diffviewer.models.DiffSet, optional):
+            The diffset on the other end of an interdiff range.
+
+    Returns:
+        dict:
+        The manifest. This contains the following keys:
+
+        ``files``:
+            A list of ``(filediff_id, interfilediff_id, force_interdiff,
+            index, depot_filename, dest_filename)`` tuples, in the order
+            shown.
+
+        ``positions``:
+            A dictionary mapping each FileDiff ID in ``files`` to its
+            position in the list, for looking up a single file.
+    """
+    if interdiffset:
+        key = 'diff-files-manifest-%s-%s' % (diffset.pk, interdiffset.pk)
+    else:
+        key = 'diff-files-manifest-%s' % diffset.pk
+
+    return cache_memoize(
+        key,
+        lambda: _build_diff_files_manifest(diffset, interdiffset))
+
+
+def _build_diff_files_manifest(diffset, interdiffset):
+    """Build the manifest of files shown for a diff or interdiff.
+
+    See :py:func:`get_diff_files_manifest` for details.
+
+    Args:
+        diffset (reviewboard.diffviewer.models.DiffSet):
+            The diffset containing the files.
+
+        interdiffset (reviewboard.diffviewer.models.DiffSet):
+            The diffset on the other end of an interdiff range, if any.
+
+    Returns:
+        dict:
+        The manifest.
+    """
+    filediffs = diffset.files.all()
+
     # A map used to quickly look up the equivalent interfilediff given a
     # source file.
     interdiff_map = {}
@@ -295,11 +549,8 @@ def get_diff_files(diffset, filediff=None, interdiffset=None, request=None):
 
     if interdiffset:
         for interfilediff in interdiffset.files.all():
-            interfilediff_source_file = _normfile(interfilediff.source_file)
-
-            if (not filediff or
-                _normfile(filediff.source_file) == interfilediff_source_file):
-                interdiff_map[interfilediff_source_file] = interfilediff
+            interdiff_map[_normfile(interfilediff.source_file)] = \
+                interfilediff
 
     # In order to support interdiffs properly, we need to display diffs
     # on every file in the union of both diffsets. Iterating over one diffset
@@ -333,91 +584,82 @@ def get_diff_files(diffset, filediff=None, interdiffset=None, request=None):
             for interdiff in six.itervalues(interdiff_map)
         ]
 
-    files = []
-
-    for parts in filediff_parts:
-        filediff, interfilediff, force_interdiff = parts
-
-        newfile = filediff.is_new
-
-        if interdiffset:
-            # First, find out if we want to even process this one.
-            # If the diffs are identical, or the patched files are identical,
-            # or if the files were deleted in both cases, then we can be
-            # absolutely sure that there's nothing interesting to show to
-            # the user.
-            if (filediff and interfilediff and
-                (filediff.diff == interfilediff.diff or
-                 (filediff.deleted and interfilediff.deleted) or
-                 (filediff.patched_sha1 is not None and
-                  filediff.patched_sha1 == interfilediff.patched_sha1))):
-                continue
-
-            source_revision = _("Diff Revision %s") % diffset.revision
-
-            if not interfilediff and force_interdiff:
-                dest_revision = (_("Diff Revision %s - File Reverted") %
-                                 interdiffset.revision)
-            else:
-                dest_revision = _("Diff Revision %s") % interdiffset.revision
-        else:
-            source_revision = get_revision_str(filediff.source_revision)
+        # If the diffs are identical, or the patched files are identical,
+        # or if the files were deleted in both cases, then we can be
+        # absolutely sure that there's nothing interesting to show to the
+        # user.
+        filediff_parts = [
+            parts
+            for parts in filediff_parts
+            if not (parts[1] and _is_interdiff_unchanged(parts[0], parts[1]))
+        ]
 
-            if newfile:
-                dest_revision = _("New File")
-            else:
-                dest_revision = _("New Change")
+    # Files are indexed in the order they were found, before sorting.
+    filediff_parts = get_sorted_filediffs(
+        [
+            (filediff, interfilediff, force_interdiff, index)
+            for index, (filediff, interfilediff, force_interdiff)
+            in enumerate(filediff_parts)
+        ],
+        key=lambda parts: parts[0])
+    files = []
+    positions = {}
 
+    for filediff, interfilediff, force_interdiff, index in filediff_parts:
         if interfilediff:
             raw_depot_filename = filediff.dest_file
             raw_dest_filename = interfilediff.dest_file
+            interfilediff_id = interfilediff.pk
         else:
             raw_depot_filename = filediff.source_file
             raw_dest_filename = filediff.dest_file
+            interfilediff_id = None
 
         depot_filename = tool.normalize_path_for_display(raw_depot_filename)
         dest_filename = tool.normalize_path_for_display(raw_dest_filename)
 
-        f = {
-            'depot_filename': depot_filename,
-            'dest_filename': dest_filename or depot_filename,
-            'revision': source_revision,
-            'dest_revision': dest_revision,
-            'filediff': filediff,
-            'interfilediff': interfilediff,
-            'force_interdiff': force_interdiff,
-            'binary': filediff.binary,
-            'deleted': filediff.deleted,
-            'moved': filediff.moved,
-            'copied': filediff.copied,
-            'moved_or_copied': filediff.moved or filediff.copied,
-            'newfile': newfile,
-            'index': len(files),
-            'chunks_loaded': False,
-            'is_new_file': (newfile and not interfilediff and
-                            not filediff.parent_diff),
-        }
+        positions[filediff.pk] = len(files)
+        files.append((filediff.pk, interfilediff_id, force_interdiff, index,
+                      depot_filename, dest_filename or depot_filename))
 
-        if force_interdiff:
-            f['force_interdiff_revision'] = interdiffset.revision
+    return {
+        'files': files,
+        'positions': positions,
+    }
 
-        files.append(f)
 
-    log_timer.done()
+def _is_interdiff_unchanged(filediff, interfilediff):
+    """Return whether an interdiff between two FileDiffs would be empty.
 
-    if len(files) == 1:
-        return files
-    else:
-        return get_sorted_filediffs(files, key=lambda f: f['filediff'])
+    This is the case if the diffs are identical, if the file was deleted in
+    both, or if the patched files are known to be identical. None of these
+    checks need to fetch or patch any files.
+    """
+    if filediff.deleted and interfilediff.deleted:
+        return True
+
+    if (filediff.patched_sha1 is not None and
+        filediff.patched_sha1 == interfilediff.patched_sha1):
+        return True
+
+    if filediff.diff_hash_id and interfilediff.diff_hash_id:
+        # Identical diffs share the same stored diff data, so there's no
+        # need to load the diffs to compare them.
+        return filediff.diff_hash_id == interfilediff.diff_hash_id
+
+    return filediff.diff == interfilediff.diff
 
 
 def populate_diff_chunks(files, enable_syntax_highlighting=True,
-                         request=None):
+                         request=None, chunk_index=None):
     """Populates a list of diff files with chunk data.
 
     This accepts a list of files (generated by get_diff_files) and generates
     diff chunk data for each file in the list. The chunk data is stored in
     the file state.
+
+    If a chunk index is provided, only that chunk's lines are needed. Other
+    chunks loaded from the cache will be summaries without lines.
     """
     from reviewboard.diffviewer.chunk_generator import get_diff_chunk_generator
 
@@ -427,7 +669,7 @@ def populate_diff_chunks(files, enable_syntax_highlighting=True,
                                              diff_file['interfilediff'],
                                              diff_file['force_interdiff'],
                                              enable_syntax_highlighting)
-        chunks = list(generator.get_chunks())
+        chunks = list(generator.get_chunks(chunk_index=chunk_index))
 
         diff_file.update({
             'chunks': chunks,
@@ -452,6 +694,117 @@ def populate_diff_chunks(files, enable_syntax_highlighting=True,
         })
 
 
+def highlight_pending_chunks(diff_file, chunks, request=None):
+    """Syntax-highlight chunks of a diff file that were collapsed.
+
+    Chunks for large files only have the lines shown by default
+    syntax-highlighted when generated. This highlights the lines of any of
+    the given chunks (which may be ranges of lines taken from the file's
+    chunks) that still need it, in place. It should be called on chunks
+    before their lines are shown.
+
+    Args:
+        diff_file (dict):
+            The file the chunks belong to, as returned by get_diff_files.
+
+        chunks (list of dict):
+            The chunks to highlight.
+
+        request (django.http.HttpRequest, optional):
+            The HTTP request from the client.
+    """
+    from reviewboard.diffviewer.chunk_generator import get_diff_chunk_generator
+
+    pending_chunks = [
+        chunk
+        for chunk in chunks
+        if chunk.get('meta', {}).get('pending_highlight')
+    ]
+
+    if pending_chunks:
+        generator = get_diff_chunk_generator(request,
+                                             diff_file['filediff'],
+                                             diff_file['interfilediff'],
+                                             diff_file['force_interdiff'])
+        generator.highlight_chunks(pending_chunks)
+
+
+def prefetch_original_files(files, enable_syntax_highlighting=True,
+                            request=None):
+    """Fetch the original versions of a list of diff files into the cache.
+
+    This accepts a list of files (generated by get_diff_files), and fetches
+    the original file contents needed to generate chunks for any of them
+    that don't already have chunks in the cache. Files are fetched
+    concurrently through :py:meth:`Repository.prefetch_files
+    <reviewboard.scmtools.models.Repository.prefetch_files>`, so that
+    rendering each file afterward only needs to hit the cache.
+
+    Args:
+        files (list of dict):
+            The list of files, as returned by get_diff_files.
+
+        enable_syntax_highlighting (bool, optional):
+            Whether the chunks will be syntax-highlighted. This is used to
+            check for cached chunks.
+
+        request (django.http.HttpRequest, optional):
+            The HTTP request from the client.
+    """
+    from reviewboard.diffviewer.chunk_cache import get_chunk_cache
+    from reviewboard.diffviewer.chunk_generator import make_chunks_cache_key
+
+    diff_files = []
+
+    for diff_file in files:
+        filediff = diff_file['filediff']
+
+        if filediff.binary or filediff.source_revision == '':
+            continue
+
+        if filediff.deleted or filediff.moved or filediff.copied:
+            # These won't have any chunks if there are no changed lines.
+            counts = filediff.get_line_counts()
+
+            if (counts['raw_insert_count'] == 0 and
+                counts['raw_delete_count'] == 0):
+                continue
+
+        diff_files.append(diff_file)
+
+    chunk_keys = [
+        make_chunks_cache_key(diff_file['filediff'],
+                              diff_file['interfilediff'],
+                              diff_file['force_interdiff'],
+                              enable_syntax_highlighting)
+        for diff_file in diff_files
+    ]
+    cached_chunks = get_chunk_cache().get_cached_keys(chunk_keys)
+
+    # FileDiffs each have their own instances of the repository, so group
+    # the files by repository ID.
+    repositories = {}
+    files_to_fetch = {}
+
+    for diff_file, chunk_key in zip(diff_files, chunk_keys):
+        if chunk_key in cached_chunks:
+            continue
+
+        for filediff in (diff_file['filediff'], diff_file['interfilediff']):
+            if filediff and not filediff.is_new:
+                diffset = filediff.diffset
+                repository = diffset.repository
+
+                repositories.setdefault(repository.pk, repository)
+                files_to_fetch.setdefault(repository.pk, []).append(
+                    (filediff.source_file, filediff.source_revision,
+                     diffset.base_commit_id))
+
+    for repository_id, repository_files in six.iteritems(files_to_fetch):
+        repositories[repository_id].prefetch_files(repository_files,
+                                                   request=request)
+
+
 def get_file_from_filediff(context, filediff, interfilediff):
     """Return the files that corresponds to the filediff/interfilediff.
 
@@ -626,7 +979,10 @@ def get_file_chunks_in_range(context, filediff, interfilediff,
     f = get_file_from_filediff(context, filediff, interfilediff)
 
     if f:
-        return get_chunks_in_range(f['chunks'], first_line, num_lines)
+        chunks = list(get_chunks_in_range(f['chunks'], first_line, num_lines))
+        highlight_pending_chunks(f, chunks, context.get('request'))
+
+        return chunks
     else:
         return []
 
@@ -773,22 +1129,6 @@ def get_sorted_filediffs(filediffs, key=None):
     for the given entry in the list. This will only be called once per
     item.
     """
-    def cmp_filediffs(x, y):
-        # Sort based on basepath in ascending order.
-        if x[0] != y[0]:
-            return cmp(x[0], y[0])
-
-        # Sort based on filename in ascending order, then based on
-        # the extension in descending order, to make *.h sort ahead of
-        # *.c/cpp.
-        x_file, x_ext = os.path.splitext(x[1])
-        y_file, y_ext = os.path.splitext(y[1])
-
-        if x_file == y_file:
-            return cmp(y_ext, x_ext)
-        else:
-            return cmp(x_file, y_file)
-
     def make_key(filediff):
         if key:
             filediff = key(filediff)
@@ -797,11 +1137,29 @@ def get_sorted_filediffs(filediffs, key=None):
         i = filename.rfind('/')
 
         if i == -1:
-            return '', filename
+            basepath = ''
+            basename = filename
         else:
-            return filename[:i], filename[i + 1:]
+            basepath = filename[:i]
+            basename = filename[i + 1:]
 
-    return sorted(filediffs, cmp=cmp_filediffs, key=make_key)
+        return (basepath,) + os.path.splitext(basename)
+
+    keyed_filediffs = [
+        (make_key(filediff), filediff)
+        for filediff in filediffs
+    ]
+
+    # Python's sorts are stable, so sorting by extension in descending order
+    # first and then by base path and base name gives the full ordering,
+    # without the cost of a comparison function.
+    keyed_filediffs.sort(key=lambda item: item[0][2], reverse=True)
+    keyed_filediffs.sort(key=lambda item: item[0][:2])
+
+    return [
+        filediff
+        for sort_key, filediff in keyed_filediffs
+    ]
 
 
 def get_displayed_diff_line_ranges(chunks, first_vlinenum, last_vlinenum):
@@ -25,3 +25,31 @@ class DiffParserError(Exception):
     def __init__(self, msg, linenum=None):
         Exception.__init__(self, msg)
         self.linenum = linenum
+
+
+class PatchRejectedError(Exception):
+    """A diff could not be applied in-process.
+
+    This is raised when a diff can't be parsed or a hunk can't be located
+    in the file. Callers are expected to fall back to the :command:`patch`
+    executable, which will report the actual error.
+    """
+    pass
+
+
+class MissingCompressionDictionaryError(ValueError):
+    """The dictionary that a diff was compressed with is not configured.
+
+    Diffs compressed with a Zstandard dictionary can only be read with that
+    dictionary.
+    """
+
+    def __init__(self, dict_id):
+        ValueError.__init__(
+            self,
+            'This diff was compressed with Zstandard dictionary %s, which is '
+            'not configured. Set DIFF_ZSTD_DICTIONARY_FILE to the file '
+            'containing it, or add the file to '
+            'DIFF_ZSTD_OLD_DICTIONARY_FILES if it has been replaced.'
+            % dict_id)
+        self.dict_id = dict_id
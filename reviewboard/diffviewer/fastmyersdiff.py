@@ -0,0 +1,353 @@
+"""An accelerated version of the Myers diff algorithm.
+
+:py:class:`FastMyersDiffer` produces exactly the same results as
+:py:class:`~reviewboard.diffviewer.myersdiff.MyersDiffer`, but its hot paths
+are written to do as little work per line as possible in Python. State is
+kept in local variables and flat arrays rather than looked up on objects or
+in dictionaries for every line, and helper callbacks are inlined.
+
+This is used by :py:func:`~reviewboard.diffviewer.differ.get_differ` unless
+``settings.DIFF_USE_FAST_MYERS_DIFFER`` is ``False``.
+"""
+
+from __future__ import unicode_literals
+
+from django.utils.six.moves import range
+
+from reviewboard.diffviewer.differ import DiffCompatVersion
+from reviewboard.diffviewer.myersdiff import MyersDiffer
+
+
+class FastMyersDiffer(MyersDiffer):
+    """An accelerated implementation of the Myers diff algorithm.
+
+    Any change to the results of :py:class:`MyersDiffer` must be mirrored
+    here. The two are checked against each other in the unit tests.
+    """
+
+    def get_opcodes(self):
+        """Generate opcodes representing the contents of the diff.
+
+        The resulting opcodes are in the format of
+        (tag, i1, i2, j1, j2)
+        """
+        self._gen_diff_data()
+
+        a_length = self.a_data.length
+        b_length = self.b_data.length
+
+        if a_length == 0 and b_length == 0:
+            # There's nothing to process or yield. Bail.
+            return
+
+        # The modified lines are turned into flat arrays up front, with a
+        # sentinel at the end, so that each check is a simple index.
+        a_modified = self._get_modified_flags(self.a_data)
+        b_modified = self._get_modified_flags(self.b_data)
+
+        a_line = b_line = 0
+        last_group = None
+
+        while a_line < a_length or b_line < b_length:
+            a_start = a_line
+            b_start = b_line
+
+            if (a_line < a_length and not a_modified[a_line] and
+                b_line < b_length and not b_modified[b_line]):
+                # Equal. Consume the whole run of unchanged lines at once.
+                tag = 'equal'
+
+                while (a_line < a_length and not a_modified[a_line] and
+                       b_line < b_length and not b_modified[b_line]):
+                    a_line += 1
+                    b_line += 1
+
+                a_changed = b_changed = a_line - a_start
+            else:
+                # Deleted, inserted or replaced.
+                while (a_line < a_length and
+                       (b_line >= b_length or a_modified[a_line])):
+                    a_line += 1
+
+                while (b_line < b_length and
+                       (a_line >= a_length or b_modified[b_line])):
+                    b_line += 1
+
+                a_changed = a_line - a_start
+                b_changed = b_line - b_start
+
+                if a_changed == 0:
+                    tag = 'insert'
+                elif b_changed == 0:
+                    tag = 'delete'
+                else:
+                    tag = 'replace'
+
+                    if a_changed > b_changed:
+                        a_line -= a_changed - b_changed
+                        a_changed = b_changed
+                    elif a_changed < b_changed:
+                        b_line -= b_changed - a_changed
+                        b_changed = a_changed
+
+            if last_group and last_group[0] == tag:
+                last_group = (tag,
+                              last_group[1], last_group[2] + a_changed,
+                              last_group[3], last_group[4] + b_changed)
+            else:
+                if last_group:
+                    yield last_group
+
+                last_group = (tag, a_start, a_start + a_changed,
+                              b_start, b_start + b_changed)
+
+        if not last_group:
+            last_group = ('equal', 0, a_length, 0, b_length)
+
+        yield last_group
+
+    def _get_modified_flags(self, data):
+        """Return an array of flags for the modified lines in a file."""
+        flags = bytearray(data.length + 1)
+
+        for i, modified in data.modified.items():
+            if modified and 0 <= i < data.length:
+                flags[i] = 1
+
+        return flags
+
+    def _find_sms(self, a_lower, a_upper, b_lower, b_upper, find_minimal):
+        """Find the Shortest Middle Snake."""
+        down_vector = self.fdiag
+        up_vector = self.bdiag
+        a_lines = self.a_data.undiscarded
+        b_lines = self.b_data.undiscarded
+        downoff = self.downoff
+        upoff = self.upoff
+        max_lines = self.max_lines
+        snake_limit = self.SNAKE_LIMIT
+        bail_on_cost = (self.compat_version >=
+                        DiffCompatVersion.MYERS_SMS_COST_BAIL)
+
+        down_k = a_lower - b_lower
+        up_k = a_upper - b_upper
+        odd_delta = (down_k - up_k) % 2 != 0
+
+        down_vector[downoff + down_k] = a_lower
+        up_vector[upoff + up_k] = a_upper
+
+        dmin = a_lower - b_upper
+        dmax = a_upper - b_lower
+
+        down_min = down_max = down_k
+        up_min = up_max = up_k
+
+        cost = 0
+        max_cost = max(256, self._very_approx_sqrt(max_lines * 4))
+
+        while True:
+            cost += 1
+            big_snake = False
+
+            if down_min > dmin:
+                down_min -= 1
+                down_vector[downoff + down_min - 1] = -1
+            else:
+                down_min += 1
+
+            if down_max < dmax:
+                down_max += 1
+                down_vector[downoff + down_max + 1] = -1
+            else:
+                down_max -= 1
+
+            # Extend the forward path.
+            for k in range(down_max, down_min - 1, -2):
+                i = downoff + k
+                tlo = down_vector[i - 1]
+                thi = down_vector[i + 1]
+
+                if tlo >= thi:
+                    x = tlo + 1
+                else:
+                    x = thi
+
+                y = x - k
+                old_x = x
+
+                while (x < a_upper and y < b_upper and
+                       a_lines[x] == b_lines[y]):
+                    x += 1
+                    y += 1
+
+                if (odd_delta and up_min <= k <= up_max and
+                    up_vector[upoff + k] <= x):
+                    return x, y, True, True
+
+                if x - old_x > snake_limit:
+                    big_snake = True
+
+                down_vector[i] = x
+
+            # Extend the reverse path.
+            if up_min > dmin:
+                up_min -= 1
+                up_vector[upoff + up_min - 1] = max_lines
+            else:
+                up_min += 1
+
+            if up_max < dmax:
+                up_max += 1
+                up_vector[upoff + up_max + 1] = max_lines
+            else:
+                up_max -= 1
+
+            for k in range(up_max, up_min - 1, -2):
+                i = upoff + k
+                tlo = up_vector[i - 1]
+                thi = up_vector[i + 1]
+
+                if tlo < thi:
+                    x = tlo
+                else:
+                    x = thi - 1
+
+                y = x - k
+                old_x = x
+
+                while (x > a_lower and y > b_lower and
+                       a_lines[x - 1] == b_lines[y - 1]):
+                    x -= 1
+                    y -= 1
+
+                if (not odd_delta and down_min <= k <= down_max and
+                    x <= down_vector[downoff + k]):
+                    return x, y, True, True
+
+                if old_x - x > snake_limit:
+                    big_snake = True
+
+                up_vector[i] = x
+
+            if find_minimal:
+                continue
+
+            # Heuristics courtesy of GNU diff. See MyersDiffer._find_sms()
+            # and MyersDiffer._find_diagonal(), which this inlines.
+            #
+            # Note that once a diagonal is in range, the reference
+            # implementation measures the distance of the rest of the
+            # diagonals from a different k-line. That's preserved here.
+            if cost > 200 and big_snake:
+                k = down_k
+
+                for d in range(down_max, down_min - 1, -2):
+                    dd = d - k
+                    x = down_vector[downoff + d]
+                    y = x - d
+                    v = (x - a_lower) * 2 + dd
+
+                    if (v > 12 * (cost + abs(dd)) and
+                        a_lower + snake_limit <= x < a_upper and
+                        b_lower + snake_limit <= y < b_upper):
+                        k = 1
+
+                        if a_lines[x - 1] == b_lines[y - 1]:
+                            return x, y, True, False
+
+                k = up_k
+
+                for d in range(up_max, up_min - 1, -2):
+                    dd = d - k
+                    x = up_vector[upoff + d]
+                    y = x - d
+                    v = (a_upper - x) * 2 + dd
+
+                    if (v > 12 * (cost + abs(dd)) and
+                        a_lower < x <= a_upper - snake_limit and
+                        b_lower < y <= b_upper - snake_limit):
+                        k = 0
+
+                        if a_lines[x] == b_lines[y]:
+                            return x, y, False, True
+
+            if cost >= max_cost and bail_on_cost:
+                # We've reached or gone past the max cost. Just give up now
+                # and report the halfway point between our best results.
+                fx_best = bx_best = 0
+
+                # Find the forward diagonal that maximized x + y
+                fxy_best = -1
+
+                for d in range(down_max, down_min - 1, -2):
+                    x = min(down_vector[downoff + d], a_upper)
+                    y = x - d
+
+                    if b_upper < y:
+                        x = b_upper + d
+                        y = b_upper
+
+                    if fxy_best < x + y:
+                        fxy_best = x + y
+                        fx_best = x
+
+                # Find the backward diagonal that minimizes x + y
+                bxy_best = max_lines
+
+                for d in range(up_max, up_min - 1, -2):
+                    x = max(a_lower, up_vector[upoff + d])
+                    y = x - d
+
+                    if y < b_lower:
+                        x = b_lower + d
+                        y = b_lower
+
+                    if x + y < bxy_best:
+                        bxy_best = x + y
+                        bx_best = x
+
+                # Use the better of the two diagonals
+                if (a_upper + b_upper - bxy_best <
+                    fxy_best - (a_lower + b_lower)):
+                    return fx_best, fxy_best - fx_best, True, False
+                else:
+                    return bx_best, bxy_best - bx_best, False, True
+
+    def _lcs(self, a_lower, a_upper, b_lower, b_upper, find_minimal):
+        """Find the Longest Common Subsequence, dividing and conquering."""
+        a_lines = self.a_data.undiscarded
+        b_lines = self.b_data.undiscarded
+
+        # Fast walkthrough equal lines at the start and end.
+        while (a_lower < a_upper and b_lower < b_upper and
+               a_lines[a_lower] == b_lines[b_lower]):
+            a_lower += 1
+            b_lower += 1
+
+        while (a_upper > a_lower and b_upper > b_lower and
+               a_lines[a_upper - 1] == b_lines[b_upper - 1]):
+            a_upper -= 1
+            b_upper -= 1
+
+        if a_lower == a_upper:
+            # Inserted lines.
+            modified = self.b_data.modified
+            real_indexes = self.b_data.real_indexes
+
+            for i in range(b_lower, b_upper):
+                modified[real_indexes[i]] = True
+        elif b_lower == b_upper:
+            # Deleted lines.
+            modified = self.a_data.modified
+            real_indexes = self.a_data.real_indexes
+
+            for i in range(a_lower, a_upper):
+                modified[real_indexes[i]] = True
+        else:
+            # Find the middle snake and length of an optimal path for A and B
+            x, y, low_minimal, high_minimal = \
+                self._find_sms(a_lower, a_upper, b_lower, b_upper,
+                               find_minimal)
+
+            self._lcs(a_lower, x, b_lower, y, low_minimal)
+            self._lcs(x, a_upper, y, b_upper, high_minimal)
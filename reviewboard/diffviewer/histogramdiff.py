@@ -0,0 +1,182 @@
+"""An implementation of the histogram diff algorithm.
+
+Histogram diff is an extension of patience diff, used by Git and JGit. It
+anchors a diff on the lines that occur the fewest times in both files, which
+are usually the lines that carry meaning (function signatures, unique
+statements) rather than blank lines or braces. The regions on either side
+of each anchor are then diffed recursively.
+
+This is fast on files with many unique lines. Moved and rewritten blocks
+also tend to stay whole, instead of being split up around unrelated blank
+lines and braces, which gives move detection cleaner ranges to match.
+
+Regions that don't contain any suitable anchors fall back on the Myers
+algorithm.
+"""
+
+from __future__ import unicode_literals
+
+from django.utils.six.moves import range
+
+from reviewboard.diffviewer.fastmyersdiff import FastMyersDiffer
+
+
+class HistogramDiffer(FastMyersDiffer):
+    """An implementation of the histogram diff algorithm.
+
+    This shares the line encoding, chunk shifting and opcode generation
+    of the Myers differ, and only replaces how the longest common
+    subsequence is found.
+    """
+
+    #: The most times a line can occur in a region to be used as an anchor.
+    #:
+    #: Regions where every common line occurs more often than this are
+    #: diffed using the Myers algorithm.
+    MAX_CHAIN_LENGTH = 64
+
+    def _gen_diff_data(self):
+        """Generate all the diff data needed to return opcodes or the ratio.
+
+        This is only called once during the lifetime of a HistogramDiffer
+        instance.
+        """
+        if self.a_data and self.b_data:
+            return
+
+        self.a_data = self.DiffData(self._gen_diff_codes(self.a, False))
+        self.b_data = self.DiffData(self._gen_diff_codes(self.b, True))
+
+        # Unlike the Myers algorithm, lines aren't discarded up front. The
+        # fallback works on the lines as they are.
+        for data in (self.a_data, self.b_data):
+            data.undiscarded = data.data
+            data.undiscarded_lines = data.length
+            data.real_indexes = list(range(data.length))
+
+        self.max_lines = self.a_data.length + self.b_data.length + 3
+        self.fdiag = [0] * self.max_lines
+        self.bdiag = [0] * self.max_lines
+        self.downoff = self.upoff = self.b_data.length + 1
+
+        self._histogram_lcs(0, self.a_data.length, 0, self.b_data.length)
+        self._shift_chunks(self.a_data, self.b_data)
+        self._shift_chunks(self.b_data, self.a_data)
+
+    def _histogram_lcs(self, a_lower, a_upper, b_lower, b_upper):
+        """Mark the modified lines between two ranges of lines.
+
+        Each region is split around the longest run of equal lines that
+        contains the least frequently occurring line. This continues until
+        there are no more anchors to split on.
+        """
+        a_lines = self.a_data.data
+        b_lines = self.b_data.data
+        a_modified = self.a_data.modified
+        b_modified = self.b_data.modified
+        max_chain_length = self.MAX_CHAIN_LENGTH
+
+        # Regions are processed from a stack, rather than recursively, so
+        # that large files with many anchors can't exhaust the stack.
+        regions = [(a_lower, a_upper, b_lower, b_upper)]
+
+        while regions:
+            a_lower, a_upper, b_lower, b_upper = regions.pop()
+
+            # Skip past the equal lines at the start and end.
+            while (a_lower < a_upper and b_lower < b_upper and
+                   a_lines[a_lower] == b_lines[b_lower]):
+                a_lower += 1
+                b_lower += 1
+
+            while (a_upper > a_lower and b_upper > b_lower and
+                   a_lines[a_upper - 1] == b_lines[b_upper - 1]):
+                a_upper -= 1
+                b_upper -= 1
+
+            if a_lower == a_upper or b_lower == b_upper:
+                for i in range(a_lower, a_upper):
+                    a_modified[i] = True
+
+                for i in range(b_lower, b_upper):
+                    b_modified[i] = True
+
+                continue
+
+            # Build the histogram of lines in the old region.
+            occurrences = {}
+
+            for i in range(a_lower, a_upper):
+                occurrences.setdefault(a_lines[i], []).append(i)
+
+            best_count = max_chain_length
+            best_length = 0
+            best_a = best_b = 0
+            has_common_lines = False
+            j = b_lower
+
+            while j < b_upper:
+                positions = occurrences.get(b_lines[j])
+                next_j = j + 1
+
+                if positions is not None:
+                    has_common_lines = True
+
+                    if len(positions) <= best_count:
+                        for i in positions:
+                            # Expand the match as far as it goes in both
+                            # directions, tracking the rarest line in it.
+                            start_a = i
+                            start_b = j
+                            count = len(positions)
+
+                            while (start_a > a_lower and
+                                   start_b > b_lower and
+                                   (a_lines[start_a - 1] ==
+                                    b_lines[start_b - 1])):
+                                start_a -= 1
+                                start_b -= 1
+                                count = min(
+                                    count,
+                                    len(occurrences[a_lines[start_a]]))
+
+                            end_a = i + 1
+                            end_b = j + 1
+
+                            while (end_a < a_upper and
+                                   end_b < b_upper and
+                                   a_lines[end_a] == b_lines[end_b]):
+                                count = min(
+                                    count,
+                                    len(occurrences[a_lines[end_a]]))
+                                end_a += 1
+                                end_b += 1
+
+                            if next_j < end_b:
+                                next_j = end_b
+
+                            length = end_a - start_a
+
+                            if (count < best_count or
+                                (count == best_count and
+                                 length > best_length)):
+                                best_count = count
+                                best_length = length
+                                best_a = start_a
+                                best_b = start_b
+
+                j = next_j
+
+            if best_length > 0:
+                regions.append((best_a + best_length, a_upper,
+                                best_b + best_length, b_upper))
+                regions.append((a_lower, best_a, b_lower, best_b))
+            elif has_common_lines:
+                # Every common line is too frequent to anchor on.
+                self._lcs(a_lower, a_upper, b_lower, b_upper, False)
+            else:
+                for i in range(a_lower, a_upper):
+                    a_modified[i] = True
+
+                for i in range(b_lower, b_upper):
+                    b_modified[i] = True
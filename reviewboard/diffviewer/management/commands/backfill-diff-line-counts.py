@@ -0,0 +1,63 @@
+from __future__ import unicode_literals, division
+
+import sys
+from optparse import make_option
+
+from django.conf import settings
+from django.contrib.humanize.templatetags.humanize import intcomma
+from django.core.management.base import BaseCommand
+from django.utils.translation import ugettext as _
+
+from reviewboard.diffviewer.models import DiffSet
+
+
+class Command(BaseCommand):
+    help = ('Stores the total line counts on diffsets created before they '
+            'were stored at upload time')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size',
+                    type='int',
+                    default=100,
+                    dest='batch_size',
+                    help='The number of diffsets to load at a time.'),
+        make_option('--recalculate',
+                    action='store_true',
+                    default=False,
+                    dest='recalculate',
+                    help='Recalculates the totals for diffsets that already '
+                         'have them stored.'),
+    )
+
+    def handle(self, *args, **options):
+        # Don't allow queries to be stored.
+        settings.DEBUG = False
+
+        self.stdout.write(
+            _('Storing total line counts on diffsets...\n'
+              '\n'
+              'This may take a while. It is safe to continue using '
+              'Review Board while this is\n'
+              'processing.\n'))
+
+        updated_count = DiffSet.objects.backfill_line_counts(
+            batch_done_cb=self._on_batch_done,
+            batch_size=options['batch_size'],
+            recalculate=options['recalculate'])
+
+        self.stdout.write(
+            _('\n'
+              '\n'
+              'Stored total line counts on %(count)s diffsets.\n')
+            % {
+                'count': intcomma(updated_count),
+            })
+
+    def _on_batch_done(self, processed_count, total_count):
+        """Report progress after a batch of diffsets has been processed."""
+        # NOTE: We use sys.stdout here instead of self.stdout in order
+        #       to control newlines.
+        sys.stdout.write('  [%d%%] %s/%s\r'
+                         % (processed_count * 100 / total_count,
+                            processed_count, total_count))
+        sys.stdout.flush()
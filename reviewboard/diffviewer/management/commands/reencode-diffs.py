@@ -0,0 +1,178 @@
+from __future__ import unicode_literals, division
+
+import os
+import sys
+from optparse import make_option
+
+from django.conf import settings
+from django.contrib.humanize.templatetags.humanize import intcomma
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import ugettext as _
+
+from reviewboard.diffviewer.compression import zstandard
+from reviewboard.diffviewer.models import RawFileDiffData
+
+
+class Command(BaseCommand):
+    help = ('Re-compresses the diffs stored in the database using the best '
+            'available compression methods')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size',
+                    type='int',
+                    default=100,
+                    dest='batch_size',
+                    help='The number of diffs to load at a time.'),
+        make_option('--train-dictionary',
+                    default=None,
+                    dest='dictionary_file',
+                    metavar='FILE',
+                    help='Trains a Zstandard dictionary from the stored '
+                         'diffs and writes it to FILE, instead of '
+                         're-compressing. FILE must not already exist. Set '
+                         'DIFF_ZSTD_DICTIONARY_FILE in settings_local.py, '
+                         'along with DIFF_COMPRESSION_USE_ZSTD, to use it.'),
+        make_option('--dictionary-size',
+                    type='int',
+                    default=112640,
+                    dest='dictionary_size',
+                    help='The maximum size of a trained dictionary, in '
+                         'bytes.'),
+        make_option('--max-samples',
+                    type='int',
+                    default=10000,
+                    dest='max_samples',
+                    help='The maximum number of diffs to train a dictionary '
+                         'with.'),
+    )
+
+    def handle(self, *args, **options):
+        # Don't allow queries to be stored.
+        settings.DEBUG = False
+
+        if options['dictionary_file']:
+            self._train_dictionary(options['dictionary_file'],
+                                   options['dictionary_size'],
+                                   options['max_samples'])
+        else:
+            self._reencode(options['batch_size'])
+
+    def _reencode(self, batch_size):
+        """Re-compress all stored diffs."""
+        self.stdout.write(
+            _('Re-compressing stored diffs...\n'
+              '\n'
+              'This may take a while. It is safe to continue using '
+              'Review Board while this is\n'
+              'processing.\n'))
+
+        info = RawFileDiffData.objects.reencode_all(
+            batch_done_cb=self._on_batch_done,
+            batch_size=batch_size)
+
+        old_size = info['old_size']
+        new_size = info['new_size']
+
+        if old_size:
+            savings_pct = (old_size - new_size) / old_size * 100
+        else:
+            savings_pct = 0
+
+        self.stdout.write(
+            _('\n'
+              '\n'
+              'Re-compressed %(count)s diffs. Stored diffs went from '
+              '%(old_size)s bytes to %(new_size)s bytes (%(savings_pct)0.2f%% '
+              'savings)\n')
+            % {
+                'count': intcomma(info['reencoded_count']),
+                'old_size': intcomma(old_size),
+                'new_size': intcomma(new_size),
+                'savings_pct': savings_pct,
+            })
+
+    def _train_dictionary(self, path, dictionary_size, max_samples):
+        """Train a Zstandard dictionary from the most recent diffs."""
+        if zstandard is None:
+            raise CommandError(
+                _('The zstandard module must be installed to train a '
+                  'dictionary.'))
+
+        # Diffs compressed with a dictionary can only be read with it, so
+        # a dictionary file must never be replaced.
+        configured_paths = [
+            os.path.realpath(configured_path)
+            for configured_path in (
+                [getattr(settings, 'DIFF_ZSTD_DICTIONARY_FILE', None)] +
+                list(getattr(settings, 'DIFF_ZSTD_OLD_DICTIONARY_FILES', [])))
+            if configured_path
+        ]
+
+        if os.path.realpath(path) in configured_paths:
+            raise CommandError(
+                _('%s is a configured dictionary. Diffs compressed with it '
+                  'would no longer be readable if it were replaced. Choose a '
+                  'new path.')
+                % path)
+
+        if os.path.exists(path):
+            raise CommandError(
+                _('%s already exists. Choose a new path for the dictionary.')
+                % path)
+
+        raw_fdds = RawFileDiffData.objects.order_by('-pk')[:max_samples]
+        samples = [raw_fdd.content for raw_fdd in raw_fdds]
+
+        if not samples:
+            raise CommandError(_('There are no stored diffs to train a '
+                                 'dictionary with.'))
+
+        try:
+            dictionary = zstandard.train_dictionary(dictionary_size, samples)
+        except zstandard.ZstdError as e:
+            raise CommandError(_('Unable to train a dictionary: %s') % e)
+
+        try:
+            # This fails if the file has been created since the check above,
+            # rather than replacing it.
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except OSError as e:
+            raise CommandError(_('Unable to write the dictionary to %s: %s')
+                               % (path, e))
+
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(dictionary.as_bytes())
+
+        self.stdout.write(
+            _('Wrote dictionary %(dict_id)s, trained from %(count)s diffs, '
+              'to %(path)s.\n'
+              '\n'
+              'Set DIFF_ZSTD_DICTIONARY_FILE in settings_local.py to use it, '
+              'along with\n'
+              'DIFF_COMPRESSION_USE_ZSTD = True if it\'s not already set, '
+              'and then run this\n'
+              'command again without --train-dictionary to re-compress '
+              'existing diffs.\n'
+              '\n'
+              'If DIFF_ZSTD_DICTIONARY_FILE is already set, add the old path '
+              'to\n'
+              'DIFF_ZSTD_OLD_DICTIONARY_FILES, so that diffs compressed with '
+              'it can still be\n'
+              'read until they have been re-compressed.\n'
+              '\n'
+              'Do not remove or replace this file while diffs compressed with '
+              'it are stored.\n')
+            % {
+                'count': intcomma(len(samples)),
+                'dict_id': dictionary.dict_id(),
+                'path': path,
+            })
+
+    def _on_batch_done(self, processed_count, total_count):
+        """Report progress after a batch of diffs has been processed."""
+        # NOTE: We use sys.stdout here instead of self.stdout in order
+        #       to control newlines.
+        sys.stdout.write('  [%d%%] %s/%s\r'
+                         % (processed_count * 100 / total_count,
+                            processed_count, total_count))
+        sys.stdout.flush()
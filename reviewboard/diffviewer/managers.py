@@ -1,12 +1,12 @@
 from __future__ import unicode_literals
 
-import bz2
 import gc
 import hashlib
+import logging
 import os
 
 from django.conf import settings
-from django.db import models, reset_queries, connection
+from django.db import models, reset_queries, connection, transaction
 from django.db.models import Count, Q
 from django.db.utils import IntegrityError
 from django.utils.encoding import smart_unicode
@@ -14,7 +14,9 @@ from django.utils.six.moves import range
 from django.utils.translation import ugettext as _
 from djblets.siteconfig.models import SiteConfiguration
 
-from reviewboard.diffviewer.differ import DiffCompatVersion
+from reviewboard.concurrency import run_in_background
+from reviewboard.diffviewer.compression import choose_codec, get_codec
+from reviewboard.diffviewer.differ import get_default_compat_version
 from reviewboard.diffviewer.errors import DiffTooBigError, EmptyDiffError
 from reviewboard.scmtools.core import PRE_CREATION, UNKNOWN, FileNotFoundError
 
@@ -27,6 +29,44 @@ class FileDiffManager(models.Manager):
     """
     MIGRATE_OBJECT_LIMIT = 200
 
+    #: The number of FileDiffs to load at a time when iterating over diffs.
+    DIFF_CONTENT_BATCH_SIZE = 20
+
+    def iter_diff_contents(self, batch_size=None):
+        """Yield the diff content of each FileDiff, in order.
+
+        The FileDiffs and their stored diff content are loaded in batches,
+        and the content is decompressed incrementally. This keeps memory
+        usage low, even for very large sets of diffs. It's meant to be used
+        on a set of FileDiffs, such as ``diffset.files``.
+
+        Args:
+            batch_size (int, optional):
+                The number of FileDiffs to load at a time. Defaults to
+                :py:attr:`DIFF_CONTENT_BATCH_SIZE`.
+
+        Yields:
+            bytes:
+            Each piece of diff content, in order of FileDiff ID.
+        """
+        batch_size = batch_size or self.DIFF_CONTENT_BATCH_SIZE
+        last_pk = 0
+
+        while True:
+            batch = list(
+                self.filter(pk__gt=last_pk)
+                .select_related('diff_hash')
+                .order_by('pk')[:batch_size])
+
+            if not batch:
+                break
+
+            for filediff in batch:
+                for content in filediff.iter_diff():
+                    yield content
+
+            last_pk = batch[-1].pk
+
     def unmigrated(self):
         """Queries FileDiffs that store their own diff content."""
         return self.exclude(
@@ -335,17 +375,45 @@ class RawFileDiffDataManager(models.Manager):
     This provides conveniences for creating an entry based on a
     LegacyFileDiffData object.
     """
+
+    #: The maximum number of hashes to look up in a single query.
+    HASH_LOOKUP_BATCH_SIZE = 200
+
+    #: The maximum number of entries to create in a single query.
+    CREATE_BATCH_SIZE = 100
+
+    #: The maximum amount of diff content, in bytes, to create in a single
+    #: query.
+    #:
+    #: This keeps queries well below MySQL's default ``max_allowed_packet``.
+    #: Larger entries are created on their own.
+    CREATE_BATCH_MAX_BYTES = 1024 * 1024
+
+    #: The size of the smallest content that will be compressed.
+    #:
+    #: Anything smaller is stored as-is, since the savings are small and
+    #: not worth decompressing the content every time it's accessed.
+    MIN_COMPRESSED_SIZE = 128
+
     def process_diff_data(self, data):
         """Processes a diff, returning the resulting content and compression.
 
         If the content would benefit from being compressed, this will
         return the compressed content and the value for the compression
         flag. Otherwise, it will return the raw content.
+
+        The compression method is chosen based on the size of the content
+        and the methods available. See
+        :py:func:`~reviewboard.diffviewer.compression.choose_codec`.
         """
-        compressed_data = bz2.compress(data, 9)
+        if len(data) < self.MIN_COMPRESSED_SIZE:
+            return data, None
+
+        codec = choose_codec(len(data))
+        compressed_data = codec.compress(data)
 
         if len(compressed_data) < len(data):
-            return compressed_data, self.model.COMPRESSION_BZIP2
+            return compressed_data, codec.code
         else:
             return data, None
 
@@ -360,6 +428,175 @@ class RawFileDiffDataManager(models.Manager):
                 'compression': compression,
             })
 
+    def bulk_get_or_create_from_data(self, data_items, extra_data=None):
+        """Return entries for several diffs, creating any that are missing.
+
+        All the diffs are hashed up front. Existing entries are then looked
+        up in as few queries as possible, and the missing ones are created
+        together in batches (see :py:attr:`CREATE_BATCH_SIZE` and
+        :py:attr:`CREATE_BATCH_MAX_BYTES`). This is much faster than calling
+        :py:meth:`get_or_create_from_data` for each diff when processing
+        large uploads.
+
+        Args:
+            data_items (list of bytes):
+                The diff content for each entry.
+
+            extra_data (list of dict, optional):
+                The extra data to store for each entry. This is only used
+                for newly-created entries, and must be in the same order as
+                ``data_items``.
+
+        Returns:
+            list of reviewboard.diffviewer.models.RawFileDiffData:
+            The entries for each diff, in the same order as ``data_items``.
+            Identical diffs will share an entry.
+        """
+        hashes = [self._hash_hexdigest(data) for data in data_items]
+        raw_fdds = self._get_by_hashes(set(hashes))
+        new_raw_fdds = []
+
+        for i, (binary_hash, data) in enumerate(zip(hashes, data_items)):
+            if binary_hash in raw_fdds:
+                continue
+
+            processed_data, compression = self.process_diff_data(data)
+            raw_fdd = self.model(binary_hash=binary_hash,
+                                 binary=processed_data,
+                                 compression=compression)
+
+            if extra_data:
+                raw_fdd.extra_data = extra_data[i]
+
+            raw_fdds[binary_hash] = raw_fdd
+            new_raw_fdds.append(raw_fdd)
+
+        if new_raw_fdds:
+            try:
+                with transaction.atomic():
+                    for batch in self._iter_create_batches(new_raw_fdds):
+                        self.bulk_create(batch)
+            except IntegrityError:
+                # Another upload created one or more of these entries before
+                # we could. Fall back on creating them one-by-one.
+                for raw_fdd in new_raw_fdds:
+                    try:
+                        with transaction.atomic():
+                            raw_fdd.save()
+                    except IntegrityError:
+                        pass
+
+            # bulk_create() doesn't give us the IDs of the new entries, so
+            # they have to be fetched.
+            raw_fdds.update(self._get_by_hashes(
+                raw_fdd.binary_hash
+                for raw_fdd in new_raw_fdds
+            ))
+
+        return [raw_fdds[binary_hash] for binary_hash in hashes]
+
+    def _iter_create_batches(self, raw_fdds):
+        """Yield batches of new entries to create in a single query.
+
+        Each batch is limited in both the number of entries and the total
+        size of their content.
+        """
+        batch = []
+        batch_bytes = 0
+
+        for raw_fdd in raw_fdds:
+            size = len(raw_fdd.binary)
+
+            if batch and (len(batch) >= self.CREATE_BATCH_SIZE or
+                          batch_bytes + size > self.CREATE_BATCH_MAX_BYTES):
+                yield batch
+                batch = []
+                batch_bytes = 0
+
+            batch.append(raw_fdd)
+            batch_bytes += size
+
+        if batch:
+            yield batch
+
+    def reencode_all(self, batch_done_cb=None, batch_size=100):
+        """Re-compress stored diffs using the preferred compression methods.
+
+        This goes through every entry in batches, decompressing the content
+        and compressing it again with the method that
+        :py:meth:`process_diff_data` would choose today. Entries already
+        stored that way are left alone. Entries compressed with a Zstandard
+        dictionary other than the current one are compressed again with the
+        current one.
+
+        Args:
+            batch_done_cb (callable, optional):
+                A function to call after each batch. It takes the number
+                of entries processed so far and the total number of entries.
+
+            batch_size (int, optional):
+                The number of entries to load at a time.
+
+        Returns:
+            dict:
+            A dictionary with the number of entries re-encoded, and the
+            total size of the stored content before and after.
+        """
+        dict_codec = get_codec(self.model.COMPRESSION_ZSTD_DICT)
+        total_count = self.count()
+        processed_count = 0
+        reencoded_count = 0
+        old_size = 0
+        new_size = 0
+        last_pk = 0
+
+        while True:
+            batch = list(self.filter(pk__gt=last_pk).order_by('pk')
+                         [:batch_size])
+
+            if not batch:
+                break
+
+            for raw_fdd in batch:
+                binary = bytes(raw_fdd.binary)
+                old_size += len(binary)
+
+                try:
+                    content = raw_fdd.content
+                except Exception as e:
+                    logging.error('Unable to decompress RawFileDiffData %s '
+                                  'for re-encoding: %s',
+                                  raw_fdd.pk, e)
+                    new_size += len(binary)
+                    continue
+
+                processed_data, compression = self.process_diff_data(content)
+
+                if (compression != raw_fdd.compression or
+                    (compression == self.model.COMPRESSION_ZSTD_DICT and
+                     dict_codec.get_dict_id(processed_data) !=
+                     dict_codec.get_dict_id(binary))):
+                    self.filter(pk=raw_fdd.pk).update(binary=processed_data,
+                                                      compression=compression)
+                    new_size += len(processed_data)
+                    reencoded_count += 1
+                else:
+                    new_size += len(binary)
+
+            last_pk = batch[-1].pk
+            processed_count += len(batch)
+
+            reset_queries()
+
+            if callable(batch_done_cb):
+                batch_done_cb(processed_count, total_count)
+
+        return {
+            'reencoded_count': reencoded_count,
+            'old_size': old_size,
+            'new_size': new_size,
+        }
+
     def create_from_legacy(self, legacy, save=True):
         processed_data, compression = self.process_diff_data(legacy.binary)
 
@@ -373,6 +610,23 @@ class RawFileDiffDataManager(models.Manager):
 
         return raw_file_diff_data
 
+    def _get_by_hashes(self, binary_hashes):
+        """Return a mapping of hashes to existing entries.
+
+        The hashes are looked up in batches, keeping the number of
+        parameters in each query within the limits of all databases.
+        """
+        binary_hashes = list(binary_hashes)
+        raw_fdds = {}
+
+        for i in range(0, len(binary_hashes), self.HASH_LOOKUP_BATCH_SIZE):
+            batch = binary_hashes[i:i + self.HASH_LOOKUP_BATCH_SIZE]
+
+            for raw_fdd in self.filter(binary_hash__in=batch):
+                raw_fdds[raw_fdd.binary_hash] = raw_fdd
+
+        return raw_fdds
+
     def _hash_hexdigest(self, diff):
         hasher = hashlib.sha1()
         hasher.update(diff)
@@ -391,6 +645,78 @@ class DiffSetManager(models.Manager):
     HEADER_EXTENSIONS = ["h", "H", "hh", "hpp", "hxx", "h++"]
     IMPL_EXTENSIONS = ["c", "C", "cc", "cpp", "cxx", "c++", "m", "mm", "M"]
 
+    #: The maximum number of FileDiffs to create in a single query.
+    FILEDIFF_CREATE_BATCH_SIZE = 100
+
+    def backfill_line_counts(self, batch_done_cb=None, batch_size=100,
+                             recalculate=False):
+        """Store total line counts on diffsets that don't have them.
+
+        Diffsets created before total line counts were stored calculate
+        them the first time they're needed. This goes through every diffset
+        in batches and stores them ahead of time. The FileDiffs for each
+        batch are loaded in a single query.
+
+        Args:
+            batch_done_cb (callable, optional):
+                A function to call after each batch. It takes the number
+                of diffsets processed so far and the total number of
+                diffsets.
+
+            batch_size (int, optional):
+                The number of diffsets to load at a time.
+
+            recalculate (bool, optional):
+                Whether to recalculate the totals for diffsets that already
+                have them stored.
+
+        Returns:
+            int:
+            The number of diffsets that had their totals stored.
+        """
+        from reviewboard.diffviewer.models import FileDiff
+
+        total_count = self.count()
+        processed_count = 0
+        updated_count = 0
+        last_pk = 0
+
+        while True:
+            batch = list(self.filter(pk__gt=last_pk).order_by('pk')
+                         [:batch_size])
+
+            if not batch:
+                break
+
+            diffsets = [
+                diffset
+                for diffset in batch
+                if recalculate or 'line_counts' not in diffset.extra_data
+            ]
+
+            if diffsets:
+                filediffs = {}
+
+                for filediff in FileDiff.objects.filter(diffset__in=diffsets):
+                    filediffs.setdefault(filediff.diffset_id, []).append(
+                        filediff)
+
+                for diffset in diffsets:
+                    diffset.recalculate_line_counts(
+                        filediffs.get(diffset.pk, []))
+
+                updated_count += len(diffsets)
+
+            last_pk = batch[-1].pk
+            processed_count += len(batch)
+
+            reset_queries()
+
+            if callable(batch_done_cb):
+                batch_done_cb(processed_count, total_count)
+
+        return updated_count
+
     def create_from_upload(self, repository, diff_file, parent_diff_file,
                            diffset_history, basedir, request,
                            base_commit_id=None, save=True):
@@ -440,20 +766,21 @@ class DiffSetManager(models.Manager):
         The diff_file_contents and parent_diff_file_contents parameters are
         strings with the actual diff contents.
         """
-        from reviewboard.diffviewer.diffutils import convert_to_unicode
+        from reviewboard.diffviewer.diffutils import (convert_to_unicode,
+                                                      update_diffset_checksums)
         from reviewboard.diffviewer.models import FileDiff
 
         tool = repository.get_scmtool()
 
         parser = tool.get_parser(diff_file_contents)
 
-        files = list(self._process_files(
+        files = self._process_files(
             parser,
             basedir,
             repository,
             base_commit_id,
             request,
-            check_existence=(not parent_diff_file_contents)))
+            check_existence=(not parent_diff_file_contents))
 
         # Parse the diff
         if len(files) == 0:
@@ -493,13 +820,15 @@ class DiffSetManager(models.Manager):
             basedir=basedir,
             history=diffset_history,
             repository=repository,
-            diffcompat=DiffCompatVersion.DEFAULT,
+            diffcompat=get_default_compat_version(),
             base_commit_id=base_commit_id)
 
         if save:
             diffset.save()
 
         encoding_list = repository.get_encoding_list()
+        filediffs = []
+        parent_diffs = []
 
         for f in files:
             parent_file = None
@@ -538,25 +867,95 @@ class DiffSetManager(models.Manager):
                 dest_file=parser.normalize_diff_filename(dest_file),
                 source_revision=smart_unicode(orig_rev),
                 dest_detail=f.newInfo,
-                diff=f.data,
-                parent_diff=parent_content,
                 binary=f.binary,
                 status=status)
+            filediff.extra_data = {
+                'raw_insert_count': f.insert_count,
+                'raw_delete_count': f.delete_count,
+            }
 
             if (parent_file and
                 (parent_file.moved or parent_file.copied) and
                 parent_file.insert_count == 0 and
                 parent_file.delete_count == 0):
-                filediff.extra_data = {'parent_moved': True}
+                filediff.extra_data['parent_moved'] = True
+
+            filediffs.append(filediff)
+            parent_diffs.append(parent_content)
 
-            filediff.set_line_counts(raw_insert_count=f.insert_count,
-                                     raw_delete_count=f.delete_count)
+        if save:
+            self._save_filediffs(filediffs, files, parent_diffs)
+
+            # Compute the SHA1s of the original and patched files now, so
+            # that interdiffs against this diff can skip unchanged files.
+            run_in_background(update_diffset_checksums, diffset.pk)
 
-            if save:
-                filediff.save()
+        # The new FileDiffs already have their line counts, so the totals
+        # can be stored without any further queries for them.
+        diffset.recalculate_line_counts(filediffs)
 
         return diffset
 
+    def _save_filediffs(self, filediffs, files, parent_diffs):
+        """Store the diff content for new FileDiffs and save them.
+
+        The diff content is stored in
+        :py:class:`~reviewboard.diffviewer.models.RawFileDiffData` entries,
+        and the FileDiffs are then created, all in bulk. This keeps the
+        number of queries low regardless of the number of files in the diff.
+
+        Args:
+            filediffs (list of reviewboard.diffviewer.models.FileDiff):
+                The unsaved FileDiffs.
+
+            files (list of reviewboard.diffviewer.parser.File):
+                The parsed files from the diff, in the same order as
+                ``filediffs``.
+
+            parent_diffs (list of bytes):
+                The parent diff content for each FileDiff. Empty entries
+                indicate there's no parent diff for a file.
+        """
+        from reviewboard.diffviewer.models import FileDiff, RawFileDiffData
+
+        diff_hashes = RawFileDiffData.objects.bulk_get_or_create_from_data(
+            [f.data for f in files],
+            extra_data=[
+                {
+                    'insert_count': f.insert_count,
+                    'delete_count': f.delete_count,
+                }
+                for f in files
+            ])
+
+        parent_diff_indexes = [
+            i
+            for i, parent_diff in enumerate(parent_diffs)
+            if parent_diff
+        ]
+        parent_diff_hashes = \
+            RawFileDiffData.objects.bulk_get_or_create_from_data(
+                [parent_diffs[i] for i in parent_diff_indexes])
+
+        for i, parent_diff_hash in zip(parent_diff_indexes,
+                                       parent_diff_hashes):
+            filediffs[i].parent_diff_hash = parent_diff_hash
+
+        for filediff, diff_hash, f in zip(filediffs, diff_hashes, files):
+            filediff.diff_hash = diff_hash
+
+            if (diff_hash.insert_count != f.insert_count or
+                diff_hash.delete_count != f.delete_count):
+                # This is an existing entry without line counts. This is
+                # rare, so it's fine to update these one-by-one.
+                diff_hash.insert_count = f.insert_count
+                diff_hash.delete_count = f.delete_count
+                diff_hash.save(update_fields=['extra_data'])
+
+        FileDiff.objects.bulk_create(
+            filediffs,
+            batch_size=self.FILEDIFF_CREATE_BATCH_SIZE)
+
     def _normalize_filename(self, filename, basedir):
         """Normalize a file name to be relative to the repository root."""
         if filename.startswith('/'):
@@ -566,7 +965,24 @@ class DiffSetManager(models.Manager):
 
     def _process_files(self, parser, basedir, repository, base_commit_id,
                        request, check_existence=False, limit_to=None):
+        """Parse and normalize the files in a diff.
+
+        If ``check_existence`` is set, the source revisions of the files are
+        checked against the repository in a single batch, rather than one
+        request at a time.
+
+        Returns:
+            list of reviewboard.diffviewer.parser.File:
+            The files in the diff.
+
+        Raises:
+            reviewboard.scmtools.errors.FileNotFoundError:
+                One of the source files could not be found in the
+                repository.
+        """
         tool = repository.get_scmtool()
+        files = []
+        files_to_check = []
 
         for f in parser.parse():
             source_filename, source_revision = tool.parse_diff_revision(
@@ -585,25 +1001,34 @@ class DiffSetManager(models.Manager):
                 continue
 
             # FIXME: this would be a good place to find permissions errors
-            if (source_revision != PRE_CREATION and
+            if (check_existence and
+                source_revision != PRE_CREATION and
                 source_revision != UNKNOWN and
                 not f.binary and
                 not f.deleted and
                 not f.moved and
-                not f.copied and
-                (check_existence and
-                 not repository.get_file_exists(source_filename,
-                                                source_revision,
-                                                base_commit_id=base_commit_id,
-                                                request=request))):
-                raise FileNotFoundError(source_filename, source_revision,
-                                        base_commit_id)
+                not f.copied):
+                files_to_check.append((source_filename, source_revision))
 
             f.origFile = source_filename
             f.origInfo = source_revision
             f.newFile = dest_filename
 
-            yield f
+            files.append(f)
+
+        if files_to_check:
+            files_exist = repository.get_files_exist(
+                files_to_check,
+                base_commit_id=base_commit_id,
+                request=request)
+
+            for (source_filename, source_revision), exists in \
+                    zip(files_to_check, files_exist):
+                if not exists:
+                    raise FileNotFoundError(source_filename, source_revision,
+                                            base_commit_id=base_commit_id)
+
+        return files
 
     def _compare_files(self, filename1, filename2):
         """
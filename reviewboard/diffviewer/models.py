@@ -1,15 +1,15 @@
 from __future__ import unicode_literals
 
-import bz2
 import logging
 
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Q
 from django.utils import six, timezone
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
 from djblets.db.fields import Base64Field, JSONField
 
+from reviewboard.diffviewer.compression import get_codec
 from reviewboard.diffviewer.errors import DiffParserError
 from reviewboard.diffviewer.managers import (RawFileDiffDataManager,
                                              FileDiffManager,
@@ -38,13 +38,20 @@ class RawFileDiffData(models.Model):
 
     This is the class used in Review Board 2.5+ to store diff content.
     Unlike in previous versions, the content is not base64-encoded. Instead,
-    it is stored either as bzip2-compressed data (if the resulting
-    compressed data is smaller than the raw data), or as the raw data itself.
+    it is stored either as compressed data (if the resulting compressed data
+    is smaller than the raw data), or as the raw data itself. See
+    :py:mod:`reviewboard.diffviewer.compression` for the methods used.
     """
     COMPRESSION_BZIP2 = 'B'
+    COMPRESSION_ZLIB = 'Z'
+    COMPRESSION_ZSTD = 'S'
+    COMPRESSION_ZSTD_DICT = 'D'
 
     COMPRESSION_CHOICES = (
         (COMPRESSION_BZIP2, _('BZip2-compressed')),
+        (COMPRESSION_ZLIB, _('Zlib-compressed')),
+        (COMPRESSION_ZSTD, _('Zstandard-compressed')),
+        (COMPRESSION_ZSTD_DICT, _('Zstandard-compressed with a dictionary')),
     )
 
     binary_hash = models.CharField(_("hash"), max_length=40, unique=True)
@@ -62,15 +69,49 @@ class RawFileDiffData(models.Model):
         The content will be uncompressed (if necessary) and returned as the
         raw set of bytes originally uploaded.
         """
-        if self.compression == self.COMPRESSION_BZIP2:
-            return bz2.decompress(self.binary)
-        elif self.compression is None:
+        if self.compression is None:
             return bytes(self.binary)
+
+        return self._get_codec().decompress(bytes(self.binary))
+
+    def iter_content(self):
+        """Yield the content of the diff, a piece at a time.
+
+        This is like :py:attr:`content`, but decompresses the content
+        incrementally, so that large diffs don't have to be held in memory
+        all at once.
+
+        Yields:
+            bytes:
+            Each piece of the content.
+        """
+        if self.compression is None:
+            yield bytes(self.binary)
         else:
+            for content in self._get_codec().iter_decompress(
+                    bytes(self.binary)):
+                yield content
+
+    def _get_codec(self):
+        """Return the compression method for the stored content.
+
+        Returns:
+            reviewboard.diffviewer.compression.CompressionCodec:
+            The compression method.
+
+        Raises:
+            NotImplementedError:
+                The compression method isn't supported.
+        """
+        codec = get_codec(self.compression)
+
+        if codec is None or not codec.can_decompress():
             raise NotImplementedError(
                 'Unsupported compression method %s for RawFileDiffData %s'
                 % (self.compression, self.pk))
 
+        return codec
+
     @property
     def insert_count(self):
         return self.extra_data.get('insert_count')
@@ -229,6 +270,21 @@ class FileDiff(models.Model):
 
     diff = property(_get_diff, _set_diff)
 
+    def iter_diff(self):
+        """Yield the diff content, a piece at a time.
+
+        This is like :py:attr:`diff`, but decompresses the content
+        incrementally. See :py:meth:`RawFileDiffData.iter_content`.
+
+        Yields:
+            bytes:
+            Each piece of the diff content.
+        """
+        if self._needs_diff_migration():
+            self._migrate_diff_data()
+
+        return self.diff_hash.iter_content()
+
     def _get_parent_diff(self):
         if self._needs_parent_diff_migration():
             self._migrate_diff_data()
@@ -297,8 +353,17 @@ class FileDiff(models.Model):
             if self.pk:
                 self.save(update_fields=['extra_data'])
 
-        raw_insert_count = self.extra_data['raw_insert_count']
-        raw_delete_count = self.extra_data['raw_delete_count']
+        return self._build_line_counts()
+
+    def _build_line_counts(self):
+        """Return the line counts currently stored in extra_data.
+
+        This is used by :py:meth:`get_line_counts` once the raw counts are
+        known to be stored, and by :py:meth:`set_line_counts` to find out
+        how the counts changed.
+        """
+        raw_insert_count = self.extra_data.get('raw_insert_count')
+        raw_delete_count = self.extra_data.get('raw_delete_count')
 
         return {
             'raw_insert_count': raw_insert_count,
@@ -326,6 +391,8 @@ class FileDiff(models.Model):
 
         The other counts are stored exclusively in FileDiff, as they are
         more render-specific.
+
+        The totals stored on the DiffSet are updated to match.
         """
         updated = False
 
@@ -336,6 +403,11 @@ class FileDiff(models.Model):
                             'un-migrated FileDiff %s' % self.pk)
             self._migrate_diff_data(False)
 
+        if self.pk:
+            # Keep track of the current counts, so that the totals on the
+            # DiffSet can be updated by the difference.
+            old_counts = self.get_line_counts()
+
         if (insert_count is not None and
             raw_insert_count is not None and
             self.diff_hash.insert_count is not None and
@@ -387,6 +459,8 @@ class FileDiff(models.Model):
 
         if updated and self.pk:
             self.save(update_fields=['extra_data'])
+            self.diffset.update_total_line_counts(old_counts,
+                                                  self._build_line_counts())
 
     def _needs_diff_migration(self):
         return self.diff_hash_id is None
@@ -571,18 +645,121 @@ class DiffSet(models.Model):
     objects = DiffSetManager()
 
     def get_total_line_counts(self):
-        """Returns the total line counts from all files in this diffset."""
+        """Returns the total line counts from all files in this diffset.
+
+        The totals are stored on the diffset when it's created, and kept up
+        to date as the line counts on its FileDiffs change, so this doesn't
+        need to look at any FileDiffs.
+
+        Diffsets created before totals were stored will have them calculated
+        and stored the first time this is called. They can also be stored
+        ahead of time through the :command:`backfill-diff-line-counts`
+        management command.
+        """
+        counts = self.extra_data.get('line_counts')
+
+        if counts is None:
+            counts = self.recalculate_line_counts()
+
+        return dict(counts)
+
+    def recalculate_line_counts(self, filediffs=None):
+        """Calculate and store the total line counts from all files.
+
+        Args:
+            filediffs (list of FileDiff, optional):
+                The FileDiffs in this diffset. If not provided, they will be
+                fetched.
+
+        Returns:
+            dict:
+            The total line counts. These have the same keys as
+            :py:meth:`FileDiff.get_line_counts`.
+        """
+        if filediffs is None:
+            filediffs = self.files.all()
+
         counts = {}
 
-        for filediff in self.files.all():
+        for filediff in filediffs:
             for key, value in six.iteritems(filediff.get_line_counts()):
                 if counts.get(key) is None:
                     counts[key] = value
                 elif value is not None:
                     counts[key] += value
 
+        if self.pk:
+            self._store_line_counts(lambda stored_counts: counts)
+        else:
+            self.extra_data['line_counts'] = counts
+
         return counts
 
+    def update_total_line_counts(self, old_counts, new_counts):
+        """Update the stored totals after a file's line counts changed.
+
+        Nothing is done if no totals are stored yet, since they'll be
+        calculated when first needed.
+
+        Args:
+            old_counts (dict):
+                The file's previous line counts.
+
+            new_counts (dict):
+                The file's new line counts.
+        """
+        def _update_counts(counts):
+            if counts is None:
+                return None
+
+            changed = False
+
+            for key, value in six.iteritems(new_counts):
+                old_value = old_counts.get(key)
+
+                if value != old_value:
+                    counts[key] = ((counts.get(key) or 0) + (value or 0) -
+                                   (old_value or 0))
+                    changed = True
+
+            if changed:
+                return counts
+            else:
+                return None
+
+        self._store_line_counts(_update_counts)
+
+    def _store_line_counts(self, update_counts):
+        """Store new total line counts in the database.
+
+        The diffset is re-fetched and locked while the totals are updated,
+        so that the totals stay correct when several files are processed at
+        once. Only the ``line_counts`` key is written back, so changes made
+        to other keys in ``extra_data`` since this diffset was loaded are
+        kept.
+
+        Args:
+            update_counts (callable):
+                A function taking the currently stored totals (or ``None``)
+                and returning the new totals, or ``None`` to leave them
+                alone.
+        """
+        with transaction.atomic():
+            try:
+                diffset = \
+                    DiffSet.objects.select_for_update().get(pk=self.pk)
+            except DiffSet.DoesNotExist:
+                return
+
+            extra_data = diffset.extra_data or {}
+            counts = update_counts(extra_data.get('line_counts'))
+
+            if counts is not None:
+                extra_data['line_counts'] = counts
+                DiffSet.objects.filter(pk=self.pk).update(
+                    extra_data=extra_data)
+                self.extra_data['line_counts'] = counts
+
     def save(self, **kwargs):
         """
         Saves this diffset.
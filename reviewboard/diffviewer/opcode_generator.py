@@ -2,6 +2,7 @@ from __future__ import unicode_literals
 
 import os
 import re
+from bisect import bisect_left
 
 from django.utils import six
 from django.utils.six.moves import range
@@ -26,7 +27,7 @@ class MoveRange(object):
         return self.groups[-1]
 
     def add_group(self, group, group_index):
-        if self.groups[-1] != group:
+        if self.groups[-1][1] != group_index:
             self.groups.append((group, group_index))
 
     def __repr__(self):
@@ -141,25 +142,32 @@ class DiffOpcodeGenerator(object):
         for group_index, group in enumerate(opcodes):
             self.groups.append(group)
 
-            # Store delete/insert ranges for later lookup. We will be building
-            # keys that in most cases will be unique for the particular block
-            # of text being inserted/deleted. There is a chance of collision,
-            # so we store a list of matching groups under that key.
+            # Store delete/insert ranges for later lookup. The removed lines
+            # are indexed by their content, with the positions of each
+            # stripped line stored per group. This lets us find the removed
+            # lines matching any inserted line without scanning the groups.
             #
-            # Later, we will loop through the keys and attempt to find insert
-            # keys/groups that match remove keys/groups.
+            # Later, we will loop through the inserted lines and attempt to
+            # find removed lines and groups that match them.
             tag = group[0]
 
             if tag in ('delete', 'replace'):
                 i1 = group[1]
                 i2 = group[2]
+                move_key = '%s-%s-%s-%s' % group[1:5]
 
                 for i in range(i1, i2):
                     line = self.differ.a[i].strip()
 
                     if line:
-                        self.removes.setdefault(line, []).append(
-                            (i, group, group_index))
+                        line_removes = self.removes.setdefault(line, [])
+
+                        if (line_removes and
+                            line_removes[-1][1] == group_index):
+                            line_removes[-1][3].append(i)
+                        else:
+                            line_removes.append(
+                                (group, group_index, move_key, [i]))
 
             if tag in ('insert', 'replace'):
                 self.inserts.append(group)
@@ -316,7 +324,7 @@ class DiffOpcodeGenerator(object):
         # lines, so we can assemble ranges later.
         i_move_cur = ij1
         i_move_range = MoveRange(i_move_cur, i_move_cur)
-        r_move_ranges = {}  # key -> (start, end, group)
+        r_move_ranges = {}  # key -> MoveRange
         move_key = None
 
         is_replace = (itag == 'replace')
@@ -347,34 +355,56 @@ class DiffOpcodeGenerator(object):
                 #
                 # If there isn't any move information for this line, we'll
                 # simply add it to the move ranges.
-                for ri, rgroup, rgroup_index in self.removes.get(iline, []):
-                    r_move_range = r_move_ranges.get(move_key)
-
-                    if not r_move_range or ri != r_move_range.end + 1:
-                        # We either didn't have a previous range, or this
-                        # group didn't immediately follow it, so we need
-                        # to start a new one.
-                        move_key = '%s-%s-%s-%s' % rgroup[1:5]
+                for rgroup, rgroup_index, rkey, ris in self.removes[iline]:
+                    num_ris = len(ris)
+                    p = 0
+
+                    while p < num_ris:
+                        ri = ris[p]
+                        p += 1
                         r_move_range = r_move_ranges.get(move_key)
 
-                    if r_move_range:
-                        # If the remove information for the line is next in
-                        # the sequence for this calculated move range...
-                        if ri == r_move_range.end + 1:
+                        if (r_move_range is None or
+                            ri != r_move_range.end + 1):
+                            # We either didn't have a previous range, or this
+                            # group didn't immediately follow it, so we need
+                            # to start a new one.
+                            move_key = rkey
+                            r_move_range = r_move_ranges.get(move_key)
+
+                            if (r_move_range is not None and
+                                ri != r_move_range.end + 1):
+                                # The range for this group doesn't continue
+                                # here. The only removed line in this group
+                                # that can continue it is the one immediately
+                                # following it, so skip straight to that,
+                                # if it matches this inserted line.
+                                next_ri = r_move_range.end + 1
+                                p = bisect_left(ris, next_ri, p)
+
+                                if p < num_ris and ris[p] != next_ri:
+                                    p = num_ris
+
+                                continue
+
+                        if r_move_range is not None:
+                            # The remove information for the line is next in
+                            # the sequence for this calculated move range.
                             # This is part of the current range, so update
                             # the end of the range to include it.
                             r_move_range.end = ri
                             r_move_range.add_group(rgroup, rgroup_index)
                             updated_range = True
-                    else:
-                        # Check that this isn't a replace line that's just
-                        # "replacing" itself (which would happen if it's just
-                        # changing whitespace).
-                        if not is_replace or i_move_cur - ij1 != ri - ii1:
+                        elif not is_replace or i_move_cur - ij1 != ri - ii1:
                             # We don't have any move ranges yet, or we're done
                             # with the existing range, so it's time to build
                             # one based on any removed lines we find that
                             # match the inserted line.
+                            #
+                            # The check above makes sure that this isn't a
+                            # replace line that's just "replacing" itself
+                            # (which would happen if it's just changing
+                            # whitespace).
                             r_move_ranges[move_key] = \
                                 MoveRange(ri, ri, [(rgroup, rgroup_index)])
                             updated_range = True
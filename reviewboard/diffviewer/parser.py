@@ -4,7 +4,6 @@ import logging
 import re
 
 from django.utils import six
-from django.utils.six.moves import range
 
 from reviewboard.diffviewer.errors import DiffParserError
 
@@ -16,7 +15,7 @@ class File(object):
         self.origInfo = None
         self.newInfo = None
         self.origChangesetId = None
-        self.data = None
+        self._data_chunks = None
         self.binary = False
         self.deleted = False
         self.moved = False
@@ -24,6 +23,61 @@ class File(object):
         self.insert_count = 0
         self.delete_count = 0
 
+    @property
+    def data(self):
+        """The raw diff content for the file.
+
+        While parsing, content is collected in pieces through
+        :py:meth:`append_data`, and only joined together the first time
+        this is accessed. This keeps parsing linear in the size of the
+        diff, rather than copying the file's content on every line.
+        """
+        chunks = self._data_chunks
+
+        if chunks is None:
+            return None
+        elif len(chunks) == 1:
+            return chunks[0]
+
+        data = b''.join(chunks)
+        self._data_chunks = [data]
+
+        return data
+
+    @data.setter
+    def data(self, data):
+        if data is None:
+            self._data_chunks = None
+        else:
+            self._data_chunks = [data]
+
+    def append_data(self, data):
+        """Append content to the file's diff data.
+
+        Args:
+            data (bytes):
+                The content to append.
+        """
+        if self._data_chunks is None:
+            self._data_chunks = [data]
+        else:
+            self._data_chunks.append(data)
+
+    def prepend_data(self, data):
+        """Prepend content to the file's diff data.
+
+        This is used to attach any content found before the file's header,
+        such as the preamble of the diff.
+
+        Args:
+            data (bytes):
+                The content to prepend.
+        """
+        if self._data_chunks is None:
+            self._data_chunks = [data]
+        else:
+            self._data_chunks.insert(0, data)
+
 
 class DiffParser(object):
     """
@@ -49,7 +103,7 @@ class DiffParser(object):
         logging.debug("DiffParser.parse: Beginning parse of diff, size = %s",
                       len(self.data))
 
-        preamble = b''
+        preamble = []
         self.files = []
         file = None
         i = 0
@@ -61,15 +115,18 @@ class DiffParser(object):
             if new_file:
                 # This line is the start of a new file diff.
                 file = new_file
-                file.data = preamble + file.data
-                preamble = b''
+
+                if preamble:
+                    file.prepend_data(self.join_lines(preamble))
+                    preamble = []
+
                 self.files.append(file)
                 i = next_linenum
             else:
                 if file:
                     i = self.parse_diff_line(i, file)
                 else:
-                    preamble += self.lines[i] + b'\n'
+                    preamble.append(self.lines[i])
                     i += 1
 
         logging.debug("DiffParser.parse: Finished parsing diff.")
@@ -85,10 +142,26 @@ class DiffParser(object):
             elif line.startswith(b'+'):
                 info.insert_count += 1
 
-        info.data += line + b'\n'
+        info.append_data(line + b'\n')
 
         return linenum + 1
 
+    def join_lines(self, lines):
+        """Join lines from the diff back into content.
+
+        Args:
+            lines (list of bytes):
+                The lines to join, without line endings.
+
+        Returns:
+            bytes:
+            The joined content, with a newline after each line.
+        """
+        if not lines:
+            return b''
+
+        return b'\n'.join(lines) + b'\n'
+
     def parse_change_header(self, linenum):
         """
         Parses part of the diff beginning at the specified line number, trying
@@ -138,9 +211,7 @@ class DiffParser(object):
 
             # The header is part of the diff, so make sure it gets in the
             # diff content.
-            file.data = b''.join([
-                self.lines[i] + b'\n' for i in range(start, linenum)
-            ])
+            file.data = self.join_lines(self.lines[start:linenum])
 
         return linenum, file
 
@@ -228,8 +299,35 @@ class DiffParser(object):
         """Returns a raw diff as a string.
 
         The returned diff as composed of all FileDiffs in the provided diffset.
+
+        Subclasses can override this to change the raw diff. It will then be
+        used by :py:meth:`iter_raw_diff` as well.
+        """
+        return b''.join(diffset.files.iter_diff_contents())
+
+    def iter_raw_diff(self, diffset):
+        """Yield a raw diff, a piece at a time.
+
+        This is like :py:meth:`raw_diff`, but loads and decompresses the
+        FileDiffs incrementally, so that large diffs can be streamed to the
+        client without being held in memory all at once.
+
+        If a subclass overrides :py:meth:`raw_diff`, this yields its result
+        instead.
+
+        Args:
+            diffset (reviewboard.diffviewer.models.DiffSet):
+                The diffset containing the FileDiffs.
+
+        Yields:
+            bytes:
+            Each piece of the raw diff.
         """
-        return b''.join([filediff.diff for filediff in diffset.files.all()])
+        if (six.get_unbound_function(type(self).raw_diff) is not
+            six.get_unbound_function(DiffParser.raw_diff)):
+            return iter([self.raw_diff(diffset)])
+
+        return diffset.files.iter_diff_contents()
 
     def get_orig_commit_id(self):
         """Returns the commit ID of the original revision for the diff.
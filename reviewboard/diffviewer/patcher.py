@@ -0,0 +1,447 @@
+"""In-process application of unified diffs.
+
+This implements the subset of GNU :command:`patch` needed to apply a single
+file's unified diff to an in-memory buffer. Hunks are located using the same
+search strategy as :command:`patch` (starting at the expected line, adjusted
+by the offset of prior hunks, then searching outward), and context lines may
+be fuzzed away in the same manner.
+
+Anything outside of that subset (context or ed-style diffs, malformed hunks,
+hunks that can't be placed) results in a
+:py:class:`~reviewboard.diffviewer.errors.PatchRejectedError`, which callers
+use to fall back to the :command:`patch` executable.
+"""
+
+from __future__ import unicode_literals
+
+import re
+
+from django.utils.six.moves import range
+
+from reviewboard.diffviewer.errors import PatchRejectedError
+
+
+#: The default maximum fuzz factor, matching GNU patch.
+DEFAULT_MAX_FUZZ = 2
+
+
+HUNK_HEADER_RE = re.compile(
+    br'^@@ -(?P<orig_start>\d+)(,(?P<orig_len>\d+))? '
+    br'\+(?P<new_start>\d+)(,(?P<new_len>\d+))? @@')
+
+
+class Hunk(object):
+    """A parsed hunk from a unified diff.
+
+    Attributes:
+        orig_start (int):
+            The 1-based starting line in the original file, as stated in
+            the hunk header.
+
+        orig_len (int):
+            The number of lines from the original file in the hunk.
+
+        new_start (int):
+            The 1-based starting line in the patched file.
+
+        new_len (int):
+            The number of lines from the patched file in the hunk.
+
+        lines (list of tuple):
+            The lines in the hunk. Each is a tuple of the operation
+            (``b' '``, ``b'-'`` or ``b'+'``) and the line content, including
+            the trailing newline (if any).
+    """
+
+    def __init__(self, orig_start, orig_len, new_start, new_len):
+        self.orig_start = orig_start
+        self.orig_len = orig_len
+        self.new_start = new_start
+        self.new_len = new_len
+        self.lines = []
+
+    @property
+    def pattern(self):
+        """The lines that must be present in the original file."""
+        return [
+            text
+            for op, text in self.lines
+            if op != b'+'
+        ]
+
+    def reverse(self):
+        """Return a reversed version of this hunk.
+
+        Returns:
+            Hunk:
+            A hunk that would undo this one.
+        """
+        reversed_ops = {
+            b'-': b'+',
+            b'+': b'-',
+            b' ': b' ',
+        }
+
+        hunk = Hunk(orig_start=self.new_start,
+                    orig_len=self.new_len,
+                    new_start=self.orig_start,
+                    new_len=self.orig_len)
+        hunk.lines = [
+            (reversed_ops[op], text)
+            for op, text in self.lines
+        ]
+
+        return hunk
+
+    @property
+    def prefix_context(self):
+        """The number of unchanged lines before the first change."""
+        count = 0
+
+        for op, text in self.lines:
+            if op != b' ':
+                break
+
+            count += 1
+
+        return count
+
+    @property
+    def suffix_context(self):
+        """The number of unchanged lines after the last change."""
+        count = 0
+
+        for op, text in reversed(self.lines):
+            if op != b' ':
+                break
+
+            count += 1
+
+        return count
+
+
+def parse_hunks(diff):
+    """Parse the hunks out of a unified diff for a single file.
+
+    Any lines outside of a hunk (such as the file headers) are ignored.
+
+    Args:
+        diff (bytes):
+            The diff content, with normalized (``\\n``) line endings.
+
+    Returns:
+        list of Hunk:
+        The hunks in the diff.
+
+    Raises:
+        reviewboard.diffviewer.errors.PatchRejectedError:
+            The diff could not be parsed as a single-file unified diff.
+    """
+    lines = diff.split(b'\n')
+
+    if lines and not lines[-1]:
+        lines.pop()
+
+    num_lines = len(lines)
+    hunks = []
+    i = 0
+
+    while i < num_lines:
+        m = HUNK_HEADER_RE.match(lines[i])
+        i += 1
+
+        if not m:
+            if hunks and lines[i - 1].startswith((b'--- ', b'*** ')):
+                raise PatchRejectedError(
+                    'Found a second file header after line %d' % i)
+
+            continue
+
+        hunk = Hunk(orig_start=int(m.group('orig_start')),
+                    orig_len=int(m.group('orig_len') or 1),
+                    new_start=int(m.group('new_start')),
+                    new_len=int(m.group('new_len') or 1))
+        orig_remaining = hunk.orig_len
+        new_remaining = hunk.new_len
+
+        while orig_remaining > 0 or new_remaining > 0:
+            if i >= num_lines:
+                raise PatchRejectedError('Truncated hunk at line %d' % i)
+
+            line = lines[i]
+            i += 1
+
+            if line.startswith(b'\\'):
+                if not hunk.lines:
+                    raise PatchRejectedError(
+                        'Unexpected newline marker at line %d' % i)
+
+                hunk.lines[-1] = (hunk.lines[-1][0], hunk.lines[-1][1][:-1])
+                continue
+
+            # Some tools strip the trailing whitespace from diffs, turning
+            # empty lines of context into blank lines. patch accepts these,
+            # so we do too.
+            op = line[:1] or b' '
+
+            if op == b' ':
+                orig_remaining -= 1
+                new_remaining -= 1
+            elif op == b'-':
+                orig_remaining -= 1
+            elif op == b'+':
+                new_remaining -= 1
+            else:
+                raise PatchRejectedError(
+                    'Unexpected line in hunk at line %d' % i)
+
+            if orig_remaining < 0 or new_remaining < 0:
+                raise PatchRejectedError(
+                    'Hunk line counts do not match at line %d' % i)
+
+            hunk.lines.append((op, line[1:] + b'\n'))
+
+        if i < num_lines and lines[i].startswith(b'\\') and hunk.lines:
+            hunk.lines[-1] = (hunk.lines[-1][0], hunk.lines[-1][1][:-1])
+            i += 1
+
+        hunks.append(hunk)
+
+    return hunks
+
+
+def apply_patch(diff, data, max_fuzz=DEFAULT_MAX_FUZZ):
+    """Apply a unified diff to a buffer in memory.
+
+    Args:
+        diff (bytes):
+            The diff content, with normalized (``\\n``) line endings.
+
+        data (bytes):
+            The original file content, with normalized line endings.
+
+        max_fuzz (int, optional):
+            The maximum number of context lines at the beginning and end of
+            a hunk that may be ignored when locating it.
+
+    Returns:
+        bytes:
+        The patched file content.
+
+    Raises:
+        reviewboard.diffviewer.errors.PatchRejectedError:
+            The diff couldn't be parsed, or one of its hunks couldn't be
+            applied.
+    """
+    hunks = parse_hunks(diff)
+
+    if not hunks:
+        raise PatchRejectedError('No hunks were found in the diff')
+
+    lines = _split_lines(data)
+    result = []
+    unterminated = []
+    in_offset = 0
+    last_frozen_line = 0
+
+    for hunk_num, hunk in enumerate(hunks, start=1):
+        pattern = hunk.pattern
+        prefix_context = hunk.prefix_context
+        suffix_context = hunk.suffix_context
+        where = 0
+
+        for fuzz in range(min(max_fuzz,
+                              max(prefix_context, suffix_context)) + 1):
+            where, in_offset = _locate_hunk(hunk, pattern, lines, fuzz,
+                                            prefix_context, suffix_context,
+                                            in_offset, last_frozen_line)
+
+            if where:
+                break
+
+            if hunk_num == 1:
+                # patch checks whether the first hunk looks reversed or
+                # already applied before trying with more fuzz, and skips
+                # the entire patch if so.
+                reversed_hunk = hunk.reverse()
+                reversed_where = _locate_hunk(reversed_hunk,
+                                              reversed_hunk.pattern, lines,
+                                              fuzz, prefix_context,
+                                              suffix_context, in_offset,
+                                              last_frozen_line)[0]
+
+                if reversed_where:
+                    raise PatchRejectedError(
+                        'The patch appears to be reversed or already '
+                        'applied')
+
+        if not where:
+            raise PatchRejectedError('Hunk #%d could not be applied'
+                                     % hunk_num)
+
+        # Context lines aren't written explicitly. They're copied from the
+        # original file when reaching the next change, or at the end of the
+        # file, just like in patch.
+        pos = where - 1
+
+        for op, text in hunk.lines:
+            if op == b' ':
+                pos += 1
+            else:
+                if pos < last_frozen_line:
+                    raise PatchRejectedError('Hunk #%d is out of order'
+                                             % hunk_num)
+
+                copy_start = last_frozen_line
+                result += lines[copy_start:pos]
+                last_frozen_line = pos
+
+                if op == b'-':
+                    pos += 1
+                    last_frozen_line = pos
+                elif pos > len(lines):
+                    raise PatchRejectedError(
+                        'Hunk #%d adds lines past the end of the file'
+                        % hunk_num)
+                elif (copy_start < pos == len(lines) and
+                      not lines[-1].endswith(b'\n')):
+                    # patch would glue this onto the unterminated last
+                    # line of the file. Leave that mess to patch.
+                    raise PatchRejectedError(
+                        'Hunk #%d adds lines after the end of a file with '
+                        'no trailing newline'
+                        % hunk_num)
+                else:
+                    if not text.endswith(b'\n'):
+                        unterminated.append(len(result))
+
+                    result.append(text)
+
+    result += lines[last_frozen_line:]
+
+    # A line without a trailing newline only stays that way if it ends up at
+    # the end of the file. Like patch, we terminate it if anything follows.
+    for i in unterminated:
+        if i < len(result) - 1:
+            result[i] += b'\n'
+
+    return b''.join(result)
+
+
+def _split_lines(data):
+    """Split a buffer into lines, keeping the trailing newlines.
+
+    Unlike :py:meth:`bytes.splitlines`, this only splits on ``\\n``, which
+    is all that patch considers a line ending.
+    """
+    if b'\r' not in data:
+        # This is the common case, and is handled quickly in C.
+        return data.splitlines(True)
+
+    lines = data.split(b'\n')
+    last_line = lines.pop()
+    lines = [line + b'\n' for line in lines]
+
+    if last_line:
+        lines.append(last_line)
+
+    return lines
+
+
+def _locate_hunk(hunk, pattern, lines, fuzz, prefix_context, suffix_context,
+                 in_offset, last_frozen_line):
+    """Locate the position of a hunk in the original file.
+
+    This mirrors ``locate_hunk()`` from GNU patch.
+
+    Returns:
+        tuple:
+        A 2-tuple of the 1-based line number the hunk's pattern starts at
+        (or 0 if it couldn't be located) and the new cumulative offset.
+    """
+    if hunk.orig_len:
+        first_guess = hunk.orig_start + in_offset
+    else:
+        first_guess = hunk.orig_start + 1 + in_offset
+
+    pat_lines = len(pattern)
+
+    if not pat_lines:
+        # A hunk with nothing to match always matches, so long as it's
+        # within the file. Anything past that is left for patch to sort out.
+        if first_guess > len(lines) + 1:
+            return 0, in_offset
+
+        return first_guess, in_offset
+
+    input_lines = len(lines)
+    context = max(prefix_context, suffix_context)
+    prefix_fuzz = fuzz + prefix_context - context
+    suffix_fuzz = fuzz + suffix_context - context
+    max_where = input_lines - (pat_lines - suffix_fuzz) + 1
+    min_where = last_frozen_line + 1
+    max_pos_offset = max_where - first_guess
+    max_neg_offset = first_guess - min_where
+    max_offset = max(max_pos_offset, max_neg_offset)
+
+    # Don't try lines <= 0.
+    if first_guess <= max_neg_offset:
+        max_neg_offset = first_guess - 1
+
+    if prefix_fuzz < 0 and hunk.orig_start <= 1:
+        # This can only match the start of the file.
+        if (suffix_fuzz < 0 and
+            (pat_lines != input_lines or
+             prefix_context < last_frozen_line)):
+            # This can only match the entire file.
+            return 0, in_offset
+
+        offset = 1 - first_guess
+
+        if (last_frozen_line <= prefix_context and
+            offset <= max_pos_offset and
+            _matches(pattern, lines, 1, 0, max(suffix_fuzz, 0))):
+            return 1, in_offset + offset
+
+        return 0, in_offset
+    elif prefix_fuzz < 0:
+        prefix_fuzz = 0
+
+    if suffix_fuzz < 0:
+        # This can only match the end of the file.
+        where = input_lines - pat_lines + 1
+        offset = first_guess - where
+
+        if (offset <= max_neg_offset and
+            _matches(pattern, lines, where, prefix_fuzz, 0)):
+            return where, in_offset - offset
+
+        return 0, in_offset
+
+    for offset in range(max_offset + 1):
+        if (offset <= max_pos_offset and
+            _matches(pattern, lines, first_guess + offset, prefix_fuzz,
+                     suffix_fuzz)):
+            return first_guess + offset, in_offset + offset
+
+        if (0 < offset <= max_neg_offset and
+            _matches(pattern, lines, first_guess - offset, prefix_fuzz,
+                     suffix_fuzz)):
+            return first_guess - offset, in_offset - offset
+
+    return 0, in_offset
+
+
+def _matches(pattern, lines, base, prefix_fuzz, suffix_fuzz):
+    """Return whether a hunk's pattern matches the file at a given line.
+
+    The first ``prefix_fuzz`` and last ``suffix_fuzz`` lines of the pattern
+    are not compared.
+    """
+    start = base - 1 + prefix_fuzz
+    end = base - 1 + len(pattern) - suffix_fuzz
+
+    if start < 0 or end > len(lines):
+        return False
+
+    return lines[start:end] == pattern[prefix_fuzz:len(pattern) - suffix_fuzz]
@@ -0,0 +1,177 @@
+"""Precomputing diffs in the background.
+
+Rendering a file in the diff viewer the first time means fetching the
+original file from the repository, patching it, diffing, highlighting and
+rendering the result. Once a diff has been published, this can be done ahead
+of time, so that reviewers opening it find the chunks already in the cache.
+
+The rendered fragments depend on the page showing the diff, so they're only
+precomputed when the caller provides a function for creating the renderer
+that page would use.
+
+Precomputing happens on the shared background task queue. Files are
+processed in the order they appear in the diff viewer, and the files for the
+interdiff against the previous revision are processed after those for the
+new revision. Only a limited number of files are processed at once for each
+repository, so that a large diff doesn't flood the repository with requests.
+"""
+
+from __future__ import unicode_literals
+
+import logging
+
+from django.conf import settings
+from django.http import HttpRequest
+from django.utils import translation
+from djblets.siteconfig.models import SiteConfiguration
+
+from reviewboard.concurrency import queue_background_task
+from reviewboard.diffviewer.diffutils import (get_diff_files,
+                                              populate_diff_chunks)
+from reviewboard.diffviewer.models import DiffSet
+
+
+#: The priority for working out which files to precompute.
+PRIORITY_PLAN = 0
+
+#: The priority for precomputing files in a diff.
+PRIORITY_DIFF = 1
+
+#: The priority for precomputing files in an interdiff.
+PRIORITY_INTERDIFF = 2
+
+
+def queue_diff_precompute(diffset_history_id, create_renderer=None):
+    """Queue precomputing the latest diff in a diffset history.
+
+    The latest diff is precomputed, along with the interdiff against the
+    revision before it, if any. The diffsets are looked up in the
+    background, so this doesn't add any queries to the caller.
+
+    Args:
+        diffset_history_id (int):
+            The ID of the diffset history containing the diff.
+
+        create_renderer (callable, optional):
+            A function for creating the renderer that the page showing the
+            diff uses for each file. It takes the file and whether to
+            syntax-highlight it, and returns a
+            :py:class:`~reviewboard.diffviewer.renderers.DiffRenderer`.
+
+            If not provided, only the chunks are precomputed.
+    """
+    queue_background_task(precompute_latest_diffset,
+                          args=(diffset_history_id, create_renderer),
+                          priority=PRIORITY_PLAN)
+
+
+def precompute_latest_diffset(diffset_history_id, create_renderer=None):
+    """Precompute the latest diff in a diffset history.
+
+    Args:
+        diffset_history_id (int):
+            The ID of the diffset history containing the diff.
+
+        create_renderer (callable, optional):
+            A function for creating the renderer for each file. See
+            :py:func:`queue_diff_precompute`.
+    """
+    diffset_ids = list(
+        DiffSet.objects
+        .filter(history=diffset_history_id)
+        .order_by('-revision')
+        .values_list('pk', flat=True)[:2])
+
+    if diffset_ids:
+        precompute_diffset(*diffset_ids, create_renderer=create_renderer)
+
+
+def precompute_diffset(diffset_id, previous_diffset_id=None,
+                       create_renderer=None):
+    """Queue precomputing each file in a diff and interdiff.
+
+    This is run on the background task queue. It looks up the files that
+    the diff viewer would show, and queues a task to precompute each of them.
+    Tasks with the same priority run in the order they're queued, so files
+    are precomputed in the order they're shown.
+
+    Args:
+        diffset_id (int):
+            The ID of the diffset to precompute.
+
+        previous_diffset_id (int, optional):
+            The ID of the previous revision of the diff, for precomputing the
+            interdiff.
+
+        create_renderer (callable, optional):
+            A function for creating the renderer for each file. See
+            :py:func:`queue_diff_precompute`.
+    """
+    diffset = DiffSet.objects.select_related('repository').get(pk=diffset_id)
+
+    siteconfig = SiteConfiguration.objects.get_current()
+    highlighting = siteconfig.get('diffviewer_syntax_highlighting')
+
+    group = 'repository-%s' % diffset.repository_id
+    group_limit = getattr(settings, 'DIFF_PRECOMPUTE_MAX_PER_REPOSITORY', 1)
+
+    files = [
+        (PRIORITY_DIFF, diff_file)
+        for diff_file in get_diff_files(diffset)
+    ]
+
+    if previous_diffset_id is not None:
+        previous_diffset = DiffSet.objects.get(pk=previous_diffset_id)
+        files += [
+            (PRIORITY_INTERDIFF, diff_file)
+            for diff_file in get_diff_files(previous_diffset, None, diffset)
+        ]
+
+    for priority, diff_file in files:
+        if not diff_file['binary']:
+            queue_background_task(precompute_diff_file,
+                                  args=(diff_file, highlighting,
+                                        create_renderer),
+                                  priority=priority,
+                                  group=group,
+                                  group_limit=group_limit)
+
+
+def precompute_diff_file(diff_file, highlighting, create_renderer=None):
+    """Precompute the chunks and rendered fragment for a file.
+
+    If a function for creating the renderer is provided, the file is
+    rendered the way the diff viewer first shows it, which stores both the
+    chunks and the rendered fragment in the cache. Otherwise, only the
+    chunks are stored.
+
+    Args:
+        diff_file (dict):
+            The file to precompute, as returned by
+            :py:func:`~reviewboard.diffviewer.diffutils.get_diff_files`.
+
+        highlighting (bool):
+            Whether to syntax-highlight the file.
+
+        create_renderer (callable, optional):
+            A function for creating the renderer for the file. See
+            :py:func:`queue_diff_precompute`.
+    """
+    filediff = diff_file['filediff']
+
+    logging.debug('Precomputing diff for filediff ID=%s, interfilediff '
+                  'ID=%s',
+                  filediff.pk,
+                  getattr(diff_file['interfilediff'], 'pk', None))
+
+    if create_renderer is None:
+        populate_diff_chunks([diff_file], highlighting)
+        return
+
+    # The rendered fragment is cached per language, and the background
+    # threads don't have one activated. Use the one that requests without a
+    # language preference resolve to.
+    language = translation.get_language_from_request(HttpRequest())
+
+    with translation.override(language):
+        create_renderer(diff_file, highlighting).render_to_string(None)
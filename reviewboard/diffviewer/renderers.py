@@ -9,7 +9,8 @@ from django.utils.translation import ugettext as _, get_language
 from djblets.cache.backend import cache_memoize
 
 from reviewboard.diffviewer.chunk_generator import compute_chunk_last_header
-from reviewboard.diffviewer.diffutils import populate_diff_chunks
+from reviewboard.diffviewer.diffutils import (highlight_pending_chunks,
+                                              populate_diff_chunks)
 from reviewboard.diffviewer.errors import UserVisibleError
 
 
@@ -86,7 +87,8 @@ class DiffRenderer(object):
         """
         if not self.diff_file.get('chunks_loaded', False):
             populate_diff_chunks([self.diff_file], self.highlighting,
-                                 request=request)
+                                 request=request,
+                                 chunk_index=self.chunk_index)
 
         if self.chunk_index is not None:
             assert not self.lines_of_context or self.collapse_all
@@ -231,11 +233,19 @@ class DiffRenderer(object):
                         self.diff_file['chunks'].remove(chunk)
 
         equal_lines = 0
+        expanded_chunks = []
 
         for chunk in self.diff_file['chunks']:
             if chunk['change'] == 'equal':
                 equal_lines += chunk['numlines']
 
+            if not self.collapse_all or not chunk.get('collapsable'):
+                expanded_chunks.append(chunk)
+
+        # Chunks for large files may not have had all their lines
+        # syntax-highlighted yet.
+        highlight_pending_chunks(self.diff_file, expanded_chunks)
+
         context.update({
             'collapseall': self.collapse_all,
             'file': self.diff_file,
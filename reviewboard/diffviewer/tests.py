@@ -1,12 +1,24 @@
 from __future__ import unicode_literals
 
 import bz2
-
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+import threading
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.http import HttpResponse
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.http import HttpRequest, HttpResponse
 from django.test import RequestFactory
-from django.utils.six.moves import zip_longest
-from djblets.cache.backend import cache_memoize
+from django.utils import translation
+from django.utils.six.moves import range, zip_longest
+from djblets.cache.backend import CACHE_CHUNK_SIZE, cache_memoize
 from djblets.db.fields import Base64DecodedValue
 from djblets.siteconfig.models import SiteConfiguration
 from djblets.testing.decorators import add_fixtures
@@ -16,25 +28,65 @@ import nose
 import reviewboard.diffviewer.diffutils as diffutils
 import reviewboard.diffviewer.parser as diffparser
 from reviewboard.admin.import_utils import has_module
+from reviewboard.concurrency import BackgroundTaskQueue, run_in_background
+from reviewboard.diffviewer import precompute
+from reviewboard.diffviewer.chunk_cache import ChunkCache, get_chunk_cache
 from reviewboard.diffviewer.chunk_generator import (DiffChunkGenerator,
-                                                    RawDiffChunkGenerator)
+                                                    RawDiffChunkGenerator,
+                                                    make_chunks_cache_key)
+from reviewboard.diffviewer.compression import (ZstdCodec, choose_codec,
+                                                get_codec)
+from reviewboard.diffviewer.differ import (DiffCompatVersion, get_differ,
+                                           get_default_compat_version)
 from reviewboard.diffviewer.diffutils import get_displayed_diff_line_ranges
-from reviewboard.diffviewer.errors import UserVisibleError
+from reviewboard.diffviewer.errors import (MissingCompressionDictionaryError,
+                                           PatchRejectedError,
+                                           UserVisibleError)
+from reviewboard.diffviewer.fastmyersdiff import FastMyersDiffer
 from reviewboard.diffviewer.forms import UploadDiffForm
+from reviewboard.diffviewer.histogramdiff import HistogramDiffer
 from reviewboard.diffviewer.models import (DiffSet, FileDiff,
                                            LegacyFileDiffData,
                                            RawFileDiffData)
 from reviewboard.diffviewer.myersdiff import MyersDiffer
 from reviewboard.diffviewer.opcode_generator import get_diff_opcode_generator
-from reviewboard.diffviewer.renderers import DiffRenderer
+from reviewboard.diffviewer.patcher import apply_patch
+from reviewboard.diffviewer.renderers import DiffRenderer, get_diff_renderer
 from reviewboard.diffviewer.processors import (filter_interdiff_opcodes,
                                                post_process_filtered_equals)
 from reviewboard.diffviewer.templatetags.difftags import highlightregion
 from reviewboard.scmtools.core import PRE_CREATION
+from reviewboard.scmtools.errors import FileNotFoundError
 from reviewboard.scmtools.models import Repository, Tool
 from reviewboard.testing import TestCase
 
 
+def _build_random_files(seed, num_lines, vocab_size, num_edits):
+    """Build a file and a randomly-edited copy of it."""
+    rng = random.Random(seed)
+
+    def make_line():
+        return '%sline %d\n' % (' ' * rng.randrange(3),
+                                rng.randrange(vocab_size))
+
+    a = [make_line() for i in range(num_lines)]
+    b = list(a)
+
+    for i in range(num_edits):
+        pos = rng.randrange(len(b) + 1)
+        size = rng.randrange(1, 30)
+        op = rng.randrange(3)
+
+        if op == 0:
+            b[pos:pos + size] = [make_line() for j in range(size)]
+        elif op == 1:
+            b[pos:pos] = [make_line() for j in range(size)]
+        else:
+            del b[pos:pos + size]
+
+    return a, b
+
+
 class MyersDifferTest(TestCase):
     def test_diff(self):
         """Testing MyersDiffer"""
@@ -63,6 +115,215 @@ class MyersDifferTest(TestCase):
         self.assertEqual(opcodes, expected)
 
 
+class FastMyersDifferTests(TestCase):
+    """Unit tests for FastMyersDiffer."""
+
+    def test_diff(self):
+        """Testing FastMyersDiffer"""
+        self.assertEqual(
+            list(FastMyersDiffer("1\n2\n3\n7\n",
+                                 "1\n2\n4\n5\n6\n7\n").get_opcodes()),
+            [("equal", 0, 4, 0, 4),
+             ("replace", 4, 5, 4, 5),
+             ("insert", 5, 5, 5, 9),
+             ("equal", 5, 8, 9, 12)])
+
+    def test_matches_myers_differ(self):
+        """Testing FastMyersDiffer produces the same results as MyersDiffer"""
+        cases = [
+            (0, 1, 0),
+            (10, 3, 2),
+            (200, 1000, 10),
+            (200, 4, 40),
+            (500, 100000, 50),
+        ]
+
+        for seed, (num_lines, vocab_size, num_edits) in enumerate(cases):
+            a, b = _build_random_files(seed, num_lines, vocab_size, num_edits)
+
+            for compat_version in DiffCompatVersion.MYERS_VERSIONS:
+                for ignore_space in (False, True):
+                    self._check_matches(a, b, ignore_space, compat_version)
+
+    def test_matches_myers_differ_with_cost_bail(self):
+        """Testing FastMyersDiffer produces the same results as MyersDiffer
+        when bailing on a high SMS cost
+        """
+        a, b = _build_random_files(0, 1000, 5, 50)
+        self._check_matches(a, b, False,
+                            DiffCompatVersion.MYERS_SMS_COST_BAIL)
+
+    def test_get_differ(self):
+        """Testing get_differ with Myers compatibility versions"""
+        self.assertIsInstance(get_differ([], []), FastMyersDiffer)
+
+        old_value = getattr(settings, 'DIFF_USE_FAST_MYERS_DIFFER', True)
+        settings.DIFF_USE_FAST_MYERS_DIFFER = False
+
+        try:
+            differ = get_differ([], [])
+            self.assertIs(type(differ), MyersDiffer)
+        finally:
+            settings.DIFF_USE_FAST_MYERS_DIFFER = old_value
+
+    def _check_matches(self, a, b, ignore_space, compat_version):
+        """Check that both differs produce the same results."""
+        differ = MyersDiffer(a, b, ignore_space=ignore_space,
+                             compat_version=compat_version)
+        fast_differ = FastMyersDiffer(a, b, ignore_space=ignore_space,
+                                      compat_version=compat_version)
+
+        self.assertEqual(list(fast_differ.get_opcodes()),
+                         list(differ.get_opcodes()))
+
+        if a or b:
+            self.assertEqual(fast_differ.ratio(), differ.ratio())
+
+
+class HistogramDifferTests(TestCase):
+    """Unit tests for HistogramDiffer."""
+
+    def test_diff(self):
+        """Testing HistogramDiffer"""
+        self.assertEqual(
+            list(HistogramDiffer("1\n2\n3\n7\n",
+                                 "1\n2\n4\n5\n6\n7\n").get_opcodes()),
+            [("equal", 0, 4, 0, 4),
+             ("replace", 4, 5, 4, 5),
+             ("insert", 5, 5, 5, 9),
+             ("equal", 5, 8, 9, 12)])
+
+    def test_diff_anchors_on_unique_lines(self):
+        """Testing HistogramDiffer keeps moved blocks together instead of
+        matching common lines
+        """
+        a = [
+            '#include <stdio.h>\n',
+            '\n',
+            '// Frobs foo heartily\n',
+            'int frobnitz(int foo)\n',
+            '{\n',
+            '    int i;\n',
+            '    for(i = 0; i < 10; i++)\n',
+            '    {\n',
+            '        printf("Your answer is: ");\n',
+            '        printf("%d\\n", foo);\n',
+            '    }\n',
+            '}\n',
+            '\n',
+            'int fact(int n)\n',
+            '{\n',
+            '    if(n > 1)\n',
+            '    {\n',
+            '        return fact(n-1) * n;\n',
+            '    }\n',
+            '    return 1;\n',
+            '}\n',
+            '\n',
+            'int main(int argc, char **argv)\n',
+            '{\n',
+            '    frobnitz(fact(10));\n',
+            '}\n',
+        ]
+        b = [
+            '#include <stdio.h>\n',
+            '\n',
+            'int fib(int n)\n',
+            '{\n',
+            '    if(n > 2)\n',
+            '    {\n',
+            '        return fib(n-1) + fib(n-2);\n',
+            '    }\n',
+            '    return 1;\n',
+            '}\n',
+            '\n',
+            '// Frobs foo heartily\n',
+            'int frobnitz(int foo)\n',
+            '{\n',
+            '    int i;\n',
+            '    for(i = 0; i < 10; i++)\n',
+            '    {\n',
+            '        printf("%d\\n", foo);\n',
+            '    }\n',
+            '}\n',
+            '\n',
+            'int main(int argc, char **argv)\n',
+            '{\n',
+            '    frobnitz(fib(10));\n',
+            '}\n',
+        ]
+
+        self.assertEqual(
+            list(HistogramDiffer(a, b).get_opcodes()),
+            [('equal', 0, 2, 0, 2),
+             ('insert', 2, 2, 2, 11),
+             ('equal', 2, 8, 11, 17),
+             ('delete', 8, 9, 17, 17),
+             ('equal', 9, 13, 17, 21),
+             ('delete', 13, 22, 21, 21),
+             ('equal', 22, 24, 21, 23),
+             ('replace', 24, 25, 23, 24),
+             ('equal', 25, 26, 24, 25)])
+
+    def test_diff_with_random_files(self):
+        """Testing HistogramDiffer opcodes cover both files with random
+        edits
+        """
+        cases = [
+            (0, 1, 0),
+            (10, 3, 2),
+            (200, 1000, 10),
+            (200, 4, 40),
+            (500, 100000, 50),
+            (1000, 5, 50),
+        ]
+
+        for seed, (num_lines, vocab_size, num_edits) in enumerate(cases):
+            a, b = _build_random_files(seed, num_lines, vocab_size,
+                                       num_edits)
+            opcodes = list(HistogramDiffer(
+                a, b,
+                compat_version=DiffCompatVersion.HISTOGRAM).get_opcodes())
+
+            i = j = 0
+
+            for tag, i1, i2, j1, j2 in opcodes:
+                self.assertEqual((i1, j1), (i, j))
+
+                if tag == 'equal':
+                    self.assertEqual(a[i1:i2], b[j1:j2])
+                elif tag == 'replace':
+                    self.assertEqual(i2 - i1, j2 - j1)
+
+                i = i2
+                j = j2
+
+            self.assertEqual((i, j), (len(a), len(b)))
+
+    def test_get_differ(self):
+        """Testing get_differ with the histogram compatibility version"""
+        self.assertIsInstance(
+            get_differ([], [], compat_version=DiffCompatVersion.HISTOGRAM),
+            HistogramDiffer)
+
+    def test_get_default_compat_version(self):
+        """Testing get_default_compat_version with the diff algorithm
+        setting
+        """
+        siteconfig = SiteConfiguration.objects.get_current()
+        old_value = siteconfig.get('diffviewer_diff_algorithm')
+
+        try:
+            self.assertEqual(get_default_compat_version(),
+                             DiffCompatVersion.DEFAULT)
+
+            siteconfig.set('diffviewer_diff_algorithm', 'histogram')
+            self.assertEqual(get_default_compat_version(),
+                             DiffCompatVersion.HISTOGRAM)
+        finally:
+            siteconfig.set('diffviewer_diff_algorithm', old_value)
+
+
 class InterestingLinesTest(TestCase):
     def test_csharp(self):
         """Testing interesting lines scanner with a C# file"""
@@ -369,6 +630,32 @@ class DiffParserTest(TestCase):
         self.assertEqual(files[0].delete_count, 0)
         self.assertEqual(files[0].data, data)
 
+    @add_fixtures(['test_scmtools'])
+    def test_iter_raw_diff(self):
+        """Testing DiffParser.iter_raw_diff"""
+        diffset = self.create_diffset(repository=self.create_repository())
+        filediff = self.create_filediff(diffset)
+
+        self.assertEqual(
+            b''.join(diffparser.DiffParser(b'').iter_raw_diff(diffset)),
+            filediff.diff)
+
+    @add_fixtures(['test_scmtools'])
+    def test_iter_raw_diff_with_raw_diff_override(self):
+        """Testing DiffParser.iter_raw_diff with a subclass overriding
+        raw_diff
+        """
+        class CustomDiffParser(diffparser.DiffParser):
+            def raw_diff(self, diffset):
+                return b'custom diff'
+
+        diffset = self.create_diffset(repository=self.create_repository())
+        self.create_filediff(diffset)
+
+        self.assertEqual(
+            b''.join(CustomDiffParser(b'').iter_raw_diff(diffset)),
+            b'custom diff')
+
     def test_patch(self):
         """Testing diffutils.patch"""
         old = (b'int\n'
@@ -926,6 +1213,29 @@ class DiffParserTest(TestCase):
             ]
         )
 
+    def test_move_detection_large_move_with_repeated_lines(self):
+        """Testing diff viewer move detection with a large moved block
+        containing repeated lines
+        """
+        moved = []
+
+        for i in range(100):
+            moved += [
+                'def func_%d(self):' % i,
+                '    value = compute(%d)' % i,
+                '    return None',
+                '',
+            ]
+
+        unchanged = ['other_line_%d = %d' % (i, i) for i in range(500)]
+
+        # The trailing blank line is not included in the move.
+        self._test_move_detection(
+            moved + unchanged,
+            unchanged + moved,
+            [dict((501 + i, 1 + i) for i in range(399))],
+            [dict((1 + i, 501 + i) for i in range(399))])
+
     def test_line_counts(self):
         """Testing DiffParser with insert/delete line counts"""
         diff = (
@@ -949,6 +1259,71 @@ class DiffParserTest(TestCase):
         self.assertEqual(files[0].insert_count, 3)
         self.assertEqual(files[0].delete_count, 4)
 
+    def test_preamble(self):
+        """Testing DiffParser.parse includes the preamble in the first file"""
+        diff = (
+            b'This is a preamble.\n'
+            b'\n'
+            b'--- README  123\n'
+            b'+++ README  (new)\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-blah\n'
+            b'+blah!\n'
+            b'--- AUTHORS  123\n'
+            b'+++ AUTHORS  (new)\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-me\n'
+            b'+you\n')
+        files = diffparser.DiffParser(diff).parse()
+
+        self.assertEqual(len(files), 2)
+        self.assertEqual(
+            files[0].data,
+            b'This is a preamble.\n'
+            b'\n'
+            b'--- README  123\n'
+            b'+++ README  (new)\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-blah\n'
+            b'+blah!\n')
+        self.assertEqual(
+            files[1].data,
+            b'--- AUTHORS  123\n'
+            b'+++ AUTHORS  (new)\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-me\n'
+            b'+you\n')
+
+    def test_large_diff(self):
+        """Testing DiffParser.parse with a large diff"""
+        lines = [b'+line %d\n' % i for i in range(100000)]
+        diff = b''.join([
+            b'--- README  123\n',
+            b'+++ README  (new)\n',
+            b'@ -0,0 +1,100000 @@\n',
+        ] + lines)
+        files = diffparser.DiffParser(diff).parse()
+
+        self.assertEqual(len(files), 1)
+        self.assertEqual(files[0].insert_count, 100000)
+        self.assertEqual(files[0].data, diff)
+
+    def test_file_data(self):
+        """Testing File.data with appended and prepended content"""
+        f = diffparser.File()
+        self.assertIsNone(f.data)
+
+        f.append_data(b'b\n')
+        f.append_data(b'c\n')
+        f.prepend_data(b'a\n')
+        self.assertEqual(f.data, b'a\nb\nc\n')
+
+        f.data += b'd\n'
+        self.assertEqual(f.data, b'a\nb\nc\nd\n')
+
+        f.data = None
+        self.assertIsNone(f.data)
+
     def _test_move_detection(self, a, b, expected_i_moves, expected_r_moves):
         differ = MyersDiffer(a, b)
         opcode_generator = get_diff_opcode_generator(differ)
@@ -969,6 +1344,128 @@ class DiffParserTest(TestCase):
         self.assertEqual(r_moves, expected_r_moves)
 
 
+class PatcherTests(SpyAgency, TestCase):
+    """Unit tests for reviewboard.diffviewer.patcher."""
+
+    old = (b'one\n'
+           b'two\n'
+           b'three\n'
+           b'four\n'
+           b'five\n'
+           b'six\n'
+           b'seven\n')
+
+    diff = (b'--- README\n'
+            b'+++ README\n'
+            b'@@ -2,5 +2,5 @@\n'
+            b' two\n'
+            b' three\n'
+            b'-four\n'
+            b'+FOUR\n'
+            b' five\n'
+            b' six\n')
+
+    def test_apply_patch(self):
+        """Testing apply_patch"""
+        self.assertEqual(
+            apply_patch(self.diff, self.old),
+            self.old.replace(b'four', b'FOUR'))
+
+    def test_apply_patch_with_offset(self):
+        """Testing apply_patch with hunks at an offset"""
+        old = b'zero\nhalf\n' + self.old
+
+        self.assertEqual(apply_patch(self.diff, old),
+                         old.replace(b'four', b'FOUR'))
+
+    def test_apply_patch_with_fuzz(self):
+        """Testing apply_patch with mismatched context lines"""
+        old = self.old.replace(b'two', b'TWO').replace(b'six', b'SIX')
+
+        self.assertEqual(apply_patch(self.diff, old),
+                         old.replace(b'four', b'FOUR'))
+
+    def test_apply_patch_with_mismatched_removed_line(self):
+        """Testing apply_patch with a mismatched line being removed"""
+        old = self.old.replace(b'four', b'fore')
+
+        with self.assertRaises(PatchRejectedError):
+            apply_patch(self.diff, old)
+
+    def test_apply_patch_with_no_newline(self):
+        """Testing apply_patch with a "No newline at end of file" marker"""
+        diff = (b'--- README\n'
+                b'+++ README\n'
+                b'@@ -6,2 +6,2 @@\n'
+                b' six\n'
+                b'-seven\n'
+                b'+seven\n'
+                b'\\ No newline at end of file\n')
+
+        self.assertEqual(apply_patch(diff, self.old), self.old[:-1])
+
+    def test_apply_patch_with_reversed_patch(self):
+        """Testing apply_patch with a patch that has already been applied"""
+        with self.assertRaises(PatchRejectedError):
+            apply_patch(self.diff, self.old.replace(b'four', b'FOUR'))
+
+    def test_apply_patch_with_no_hunks(self):
+        """Testing apply_patch with a diff containing no hunks"""
+        with self.assertRaises(PatchRejectedError):
+            apply_patch(b'Binary files a/foo and b/foo differ\n', self.old)
+
+    def test_patch_in_process(self):
+        """Testing diffutils.patch applies clean diffs in-process"""
+        self.spy_on(diffutils._patch_with_tool)
+
+        self.assertEqual(diffutils.patch(self.diff, self.old, 'README'),
+                         self.old.replace(b'four', b'FOUR'))
+        self.assertFalse(diffutils._patch_with_tool.spy.called)
+
+    def test_patch_falls_back_to_tool(self):
+        """Testing diffutils.patch falls back to patch for rejected diffs"""
+        self.spy_on(diffutils._patch_with_tool)
+
+        with self.assertRaises(Exception):
+            diffutils.patch(self.diff, b'unrelated\n', 'README')
+
+        self.assertTrue(diffutils._patch_with_tool.spy.called)
+
+    def test_apply_patch_with_insert_past_eof(self):
+        """Testing apply_patch with an insertion past the end of the file"""
+        diff = (b'--- README\n'
+                b'+++ README\n'
+                b'@@ -20,0 +21 @@\n'
+                b'+eight\n')
+
+        with self.assertRaises(PatchRejectedError):
+            apply_patch(diff, self.old)
+
+    def test_apply_patch_with_insert_past_eof_no_newline(self):
+        """Testing apply_patch with an insertion past the end of a file
+        with no trailing newline
+        """
+        diff = (b'--- README\n'
+                b'+++ README\n'
+                b'@@ -20,0 +21 @@\n'
+                b'+eight\n')
+
+        with self.assertRaises(PatchRejectedError):
+            apply_patch(diff, self.old[:-1])
+
+    def test_apply_patch_with_insert_at_eof_no_newline(self):
+        """Testing apply_patch with an insertion at the end of a file with
+        no trailing newline
+        """
+        diff = (b'--- README\n'
+                b'+++ README\n'
+                b'@@ -7,0 +8 @@\n'
+                b'+eight\n')
+
+        with self.assertRaises(PatchRejectedError):
+            apply_patch(diff, self.old[:-1])
+
+
 class FileDiffTests(TestCase):
     """Unit tests for FileDiff."""
     fixtures = ['test_scmtools']
@@ -1043,8 +1540,104 @@ class FileDiffTests(TestCase):
         self.assertEqual(diff_hash.insert_count, 1)
         self.assertEqual(diff_hash.delete_count, 2)
 
+    def test_set_line_counts_updates_diffset_totals(self):
+        """Testing FileDiff.set_line_counts updates the totals stored on the
+        DiffSet
+        """
+        self.filediff.save()
+        FileDiff.objects.create(diffset=self.filediff.diffset,
+                                source_file='NEWS',
+                                dest_file='NEWS',
+                                diff=self.filediff.diff)
+
+        diffset = self.filediff.diffset
+        counts = diffset.get_total_line_counts()
+        self.assertEqual(counts['raw_insert_count'], 4)
+        self.assertEqual(counts['insert_count'], 4)
+        self.assertIsNone(counts['equal_count'])
+
+        self.filediff.set_line_counts(insert_count=1,
+                                      delete_count=1,
+                                      replace_count=1,
+                                      equal_count=10,
+                                      total_line_count=13)
+
+        diffset = DiffSet.objects.get(pk=diffset.pk)
+
+        with self.assertNumQueries(0):
+            counts = diffset.get_total_line_counts()
+
+        self.assertEqual(counts['raw_insert_count'], 4)
+        self.assertEqual(counts['raw_delete_count'], 2)
+        self.assertEqual(counts['insert_count'], 3)
+        self.assertEqual(counts['delete_count'], 2)
+        self.assertEqual(counts['replace_count'], 1)
+        self.assertEqual(counts['equal_count'], 10)
+        self.assertEqual(counts['total_line_count'], 13)
+
+    def test_set_line_counts_keeps_other_diffset_extra_data(self):
+        """Testing FileDiff.set_line_counts keeps other keys written to the
+        DiffSet's extra_data since it was loaded
+        """
+        self.filediff.save()
+        diffset = self.filediff.diffset
+        diffset.get_total_line_counts()
+
+        DiffSet.objects.filter(pk=diffset.pk).update(
+            extra_data=dict(DiffSet.objects.get(pk=diffset.pk).extra_data,
+                            foo='bar'))
+
+        self.filediff.set_line_counts(insert_count=5)
+
+        diffset = DiffSet.objects.get(pk=diffset.pk)
+        self.assertEqual(diffset.extra_data['foo'], 'bar')
+        self.assertEqual(diffset.extra_data['line_counts']['insert_count'],
+                         5)
+
+    def test_get_total_line_counts_keeps_other_extra_data(self):
+        """Testing DiffSet.get_total_line_counts keeps other keys written to
+        extra_data since the DiffSet was loaded
+        """
+        self.filediff.save()
+        diffset = self.filediff.diffset
+        self.assertNotIn('line_counts', diffset.extra_data)
+
+        DiffSet.objects.filter(pk=diffset.pk).update(
+            extra_data={'foo': 'bar'})
+
+        counts = diffset.get_total_line_counts()
+        self.assertEqual(counts['insert_count'], 2)
+
+        diffset = DiffSet.objects.get(pk=diffset.pk)
+        self.assertEqual(diffset.extra_data['foo'], 'bar')
+        self.assertEqual(diffset.extra_data['line_counts'], counts)
+
+    def test_iter_diff_contents(self):
+        """Testing FileDiffManager.iter_diff_contents"""
+        self.filediff.save()
+        diffs = [self.filediff.diff]
+
+        for i in range(4):
+            diff = b''.join(
+                b'+line %d-%d\n' % (i, j)
+                for j in range(1000)
+            )
+            diffs.append(diff)
+            FileDiff.objects.create(diffset=self.filediff.diffset,
+                                    source_file='file%d' % i,
+                                    dest_file='file%d' % i,
+                                    diff=diff)
+
+        filediffs = self.filediff.diffset.files
+
+        # There's one query for each batch, and one to find the end.
+        with self.assertNumQueries(4):
+            self.assertEqual(
+                b''.join(filediffs.iter_diff_contents(batch_size=2)),
+                b''.join(diffs))
 
-class RawFileDiffDataManagerTests(TestCase):
+
+class RawFileDiffDataManagerTests(SpyAgency, TestCase):
     """Unit tests for RawFileDiffDataManager."""
 
     small_diff = (
@@ -1086,13 +1679,341 @@ class RawFileDiffDataManagerTests(TestCase):
 
     def test_process_diff_data_large_diff_compressed(self):
         """Testing RawFileDiffDataManager.process_diff_data with large diff
-        results in bzip2-compressed storage
+        results in compressed storage
         """
         data, compression = \
             RawFileDiffData.objects.process_diff_data(self.large_diff)
 
-        self.assertEqual(data, bz2.compress(self.large_diff, 9))
-        self.assertEqual(compression, RawFileDiffData.COMPRESSION_BZIP2)
+        codec = choose_codec(len(self.large_diff))
+        self.assertEqual(data, codec.compress(self.large_diff))
+        self.assertEqual(compression, codec.code)
+
+    def test_process_diff_data_without_zstd(self):
+        """Testing RawFileDiffDataManager.process_diff_data without zstandard
+        results in zlib-compressed storage
+        """
+        self.spy_on(ZstdCodec.is_available, call_fake=lambda self: False)
+
+        data, compression = \
+            RawFileDiffData.objects.process_diff_data(self.large_diff)
+
+        self.assertEqual(data, zlib.compress(self.large_diff, 6))
+        self.assertEqual(compression, RawFileDiffData.COMPRESSION_ZLIB)
+
+    def test_content_with_bzip2(self):
+        """Testing RawFileDiffData.content with bzip2-compressed data"""
+        raw_fdd = RawFileDiffData(
+            binary=bz2.compress(self.large_diff, 9),
+            compression=RawFileDiffData.COMPRESSION_BZIP2)
+
+        self.assertEqual(raw_fdd.content, self.large_diff)
+
+    def test_reencode_all(self):
+        """Testing RawFileDiffDataManager.reencode_all"""
+        bzip2_fdd = RawFileDiffData.objects.create(
+            binary_hash='a' * 40,
+            binary=bz2.compress(self.large_diff, 9),
+            compression=RawFileDiffData.COMPRESSION_BZIP2)
+        raw_fdd = RawFileDiffData.objects.create(
+            binary_hash='b' * 40,
+            binary=self.small_diff,
+            compression=None)
+
+        info = RawFileDiffData.objects.reencode_all(batch_size=1)
+
+        self.assertEqual(info['reencoded_count'], 1)
+
+        bzip2_fdd = RawFileDiffData.objects.get(pk=bzip2_fdd.pk)
+        self.assertEqual(bzip2_fdd.compression,
+                         choose_codec(len(self.large_diff)).code)
+        self.assertEqual(bzip2_fdd.content, self.large_diff)
+
+        raw_fdd = RawFileDiffData.objects.get(pk=raw_fdd.pk)
+        self.assertIsNone(raw_fdd.compression)
+        self.assertEqual(raw_fdd.content, self.small_diff)
+
+    def test_bulk_get_or_create_from_data(self):
+        """Testing RawFileDiffDataManager.bulk_get_or_create_from_data"""
+        existing = RawFileDiffData.objects.create(
+            binary_hash=hashlib.sha1(self.small_diff).hexdigest(),
+            binary=self.small_diff,
+            compression=None)
+
+        raw_fdds = RawFileDiffData.objects.bulk_get_or_create_from_data(
+            [self.small_diff, self.large_diff, self.large_diff],
+            extra_data=[
+                {'insert_count': 1},
+                {'insert_count': 10},
+                {'insert_count': 10},
+            ])
+
+        self.assertEqual(len(raw_fdds), 3)
+        self.assertEqual(raw_fdds[0].pk, existing.pk)
+        self.assertIsNotNone(raw_fdds[1].pk)
+        self.assertEqual(raw_fdds[1].pk, raw_fdds[2].pk)
+        self.assertEqual(raw_fdds[1].content, self.large_diff)
+        self.assertEqual(raw_fdds[1].compression,
+                         choose_codec(len(self.large_diff)).code)
+        self.assertEqual(raw_fdds[1].insert_count, 10)
+        self.assertEqual(RawFileDiffData.objects.count(), 2)
+
+    def test_bulk_get_or_create_from_data_in_batches(self):
+        """Testing RawFileDiffDataManager.bulk_get_or_create_from_data
+        creates entries in batches
+        """
+        manager = RawFileDiffData.objects
+        self.spy_on(manager.bulk_create)
+
+        manager.CREATE_BATCH_SIZE = 2
+        manager.CREATE_BATCH_MAX_BYTES = 1000
+        self.addCleanup(delattr, manager, 'CREATE_BATCH_SIZE')
+        self.addCleanup(delattr, manager, 'CREATE_BATCH_MAX_BYTES')
+
+        data_items = [
+            b'+line %d\n' % i
+            for i in range(5)
+        ]
+
+        # Content that can't be compressed, which is larger than a batch
+        # allows.
+        data_items.insert(2, os.urandom(2000))
+
+        raw_fdds = manager.bulk_get_or_create_from_data(data_items)
+
+        self.assertEqual(
+            [len(call.args[0]) for call in manager.bulk_create.spy.calls],
+            [2, 1, 2, 1])
+        self.assertEqual([raw_fdd.content for raw_fdd in raw_fdds],
+                         data_items)
+        self.assertEqual(RawFileDiffData.objects.count(), 6)
+
+
+class CompressionTests(SpyAgency, TestCase):
+    """Unit tests for reviewboard.diffviewer.compression."""
+
+    data = b''.join(
+        b'+line %d\n' % i
+        for i in range(100)
+    )
+
+    def setUp(self):
+        super(CompressionTests, self).setUp()
+
+        self._old_use_zstd = settings.DIFF_COMPRESSION_USE_ZSTD
+        self._old_dictionary_file = settings.DIFF_ZSTD_DICTIONARY_FILE
+        self._old_old_dictionary_files = \
+            settings.DIFF_ZSTD_OLD_DICTIONARY_FILES
+
+    def tearDown(self):
+        super(CompressionTests, self).tearDown()
+
+        settings.DIFF_COMPRESSION_USE_ZSTD = self._old_use_zstd
+        settings.DIFF_ZSTD_DICTIONARY_FILE = self._old_dictionary_file
+        settings.DIFF_ZSTD_OLD_DICTIONARY_FILES = \
+            self._old_old_dictionary_files
+
+    def test_zlib(self):
+        """Testing zlib compression"""
+        self._test_codec(RawFileDiffData.COMPRESSION_ZLIB)
+
+    def test_bzip2(self):
+        """Testing bzip2 compression"""
+        self._test_codec(RawFileDiffData.COMPRESSION_BZIP2)
+
+    def test_zstd(self):
+        """Testing Zstandard compression"""
+        if not has_module('zstandard'):
+            raise nose.SkipTest('zstandard is not installed')
+
+        self._test_codec(RawFileDiffData.COMPRESSION_ZSTD)
+
+    def test_zstd_with_dictionary(self):
+        """Testing Zstandard compression with a dictionary"""
+        if not has_module('zstandard'):
+            raise nose.SkipTest('zstandard is not installed')
+
+        self.assertFalse(
+            get_codec(RawFileDiffData.COMPRESSION_ZSTD_DICT).is_available())
+
+        self._write_dictionary()
+
+        self._test_codec(RawFileDiffData.COMPRESSION_ZSTD_DICT)
+
+        # The dictionary is only used once Zstandard is enabled.
+        self.assertEqual(choose_codec(len(self.data)).code,
+                         RawFileDiffData.COMPRESSION_ZLIB)
+
+        settings.DIFF_COMPRESSION_USE_ZSTD = True
+        self.assertEqual(choose_codec(len(self.data)).code,
+                         RawFileDiffData.COMPRESSION_ZSTD_DICT)
+        self.assertEqual(choose_codec(1024 * 1024).code,
+                         RawFileDiffData.COMPRESSION_ZSTD)
+
+    def test_zstd_with_wrong_dictionary(self):
+        """Testing Zstandard compression with a different dictionary than
+        the content was compressed with
+        """
+        if not has_module('zstandard'):
+            raise nose.SkipTest('zstandard is not installed')
+
+        codec = get_codec(RawFileDiffData.COMPRESSION_ZSTD_DICT)
+
+        self._write_dictionary()
+        compressed = codec.compress(self.data)
+
+        self._write_dictionary(seed=b'other')
+
+        with self.assertRaises(ValueError):
+            codec.decompress(compressed)
+
+        with self.assertRaises(ValueError):
+            list(codec.iter_decompress(compressed))
+
+    def test_zstd_with_old_dictionary(self):
+        """Testing Zstandard compression with content compressed with a
+        dictionary that has since been replaced
+        """
+        if not has_module('zstandard'):
+            raise nose.SkipTest('zstandard is not installed')
+
+        codec = get_codec(RawFileDiffData.COMPRESSION_ZSTD_DICT)
+
+        old_path = self._write_dictionary()
+        compressed = codec.compress(self.data)
+
+        self._write_dictionary(seed=b'other')
+        settings.DIFF_ZSTD_OLD_DICTIONARY_FILES = [old_path]
+
+        self.assertNotEqual(codec.get_dict_id(codec.compress(self.data)),
+                            codec.get_dict_id(compressed))
+        self.assertEqual(codec.decompress(compressed), self.data)
+        self.assertEqual(b''.join(codec.iter_decompress(compressed)),
+                         self.data)
+
+    def test_zstd_with_missing_dictionary(self):
+        """Testing RawFileDiffData.content with content compressed with a
+        dictionary that isn't configured
+        """
+        if not has_module('zstandard'):
+            raise nose.SkipTest('zstandard is not installed')
+
+        settings.DIFF_COMPRESSION_USE_ZSTD = True
+        self._write_dictionary()
+        raw_fdd = RawFileDiffData.objects.get_or_create_from_data(
+            self.data)[0]
+        self.assertEqual(raw_fdd.compression,
+                         RawFileDiffData.COMPRESSION_ZSTD_DICT)
+
+        settings.DIFF_ZSTD_DICTIONARY_FILE = None
+
+        with self.assertRaises(MissingCompressionDictionaryError):
+            raw_fdd.content
+
+    def test_reencode_all_with_old_dictionary(self):
+        """Testing RawFileDiffData.objects.reencode_all re-compresses
+        content compressed with a replaced dictionary
+        """
+        if not has_module('zstandard'):
+            raise nose.SkipTest('zstandard is not installed')
+
+        settings.DIFF_COMPRESSION_USE_ZSTD = True
+        codec = get_codec(RawFileDiffData.COMPRESSION_ZSTD_DICT)
+
+        old_path = self._write_dictionary()
+        raw_fdd = RawFileDiffData.objects.get_or_create_from_data(
+            self.data)[0]
+
+        self._write_dictionary(seed=b'other')
+        settings.DIFF_ZSTD_OLD_DICTIONARY_FILES = [old_path]
+
+        info = RawFileDiffData.objects.reencode_all()
+        self.assertEqual(info['reencoded_count'], 1)
+
+        raw_fdd = RawFileDiffData.objects.get(pk=raw_fdd.pk)
+        self.assertEqual(codec.get_dict_id(bytes(raw_fdd.binary)),
+                         codec.get_dictionary().dict_id())
+        self.assertEqual(raw_fdd.content, self.data)
+
+    def test_train_dictionary_with_existing_file(self):
+        """Testing reencode-diffs --train-dictionary with an existing file"""
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.unlink, path)
+
+        with self.assertRaises(CommandError):
+            call_command('reencode-diffs', dictionary_file=path)
+
+    def test_train_dictionary_with_configured_file(self):
+        """Testing reencode-diffs --train-dictionary with the configured
+        dictionary file
+        """
+        path = os.path.join(tempfile.mkdtemp(), 'dictionary')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        settings.DIFF_ZSTD_DICTIONARY_FILE = path
+
+        with self.assertRaises(CommandError):
+            call_command('reencode-diffs', dictionary_file=path)
+
+        self.assertFalse(os.path.exists(path))
+
+    def test_choose_codec(self):
+        """Testing choose_codec uses zlib by default"""
+        self.assertEqual(choose_codec(len(self.data)).code,
+                         RawFileDiffData.COMPRESSION_ZLIB)
+
+    def test_choose_codec_with_zstd_enabled(self):
+        """Testing choose_codec with DIFF_COMPRESSION_USE_ZSTD"""
+        if not has_module('zstandard'):
+            raise nose.SkipTest('zstandard is not installed')
+
+        settings.DIFF_COMPRESSION_USE_ZSTD = True
+        self.assertEqual(choose_codec(len(self.data)).code,
+                         RawFileDiffData.COMPRESSION_ZSTD)
+
+    def test_choose_codec_with_zstd_enabled_without_zstd(self):
+        """Testing choose_codec with DIFF_COMPRESSION_USE_ZSTD without
+        zstandard
+        """
+        self.spy_on(ZstdCodec.is_available, call_fake=lambda self: False)
+
+        settings.DIFF_COMPRESSION_USE_ZSTD = True
+        self.assertEqual(choose_codec(len(self.data)).code,
+                         RawFileDiffData.COMPRESSION_ZLIB)
+
+    def _test_codec(self, code):
+        codec = get_codec(code)
+        self.assertTrue(codec.is_available())
+
+        compressed = codec.compress(self.data)
+        self.assertLess(len(compressed), len(self.data))
+        self.assertEqual(codec.decompress(compressed), self.data)
+        self.assertEqual(
+            b''.join(codec.iter_decompress(compressed, chunk_size=16)),
+            self.data)
+
+    def _write_dictionary(self, seed=b'file'):
+        import zstandard
+
+        samples = [
+            b'diff --git a/%s%d b/%s%d\n'
+            b'--- a/%s%d\n'
+            b'+++ b/%s%d\n'
+            b'@@ -1,1 +1,1 @@\n'
+            b'-old line %d\n'
+            b'+new line %d\n'
+            % (seed, i, seed, i, seed, i, seed, i, i, i * 7)
+            for i in range(1000)
+        ]
+
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.unlink, path)
+
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(zstandard.train_dictionary(4096, samples).as_bytes())
+
+        settings.DIFF_ZSTD_DICTIONARY_FILE = path
+
+        return path
 
 
 class FileDiffMigrationTests(TestCase):
@@ -1542,17 +2463,190 @@ class DiffSetManagerTests(SpyAgency, TestCase):
 
         repository = self.create_repository(tool_name='Test')
 
-        self.spy_on(repository.get_file_exists,
-                    call_fake=lambda *args, **kwargs: True)
+        self.spy_on(repository.get_files_exist,
+                    call_fake=lambda repository, files, *args, **kwargs:
+                        [True] * len(files))
+
+        self.spy_on(run_in_background, call_original=False)
+
+        diffset = DiffSet.objects.create_from_data(
+            repository, 'diff', diff, None, None, None, '/', None)
+
+        self.assertEqual(diffset.files.count(), 1)
+        self.assertEqual(diffset.diffcompat, DiffCompatVersion.DEFAULT)
+
+        # The file SHA1s are computed in the background.
+        self.assertTrue(run_in_background.called_with(
+            diffutils.update_diffset_checksums, diffset.pk))
+
+    def test_creating_stores_line_counts(self):
+        """Test creating a DiffSet stores the total line counts"""
+        diff = (
+            b'diff --git a/README b/README\n'
+            b'index d6613f5..5b50866 100644\n'
+            b'--- README\n'
+            b'+++ README\n'
+            b'@ -1,1 +1,2 @@\n'
+            b'-blah..\n'
+            b'+blah blah\n'
+            b'+blah!\n'
+            b'diff --git a/NEWS b/NEWS\n'
+            b'index d6613f5..5b50866 100644\n'
+            b'--- NEWS\n'
+            b'+++ NEWS\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-blah..\n'
+            b'+blah blah\n'
+        )
+
+        repository = self.create_repository(tool_name='Test')
+
+        self.spy_on(repository.get_files_exist,
+                    call_fake=lambda repository, files, *args, **kwargs:
+                        [True] * len(files))
+
+        diffset = DiffSet.objects.create_from_data(
+            repository, 'diff', diff, None, None, None, '/', None)
+        diffset = DiffSet.objects.get(pk=diffset.pk)
+
+        with self.assertNumQueries(0):
+            counts = diffset.get_total_line_counts()
+
+        self.assertEqual(counts['raw_insert_count'], 3)
+        self.assertEqual(counts['raw_delete_count'], 2)
+        self.assertEqual(counts['insert_count'], 3)
+        self.assertEqual(counts['delete_count'], 2)
+        self.assertIsNone(counts['total_line_count'])
+
+    def test_backfill_line_counts(self):
+        """Testing DiffSetManager.backfill_line_counts"""
+        repository = self.create_repository(tool_name='Test')
+        diffsets = []
+
+        diff = (
+            b'diff --git a/README b/README\n'
+            b'index d6613f5..5b50866 100644\n'
+            b'--- README\n'
+            b'+++ README\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-blah..\n'
+            b'+blah blah\n'
+        )
+
+        for i in range(3):
+            diffset = self.create_diffset(repository=repository)
+            self.create_filediff(diffset, diff=diff)
+            self.create_filediff(diffset, diff=diff)
+            diffsets.append(diffset)
+
+        # This one already has totals stored.
+        diffsets[0].get_total_line_counts()
+
+        self.assertEqual(
+            DiffSet.objects.backfill_line_counts(batch_size=2), 2)
+
+        for diffset in diffsets:
+            diffset = DiffSet.objects.get(pk=diffset.pk)
+
+            with self.assertNumQueries(0):
+                counts = diffset.get_total_line_counts()
+
+            self.assertEqual(counts['raw_insert_count'], 2)
+            self.assertEqual(counts['raw_delete_count'], 2)
+
+    def test_creating_with_histogram_diff_algorithm(self):
+        """Test creating a DiffSet with the histogram diff algorithm
+        selected
+        """
+        diff = (
+            b'diff --git a/README b/README\n'
+            b'index d6613f5..5b50866 100644\n'
+            b'--- README\n'
+            b'+++ README\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-blah..\n'
+            b'+blah blah\n'
+        )
+
+        repository = self.create_repository(tool_name='Test')
+
+        self.spy_on(repository.get_files_exist,
+                    call_fake=lambda repository, files, *args, **kwargs:
+                        [True] * len(files))
+
+        siteconfig = SiteConfiguration.objects.get_current()
+        old_value = siteconfig.get('diffviewer_diff_algorithm')
+        siteconfig.set('diffviewer_diff_algorithm', 'histogram')
+
+        try:
+            diffset = DiffSet.objects.create_from_data(
+                repository, 'diff', diff, None, None, None, '/', None)
+        finally:
+            siteconfig.set('diffviewer_diff_algorithm', old_value)
+
+        self.assertEqual(diffset.diffcompat, DiffCompatVersion.HISTOGRAM)
+
+    def test_creating_with_diff_data_with_basedir_no_slash(self):
+        """Test creating a DiffSet from diff file data with basedir without
+        leading slash
+        """
+        diff = (
+            b'diff --git a/README b/README\n'
+            b'index d6613f5..5b50866 100644\n'
+            b'--- README\n'
+            b'+++ README\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-blah..\n'
+            b'+blah blah\n'
+        )
+
+        repository = self.create_repository(tool_name='Test')
+
+        self.spy_on(repository.get_files_exist,
+                    call_fake=lambda repository, files, *args, **kwargs:
+                        [True] * len(files))
+
+        diffset = DiffSet.objects.create_from_data(
+            repository, 'diff', diff, None, None, None, 'trunk/', None)
+
+        self.assertEqual(diffset.files.count(), 1)
+
+        filediff = diffset.files.all()[0]
+        self.assertEqual(filediff.source_file, 'trunk/README')
+        self.assertEqual(filediff.dest_file, 'trunk/README')
+
+    def test_creating_with_diff_data_with_basedir_slash(self):
+        """Test creating a DiffSet from diff file data with basedir with
+        leading slash
+        """
+        diff = (
+            b'diff --git a/README b/README\n'
+            b'index d6613f5..5b50866 100644\n'
+            b'--- README\n'
+            b'+++ README\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-blah..\n'
+            b'+blah blah\n'
+        )
+
+        repository = self.create_repository(tool_name='Test')
+
+        self.spy_on(repository.get_files_exist,
+                    call_fake=lambda repository, files, *args, **kwargs:
+                        [True] * len(files))
 
         diffset = DiffSet.objects.create_from_data(
-            repository, 'diff', diff, None, None, None, '/', None)
+            repository, 'diff', diff, None, None, None, '/trunk/', None)
 
         self.assertEqual(diffset.files.count(), 1)
 
-    def test_creating_with_diff_data_with_basedir_no_slash(self):
-        """Test creating a DiffSet from diff file data with basedir without
-        leading slash
+        filediff = diffset.files.all()[0]
+        self.assertEqual(filediff.source_file, 'trunk/README')
+        self.assertEqual(filediff.dest_file, 'trunk/README')
+
+    def test_creating_with_diff_data_checks_files_in_bulk(self):
+        """Test creating a DiffSet from diff file data checks all files in
+        one batch
         """
         diff = (
             b'diff --git a/README b/README\n'
@@ -1562,27 +2656,42 @@ class DiffSetManagerTests(SpyAgency, TestCase):
             b'@ -1,1 +1,1 @@\n'
             b'-blah..\n'
             b'+blah blah\n'
+            b'diff --git a/NEWS b/NEWS\n'
+            b'index 1234567..5b50866 100644\n'
+            b'--- NEWS\n'
+            b'+++ NEWS\n'
+            b'@ -1,1 +1,1 @@\n'
+            b'-foo\n'
+            b'+bar\n'
         )
 
         repository = self.create_repository(tool_name='Test')
 
-        self.spy_on(repository.get_file_exists,
-                    call_fake=lambda *args, **kwargs: True)
-
-        diffset = DiffSet.objects.create_from_data(
-            repository, 'diff', diff, None, None, None, 'trunk/', None)
-
-        self.assertEqual(diffset.files.count(), 1)
-
-        filediff = diffset.files.all()[0]
-        self.assertEqual(filediff.source_file, 'trunk/README')
-        self.assertEqual(filediff.dest_file, 'trunk/README')
-
-    def test_creating_with_diff_data_with_basedir_slash(self):
-        """Test creating a DiffSet from diff file data with basedir with
-        leading slash
+        self.spy_on(repository.get_files_exist,
+                    call_fake=lambda repository, files, *args, **kwargs:
+                        [True, False])
+        self.spy_on(repository.get_file_exists)
+
+        with self.assertRaises(FileNotFoundError) as cm:
+            DiffSet.objects.create_from_data(
+                repository, 'diff', diff, None, None, None, '/', None,
+                base_commit_id='abc123')
+
+        self.assertEqual(cm.exception.path, '/NEWS')
+        self.assertEqual(cm.exception.revision, '1234567')
+        self.assertEqual(cm.exception.base_commit_id, 'abc123')
+
+        self.assertEqual(len(repository.get_files_exist.spy.calls), 1)
+        self.assertEqual(repository.get_files_exist.spy.calls[0].args[0],
+                         [('/README', 'd6613f5'), ('/NEWS', '1234567')])
+        self.assertFalse(repository.get_file_exists.spy.called)
+        self.assertEqual(DiffSet.objects.count(), 0)
+
+    def test_creating_with_diff_data_stores_diffs_in_bulk(self):
+        """Test creating a DiffSet from diff file data stores the file diffs
+        in bulk
         """
-        diff = (
+        readme_diff = (
             b'diff --git a/README b/README\n'
             b'index d6613f5..5b50866 100644\n'
             b'--- README\n'
@@ -1591,20 +2700,50 @@ class DiffSetManagerTests(SpyAgency, TestCase):
             b'-blah..\n'
             b'+blah blah\n'
         )
+        news_diff = (
+            b'diff --git a/NEWS b/NEWS\n'
+            b'index 1234567..5b50866 100644\n'
+            b'--- NEWS\n'
+            b'+++ NEWS\n'
+            b'@ -1,1 +1,2 @@\n'
+            b'-foo\n'
+            b'+bar\n'
+            b'+baz\n'
+        )
 
         repository = self.create_repository(tool_name='Test')
 
-        self.spy_on(repository.get_file_exists,
-                    call_fake=lambda *args, **kwargs: True)
+        self.spy_on(repository.get_files_exist,
+                    call_fake=lambda repository, files, *args, **kwargs:
+                        [True] * len(files))
+        self.spy_on(RawFileDiffData.objects.get_or_create_from_data)
+
+        # This has been uploaded before, but without line counts.
+        existing = RawFileDiffData.objects.create(
+            binary_hash=hashlib.sha1(readme_diff).hexdigest(),
+            binary=readme_diff,
+            compression=None)
 
         diffset = DiffSet.objects.create_from_data(
-            repository, 'diff', diff, None, None, None, '/trunk/', None)
+            repository, 'diff', readme_diff + news_diff, None, None, None,
+            '/', None)
 
-        self.assertEqual(diffset.files.count(), 1)
+        self.assertFalse(
+            RawFileDiffData.objects.get_or_create_from_data.spy.called)
+        self.assertEqual(RawFileDiffData.objects.count(), 2)
 
-        filediff = diffset.files.all()[0]
-        self.assertEqual(filediff.source_file, 'trunk/README')
-        self.assertEqual(filediff.dest_file, 'trunk/README')
+        filediffs = list(diffset.files.order_by('pk'))
+        self.assertEqual(len(filediffs), 2)
+        self.assertEqual(filediffs[0].dest_file, 'NEWS')
+        self.assertEqual(filediffs[0].diff, news_diff)
+        self.assertEqual(filediffs[0].diff_hash.insert_count, 2)
+        self.assertEqual(filediffs[0].diff_hash.delete_count, 1)
+        self.assertEqual(filediffs[1].dest_file, 'README')
+        self.assertEqual(filediffs[1].diff_hash_id, existing.pk)
+        self.assertEqual(filediffs[1].diff_hash.insert_count, 1)
+        self.assertEqual(filediffs[1].diff_hash.delete_count, 1)
+        self.assertEqual(filediffs[1].get_line_counts()['raw_insert_count'],
+                         1)
 
 
 class UploadDiffFormTests(SpyAgency, TestCase):
@@ -1628,8 +2767,9 @@ class UploadDiffFormTests(SpyAgency, TestCase):
 
         repository = self.create_repository(tool_name='Test')
 
-        self.spy_on(repository.get_file_exists,
-                    call_fake=lambda *args, **kwargs: True)
+        self.spy_on(repository.get_files_exist,
+                    call_fake=lambda repository, files, *args, **kwargs:
+                        [True] * len(files))
 
         form = UploadDiffForm(
             repository=repository,
@@ -1651,9 +2791,12 @@ class UploadDiffFormTests(SpyAgency, TestCase):
         """Testing UploadDiffForm and filtering parent diff files"""
         saw_file_exists = {}
 
-        def get_file_exists(repository, filename, revision, *args, **kwargs):
-            saw_file_exists[(filename, revision)] = True
-            return True
+        def get_files_exist(repository, paths_and_revisions, *args,
+                            **kwargs):
+            for filename, revision in paths_and_revisions:
+                saw_file_exists[(filename, revision)] = True
+
+            return [True] * len(paths_and_revisions)
 
         diff = (
             b'diff --git a/README b/README\n'
@@ -1690,7 +2833,7 @@ class UploadDiffFormTests(SpyAgency, TestCase):
                                               content_type='text/x-patch')
 
         repository = self.create_repository(tool_name='Test')
-        self.spy_on(repository.get_file_exists, call_fake=get_file_exists)
+        self.spy_on(repository.get_files_exist, call_fake=get_files_exist)
 
         form = UploadDiffForm(
             repository=repository,
@@ -1798,8 +2941,9 @@ class UploadDiffFormTests(SpyAgency, TestCase):
             content_type='text/x-patch')
 
         repository = self.create_repository(tool_name='Test')
-        self.spy_on(repository.get_file_exists,
-                    call_fake=lambda *args, **kwargs: True)
+        self.spy_on(repository.get_files_exist,
+                    call_fake=lambda repository, files, *args, **kwargs:
+                        [True] * len(files))
         # We will only be making one call to get_file and we can fake it out.
         self.spy_on(repository.get_file,
                     call_fake=lambda *args, **kwargs: b'Foo\n')
@@ -1871,8 +3015,9 @@ class UploadDiffFormTests(SpyAgency, TestCase):
             content_type='text/x-patch')
 
         repository = self.create_repository(tool_name='Test')
-        self.spy_on(repository.get_file_exists,
-                    call_fake=lambda *args, **kwargs: True)
+        self.spy_on(repository.get_files_exist,
+                    call_fake=lambda repository, files, *args, **kwargs:
+                        [True] * len(files))
         # We will only be making one call to get_file and we can fake it out.
         self.spy_on(repository.get_file,
                     call_fake=lambda *args, **kwargs: b'Foo\n')
@@ -2318,7 +3463,7 @@ class ProcessorsTests(TestCase):
             prev_j2 = j2
 
 
-class RawDiffChunkGeneratorTests(TestCase):
+class RawDiffChunkGeneratorTests(SpyAgency, TestCase):
     """Unit tests for RawDiffChunkGenerator."""
 
     @property
@@ -2354,6 +3499,241 @@ class RawDiffChunkGeneratorTests(TestCase):
         self.assertEqual(chunks[2]['change'], 'equal')
         self.assertEqual(chunks[3]['change'], 'replace')
 
+    def test_get_chunks_reuses_highlighted_lines(self):
+        """Testing RawDiffChunkGenerator.get_chunks reuses highlighted lines
+        for files with the same content
+        """
+        old = (
+            b'def foo():\n'
+            b'    return 1\n'
+        )
+
+        new = (
+            b'def foo():\n'
+            b'    return 2\n'
+        )
+
+        cache.clear()
+        self.spy_on(RawDiffChunkGenerator._highlight_lines)
+
+        chunks1 = list(
+            RawDiffChunkGenerator(old, new, 'a.py', 'a.py').get_chunks())
+        self.assertEqual(len(RawDiffChunkGenerator._highlight_lines.calls), 2)
+
+        # The same content in other files highlights the same way.
+        chunks2 = list(
+            RawDiffChunkGenerator(old, new, 'b.py', 'c.py').get_chunks())
+        self.assertEqual(len(RawDiffChunkGenerator._highlight_lines.calls), 2)
+        self.assertEqual(chunks1, chunks2)
+
+        # Only the new content needs to be highlighted here.
+        list(RawDiffChunkGenerator(new, old + b'\n', 'a.py',
+                                   'a.py').get_chunks())
+        self.assertEqual(len(RawDiffChunkGenerator._highlight_lines.calls), 3)
+
+    def test_get_chunks_highlighted_lines_per_lexer(self):
+        """Testing RawDiffChunkGenerator.get_chunks highlights the same
+        content separately for different lexers
+        """
+        data = b'int main() { return 0; }\n'
+
+        cache.clear()
+        self.spy_on(RawDiffChunkGenerator._highlight_lines)
+
+        list(RawDiffChunkGenerator(data, data + data, 'a.c',
+                                   'a.c').get_chunks())
+        self.assertEqual(len(RawDiffChunkGenerator._highlight_lines.calls), 2)
+
+        list(RawDiffChunkGenerator(data, data + data, 'a.js',
+                                   'a.js').get_chunks())
+        self.assertEqual(len(RawDiffChunkGenerator._highlight_lines.calls), 4)
+
+    def test_get_chunks_highlights_expanded_lines_only(self):
+        """Testing RawDiffChunkGenerator.get_chunks only highlights lines in
+        expanded chunks for large files
+        """
+        old, new = self._build_large_files()
+
+        cache.clear()
+        chunks = list(RawDiffChunkGenerator(old, new, 'a.py',
+                                            'a.py').get_chunks())
+
+        self.assertEqual(
+            [(chunk['change'], chunk['collapsable']) for chunk in chunks],
+            [
+                ('equal', True),
+                ('equal', False),
+                ('replace', False),
+                ('equal', False),
+                ('equal', True),
+            ])
+
+        for chunk in chunks:
+            markup = ''.join(line[2] for line in chunk['lines'])
+
+            if chunk['collapsable']:
+                self.assertIn('pending_highlight', chunk['meta'])
+                self.assertNotIn('<span', markup)
+            else:
+                self.assertNotIn('pending_highlight', chunk['meta'])
+                self.assertIn('<span', markup)
+
+    def test_highlight_chunk(self):
+        """Testing RawDiffChunkGenerator.highlight_chunk"""
+        old, new = self._build_large_files()
+
+        cache.clear()
+        generator = RawDiffChunkGenerator(old, new, 'a.py', 'a.py')
+        chunks = list(generator.get_chunks())
+
+        for chunk in chunks:
+            generator.highlight_chunk(chunk)
+
+        # The result should match highlighting the whole files.
+        generator = RawDiffChunkGenerator(old, new, 'a.py', 'a.py')
+        generator.HIGHLIGHT_REGIONS_MIN_LINES = 10000
+        full_chunks = list(generator.get_chunks())
+
+        self.assertTrue(all(
+            '<span' in line[2] and '<span' in line[5]
+            for chunk in full_chunks
+            for line in chunk['lines']
+            if line[2] and line[5]
+        ))
+        self.assertEqual(
+            [chunk['lines'] for chunk in chunks],
+            [chunk['lines'] for chunk in full_chunks])
+
+    def test_highlight_chunks_lexes_each_file_once(self):
+        """Testing RawDiffChunkGenerator.highlight_chunks lexes each file once
+        for all the chunks
+        """
+        old, new = self._build_large_files()
+        new = new.replace(b'return 50\n', b'return -50\n')
+        new = new.replace(b'return 250\n', b'return -250\n')
+
+        cache.clear()
+        generator = RawDiffChunkGenerator(old, new, 'a.py', 'a.py')
+        chunks = list(generator.get_chunks())
+        self.assertEqual(len([chunk for chunk in chunks
+                              if chunk['collapsable']]),
+                         4)
+
+        self.spy_on(generator._get_lexer)
+        self.spy_on(generator._highlight_ranges)
+
+        generator.highlight_chunks(chunks)
+
+        self.assertEqual(len(generator._get_lexer.spy.calls), 2)
+        self.assertEqual(len(generator._highlight_ranges.spy.calls), 2)
+
+        # The result should match highlighting the whole files.
+        generator = RawDiffChunkGenerator(old, new, 'a.py', 'a.py')
+        generator.HIGHLIGHT_REGIONS_MIN_LINES = 10000
+
+        self.assertEqual(
+            [chunk['lines'] for chunk in chunks],
+            [chunk['lines'] for chunk in generator.get_chunks()])
+
+    def test_highlight_chunk_with_range_of_lines(self):
+        """Testing RawDiffChunkGenerator.highlight_chunk with a range of
+        lines from a chunk
+        """
+        old, new = self._build_large_files()
+
+        cache.clear()
+        generator = RawDiffChunkGenerator(old, new, 'a.py', 'a.py')
+        chunk = list(generator.get_chunks())[0]
+        lines = chunk['lines'][100:103]
+
+        generator.highlight_chunk({
+            'lines': lines,
+            'meta': chunk['meta'],
+        })
+
+        self.assertEqual(lines[0][2],
+                         '<span class="k">def</span> '
+                         '<span class="nf">func25</span>'
+                         '<span class="p">():</span>')
+        self.assertIn('<span', lines[1][5])
+        self.assertNotIn('<span', chunk['lines'][99][2])
+        self.assertNotIn('<span', chunk['lines'][103][2])
+
+    def test_highlight_chunk_without_cached_file(self):
+        """Testing RawDiffChunkGenerator.highlight_chunk when the file's
+        content is no longer in the cache
+        """
+        old, new = self._build_large_files()
+
+        cache.clear()
+        generator = RawDiffChunkGenerator(old, new, 'a.py', 'a.py')
+        chunk = list(generator.get_chunks())[0]
+
+        cache.clear()
+        generator.highlight_chunk(chunk)
+
+        self.assertEqual(chunk['lines'][0][2],
+                         '<span class="k">def</span> '
+                         '<span class="nf">func0</span>'
+                         '<span class="p">():</span>')
+
+    def test_get_chunks_highlights_expanded_lines_in_strings(self):
+        """Testing RawDiffChunkGenerator.get_chunks highlights lines in
+        expanded chunks of large files the same as the whole file, when
+        changed in the middle of a long string
+        """
+        old_lines = ['"""Module docstring.']
+
+        for i in range(300):
+            old_lines += [
+                '',
+                'Paragraph %d of the docstring' % i,
+                'continues here.',
+            ]
+
+        old_lines.append('"""')
+
+        for i in range(100):
+            old_lines.append('value%d = %d' % (i, i))
+
+        new_lines = list(old_lines)
+        new_lines[500] = 'continues over here.'
+
+        old = '\n'.join(old_lines).encode('utf-8')
+        new = '\n'.join(new_lines).encode('utf-8')
+
+        cache.clear()
+        chunks = list(RawDiffChunkGenerator(old, new, 'a.py',
+                                            'a.py').get_chunks())
+
+        generator = RawDiffChunkGenerator(old, new, 'a.py', 'a.py')
+        generator.HIGHLIGHT_REGIONS_MIN_LINES = 10000
+        full_chunks = list(generator.get_chunks())
+
+        self.assertEqual(len(chunks), len(full_chunks))
+
+        for chunk, full_chunk in zip(chunks, full_chunks):
+            if not chunk['collapsable']:
+                self.assertEqual(chunk['lines'], full_chunk['lines'])
+
+    def _build_large_files(self):
+        """Build a large file and a copy with a single line changed."""
+        old_lines = []
+
+        for i in range(300):
+            old_lines += [
+                'def func%d():' % i,
+                '    """Return %d."""' % i,
+                '    return %d' % i,
+                '',
+            ]
+
+        new_lines = list(old_lines)
+        new_lines[602] = '    return -150'
+
+        return ('\n'.join(old_lines).encode('utf-8'),
+                '\n'.join(new_lines).encode('utf-8'))
+
     def test_indent_spaces(self):
         """Testing RawDiffChunkGenerator._serialize_indentation with spaces"""
         self.assertEqual(
@@ -2907,10 +4287,216 @@ class DiffRendererTests(SpyAgency, TestCase):
         chunk = diff_file['chunks'][0]
         self.assertEqual(chunk['change'], 'replace')
 
+    @add_fixtures(['test_scmtools'])
+    def test_make_context_highlights_expanded_chunks(self):
+        """Testing DiffRenderer.make_context highlights collapsed chunks of
+        large files that are being expanded
+        """
+        old = ''.join('def func%d():\n    pass\n\n' % i
+                      for i in range(400)).encode('utf-8')
+        new = old.replace(b'func200', b'function200')
+
+        repository = self.create_repository(tool_name='Test')
+        diffset = self.create_diffset(repository=repository)
+
+        cache.clear()
+        chunks = list(RawDiffChunkGenerator(old, new, 'a.py',
+                                            'a.py').get_chunks())
+        diff_file = {
+            'chunks': chunks,
+            'filediff': self.create_filediff(diffset),
+            'interfilediff': None,
+            'force_interdiff': False,
+        }
+
+        # Collapsed chunks are left alone.
+        renderer = DiffRenderer(diff_file)
+        renderer.make_context()
+
+        self.assertNotIn('<span', chunks[0]['lines'][0][2])
+        self.assertNotIn('<span', chunks[-1]['lines'][0][2])
 
-class DiffUtilsTests(TestCase):
+        # Expanding a chunk highlights it.
+        renderer = DiffRenderer(diff_file, chunk_index=0, collapse_all=False)
+        renderer.make_context()
+
+        self.assertIn('<span', chunks[0]['lines'][0][2])
+        self.assertNotIn('<span', chunks[-1]['lines'][0][2])
+
+
+class DiffUtilsTests(SpyAgency, TestCase):
     """Unit tests for diffutils."""
 
+    new_file_diff = (
+        b'diff --git a/foo.txt b/foo.txt\n'
+        b'new file mode 100644\n'
+        b'index 0000000..092beec\n'
+        b'--- /dev/null\n'
+        b'+++ b/foo.txt\n'
+        b'@@ -0,0 +1,2 @@\n'
+        b'+This is foo!\n'
+        b'+=]\n'
+    )
+
+    @add_fixtures(['test_scmtools'])
+    def test_update_filediff_checksums(self):
+        """Testing update_filediff_checksums"""
+        repository = self.create_repository(tool_name='Git')
+        diffset = self.create_diffset(repository=repository)
+        filediff = self.create_filediff(diffset=diffset,
+                                        source_file='foo.txt',
+                                        dest_file='foo.txt',
+                                        source_revision=PRE_CREATION,
+                                        diff=self.new_file_diff)
+
+        self.assertTrue(diffutils.update_filediff_checksums(filediff))
+
+        filediff = FileDiff.objects.get(pk=filediff.pk)
+        self.assertEqual(filediff.orig_sha1, hashlib.sha1(b'').hexdigest())
+        self.assertEqual(filediff.patched_sha1,
+                         hashlib.sha1(b'This is foo!\n=]\n').hexdigest())
+
+        # They're only computed once.
+        self.assertFalse(diffutils.update_filediff_checksums(filediff))
+
+    @add_fixtures(['test_scmtools'])
+    def test_update_filediff_checksums_with_error(self):
+        """Testing update_filediff_checksums with an error fetching the
+        original file
+        """
+        repository = self.create_repository(tool_name='Git')
+        diffset = self.create_diffset(repository=repository)
+        filediff = self.create_filediff(diffset=diffset)
+
+        self.spy_on(Repository.get_file,
+                    call_fake=lambda *args, **kwargs: self._raise_not_found())
+
+        self.assertFalse(diffutils.update_filediff_checksums(filediff))
+        self.assertIsNone(filediff.orig_sha1)
+        self.assertIsNone(filediff.patched_sha1)
+
+    @add_fixtures(['test_scmtools'])
+    def test_get_diff_files_with_interdiff_identical_patched_files(self):
+        """Testing get_diff_files with an interdiff skips files that are
+        identical after patching
+        """
+        repository = self.create_repository(tool_name='Git')
+        diffset = self.create_diffset(repository=repository)
+        filediff = self.create_filediff(diffset=diffset)
+        filediff.extra_data.update({
+            'orig_sha1': 'a' * 40,
+            'patched_sha1': 'b' * 40,
+        })
+        filediff.save()
+
+        interdiffset = self.create_diffset(repository=repository, revision=2)
+        interfilediff = self.create_filediff(diffset=interdiffset,
+                                             source_revision='456',
+                                             diff=self.new_file_diff)
+        interfilediff.extra_data.update({
+            'orig_sha1': 'c' * 40,
+            'patched_sha1': 'b' * 40,
+        })
+        interfilediff.save()
+
+        self.spy_on(diffutils.get_original_file)
+
+        self.assertEqual(
+            diffutils.get_diff_files(diffset, None, interdiffset), [])
+
+        generator = DiffChunkGenerator(None, filediff, interfilediff)
+        self.assertEqual(list(generator.get_chunks()), [])
+        self.assertFalse(diffutils.get_original_file.called)
+
+    @add_fixtures(['test_scmtools'])
+    def test_get_diff_files_with_interdiff_identical_diffs(self):
+        """Testing get_diff_files with an interdiff skips identical diffs
+        without loading them
+        """
+        repository = self.create_repository(tool_name='Git')
+        diffset = self.create_diffset(repository=repository)
+        self.create_filediff(diffset=diffset)
+        self.create_filediff(diffset=diffset, source_file='/other-file',
+                             dest_file='/other-file',
+                             diff=self.new_file_diff)
+
+        interdiffset = self.create_diffset(repository=repository, revision=2)
+        self.create_filediff(diffset=interdiffset)
+
+        self.spy_on(FileDiff._get_diff)
+
+        diff_files = diffutils.get_diff_files(diffset, None, interdiffset)
+
+        self.assertEqual(len(diff_files), 1)
+        self.assertEqual(diff_files[0]['filediff'].source_file, '/other-file')
+        self.assertFalse(FileDiff._get_diff.called)
+
+    @add_fixtures(['test_scmtools'])
+    def test_get_diff_files_caches_manifest(self):
+        """Testing get_diff_files reuses the cached file manifest"""
+        repository = self.create_repository(tool_name='Git')
+        diffset = self.create_diffset(repository=repository)
+        self.create_filediff(diffset=diffset, source_file='/src/foo.c',
+                             dest_file='/src/foo.c')
+        filediff = self.create_filediff(diffset=diffset,
+                                        source_file='/src/foo.h',
+                                        dest_file='/src/foo.h')
+        self.create_filediff(diffset=diffset, source_file='/README',
+                             dest_file='/README')
+
+        self.spy_on(diffutils._build_diff_files_manifest)
+
+        diff_files = diffutils.get_diff_files(diffset)
+        self.assertEqual(
+            [diff_file['depot_filename'] for diff_file in diff_files],
+            ['/README', '/src/foo.h', '/src/foo.c'])
+        self.assertEqual(
+            [diff_file['index'] for diff_file in diff_files],
+            [2, 1, 0])
+
+        self.assertEqual(diffutils.get_diff_files(diffset), diff_files)
+
+        # A single file is looked up from the manifest, without loading
+        # the rest of the files.
+        with self.assertNumQueries(0):
+            single_files = diffutils.get_diff_files(diffset, filediff)
+
+        self.assertEqual(single_files, [diff_files[1]])
+        self.assertEqual(
+            len(diffutils._build_diff_files_manifest.spy.calls), 1)
+
+    def test_get_sorted_filediffs(self):
+        """Testing get_sorted_filediffs"""
+        filenames = [
+            '/src/main.cpp',
+            '/README',
+            '/src/main.h',
+            '/src/lib/util.c',
+            '/src/lib/util.h',
+            '/Makefile',
+        ]
+        filediffs = [
+            FileDiff(source_file=filename)
+            for filename in filenames
+        ]
+
+        self.assertEqual(
+            [
+                filediff.source_file
+                for filediff in diffutils.get_sorted_filediffs(filediffs)
+            ],
+            [
+                '/Makefile',
+                '/README',
+                '/src/main.h',
+                '/src/main.cpp',
+                '/src/lib/util.h',
+                '/src/lib/util.c',
+            ])
+
+    def _raise_not_found(self):
+        raise FileNotFoundError('/test-file', '123')
+
     @add_fixtures(['test_users', 'test_scmtools'])
     def test_interdiff_when_renaming_twice(self):
         """Testing interdiff when renaming twice"""
@@ -3430,6 +5016,316 @@ class DiffUtilsTests(TestCase):
             }))
 
 
+class ChunkCacheTests(SpyAgency, TestCase):
+    """Unit tests for reviewboard.diffviewer.chunk_cache.ChunkCache."""
+
+    def setUp(self):
+        super(ChunkCacheTests, self).setUp()
+
+        cache.clear()
+
+        old = ''.join('Line %d\n' % i for i in range(30)).encode('utf-8')
+        new = old.replace(b'Line 15', b'Line fifteen')
+        self.chunks = list(
+            RawDiffChunkGenerator(old, new, 'file1', 'file2').get_chunks())
+        self.num_generated = 0
+
+    def tearDown(self):
+        super(ChunkCacheTests, self).tearDown()
+
+        cache.clear()
+
+    def test_get_chunks(self):
+        """Testing ChunkCache.get_chunks"""
+        chunk_cache = ChunkCache()
+
+        self.assertEqual(chunk_cache.get_chunks('key', self._generate),
+                         self.chunks)
+        self.assertEqual(chunk_cache.get_chunks('key', self._generate),
+                         self.chunks)
+        self.assertEqual(self.num_generated, 1)
+
+        stats = chunk_cache.get_stats()
+        self.assertEqual(stats['local']['hits'], 1)
+        self.assertEqual(stats['local']['misses'], 1)
+        self.assertEqual(stats['local']['entries'], 1)
+        self.assertTrue(stats['local']['size'] > 0)
+        self.assertEqual(stats['shared']['misses'], 1)
+        self.assertFalse(stats['disk']['enabled'])
+
+    def test_get_chunks_from_shared_cache(self):
+        """Testing ChunkCache.get_chunks with chunks from another process"""
+        ChunkCache().get_chunks('key', self._generate)
+
+        chunk_cache = ChunkCache()
+        self.assertEqual(chunk_cache.get_chunks('key', self._generate),
+                         self.chunks)
+        self.assertEqual(self.num_generated, 1)
+
+        stats = chunk_cache.get_stats()
+        self.assertEqual(stats['local']['misses'], 1)
+        self.assertEqual(stats['shared']['hits'], 1)
+        self.assertEqual(stats['local']['entries'], 1)
+
+    def test_get_chunks_with_chunk_index(self):
+        """Testing ChunkCache.get_chunks with chunk_index"""
+        ChunkCache().get_chunks('key', self._generate)
+
+        chunk_cache = ChunkCache()
+        chunks = chunk_cache.get_chunks('key', self._generate, chunk_index=2)
+
+        self.assertEqual(self.num_generated, 1)
+        self.assertEqual(len(chunks), len(self.chunks))
+        self.assertEqual(chunks[2], self.chunks[2])
+
+        for i in (0, 1, 3, 4):
+            self.assertNotIn('lines', chunks[i])
+
+            for key in ('index', 'change', 'collapsable', 'numlines'):
+                self.assertEqual(chunks[i][key], self.chunks[i][key])
+
+        # Only part of the chunks were loaded, so they aren't kept.
+        self.assertEqual(chunk_cache.get_stats()['local']['entries'], 0)
+
+    def test_get_chunks_after_cache_cleared(self):
+        """Testing ChunkCache.get_chunks after the main cache is cleared"""
+        chunk_cache = ChunkCache()
+        chunk_cache.get_chunks('key', self._generate)
+
+        cache.clear()
+
+        self.assertEqual(chunk_cache.get_chunks('key', self._generate),
+                         self.chunks)
+        self.assertEqual(self.num_generated, 2)
+
+    def test_get_chunks_from_disk(self):
+        """Testing ChunkCache.get_chunks with chunks stored on disk"""
+        disk_dir = tempfile.mkdtemp(prefix='rb-chunks-')
+
+        try:
+            ChunkCache(disk_dir=disk_dir).get_chunks('key', self._generate)
+            cache.clear()
+
+            chunk_cache = ChunkCache(disk_dir=disk_dir)
+            self.assertEqual(chunk_cache.get_chunks('key', self._generate),
+                             self.chunks)
+            self.assertEqual(self.num_generated, 1)
+
+            stats = chunk_cache.get_stats()
+            self.assertEqual(stats['shared']['misses'], 1)
+            self.assertEqual(stats['disk']['hits'], 1)
+
+            # The chunks are stored in the main cache again.
+            self.assertEqual(ChunkCache().get_cached_keys(['key']),
+                             set(['key']))
+        finally:
+            shutil.rmtree(disk_dir)
+
+    def test_get_chunks_from_disk_with_other_site(self):
+        """Testing ChunkCache.get_chunks doesn't use chunks stored on disk
+        by another site
+        """
+        disk_dir = tempfile.mkdtemp(prefix='rb-chunks-')
+        old_site_root = settings.SITE_ROOT
+
+        try:
+            ChunkCache(disk_dir=disk_dir).get_chunks('key', self._generate)
+            cache.clear()
+
+            settings.SITE_ROOT = '/other-site/'
+            chunk_cache = ChunkCache(disk_dir=disk_dir)
+            self.assertEqual(chunk_cache.get_chunks('key', self._generate),
+                             self.chunks)
+            self.assertEqual(self.num_generated, 2)
+            self.assertEqual(chunk_cache.get_stats()['disk']['misses'], 1)
+        finally:
+            settings.SITE_ROOT = old_site_root
+            shutil.rmtree(disk_dir)
+
+    def test_set_chunks_schedules_disk_purge(self):
+        """Testing ChunkCache.set_chunks removes old chunks from disk in the
+        background
+        """
+        disk_dir = tempfile.mkdtemp(prefix='rb-chunks-')
+        self.spy_on(run_in_background, call_original=False)
+
+        try:
+            chunk_cache = ChunkCache(disk_dir=disk_dir)
+            chunk_cache.set_chunks('key1', self.chunks)
+            chunk_cache.set_chunks('key2', self.chunks)
+
+            # This is only done once per interval.
+            self.assertEqual(len(run_in_background.spy.calls), 1)
+            self.assertEqual(run_in_background.spy.last_call.args,
+                             (chunk_cache.purge_disk,))
+        finally:
+            shutil.rmtree(disk_dir)
+
+    def test_purge_disk_with_expired_chunks(self):
+        """Testing ChunkCache.purge_disk removes expired chunks"""
+        disk_dir = tempfile.mkdtemp(prefix='rb-chunks-')
+
+        try:
+            chunk_cache = ChunkCache(disk_dir=disk_dir)
+            chunk_cache.set_chunks('key1', self.chunks)
+            chunk_cache.set_chunks('key2', self.chunks)
+            self._age_disk_entry(chunk_cache, 'key1',
+                                 settings.CACHE_EXPIRATION_TIME + 60)
+
+            self.assertEqual(chunk_cache.purge_disk(), 1)
+            self.assertFalse(
+                os.path.exists(chunk_cache._get_disk_path('key1')))
+            self.assertTrue(
+                os.path.exists(chunk_cache._get_disk_path('key2')))
+        finally:
+            shutil.rmtree(disk_dir)
+
+    def test_purge_disk_with_disk_max_size(self):
+        """Testing ChunkCache.purge_disk removes the oldest chunks when over
+        the maximum size
+        """
+        disk_dir = tempfile.mkdtemp(prefix='rb-chunks-')
+
+        try:
+            chunk_cache = ChunkCache(disk_dir=disk_dir)
+
+            for i, key in enumerate(('key1', 'key2', 'key3')):
+                chunk_cache.set_chunks(key, self.chunks)
+                self._age_disk_entry(chunk_cache, key, 60 * (3 - i))
+
+            path = chunk_cache._get_disk_path('key1')
+            size = sum(
+                os.path.getsize(os.path.join(path, filename))
+                for filename in os.listdir(path)
+            )
+
+            chunk_cache = ChunkCache(disk_dir=disk_dir,
+                                     disk_max_size=size * 2)
+            self.assertEqual(chunk_cache.purge_disk(), 1)
+            self.assertFalse(
+                os.path.exists(chunk_cache._get_disk_path('key1')))
+            self.assertTrue(
+                os.path.exists(chunk_cache._get_disk_path('key2')))
+            self.assertTrue(
+                os.path.exists(chunk_cache._get_disk_path('key3')))
+
+            self.assertEqual(chunk_cache.purge_disk(), 0)
+        finally:
+            shutil.rmtree(disk_dir)
+
+    def test_get_chunks_with_large_chunks(self):
+        """Testing ChunkCache.get_chunks with chunks larger than a cache
+        entry
+        """
+        self.chunks = [{
+            'index': 0,
+            'change': 'equal',
+            'collapsable': False,
+            'numlines': 1,
+            'meta': {},
+            'lines': [os.urandom(CACHE_CHUNK_SIZE * 2)],
+        }]
+
+        ChunkCache().get_chunks('key', self._generate)
+
+        self.assertEqual(ChunkCache().get_chunks('key', self._generate),
+                         self.chunks)
+        self.assertEqual(self.num_generated, 1)
+
+    def test_local_max_size(self):
+        """Testing ChunkCache removes the least recently used chunks from
+        memory
+        """
+        chunk_cache = ChunkCache()
+        chunk_cache.get_chunks('key1', self._generate)
+        size = chunk_cache.get_stats()['local']['size']
+
+        chunk_cache = ChunkCache(local_max_size=size * 2)
+        chunk_cache.get_chunks('key1', self._generate)
+        chunk_cache.get_chunks('key2', self._generate)
+        chunk_cache.get_chunks('key1', self._generate)
+        chunk_cache.get_chunks('key3', self._generate)
+
+        stats = chunk_cache.get_stats()
+        self.assertEqual(stats['local']['entries'], 2)
+        self.assertEqual(stats['local']['size'], size * 2)
+
+        # key2 was the least recently used.
+        chunk_cache.get_chunks('key1', self._generate)
+        chunk_cache.get_chunks('key2', self._generate)
+
+        stats = chunk_cache.get_stats()
+        self.assertEqual(stats['local']['hits'], 2)
+        self.assertEqual(stats['shared']['hits'], 2)
+
+    def test_get_cached_keys(self):
+        """Testing ChunkCache.get_cached_keys"""
+        chunk_cache = ChunkCache()
+        chunk_cache.set_chunks('key1', self.chunks)
+
+        self.assertEqual(chunk_cache.get_cached_keys(['key1', 'key2']),
+                         set(['key1']))
+
+    def _generate(self):
+        self.num_generated += 1
+
+        return self.chunks
+
+    def _age_disk_entry(self, chunk_cache, key, seconds):
+        path = os.path.join(chunk_cache._get_disk_path(key), 'manifest')
+        mtime = os.path.getmtime(path) - seconds
+        os.utime(path, (mtime, mtime))
+
+
+class PrefetchOriginalFilesTests(SpyAgency, TestCase):
+    """Unit tests for diffutils.prefetch_original_files."""
+    fixtures = ['test_scmtools']
+
+    def setUp(self):
+        super(PrefetchOriginalFilesTests, self).setUp()
+
+        self.repository = self.create_repository(tool_name='Git')
+        self.diffset = self.create_diffset(repository=self.repository)
+        self.filediff = self.create_filediff(self.diffset,
+                                             source_file='/readme',
+                                             source_revision='e965047')
+        self.create_filediff(self.diffset,
+                             source_file='/newfile',
+                             dest_file='/newfile',
+                             source_revision=PRE_CREATION)
+        binary_filediff = self.create_filediff(self.diffset,
+                                               source_file='/image.png',
+                                               dest_file='/image.png',
+                                               source_revision='d6613f5')
+        binary_filediff.binary = True
+        binary_filediff.save(update_fields=['binary'])
+
+        self.spy_on(Repository.prefetch_files, call_original=False)
+
+    def tearDown(self):
+        super(PrefetchOriginalFilesTests, self).tearDown()
+
+        cache.clear()
+
+    def test_prefetch_original_files(self):
+        """Testing prefetch_original_files"""
+        files = diffutils.get_diff_files(self.diffset)
+        diffutils.prefetch_original_files(files)
+
+        self.assertEqual(len(Repository.prefetch_files.spy.calls), 1)
+        self.assertEqual(Repository.prefetch_files.spy.calls[0].args,
+                         ([('/readme', 'e965047', None)],))
+
+    def test_prefetch_original_files_with_cached_chunks(self):
+        """Testing prefetch_original_files skips files with cached chunks"""
+        get_chunk_cache().set_chunks(make_chunks_cache_key(self.filediff), [])
+
+        files = diffutils.get_diff_files(self.diffset)
+        diffutils.prefetch_original_files(files)
+
+        self.assertFalse(Repository.prefetch_files.spy.called)
+
+
 class DiffExpansionHeaderTests(TestCase):
     """Testing generation of diff expansion headers."""
 
@@ -3541,3 +5437,178 @@ class DiffExpansionHeaderTests(TestCase):
                 },
                 'right': None,
             })
+
+
+class BackgroundTaskQueueTests(TestCase):
+    """Unit tests for reviewboard.concurrency.BackgroundTaskQueue."""
+
+    def test_priority(self):
+        """Testing BackgroundTaskQueue runs tasks in order of priority"""
+        queue = BackgroundTaskQueue(1)
+        started = threading.Event()
+        unblock = threading.Event()
+        ran = []
+
+        def _block():
+            started.set()
+            unblock.wait(5)
+
+        queue.add(_block)
+        self.assertTrue(started.wait(5))
+
+        queue.add(ran.append, args=('c',), priority=2)
+        queue.add(ran.append, args=('b1',), priority=1)
+        queue.add(ran.append, args=('b2',), priority=1)
+        queue.add(ran.append, args=('a',), priority=0)
+        unblock.set()
+
+        self.assertTrue(queue.join(5))
+        self.assertEqual(ran, ['a', 'b1', 'b2', 'c'])
+
+    def test_group_limit(self):
+        """Testing BackgroundTaskQueue limits tasks running in a group"""
+        queue = BackgroundTaskQueue(2)
+        started = threading.Event()
+        unblock = threading.Event()
+        other_ran = threading.Event()
+        ran = []
+
+        def _block():
+            started.set()
+            unblock.wait(5)
+
+        def _run_other():
+            ran.append('other')
+            other_ran.set()
+
+        queue.add(_block, group='repo', group_limit=1)
+        self.assertTrue(started.wait(5))
+
+        queue.add(ran.append, args=('repo',), group='repo', group_limit=1)
+        queue.add(_run_other)
+
+        # The task in the other group runs first, since the group is full.
+        self.assertTrue(other_ran.wait(5))
+        self.assertEqual(ran, ['other'])
+
+        unblock.set()
+
+        self.assertTrue(queue.join(5))
+        self.assertEqual(ran, ['other', 'repo'])
+
+
+class DiffPrecomputeTests(SpyAgency, TestCase):
+    """Unit tests for reviewboard.diffviewer.precompute."""
+    fixtures = ['test_users', 'test_scmtools']
+
+    def setUp(self):
+        super(DiffPrecomputeTests, self).setUp()
+
+        self.queued = []
+
+        def _queue_background_task(func, args=(), kwargs=None, priority=0,
+                                   **task_kwargs):
+            self.queued.append((func, priority))
+            func(*args, **(kwargs or {}))
+
+        self.spy_on(precompute.queue_background_task,
+                    call_fake=_queue_background_task)
+
+        self.review_request = self.create_review_request(
+            create_repository=True)
+
+    def tearDown(self):
+        super(DiffPrecomputeTests, self).tearDown()
+
+        cache.clear()
+
+    def test_precompute(self):
+        """Testing queue_diff_precompute caches the diff's chunks"""
+        diffset = self.create_diffset(self.review_request)
+        filediff = self.create_filediff(diffset,
+                                        source_file='foo.txt',
+                                        dest_file='foo.txt',
+                                        source_revision=PRE_CREATION,
+                                        diff=DiffUtilsTests.new_file_diff)
+
+        self.spy_on(DiffRenderer.render_to_string_uncached)
+
+        precompute.queue_diff_precompute(
+            self.review_request.diffset_history_id)
+
+        key = make_chunks_cache_key(filediff, enable_syntax_highlighting=True)
+        self.assertEqual(get_chunk_cache().get_cached_keys([key]),
+                         set([key]))
+
+        # Without a way to create the renderer the page would use, no
+        # fragments are rendered.
+        self.assertFalse(DiffRenderer.render_to_string_uncached.spy.called)
+
+    def test_precompute_with_create_renderer(self):
+        """Testing queue_diff_precompute with create_renderer caches the
+        rendered diff in the language requests resolve to
+        """
+        diffset = self.create_diffset(self.review_request)
+        self.create_filediff(diffset,
+                             source_file='foo.txt',
+                             dest_file='foo.txt',
+                             source_revision=PRE_CREATION,
+                             diff=DiffUtilsTests.new_file_diff)
+
+        def _create_renderer(diff_file, highlighting):
+            return get_diff_renderer(diff_file, collapse_all=True,
+                                     highlighting=highlighting)
+
+        precompute.queue_diff_precompute(
+            self.review_request.diffset_history_id,
+            create_renderer=_create_renderer)
+
+        self.spy_on(DiffRenderer.render_to_string_uncached)
+
+        language = translation.get_language_from_request(HttpRequest())
+
+        with translation.override(language):
+            files = diffutils.get_diff_files(diffset)
+            renderer = _create_renderer(files[0], True)
+            self.assertIn('This is foo!', renderer.render_to_string(None))
+
+        self.assertFalse(DiffRenderer.render_to_string_uncached.spy.called)
+
+    def test_precompute_with_interdiff(self):
+        """Testing queue_diff_precompute precomputes the interdiff after the
+        diff
+        """
+        self.spy_on(precompute.precompute_diff_file, call_original=False)
+
+        diffset1 = self.create_diffset(self.review_request, revision=1)
+        self.create_filediff(diffset1)
+
+        diffset2 = self.create_diffset(self.review_request, revision=2)
+        filediff2 = self.create_filediff(
+            diffset2,
+            diff=self.DEFAULT_FILEDIFF_DATA.replace(b'everybody', b'everyone'))
+        binary_filediff = self.create_filediff(diffset2,
+                                               source_file='/image.png',
+                                               dest_file='/image.png')
+        binary_filediff.binary = True
+        binary_filediff.save(update_fields=['binary'])
+
+        precompute.queue_diff_precompute(
+            self.review_request.diffset_history_id)
+
+        self.assertEqual(
+            [priority for func, priority in self.queued],
+            [precompute.PRIORITY_PLAN,
+             precompute.PRIORITY_DIFF,
+             precompute.PRIORITY_INTERDIFF])
+
+        calls = precompute.precompute_diff_file.spy.calls
+        self.assertEqual(len(calls), 2)
+
+        diff_file = calls[0].args[0]
+        self.assertEqual(diff_file['filediff'], filediff2)
+        self.assertFalse(diff_file['force_interdiff'])
+
+        interdiff_file = calls[1].args[0]
+        self.assertEqual(interdiff_file['interfilediff'], filediff2)
+        self.assertTrue(interdiff_file['force_interdiff'])
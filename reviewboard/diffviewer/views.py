@@ -1,12 +1,14 @@
 from __future__ import unicode_literals
 
+import json
 import logging
 import traceback
 
 from django.conf import settings
 from django.core.paginator import InvalidPage, Paginator
-from django.http import (HttpResponse, HttpResponseNotModified,
-                         HttpResponseServerError, Http404)
+from django.http import (HttpResponse, HttpResponseBadRequest,
+                         HttpResponseNotModified, HttpResponseServerError,
+                         Http404)
 from django.shortcuts import get_object_or_404
 from django.template import RequestContext
 from django.template.loader import render_to_string
@@ -16,7 +18,8 @@ from djblets.siteconfig.models import SiteConfiguration
 from djblets.util.http import encode_etag, etag_if_none_match, set_etag
 
 from reviewboard.diffviewer.diffutils import (get_diff_files,
-                                              get_enable_highlighting)
+                                              get_enable_highlighting,
+                                              prefetch_original_files)
 from reviewboard.diffviewer.errors import UserVisibleError
 from reviewboard.diffviewer.models import DiffSet, FileDiff
 from reviewboard.diffviewer.renderers import (get_diff_renderer,
@@ -172,6 +175,14 @@ class DiffViewerView(TemplateView):
         except InvalidPage:
             page = paginator.page(paginator.num_pages)
 
+        # Fetch the original files for this page up-front, and all at once,
+        # so the fragments that render them don't each wait on the
+        # repository.
+        prefetch_original_files(
+            page.object_list,
+            get_enable_highlighting(self.request.user),
+            request=self.request)
+
         diff_context = {
             'revision': {
                 'revision': diffset.revision,
@@ -374,40 +385,8 @@ class DiffFragmentView(View):
         A subclass may instead return a HttpResponse to indicate an error
         with the DiffSets.
         """
-        # Depending on whether we're invoked from a URL or from a wrapper
-        # with precomputed diffsets, we may be working with either IDs or
-        # actual objects. If they're objects, just use them as-is. Otherwise,
-        # if they're IDs, we want to grab them both (if both are provided)
-        # in one go, to save on an SQL query.
-        diffset = None
-        interdiffset = None
-
-        diffset_ids = []
-
-        if isinstance(diffset_or_id, DiffSet):
-            diffset = diffset_or_id
-        else:
-            diffset_ids.append(diffset_or_id)
-
-        if interdiffset_or_id:
-            if isinstance(interdiffset_or_id, DiffSet):
-                interdiffset = interdiffset_or_id
-            else:
-                diffset_ids.append(interdiffset_or_id)
-
-        if diffset_ids:
-            diffsets = DiffSet.objects.filter(pk__in=diffset_ids)
-
-            if len(diffsets) != len(diffset_ids):
-                raise Http404
-
-            for temp_diffset in diffsets:
-                if temp_diffset.pk == diffset_or_id:
-                    diffset = temp_diffset
-                elif temp_diffset.pk == interdiffset_or_id:
-                    interdiffset = temp_diffset
-                else:
-                    assert False
+        diffset, interdiffset = self._get_diffsets(diffset_or_id,
+                                                   interdiffset_or_id)
 
         filediff = get_object_or_404(FileDiff, pk=filediff_id, diffset=diffset)
 
@@ -457,6 +436,63 @@ class DiffFragmentView(View):
         """
         return {}
 
+    def _get_diffsets(self, diffset_or_id, interdiffset_or_id=None):
+        """Return the DiffSets for the diff or interdiff being rendered.
+
+        Args:
+            diffset_or_id (object):
+                The DiffSet or the ID of one.
+
+            interdiffset_or_id (object, optional):
+                The DiffSet or the ID of one for the other end of an interdiff
+                range.
+
+        Returns:
+            tuple:
+            A 2-tuple of the DiffSet and the interdiff DiffSet (which may be
+            ``None``).
+
+        Raises:
+            django.http.Http404:
+                One of the DiffSets could not be found.
+        """
+        # Depending on whether we're invoked from a URL or from a wrapper
+        # with precomputed diffsets, we may be working with either IDs or
+        # actual objects. If they're objects, just use them as-is. Otherwise,
+        # if they're IDs, we want to grab them both (if both are provided)
+        # in one go, to save on an SQL query.
+        diffset = None
+        interdiffset = None
+
+        diffset_ids = []
+
+        if isinstance(diffset_or_id, DiffSet):
+            diffset = diffset_or_id
+        else:
+            diffset_ids.append(diffset_or_id)
+
+        if interdiffset_or_id:
+            if isinstance(interdiffset_or_id, DiffSet):
+                interdiffset = interdiffset_or_id
+            else:
+                diffset_ids.append(interdiffset_or_id)
+
+        if diffset_ids:
+            diffsets = DiffSet.objects.filter(pk__in=diffset_ids)
+
+            if len(diffsets) != len(diffset_ids):
+                raise Http404
+
+            for temp_diffset in diffsets:
+                if temp_diffset.pk == diffset_or_id:
+                    diffset = temp_diffset
+                elif temp_diffset.pk == interdiffset_or_id:
+                    interdiffset = temp_diffset
+                else:
+                    assert False
+
+        return diffset, interdiffset
+
     def _get_renderer_settings(self, chunk_index=None, **kwargs):
         """Calculate the render settings for the display of a diff.
 
@@ -528,6 +564,221 @@ class DiffFragmentView(View):
         return None
 
 
+class DiffFragmentBatchView(DiffFragmentView):
+    """Renders the fragments for several files in a diff at once.
+
+    The diff viewer would otherwise fetch each file's fragment from
+    :py:class:`DiffFragmentView` separately, repeating the lookups and
+    permission checks for the diff each time. This does those once for the
+    whole batch, and then renders each file.
+
+    The view expects the same parameters as :py:class:`DiffFragmentView`,
+    except for ``filediff_id``, ``interfilediff_id`` and ``chunkindex``.
+    The files to render are instead passed in the ``?ids=`` query parameter,
+    as a comma-separated list of FileDiff IDs. Each ID may be followed by
+    ``-`` and the ID of the interdiff FileDiff.
+
+    Files whose chunks aren't cached have their original versions fetched
+    from the repository concurrently before rendering.
+
+    The response is a JSON payload containing a ``files`` list, with an
+    entry for each requested file in order. Each entry contains the
+    ``filediff_id``, ``interfilediff_id``, ``index``, rendered ``html``,
+    and the ``etag`` that :py:class:`DiffFragmentView` would use for the
+    file (or ``null`` if the file failed to render). The response as a whole
+    has an ETag built from those of each file.
+    """
+
+    #: The most files that can be requested at once.
+    max_files = 50
+
+    def get(self, request, *args, **kwargs):
+        """Handles GET requests for this view.
+
+        This will render each requested file and return the results.
+        """
+        file_ids = self._parse_file_ids(request.GET.get('ids', ''))
+
+        if not file_ids or len(file_ids) > self.max_files:
+            return HttpResponseBadRequest()
+
+        renderer_settings = self._get_renderer_settings(**kwargs)
+        file_etags = [
+            self.make_etag(renderer_settings, filediff_id, interfilediff_id)
+            for filediff_id, interfilediff_id in file_ids
+        ]
+        etag = encode_etag(':'.join(file_etags))
+
+        if etag_if_none_match(request, etag):
+            return HttpResponseNotModified()
+
+        try:
+            diff_info_or_response = self.process_diffset_info(**kwargs)
+
+            if isinstance(diff_info_or_response, HttpResponse):
+                return diff_info_or_response
+
+            diff_files = self._get_requested_diff_files(
+                file_ids=file_ids,
+                **diff_info_or_response)
+        except Http404:
+            raise
+        except Exception as e:
+            logging.exception('%s.get: Error when processing diffset info '
+                              'for filediff IDs %s: %s',
+                              self.__class__.__name__,
+                              request.GET.get('ids'),
+                              e,
+                              request=request)
+
+            return exception_traceback(self.request, e,
+                                       self.error_template_name)
+
+        kwargs.update(diff_info_or_response)
+        context = self.get_context_data(**kwargs)
+
+        prefetch_original_files(diff_files,
+                                renderer_settings['highlighting'],
+                                request=request)
+
+        results = []
+        had_error = False
+
+        for diff_file, file_etag in zip(diff_files, file_etags):
+            filediff = diff_file['filediff']
+            interfilediff = diff_file['interfilediff']
+
+            try:
+                # Renderers add their own file-specific state to the
+                # context, so each file needs its own copy.
+                renderer = self.create_renderer(
+                    context=dict(context),
+                    renderer_settings=renderer_settings,
+                    diff_file=diff_file,
+                    *args, **kwargs)
+                html = renderer.render_to_string(request)
+            except Exception as e:
+                logging.exception('%s.get: Error when rendering diffset for '
+                                  'filediff ID=%s, interfilediff ID=%s: %s',
+                                  self.__class__.__name__,
+                                  filediff.pk,
+                                  getattr(interfilediff, 'pk', None),
+                                  e,
+                                  request=request)
+
+                html = exception_traceback_string(
+                    self.request, e, self.error_template_name,
+                    extra_context={
+                        'file': diff_file,
+                    })
+                file_etag = None
+                had_error = True
+
+            results.append({
+                'filediff_id': filediff.pk,
+                'interfilediff_id': getattr(interfilediff, 'pk', None),
+                'index': diff_file['index'],
+                'etag': file_etag,
+                'html': html,
+            })
+
+        response = HttpResponse(json.dumps({'files': results}),
+                                content_type='application/json')
+
+        if not had_error:
+            set_etag(response, etag)
+
+        return response
+
+    def process_diffset_info(self, diffset_or_id, interdiffset_or_id=None,
+                             **kwargs):
+        """Process and return information on the desired diff.
+
+        This works like :py:meth:`DiffFragmentView.process_diffset_info`,
+        but only looks up the DiffSets, since there are many FileDiffs.
+        """
+        diffset, interdiffset = self._get_diffsets(diffset_or_id,
+                                                   interdiffset_or_id)
+
+        return {
+            'diffset': diffset,
+            'interdiffset': interdiffset,
+        }
+
+    def _parse_file_ids(self, ids):
+        """Parse the list of requested files.
+
+        Args:
+            ids (unicode):
+                The value of the ``?ids=`` query parameter.
+
+        Returns:
+            list of tuple:
+            A list of ``(filediff_id, interfilediff_id)`` tuples. This will be
+            empty if the list couldn't be parsed.
+        """
+        file_ids = []
+
+        for file_id in ids.split(','):
+            parts = file_id.split('-', 1)
+
+            try:
+                filediff_id = int(parts[0])
+
+                if len(parts) == 2:
+                    interfilediff_id = int(parts[1])
+                else:
+                    interfilediff_id = None
+            except ValueError:
+                return []
+
+            file_ids.append((filediff_id, interfilediff_id))
+
+        return file_ids
+
+    def _get_requested_diff_files(self, diffset, interdiffset, file_ids,
+                                  **kwargs):
+        """Return information on the requested files.
+
+        The files are looked up from the full list of files in the diff, so
+        that each has the same index it's shown with in the diff viewer.
+
+        Args:
+            diffset (reviewboard.diffviewer.models.DiffSet):
+                The DiffSet containing the files.
+
+            interdiffset (reviewboard.diffviewer.models.DiffSet):
+                The DiffSet on the other end of an interdiff range, if any.
+
+            file_ids (list of tuple):
+                The ``(filediff_id, interfilediff_id)`` tuples for the
+                requested files.
+
+            **kwargs (dict):
+                Additional information from :py:meth:`process_diffset_info`.
+
+        Returns:
+            list of dict:
+            The files, in the order they were requested.
+
+        Raises:
+            django.http.Http404:
+                One of the files isn't in the diff.
+        """
+        files = dict(
+            ((diff_file['filediff'].pk,
+              getattr(diff_file['interfilediff'], 'pk', None)),
+             diff_file)
+            for diff_file in get_diff_files(diffset, None, interdiffset,
+                                            request=self.request)
+        )
+
+        try:
+            return [files[file_id] for file_id in file_ids]
+        except KeyError:
+            raise Http404
+
+
 def exception_traceback_string(request, e, template_name, extra_context={}):
     context = {'error': e}
     context.update(extra_context)
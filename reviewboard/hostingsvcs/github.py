@@ -719,6 +719,54 @@ class GitHub(HostingService, BugTracker):
         except FileNotFoundError:
             return False
 
+    def get_files_exist(self, repository, paths_and_revisions,
+                        base_commit_id=None, *args, **kwargs):
+        """Return whether each of a list of files exists in the repository.
+
+        If the base commit is known, its tree is fetched in a single request,
+        and any files whose blobs are in the tree are known to exist. Only
+        the rest need to be checked individually.
+        """
+        results = [False] * len(paths_and_revisions)
+        unresolved = list(range(len(paths_and_revisions)))
+
+        if base_commit_id:
+            repo_api_url = self._get_repo_api_url(repository)
+
+            try:
+                tree = self.client.api_get_tree(repo_api_url, base_commit_id,
+                                                recursive=True)
+            except SCMError:
+                tree = None
+
+            if tree:
+                blob_shas = set(
+                    entry['sha']
+                    for entry in tree['tree']
+                    if entry['type'] == 'blob'
+                )
+
+                results = [
+                    revision in blob_shas
+                    for path, revision in paths_and_revisions
+                ]
+                unresolved = [
+                    i
+                    for i, exists in enumerate(results)
+                    if not exists
+                ]
+
+        if unresolved:
+            checked = super(GitHub, self).get_files_exist(
+                repository,
+                [paths_and_revisions[i] for i in unresolved],
+                base_commit_id=base_commit_id)
+
+            for i, exists in zip(unresolved, checked):
+                results[i] = exists
+
+        return results
+
     def get_branches(self, repository):
         repo_api_url = self._get_repo_api_url(repository)
         refs = self.client.api_get_heads(repo_api_url)
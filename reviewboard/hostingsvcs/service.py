@@ -19,6 +19,7 @@ from djblets.registries.registry import (ALREADY_REGISTERED, LOAD_ENTRY_POINT,
                                          NOT_REGISTERED)
 
 import reviewboard.hostingsvcs.urls as hostingsvcs_urls
+from reviewboard.concurrency import map_concurrently
 from reviewboard.registries.registry import EntryPointRegistry
 from reviewboard.signals import initializing
 
@@ -187,6 +188,12 @@ class HostingService(object):
     #: Optional form used to configure authentication settings for an account.
     auth_form = None
 
+    #: The maximum number of files that get_files_exist() will check at
+    #: once, for services that need a separate request for each file. This
+    #: also limits Repository.prefetch_files() for services that implement
+    #: get_file().
+    max_concurrent_file_checks = 8
+
     # These values are defaults that can be overridden in repository_plans
     # above.
     needs_authorization = False
@@ -316,6 +323,52 @@ class HostingService(object):
 
         return repository.get_scmtool().file_exists(path, revision, **kwargs)
 
+    def get_files_exist(self, repository, paths_and_revisions,
+                        base_commit_id=None, **kwargs):
+        """Return whether each of a list of files exists in a repository.
+
+        By default, this calls :py:meth:`get_file_exists` for each file,
+        running up to :py:attr:`max_concurrent_file_checks` checks at once.
+        Services that don't override :py:meth:`get_file_exists` hand the
+        whole list to the repository's SCMTool instead.
+
+        Subclasses can override this to check all the files using fewer
+        requests.
+
+        Args:
+            repository (reviewboard.scmtools.models.Repository):
+                The repository containing the files.
+
+            paths_and_revisions (list of tuple):
+                A list of ``(path, revision)`` tuples for the files to check.
+
+            base_commit_id (unicode, optional):
+                The ID of the commit the files are relative to.
+
+            **kwargs (dict):
+                Additional keyword arguments, for future expansion.
+
+        Returns:
+            list of bool:
+            Whether each file exists, in the same order as
+            ``paths_and_revisions``.
+        """
+        if not self.supports_repositories:
+            raise NotImplementedError
+
+        if (six.get_unbound_function(type(self).get_file_exists) is
+            six.get_unbound_function(HostingService.get_file_exists)):
+            return repository.get_scmtool().get_files_exist(
+                paths_and_revisions,
+                base_commit_id=base_commit_id)
+
+        return map_concurrently(
+            lambda path_and_revision: self.get_file_exists(
+                repository, *path_and_revision,
+                base_commit_id=base_commit_id),
+            paths_and_revisions,
+            self.max_concurrent_file_checks)
+
     def get_branches(self, repository):
         """Get a list of all branches in the repositories.
 
@@ -648,6 +648,27 @@ class GitHubTests(ServiceTests):
             SCMError, 'Not Found',
             lambda: service.get_change(repository, commit_sha))
 
+    def test_get_files_exist_with_base_commit_id(self):
+        """Testing GitHub get_files_exist with base commit ID uses the tree
+        """
+        self._test_get_files_exist(
+            base_commit_id='1c44b461cebe5874a857c51a4a13a849a4d1e52d',
+            expected_urls=[
+                'git/blobs/5f40d78c0e4b3ba4e40fbe02da4da2d9cbbfbbaf',
+                'git/blobs/ffffffffffffffffffffffffffffffffffffffff',
+                'git/trees/1c44b461cebe5874a857c51a4a13a849a4d1e52d',
+            ])
+
+    def test_get_files_exist_without_base_commit_id(self):
+        """Testing GitHub get_files_exist without base commit ID"""
+        self._test_get_files_exist(
+            base_commit_id=None,
+            expected_urls=[
+                'git/blobs/5f40d78c0e4b3ba4e40fbe02da4da2d9cbbfbbaf',
+                'git/blobs/62e49f1ad8c8fd8ddeac1a4c9e9f0b8b9c3b5fe8',
+                'git/blobs/ffffffffffffffffffffffffffffffffffffffff',
+            ])
+
     def test_get_remote_repositories_with_owner(self, **kwargs):
         """Testing GitHub.get_remote_repositories with requesting
         authenticated user's repositories
@@ -1190,6 +1211,63 @@ class GitHubTests(ServiceTests):
             HTTP_X_GITHUB_EVENT=event,
             HTTP_X_HUB_SIGNATURE='sha1=%s' % m.hexdigest())
 
+    def _test_get_files_exist(self, base_commit_id, expected_urls):
+        tree_api_response = json.dumps({
+            'sha': 'a8d0c7aa4d8ac4e3fa02f2f3e1c3ba2c5a9dcd9b',
+            'tree': [
+                {
+                    'path': 'README',
+                    'type': 'blob',
+                    'sha': '62e49f1ad8c8fd8ddeac1a4c9e9f0b8b9c3b5fe8',
+                },
+                {
+                    'path': 'docs',
+                    'type': 'tree',
+                    'sha': '5f40d78c0e4b3ba4e40fbe02da4da2d9cbbfbbaf',
+                },
+            ],
+            'truncated': False,
+        })
+
+        def _http_get(service, url, *args, **kwargs):
+            path = urlparse(url).path.split('/myrepo/', 1)[1]
+
+            if path.startswith('git/trees/'):
+                return tree_api_response, {}
+            elif path == 'git/blobs/ffffffffffffffffffffffffffffffffffffffff':
+                raise HTTPError(url, 404, '', {}, StringIO())
+            else:
+                return b'data', {}
+
+        account = self._get_hosting_account()
+        account.data['authorization'] = {'token': 'abc123'}
+
+        service = account.service
+        self.spy_on(service.client.http_get, call_fake=_http_get)
+
+        repository = Repository(hosting_account=account)
+        repository.extra_data = {
+            'repository_plan': 'public',
+            'github_public_repo_name': 'myrepo',
+        }
+
+        results = service.get_files_exist(
+            repository,
+            [
+                ('/README', '62e49f1ad8c8fd8ddeac1a4c9e9f0b8b9c3b5fe8'),
+                ('/NEWS', '5f40d78c0e4b3ba4e40fbe02da4da2d9cbbfbbaf'),
+                ('/AUTHORS', 'ffffffffffffffffffffffffffffffffffffffff'),
+            ],
+            base_commit_id=base_commit_id)
+
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(
+            sorted(
+                urlparse(call.args[0]).path.split('/myrepo/', 1)[1]
+                for call in service.client.http_get.spy.calls
+            ),
+            expected_urls)
+
     def _test_check_repository(self, expected_user='myuser', **kwargs):
         def _http_get(service, url, *args, **kwargs):
             self.assertEqual(
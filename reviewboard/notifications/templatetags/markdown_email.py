@@ -1,29 +1,32 @@
 from __future__ import unicode_literals
 
-import markdown
 from django import template
 from django.utils.safestring import mark_safe
 from djblets.markdown import markdown_unescape
 
+from reviewboard.reviews.markdown_utils import render_markdown
+
 
 register = template.Library()
 
 
+# Keyword arguments used when rendering Markdown for e-mails.
+MARKDOWN_EMAIL_KWARGS = {
+    'safe_mode': 'escape',
+    'output_format': 'xhtml1',
+    'extensions': [
+        'fenced_code', 'codehilite(noclasses=True)', 'tables',
+        'djblets.markdown.extensions.wysiwyg_email',
+    ],
+}
+
+
 @register.filter
 def markdown_email_html(text, is_rich_text):
     if not is_rich_text:
         return text
 
-    marked = markdown.markdown(
-        text,
-        extensions=[
-            'fenced_code', 'codehilite(noclasses=True)', 'tables',
-            'djblets.markdown.extensions.wysiwyg_email',
-        ],
-        output_format='xhtml1',
-        safe_mode='escape')
-
-    return mark_safe(marked)
+    return mark_safe(render_markdown(text, MARKDOWN_EMAIL_KWARGS))
 
 
 @register.filter
@@ -0,0 +1,302 @@
+from __future__ import unicode_literals
+
+from functools import partial
+
+from django.utils import six
+
+from reviewboard.signals import initializing
+
+
+#: Profile fields that affect how diff fragments are rendered.
+_FRAGMENT_PROFILE_FIELDS = (
+    'collapsed_diffs',
+    'default_use_rich_text',
+    'is_private',
+    'open_an_issue',
+    'settings',
+    'syntax_highlighting',
+    'timezone',
+)
+
+#: Profile fields that affect how entries are rendered for other users.
+#:
+#: These control how the user's name and avatar are shown.
+_ENTRY_PROFILE_FIELDS = (
+    'is_private',
+    'settings',
+)
+
+#: User fields that affect how entries are rendered.
+#:
+#: These are used for the user's name and avatar.
+_ENTRY_USER_FIELDS = (
+    'email',
+    'first_name',
+    'last_name',
+    'username',
+)
+
+
+def _on_review_request_published(review_request, changedesc=None,
+                                 **kwargs):
+    """Handle a review request being published.
+
+    The stored ETags for the review request's fragments are invalidated.
+
+    When a review request is first published, or a new diff is published,
+    the files in the diff (and the interdiff against the previous revision)
+    are precomputed in the background, so that the first reviewer to open
+    it doesn't have to wait.
+    """
+    from reviewboard.diffviewer.precompute import queue_diff_precompute
+    from reviewboard.reviews.middleware import invalidate_fragment_etags
+    from reviewboard.reviews.views import ReviewsDiffFragmentView
+
+    invalidate_fragment_etags(review_request)
+
+    if (review_request.diffset_history_id and
+        (changedesc is None or 'diff' in changedesc.fields_changed)):
+        queue_diff_precompute(
+            review_request.diffset_history_id,
+            create_renderer=partial(
+                ReviewsDiffFragmentView.create_precompute_renderer,
+                review_request))
+
+
+def _on_review_saved(instance, raw=False, **kwargs):
+    """Invalidate the fragment ETags for a review's review request.
+
+    Fragments for a review's comments change when a comment is edited or
+    the review is published, both of which save the review.
+    """
+    from reviewboard.reviews.middleware import invalidate_fragment_etags
+
+    if not raw:
+        invalidate_fragment_etags(instance.review_request)
+
+
+def _on_review_comments_changed(instance, action, reverse, model, pk_set,
+                                **kwargs):
+    """Update comments added to or removed from a review.
+
+    Comments store the IDs of their review and review request, so that they
+    can be looked up without going through the review's ManyToManyField.
+    Those are set when a comment is added to a review, and cleared when
+    it's removed from that review.
+
+    Adding or removing comments with issues on a published review also
+    updates the issue counts for the review request.
+    """
+    from django.db.models import Count
+
+    from reviewboard.reviews.models import Review
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if reverse:
+        # The reviews were changed through the comment's "review" relation.
+        comments = type(instance).objects.filter(pk=instance.pk)
+
+        if pk_set is not None:
+            reviews = Review.objects.filter(pk__in=pk_set)
+        elif instance.review_id is not None:
+            reviews = Review.objects.filter(pk=instance.review_id)
+        else:
+            reviews = []
+    else:
+        comments = model.objects.all()
+        reviews = [instance]
+
+        if pk_set is not None:
+            comments = comments.filter(pk__in=pk_set)
+
+    for review in reviews:
+        if action == 'post_add':
+            review_comments = comments
+            review_id = review.pk
+            review_request_id = review.review_request_id
+            multiplier = 1
+        else:
+            review_comments = comments.filter(review_id=review.pk)
+            review_id = None
+            review_request_id = None
+            multiplier = -1
+
+        if review.public and not review.is_reply():
+            issue_counts = (
+                review_comments
+                .filter(issue_opened=True, reply_to__isnull=True)
+                .order_by()
+                .values_list('issue_status')
+                .annotate(count=Count('pk')))
+
+            review.review_request.increment_issue_counts(dict(
+                (issue_status, count * multiplier)
+                for issue_status, count in issue_counts
+            ))
+
+        review_comments.update(review_id=review_id,
+                               review_request_id=review_request_id)
+
+        if reverse and (action == 'post_add' or
+                        instance.review_id == review.pk):
+            instance.review_id = review_id
+            instance.review_request_id = review_request_id
+
+
+def _on_siteconfig_saved(**kwargs):
+    """Invalidate the fragment ETags and cached entries for all review requests.
+
+    This is called when the site settings are saved, since any of them may
+    affect how diffs and review request entries are rendered.
+    """
+    from reviewboard.reviews.entry_cache import invalidate_cached_entries
+    from reviewboard.reviews.middleware import invalidate_fragment_etags
+
+    invalidate_fragment_etags()
+    invalidate_cached_entries()
+
+
+def _on_profile_pre_save(instance, raw=False, update_fields=None, **kwargs):
+    """Record the stored rendering settings of a profile being saved.
+
+    These are compared against the new settings once the profile is saved,
+    so that cached fragments and entries are only invalidated when the
+    settings used to render them have changed. Profiles are saved for many
+    other reasons, such as changing the sort order of a datagrid.
+    """
+    from reviewboard.accounts.models import Profile
+
+    instance._old_rendering_settings = None
+
+    if raw or instance.pk is None:
+        return
+
+    field_names = [
+        field_name
+        for field_name in _FRAGMENT_PROFILE_FIELDS
+        if update_fields is None or field_name in update_fields
+    ]
+
+    if field_names:
+        try:
+            old_profile = Profile.objects.get(pk=instance.pk)
+        except Profile.DoesNotExist:
+            return
+
+        instance._old_rendering_settings = dict(
+            (field_name, getattr(old_profile, field_name))
+            for field_name in field_names
+        )
+
+
+def _on_profile_saved(instance, **kwargs):
+    """Invalidate cached fragments and entries after rendering settings change.
+
+    Fragment ETags are invalidated when any setting used to render diffs has
+    changed. Cached entries only need to be invalidated when a setting shown
+    to other users has changed, since the viewing user's own settings are
+    part of the cache keys for entries.
+
+    Profiles are created with default settings while pages are being
+    rendered, so creating one doesn't invalidate anything.
+    """
+    from reviewboard.reviews.entry_cache import invalidate_cached_entries
+    from reviewboard.reviews.middleware import invalidate_fragment_etags
+
+    old_settings = getattr(instance, '_old_rendering_settings', None)
+    instance._old_rendering_settings = None
+
+    if not old_settings:
+        return
+
+    changed = set(
+        field_name
+        for field_name, old_value in six.iteritems(old_settings)
+        if getattr(instance, field_name) != old_value
+    )
+
+    if changed:
+        invalidate_fragment_etags()
+
+        if changed.intersection(_ENTRY_PROFILE_FIELDS):
+            invalidate_cached_entries()
+
+
+def _on_user_pre_save(instance, raw=False, update_fields=None, **kwargs):
+    """Record the stored name and e-mail address of a user being saved.
+
+    These are compared against the new values once the user is saved, so
+    that cached entries are only invalidated when the way the user is shown
+    has changed. Users are saved for other reasons, such as logging in.
+    """
+    from django.contrib.auth.models import User
+
+    instance._old_entry_fields = None
+
+    if raw or instance.pk is None:
+        return
+
+    field_names = [
+        field_name
+        for field_name in _ENTRY_USER_FIELDS
+        if update_fields is None or field_name in update_fields
+    ]
+
+    if field_names:
+        try:
+            old_user = User.objects.get(pk=instance.pk)
+        except User.DoesNotExist:
+            return
+
+        instance._old_entry_fields = dict(
+            (field_name, getattr(old_user, field_name))
+            for field_name in field_names
+        )
+
+
+def _on_user_saved(instance, **kwargs):
+    """Invalidate cached entries after a user's name or e-mail changes.
+
+    Cached entries contain the names and avatars of the users who wrote
+    them, which are built from these fields.
+    """
+    from reviewboard.reviews.entry_cache import invalidate_cached_entries
+
+    old_fields = getattr(instance, '_old_entry_fields', None)
+    instance._old_entry_fields = None
+
+    if old_fields and any(
+        getattr(instance, field_name) != old_value
+        for field_name, old_value in six.iteritems(old_fields)):
+        invalidate_cached_entries()
+
+
+def _connect_signals(**kwargs):
+    """Connect the signal handlers for review requests."""
+    from django.contrib.auth.models import User
+    from django.db.models.signals import m2m_changed, post_save, pre_save
+    from djblets.siteconfig.models import SiteConfiguration
+
+    from reviewboard.accounts.models import Profile
+    from reviewboard.reviews.models import Review, ReviewRequest
+    from reviewboard.reviews.signals import review_request_published
+
+    review_request_published.connect(_on_review_request_published,
+                                     sender=ReviewRequest)
+    post_save.connect(_on_review_saved, sender=Review)
+
+    for field_name in ('comments', 'file_attachment_comments',
+                       'general_comments', 'screenshot_comments'):
+        m2m_changed.connect(_on_review_comments_changed,
+                            sender=getattr(Review, field_name).through)
+
+    pre_save.connect(_on_profile_pre_save, sender=Profile)
+    post_save.connect(_on_profile_saved, sender=Profile)
+    pre_save.connect(_on_user_pre_save, sender=User)
+    post_save.connect(_on_user_saved, sender=User)
+    post_save.connect(_on_siteconfig_saved, sender=SiteConfiguration)
+
+
+initializing.connect(_connect_signals)
@@ -0,0 +1,268 @@
+"""Caching for the rendered entries on the review request page.
+
+Most of the reviews and changes on a review request haven't changed since
+the page was last rendered, even when something else on the page has. The
+box for each entry is cached as rendered HTML, so only new or changed entries
+need to be rendered.
+
+The cache key for an entry covers the entry's own state (its timestamp, the
+replies to it and the status of its issues), along with the parts of the
+request that change how every entry renders, such as the language, time zone
+and ``TEMPLATE_SERIAL``.
+
+The rest of the user-specific state is applied to the cached HTML when it's
+used. Entries are cached without a collapsed state, which is filled in for
+each user. Entries with the user's own draft replies aren't cached at all,
+since those drafts are only shown to that user.
+"""
+
+from __future__ import unicode_literals
+
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import six, timezone, translation
+from django.utils.safestring import mark_safe
+from djblets.cache.backend import make_cache_key
+from djblets.extensions.hooks import TemplateHook
+
+from reviewboard.reviews.markdown_utils import is_rich_text_default_for_user
+
+
+#: The cache key for the version shared by all cached entries.
+_VERSION_KEY = 'review-entry-version'
+
+#: The template hook points rendered in the entry boxes.
+#:
+#: Extensions may render anything at these, so entries aren't cached while
+#: any are registered.
+_TEMPLATE_HOOK_NAMES = (
+    'review-summary-header-pre',
+    'review-summary-header-post',
+)
+
+#: A placeholder for the entry's class name in cached HTML.
+#:
+#: This is an HTML comment, which can't be produced by any escaped content
+#: in the entry.
+_CLASS_MARKER = mark_safe('<!-- entry-class -->')
+
+#: The collapse button for an expanded entry, as rendered in the templates.
+_EXPANDED_BUTTON = ('<div class="collapse-button btn">'
+                    '<div class="rb-icon rb-icon-collapse-review">')
+
+#: The collapse button for a collapsed entry, as rendered in the templates.
+_COLLAPSED_BUTTON = ('<div class="collapse-button btn">'
+                     '<div class="rb-icon rb-icon-expand-review">')
+
+
+def invalidate_cached_entries():
+    """Invalidate the cached HTML for all entries.
+
+    This should be called when site or user settings shown in the entries
+    may have changed.
+    """
+    cache.delete(make_cache_key(_VERSION_KEY))
+
+
+def load_cached_entries(request, review_request, draft, entries):
+    """Look up the cached HTML for a list of entries.
+
+    The HTML for all the entries is looked up at once. Each entry that can be
+    cached has its ``cache_key`` set, and each one found in the cache has its
+    HTML set in ``cached_html``. Entries that are found don't need anything
+    else computed for rendering.
+
+    Args:
+        request (django.http.HttpRequest):
+            The HTTP request from the client.
+
+        review_request (reviewboard.reviews.models.ReviewRequest):
+            The review request owning the entries.
+
+        draft (reviewboard.reviews.models.ReviewRequestDraft):
+            The user's draft of the review request, if any.
+
+        entries (list of dict):
+            The entries to look up.
+    """
+    from reviewboard.extensions.hooks import CommentDetailDisplayHook
+
+    if (CommentDetailDisplayHook.hooks or
+        any(TemplateHook.by_name(name) for name in _TEMPLATE_HOOK_NAMES)):
+        return
+
+    user = request.user
+    request_state = _get_request_state(user, review_request, draft)
+    keys = []
+
+    for entry in entries:
+        if 'review' in entry:
+            entry_state = _get_review_entry_state(entry, user)
+        elif 'changedesc' in entry:
+            changedesc = entry['changedesc']
+            entry_state = 'changedesc:%s:%s' % (changedesc.pk,
+                                                changedesc.timestamp)
+        else:
+            entry_state = None
+
+        if entry_state is not None:
+            key_hash = hashlib.sha1(
+                ('%s\0%s' % (request_state, entry_state)).encode('utf-8'))
+            entry['cache_key'] = make_cache_key(
+                'review-entry:%s' % key_hash.hexdigest())
+            keys.append(entry['cache_key'])
+
+    if not keys:
+        return
+
+    version_key = make_cache_key(_VERSION_KEY)
+    cached = cache.get_many([version_key] + keys)
+    version = cached.get(version_key)
+
+    if version is None:
+        version = uuid.uuid4().hex
+
+        if not cache.add(version_key, version):
+            version = cache.get(version_key)
+
+    for entry in entries:
+        if 'cache_key' in entry:
+            entry['cache_version'] = version
+            data = cached.get(entry['cache_key'])
+
+            if data is not None and data[0] == version:
+                entry['cached_html'] = data[1]
+
+
+def render_entry(context, entry, template_name):
+    """Render the box for an entry, using the cached HTML if possible.
+
+    If the entry can be cached but wasn't found, it's rendered without a
+    collapsed state and stored in the cache. The entry's collapsed state is
+    then applied to the HTML.
+
+    Args:
+        context (django.template.Context):
+            The context for rendering the entry.
+
+        entry (dict):
+            The entry to render.
+
+        template_name (unicode):
+            The template for the entry's box.
+
+    Returns:
+        django.utils.safestring.SafeText:
+        The rendered box.
+    """
+    cache_key = entry.get('cache_key')
+
+    if cache_key is None:
+        context.push()
+        context['entry'] = entry
+        html = render_to_string(template_name, context)
+        context.pop()
+
+        return html
+
+    html = entry.get('cached_html')
+
+    if html is None:
+        context.push()
+        context['entry'] = dict(entry, collapsed=False, **{
+            'class': _CLASS_MARKER,
+        })
+        html = render_to_string(template_name, context)
+        context.pop()
+
+        version = entry.get('cache_version')
+
+        if version is not None:
+            cache.set(cache_key, (version, html))
+
+    html = html.replace(_CLASS_MARKER, entry['class'], 1)
+
+    if entry['collapsed']:
+        html = html.replace(_EXPANDED_BUTTON, _COLLAPSED_BUTTON, 1)
+
+    return mark_safe(html)
+
+
+def _get_request_state(user, review_request, draft):
+    """Return the state of a request that affects every entry.
+
+    Args:
+        user (django.contrib.auth.models.User):
+            The user viewing the entries.
+
+        review_request (reviewboard.reviews.models.ReviewRequest):
+            The review request owning the entries.
+
+        draft (reviewboard.reviews.models.ReviewRequestDraft):
+            The user's draft of the review request, if any.
+
+    Returns:
+        unicode:
+        A string representing the state.
+    """
+    if draft is not None:
+        draft_timestamp = draft.last_updated
+    else:
+        draft_timestamp = ''
+
+    return '%s:%s:%s:%s:%s:%s:%s' % (
+        settings.TEMPLATE_SERIAL,
+        translation.get_language(),
+        timezone.get_current_timezone_name(),
+        user.is_authenticated(),
+        is_rich_text_default_for_user(user),
+        review_request.is_mutable_by(user),
+        draft_timestamp)
+
+
+def _get_review_entry_state(entry, user):
+    """Return the state of an entry for a review.
+
+    This covers the review, the replies to it, and the status of each issue
+    on it.
+
+    Args:
+        entry (dict):
+            The entry for the review.
+
+        user (django.contrib.auth.models.User):
+            The user viewing the entry.
+
+    Returns:
+        unicode:
+        A string representing the state, or ``None`` if the entry has draft
+        replies and can't be cached.
+    """
+    review = entry['review']
+    state = [
+        'review:%s:%s:%s' % (review.pk, review.timestamp,
+                             review.user_id == user.pk),
+    ]
+
+    for reply in review._body_top_replies + review._body_bottom_replies:
+        if not reply.public:
+            return None
+
+        state.append('%s:%s' % (reply.pk, reply.timestamp))
+
+    for key, comments in sorted(six.iteritems(entry['comments'])):
+        for comment in comments:
+            state.append('%s:%s:%s' % (key, comment.pk, comment.issue_status))
+
+            for reply_comment in comment._replies:
+                if not reply_comment._review.public:
+                    return None
+
+                state.append('%s:%s' % (reply_comment.pk,
+                                        reply_comment.timestamp))
+
+    return ','.join(state)
@@ -34,4 +34,5 @@ SEQUENCE = [
     'is_default_group',
     'general_comments',
     'add_owner_to_draft',
+    'comment_review_ids',
 ]
@@ -0,0 +1,24 @@
+from __future__ import unicode_literals
+
+from django.db import models
+from django_evolution.mutations import AddField
+
+
+MUTATIONS = [
+    AddField('Comment', 'review_id', models.IntegerField, null=True,
+             db_index=True),
+    AddField('Comment', 'review_request_id', models.IntegerField, null=True,
+             db_index=True),
+    AddField('FileAttachmentComment', 'review_id', models.IntegerField,
+             null=True, db_index=True),
+    AddField('FileAttachmentComment', 'review_request_id',
+             models.IntegerField, null=True, db_index=True),
+    AddField('GeneralComment', 'review_id', models.IntegerField, null=True,
+             db_index=True),
+    AddField('GeneralComment', 'review_request_id', models.IntegerField,
+             null=True, db_index=True),
+    AddField('ScreenshotComment', 'review_id', models.IntegerField,
+             null=True, db_index=True),
+    AddField('ScreenshotComment', 'review_request_id', models.IntegerField,
+             null=True, db_index=True),
+]
@@ -0,0 +1,61 @@
+from __future__ import unicode_literals, division
+
+import sys
+from optparse import make_option
+
+from django.conf import settings
+from django.contrib.humanize.templatetags.humanize import intcomma
+from django.core.management.base import BaseCommand
+from django.utils.translation import ugettext as _
+
+from reviewboard.reviews.models import (Comment, FileAttachmentComment,
+                                        GeneralComment, ScreenshotComment)
+
+
+class Command(BaseCommand):
+    help = ('Stores the review and review request IDs on comments created '
+            'before they were stored on comments')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size',
+                    type='int',
+                    default=1000,
+                    dest='batch_size',
+                    help='The number of comments to process at a time.'),
+    )
+
+    def handle(self, *args, **options):
+        # Don't allow queries to be stored.
+        settings.DEBUG = False
+
+        self.stdout.write(
+            _('Storing review IDs on comments...\n'
+              '\n'
+              'This may take a while. It is safe to continue using '
+              'Review Board while this is\n'
+              'processing.\n'))
+
+        updated_count = 0
+
+        for model in (Comment, FileAttachmentComment, GeneralComment,
+                      ScreenshotComment):
+            updated_count += model.objects.backfill_review_ids(
+                batch_done_cb=self._on_batch_done,
+                batch_size=options['batch_size'])
+
+        self.stdout.write(
+            _('\n'
+              '\n'
+              'Stored review IDs on %(count)s comments.\n')
+            % {
+                'count': intcomma(updated_count),
+            })
+
+    def _on_batch_done(self, processed_count, total_count):
+        """Report progress after a batch of comments has been processed."""
+        # NOTE: We use sys.stdout here instead of self.stdout in order
+        #       to control newlines.
+        sys.stdout.write('  [%d%%] %s/%s\r'
+                         % (processed_count * 100 / total_count,
+                            processed_count, total_count))
+        sys.stdout.flush()
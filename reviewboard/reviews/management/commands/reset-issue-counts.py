@@ -1,6 +1,5 @@
 from __future__ import unicode_literals
 
-import logging
 from optparse import make_option
 
 from django.core.management.base import BaseCommand, CommandError
@@ -21,8 +20,9 @@ class Command(BaseCommand):
                     action='store_true',
                     default=False,
                     dest='recalculate',
-                    help='Recalculates issue counts for the review requests. '
-                         'This is not compatible with --all'),
+                    help='Recalculates issue counts for the review requests, '
+                         'instead of leaving them to be recalculated when '
+                         'next loaded.'),
     )
 
     def handle(self, *args, **options):
@@ -30,9 +30,7 @@ class Command(BaseCommand):
         recalculate = options.get('recalculate')
 
         if update_all:
-            if recalculate:
-                raise CommandError('--recalculate cannot be used with --all')
-
+            pks = None
             q = ReviewRequest.objects.all()
         else:
             pks = []
@@ -50,21 +48,18 @@ class Command(BaseCommand):
 
             q = ReviewRequest.objects.filter(pk__in=pks)
 
-        q.update(issue_open_count=None,
-                 issue_resolved_count=None,
-                 issue_dropped_count=None)
-
-        if not update_all and recalculate:
-            if int(options['verbosity']) > 1:
-                root_logger = logging.getLogger('')
-                root_logger.setLevel(logging.DEBUG)
-
-            # Load each review request. The issue counters will recalculate,
-            # and output will be shown if verbosity > 1.
-            list(q)
+        if recalculate:
+            # Count the issues for all the review requests at once.
+            ReviewRequest.objects.recalculate_issue_counts(pks)
+            action = 'recalculated'
+        else:
+            q.update(issue_open_count=None,
+                     issue_resolved_count=None,
+                     issue_dropped_count=None)
+            action = 'reset'
 
         if update_all:
-            self.stdout.write('All issue counts reset.')
+            self.stdout.write('All issue counts %s.' % action)
         else:
-            self.stdout.write('Issue counts for review request(s) %s reset.'
-                              % ', '.join(args))
+            self.stdout.write('Issue counts for review request(s) %s %s.'
+                              % (', '.join(args), action))
@@ -4,8 +4,8 @@ import logging
 
 from django.contrib.auth.models import User
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import connections, router, transaction
-from django.db.models import Manager, Q
+from django.db import connections, reset_queries, router, transaction
+from django.db.models import Count, Manager, Q
 from django.db.models.query import QuerySet
 from django.utils import six
 from djblets.db.managers import ConcurrencyManager
@@ -15,6 +15,87 @@ from reviewboard.scmtools.errors import ChangeNumberInUseError
 from reviewboard.scmtools.models import Repository
 
 
+class CommentManager(ConcurrencyManager):
+    """A manager for comment models.
+
+    Comments are attached to reviews through a ManyToManyField on the review,
+    but also store the IDs of their review and review request, so that they
+    can be looked up without joining through the ManyToManyField's table.
+    These IDs are stored when the comment is added to a review.
+
+    Comments created before these IDs were stored have them filled in by
+    :py:meth:`backfill_review_ids`.
+    """
+
+    def backfill_review_ids(self, batch_done_cb=None, batch_size=1000):
+        """Store the review and review request IDs on older comments.
+
+        This goes through the ManyToManyField's table in batches, and stores
+        the IDs on every comment that doesn't have them yet. Each batch takes
+        one query to load and one update for each review in the batch.
+
+        This is run by :command:`rb-site upgrade`, and can be run through the
+        :command:`backfill-comment-review-ids` management command.
+
+        Args:
+            batch_done_cb (callable, optional):
+                A function to call after each batch. It takes the number
+                of comments processed so far and the total number of
+                comments to process.
+
+            batch_size (int, optional):
+                The number of comments to process at a time.
+
+        Returns:
+            int:
+            The number of comments that had their IDs stored.
+        """
+        related_field = self.model.review.related.field
+        comment_field_name = related_field.m2m_reverse_field_name()
+
+        missing = related_field.rel.through.objects.filter(**{
+            '%s__review_id__isnull' % comment_field_name: True,
+        })
+
+        total_count = missing.count()
+        processed_count = 0
+        last_pk = 0
+
+        while processed_count < total_count:
+            rows = list(
+                missing
+                .filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', 'review_id', 'review__review_request_id',
+                             '%s_id' % comment_field_name)
+                [:batch_size])
+
+            if not rows:
+                break
+
+            comment_ids = {}
+
+            for pk, review_id, review_request_id, comment_id in rows:
+                comment_ids.setdefault((review_id, review_request_id),
+                                       []).append(comment_id)
+
+            for (review_id, review_request_id), ids in \
+                six.iteritems(comment_ids):
+                self.filter(pk__in=ids).update(
+                    review_id=review_id,
+                    review_request_id=review_request_id)
+
+            last_pk = rows[-1][0]
+            processed_count += len(rows)
+
+            reset_queries()
+
+            if callable(batch_done_cb):
+                batch_done_cb(processed_count, total_count)
+
+        return processed_count
+
+
 class DefaultReviewerManager(Manager):
     """A manager for DefaultReviewer models."""
 
@@ -384,6 +465,88 @@ class ReviewRequestManager(ConcurrencyManager):
             return self.model.objects.get(Q(local_id=pk) &
                                           Q(local_site=local_site))
 
+    def recalculate_issue_counts(self, review_request_ids=None,
+                                 batch_size=500):
+        """Recalculate the issue counters for review requests.
+
+        Issues are counted with one query for each type of comment, grouped
+        by review request and issue status, rather than by loading each
+        review request in turn. The counters are then written with one
+        update for each distinct set of counts.
+
+        Args:
+            review_request_ids (list of int, optional):
+                The IDs of the review requests to recalculate. If not
+                provided, all review requests will be recalculated.
+
+            batch_size (int, optional):
+                The maximum number of review requests to write in a single
+                update.
+
+        Returns:
+            int:
+            The number of review requests that were recalculated.
+        """
+        from reviewboard.reviews.models import (Comment,
+                                                FileAttachmentComment,
+                                                GeneralComment, Review,
+                                                ScreenshotComment)
+
+        counter_fields = self.model.ISSUE_COUNTER_FIELDS
+        review_requests = self.all()
+        reviews = Review.objects.filter(public=True,
+                                        base_reply_to__isnull=True)
+
+        if review_request_ids is not None:
+            review_requests = review_requests.filter(pk__in=review_request_ids)
+            reviews = reviews.filter(review_request__in=review_request_ids)
+
+        reviews = reviews.order_by().values('pk')
+        issue_counts = {}
+
+        for model in (Comment, FileAttachmentComment, GeneralComment,
+                      ScreenshotComment):
+            status_counts = (
+                model.objects
+                .filter(review_id__in=reviews,
+                        issue_opened=True,
+                        reply_to__isnull=True)
+                .order_by()
+                .values_list('review_request_id', 'issue_status')
+                .annotate(count=Count('pk')))
+
+            for review_request_id, issue_status, count in status_counts:
+                if issue_status in counter_fields:
+                    counts = issue_counts.setdefault(review_request_id, {})
+                    counts[issue_status] = \
+                        counts.get(issue_status, 0) + count
+
+        # Group the review requests by their counts, so that each distinct
+        # set of counts can be written at once.
+        ids_by_counts = {}
+
+        for review_request_id, counts in six.iteritems(issue_counts):
+            key = tuple(sorted(six.iteritems(counts)))
+            ids_by_counts.setdefault(key, []).append(review_request_id)
+
+        with transaction.atomic():
+            updated_count = review_requests.update(**dict(
+                (field_name, 0)
+                for field_name in six.itervalues(counter_fields)
+            ))
+
+            for counts, ids in six.iteritems(ids_by_counts):
+                values = dict(
+                    (counter_fields[issue_status], count)
+                    for issue_status, count in counts
+                )
+
+                for i in range(0, len(ids), batch_size):
+                    self.filter(pk__in=ids[i:i + batch_size]).update(
+                        **values)
+
+        return updated_count
+
 
 class ReviewManager(ConcurrencyManager):
     """A manager for Review models.
@@ -1,11 +1,20 @@
 from __future__ import unicode_literals
 
+import hashlib
+import json
+import threading
 import warnings
+from collections import OrderedDict
 
+import djblets
+import markdown as markdown_module
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import Model
 from django.utils.html import escape
 from djblets import markdown as djblets_markdown
+from djblets.cache.backend import make_cache_key
 from djblets.siteconfig.models import SiteConfiguration
 from markdown import markdown
 
@@ -27,6 +36,13 @@ MARKDOWN_KWARGS = {
 }
 
 
+# Rendered Markdown recently used by this process, keyed by the text's hash
+# and the rendering options. This is checked before the main cache.
+_render_cache = OrderedDict()
+_render_cache_size = 0
+_render_cache_lock = threading.Lock()
+
+
 def markdown_escape(text):
     """Escapes text for use in Markdown.
 
@@ -201,16 +217,136 @@ def sanitize_illegal_chars_for_xml(s):
     return djblets_markdown.sanitize_illegal_chars_for_xml(s)
 
 
-def render_markdown(text):
+def render_markdown(text, markdown_kwargs=None):
     """Renders Markdown text to HTML.
 
     The Markdown text will be sanitized to prevent injecting custom HTML.
     It will also enable a few plugins for code highlighting and sane lists.
+
+    The rendered HTML is cached by a hash of the text and the options used
+    to render it, first in this process's memory and then in the main cache,
+    so the same text is only rendered once.
+
+    Args:
+        text (unicode):
+            The Markdown text to render.
+
+        markdown_kwargs (dict, optional):
+            Keyword arguments for the Markdown renderer. Defaults to
+            :py:data:`MARKDOWN_KWARGS`.
+
+    Returns:
+        unicode:
+        The rendered HTML.
     """
     if isinstance(text, bytes):
         text = text.decode('utf-8')
 
-    return markdown(text, **MARKDOWN_KWARGS)
+    if markdown_kwargs is None:
+        markdown_kwargs = MARKDOWN_KWARGS
+
+    key = 'markdown-html:%s:%s' % (
+        get_markdown_kwargs_version(markdown_kwargs),
+        hashlib.sha1(text.encode('utf-8')).hexdigest())
+
+    html = _get_cached_render(key)
+
+    if html is None:
+        shared_key = make_cache_key(key)
+        html = cache.get(shared_key)
+
+        if html is None:
+            html = markdown(text, **markdown_kwargs)
+            cache.set(shared_key, html)
+
+        _set_cached_render(key, html)
+
+    return html
+
+
+def get_markdown_kwargs_version(markdown_kwargs):
+    """Return a version identifying the output of a set of Markdown options.
+
+    This covers the options along with the versions of Markdown and Djblets,
+    which provides some of the extensions. Text rendered with options having
+    the same version will have the same HTML.
+
+    Args:
+        markdown_kwargs (dict):
+            Keyword arguments for the Markdown renderer.
+
+    Returns:
+        unicode:
+        The version of the options.
+    """
+    return hashlib.sha1(json.dumps(
+        [markdown_module.version, djblets.get_package_version(),
+         markdown_kwargs],
+        sort_keys=True,
+        default=repr).encode('utf-8')).hexdigest()
+
+
+def clear_markdown_render_cache():
+    """Remove all rendered Markdown stored in this process's memory."""
+    global _render_cache_size
+
+    with _render_cache_lock:
+        _render_cache.clear()
+        _render_cache_size = 0
+
+
+def _get_cached_render(key):
+    """Return rendered Markdown stored in this process's memory.
+
+    Args:
+        key (unicode):
+            The key for the rendered Markdown.
+
+    Returns:
+        unicode:
+        The rendered HTML, or ``None`` if it's not stored.
+    """
+    with _render_cache_lock:
+        html = _render_cache.pop(key, None)
+
+        if html is not None:
+            # Move this to the most recently used end.
+            _render_cache[key] = html
+
+    return html
+
+
+def _set_cached_render(key, html):
+    """Store rendered Markdown in this process's memory.
+
+    The least recently used HTML is removed to make room. HTML too large to
+    ever fit isn't stored.
+
+    Args:
+        key (unicode):
+            The key for the rendered Markdown.
+
+        html (unicode):
+            The rendered HTML.
+    """
+    global _render_cache_size
+
+    max_size = settings.MARKDOWN_RENDER_CACHE_LOCAL_SIZE
+
+    if len(html) > max_size:
+        return
+
+    with _render_cache_lock:
+        old_html = _render_cache.pop(key, None)
+
+        if old_html is not None:
+            _render_cache_size -= len(old_html)
+
+        while _render_cache and _render_cache_size + len(html) > max_size:
+            _render_cache_size -= len(_render_cache.popitem(last=False)[1])
+
+        _render_cache[key] = html
+        _render_cache_size += len(html)
 
 
 def render_markdown_from_file(f):
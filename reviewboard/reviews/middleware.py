@@ -0,0 +1,193 @@
+"""Middleware for answering conditional requests for diff fragments."""
+
+from __future__ import unicode_literals
+
+import hashlib
+import re
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponseNotModified
+from djblets.cache.backend import make_cache_key
+from djblets.util.http import set_etag
+
+
+#: How long, in seconds, fragment ETags and versions are kept in the cache.
+FRAGMENT_ETAG_EXPIRATION = 7 * 24 * 60 * 60
+
+#: The cache key for the version shared by all fragments.
+_GLOBAL_VERSION_KEY = 'diff-fragment-version'
+
+#: The URLs of the fragments that can be answered by the middleware.
+#:
+#: This captures the URL of the review request owning the fragment.
+_FRAGMENT_PATH_RE = re.compile(
+    r'^(?P<review_request_path>.*/r/\d+/)'
+    r'(diff/\d+(-\d+)?/fragments?/|fragments/diff-comments/)')
+
+
+def invalidate_fragment_etags(review_request=None):
+    """Invalidate the stored ETags for diff fragments.
+
+    After this is called, conditional requests for the affected fragments
+    will go through the views again, until they store new ETags.
+
+    Args:
+        review_request (reviewboard.reviews.models.ReviewRequest, optional):
+            The review request owning the fragments. If not provided, the
+            ETags for all fragments will be invalidated.
+    """
+    if review_request is None:
+        cache.delete(make_cache_key(_GLOBAL_VERSION_KEY))
+    else:
+        cache.delete(_make_version_key(review_request.get_absolute_url()))
+
+
+def _make_version_key(review_request_path):
+    """Return the cache key for the version of a review request's fragments.
+
+    Args:
+        review_request_path (unicode):
+            The URL of the review request.
+
+    Returns:
+        unicode:
+        The cache key.
+    """
+    return make_cache_key('%s:%s' % (_GLOBAL_VERSION_KEY,
+                                     review_request_path))
+
+
+class DiffFragmentETagMiddleware(object):
+    """Middleware that answers conditional requests for diff fragments.
+
+    The diff fragment views need to look up the review request, check
+    access, and look up the diffs or comments before they can tell whether
+    the client's copy of a fragment is current. Clients reloading large
+    reviews repeat that for every fragment on the page.
+
+    When a fragment view responds with an ETag, this stores the ETag in the
+    cache for the session and URL. If the same session later requests the
+    URL with that ETag in ``If-None-Match``, this responds with
+    :http:`304` directly, using a single cache lookup and no database
+    queries.
+
+    The stored ETags are tied to a version for the review request and a
+    version shared by all fragments. These are invalidated by
+    :py:func:`invalidate_fragment_etags` when anything shown in the
+    fragments may have changed. The ``TEMPLATE_SERIAL`` is part of the
+    cache key, so new templates invalidate everything.
+    """
+
+    def process_request(self, request):
+        """Answer a conditional request for a fragment, if possible.
+
+        Args:
+            request (django.http.HttpRequest):
+                The HTTP request from the client.
+
+        Returns:
+            django.http.HttpResponse:
+            A :http:`304` response if the client's copy of the fragment is
+            current, or ``None`` to continue processing the request.
+        """
+        if request.method != 'GET':
+            return None
+
+        m = _FRAGMENT_PATH_RE.match(request.path)
+
+        if not m:
+            return None
+
+        etag_key = self._make_etag_key(request)
+        version_keys = [
+            make_cache_key(_GLOBAL_VERSION_KEY),
+            _make_version_key(m.group('review_request_path')),
+        ]
+
+        cached = cache.get_many([etag_key] + version_keys)
+        versions = []
+
+        for version_key in version_keys:
+            version = cached.get(version_key)
+
+            if version is None:
+                # Start a new version before the view runs, so that any
+                # invalidation while it's running will replace it.
+                version = uuid.uuid4().hex
+
+                if not cache.add(version_key, version,
+                                 FRAGMENT_ETAG_EXPIRATION):
+                    version = cache.get(version_key)
+
+            versions.append(version)
+
+        versions = tuple(versions)
+        etag = request.META.get('HTTP_IF_NONE_MATCH')
+        versioned_etag = (etag, versions)
+
+        if etag and cached.get(etag_key) == versioned_etag:
+            response = HttpResponseNotModified()
+            set_etag(response, etag)
+
+            return response
+
+        request._diff_fragment_etag_info = (etag_key, versions)
+
+        return None
+
+    def process_response(self, request, response):
+        """Store the ETag for a fragment.
+
+        Args:
+            request (django.http.HttpRequest):
+                The HTTP request from the client.
+
+            response (django.http.HttpResponse):
+                The response from the view.
+
+        Returns:
+            django.http.HttpResponse:
+            The response.
+        """
+        etag_info = getattr(request, '_diff_fragment_etag_info', None)
+
+        if etag_info is not None:
+            if response.status_code == 200:
+                etag = response.get('ETag')
+            elif response.status_code == 304:
+                etag = request.META.get('HTTP_IF_NONE_MATCH')
+            else:
+                etag = None
+
+            if etag and None not in etag_info[1]:
+                etag_key, versions = etag_info
+                cache.set(etag_key, (etag, versions),
+                          FRAGMENT_ETAG_EXPIRATION)
+
+        return response
+
+    def _make_etag_key(self, request):
+        """Return the cache key for a stored fragment ETag.
+
+        The key covers everything about the request that can change the
+        rendered fragment or who can see it.
+
+        Args:
+            request (django.http.HttpRequest):
+                The HTTP request from the client.
+
+        Returns:
+            unicode:
+            The cache key.
+        """
+        key_hash = hashlib.sha1((
+            '%s\0%s\0%s\0%s' % (
+                request.COOKIES.get(settings.SESSION_COOKIE_NAME, ''),
+                request.COOKIES.get('collapsediffs', ''),
+                request.get_full_path(),
+                settings.TEMPLATE_SERIAL)
+        ).encode('utf-8')).hexdigest()
+
+        return make_cache_key('diff-fragment-etag:%s' % key_hash)
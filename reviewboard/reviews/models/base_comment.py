@@ -6,8 +6,9 @@ from django.db.models import Q
 from django.utils import timezone
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
-from djblets.db.fields import CounterField, JSONField
-from djblets.db.managers import ConcurrencyManager
+from djblets.db.fields import JSONField
+
+from reviewboard.reviews.managers import CommentManager
 
 
 @python_2_unicode_compatible
@@ -38,8 +39,17 @@ class BaseComment(models.Model):
 
     extra_data = JSONField(null=True)
 
-    # Set this up with a ConcurrencyManager to help prevent race conditions.
-    objects = ConcurrencyManager()
+    # These are stored when the comment is added to a review, so that the
+    # comments for a review or review request can be looked up directly,
+    # rather than through the review's ManyToManyField.
+    review_id = models.IntegerField(_('review ID'), null=True, db_index=True)
+    review_request_id = models.IntegerField(_('review request ID'),
+                                            null=True,
+                                            db_index=True)
+
+    # CommentManager is a ConcurrencyManager, to help prevent race
+    # conditions.
+    objects = CommentManager()
 
     @staticmethod
     def issue_status_to_string(status):
@@ -130,6 +140,17 @@ class BaseComment(models.Model):
 
         self.timestamp = timezone.now()
 
+        if self.pk is not None and self.review_id is None:
+            # This comment was loaded before it was added to a review, or
+            # before review IDs were stored on comments. Store them now, so
+            # that saving doesn't clear them.
+            try:
+                review = self.get_review()
+                self.review_id = review.pk
+                self.review_request_id = review.review_request_id
+            except ObjectDoesNotExist:
+                pass
+
         super(BaseComment, self).save()
 
         try:
@@ -147,23 +168,39 @@ class BaseComment(models.Model):
                     self._loaded_issue_status != self.issue_status):
                     # The user has toggled the issue status of this comment,
                     # so update the issue counts for the review request.
-                    old_field = ReviewRequest.ISSUE_COUNTER_FIELDS[
-                        self._loaded_issue_status]
-                    new_field = ReviewRequest.ISSUE_COUNTER_FIELDS[
-                        self.issue_status]
-
-                    CounterField.increment_many(
-                        self.get_review_request(),
-                        {
-                            old_field: -1,
-                            new_field: 1,
-                        })
+                    self.get_review_request().increment_issue_counts({
+                        self._loaded_issue_status: -1,
+                        self.issue_status: 1,
+                    })
 
                 q = ReviewRequest.objects.filter(pk=review.review_request_id)
                 q.update(last_review_activity_timestamp=self.timestamp)
         except ObjectDoesNotExist:
             pass
 
+        # The issue counts now include the saved status, so further saves
+        # should only count changes from it.
+        self._loaded_issue_status = self.issue_status
+
+    def delete(self, **kwargs):
+        """Delete the comment.
+
+        If the comment has an issue on a published review, the issue counts
+        for the review request are updated.
+        """
+        if self.issue_opened and not self.is_reply():
+            try:
+                review = self.get_review()
+
+                if review.public and not review.is_reply():
+                    review.review_request.increment_issue_counts({
+                        self._loaded_issue_status: -1,
+                    })
+            except ObjectDoesNotExist:
+                pass
+
+        super(BaseComment, self).delete(**kwargs)
+
     def __str__(self):
         return self.text
 
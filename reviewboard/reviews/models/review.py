@@ -3,7 +3,7 @@ from __future__ import unicode_literals
 from django.contrib.auth.models import User
 from django.db import models
 from django.db.models import Q
-from django.utils import timezone
+from django.utils import six, timezone
 from django.utils.functional import cached_property
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext_lazy as _
@@ -276,8 +276,18 @@ class Review(models.Model):
     def delete(self):
         """Deletes this review.
 
-        This will enforce that all contained comments are also deleted.
+        This will enforce that all contained comments are also deleted. If
+        the review was published, its issues are removed from the issue
+        counts for the review request.
         """
+        if self.public and not self.is_reply():
+            issue_counts = fetch_issue_counts(self.review_request,
+                                              Q(pk=self.pk))
+            self.review_request.increment_issue_counts(dict(
+                (issue_status, -count)
+                for issue_status, count in six.iteritems(issue_counts)
+            ))
+
         self.comments.all().delete()
         self.screenshot_comments.all().delete()
         self.file_attachment_comments.all().delete()
@@ -290,11 +300,18 @@ class Review(models.Model):
                                 self.pk)
 
     def get_all_comments(self, **kwargs):
-        """Return a list of all contained comments of all types."""
-        return (list(self.comments.filter(**kwargs)) +
-                list(self.screenshot_comments.filter(**kwargs)) +
-                list(self.file_attachment_comments.filter(**kwargs)) +
-                list(self.general_comments.filter(**kwargs)))
+        """Return a list of all contained comments of all types.
+
+        The comments are looked up by the review ID stored on them, rather
+        than through the ManyToManyFields.
+        """
+        comments = []
+
+        for model in (Comment, ScreenshotComment, FileAttachmentComment,
+                      GeneralComment):
+            comments += model.objects.filter(review_id=self.pk, **kwargs)
+
+        return comments
 
     def has_comments(self, only_issues=False):
         """Return whether the review contains any comments/issues.
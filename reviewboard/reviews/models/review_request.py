@@ -5,7 +5,7 @@ import logging
 from django.contrib.auth.models import User
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import models
+from django.db import connections, models, router
 from django.db.models import Count, Q
 from django.utils import six, timezone
 from django.utils.translation import ugettext_lazy as _
@@ -24,8 +24,13 @@ from reviewboard.reviews.managers import ReviewRequestManager
 from reviewboard.reviews.models.base_comment import BaseComment
 from reviewboard.reviews.models.base_review_request_details import \
     BaseReviewRequestDetails
+from reviewboard.reviews.models.diff_comment import Comment
+from reviewboard.reviews.models.file_attachment_comment import \
+    FileAttachmentComment
+from reviewboard.reviews.models.general_comment import GeneralComment
 from reviewboard.reviews.models.group import Group
 from reviewboard.reviews.models.screenshot import Screenshot
+from reviewboard.reviews.models.screenshot_comment import ScreenshotComment
 from reviewboard.reviews.signals import (review_request_closed,
                                          review_request_closing,
                                          review_request_published,
@@ -42,6 +47,10 @@ def fetch_issue_counts(review_request, extra_query=None):
 
     This queries all opened issues across all public comments on a
     review request and returns them.
+
+    Each type of comment is counted by status, using the review request and
+    review IDs stored on the comments. The counts for all types are fetched
+    together in a single query.
     """
     issue_counts = {
         BaseComment.OPEN: 0,
@@ -54,45 +63,35 @@ def fetch_issue_counts(review_request, extra_query=None):
     if extra_query:
         q = q & extra_query
 
-    issue_statuses = review_request.reviews.filter(q).values(
-        'comments__pk',
-        'comments__issue_opened',
-        'comments__issue_status',
-        'file_attachment_comments__pk',
-        'file_attachment_comments__issue_opened',
-        'file_attachment_comments__issue_status',
-        'general_comments__pk',
-        'general_comments__issue_opened',
-        'general_comments__issue_status',
-        'screenshot_comments__pk',
-        'screenshot_comments__issue_opened',
-        'screenshot_comments__issue_status')
-
-    if issue_statuses:
-        comment_fields = {
-            'comments': set(),
-            'file_attachment_comments': set(),
-            'general_comments': set(),
-            'screenshot_comments': set(),
-        }
-
-        for issue_fields in issue_statuses:
-            for key, comments in six.iteritems(comment_fields):
-                issue_opened = issue_fields[key + '__issue_opened']
-                comment_pk = issue_fields[key + '__pk']
-
-                if issue_opened and comment_pk not in comments:
-                    comments.add(comment_pk)
-                    issue_status = issue_fields[key + '__issue_status']
-
-                    if issue_status:
-                        issue_counts[issue_status] += 1
-
-        logging.debug('Calculated issue counts for review request ID %s '
-                      'across %s review(s): Resulting counts = %r; '
-                      'DB values = %r; Field IDs = %r',
-                      review_request.pk, len(issue_statuses), issue_counts,
-                      issue_statuses, comment_fields)
+    reviews = review_request.reviews.filter(q).order_by().values('pk')
+    queries = []
+    params = []
+
+    for model in (Comment, FileAttachmentComment, GeneralComment,
+                  ScreenshotComment):
+        query, query_params = (
+            model.objects
+            .filter(review_request_id=review_request.pk,
+                    review_id__in=reviews,
+                    issue_opened=True)
+            .order_by()
+            .values_list('issue_status')
+            .annotate(count=Count('pk'))
+            .query.sql_with_params())
+
+        queries.append(query)
+        params += query_params
+
+    cursor = connections[router.db_for_read(Comment)].cursor()
+    cursor.execute(' UNION ALL '.join(queries), params)
+
+    for issue_status, count in cursor.fetchall():
+        if issue_status:
+            issue_counts[issue_status] += count
+
+    logging.debug('Calculated issue counts for review request ID %s: '
+                  'Resulting counts = %r',
+                  review_request.pk, issue_counts)
 
     return issue_counts
 
@@ -652,6 +651,26 @@ class ReviewRequest(BaseReviewRequestDetails):
 
         return self._blocks
 
+    def increment_issue_counts(self, issue_counts):
+        """Apply changes in the number of issues to the issue counters.
+
+        The counters are updated atomically in the database. Counters that
+        haven't been initialized yet are left alone, since they'll count the
+        issues when they're first loaded.
+
+        Args:
+            issue_counts (dict):
+                A mapping of issue statuses to the change in the number of
+                issues with that status. Changes can be negative.
+        """
+        CounterField.increment_many(
+            self,
+            dict(
+                (self.ISSUE_COUNTER_FIELDS[issue_status], count)
+                for issue_status, count in six.iteritems(issue_counts)
+                if issue_status in self.ISSUE_COUNTER_FIELDS
+            ))
+
     def save(self, update_counts=False, **kwargs):
         if update_counts or self.id is None:
             self._update_counts()
@@ -19,6 +19,7 @@ from djblets.util.humanize import humanize_list
 from reviewboard.accounts.models import Profile, Trophy
 from reviewboard.diffviewer.diffutils import get_displayed_diff_line_ranges
 from reviewboard.reviews.actions import get_top_level_actions
+from reviewboard.reviews.entry_cache import render_entry
 from reviewboard.reviews.fields import (get_review_request_fieldset,
                                         get_review_request_fieldsets)
 from reviewboard.reviews.markdown_utils import (is_rich_text_default_for_user,
@@ -252,6 +253,35 @@ def reply_section(context, entry, comment, context_type, context_id,
     }
 
 
+@register.tag
+@basictag(takes_context=True)
+def review_entry_box(context, entry):
+    """Renders the box for a review or change on the review request page.
+
+    The rendered box is cached, along with the other entries on the page.
+    See :py:mod:`reviewboard.reviews.entry_cache`.
+
+    Args:
+        context (django.template.Context):
+            The template context.
+
+        entry (dict):
+            The entry for the review or change description.
+
+    Returns:
+        django.utils.safestring.SafeText:
+        The rendered box.
+    """
+    if 'review' in entry:
+        template_name = 'reviews/boxes/review.html'
+    elif 'changedesc' in entry:
+        template_name = 'reviews/boxes/change.html'
+    else:
+        return ''
+
+    return render_entry(context, entry, template_name)
+
+
 @register.inclusion_tag('datagrids/dashboard_entry.html', takes_context=True)
 def dashboard_entry(context, level, text, view, param=None):
     """
@@ -1,14 +1,18 @@
 from __future__ import print_function, unicode_literals
 
 from datetime import timedelta
+import json
 import logging
 import os
 
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.template import Context, Template
 from django.test.client import RequestFactory
-from django.utils import six
+from django.utils import six, timezone
+from django.utils.http import urlquote
 from django.utils.safestring import SafeText
 from djblets.auth.signals import user_registered
 from djblets.siteconfig.models import SiteConfiguration
@@ -18,8 +22,13 @@ from mock import Mock
 
 from reviewboard.accounts.models import (Profile,
                                          LocalSiteProfile,
+                                         ReviewRequestVisit,
                                          _add_default_groups)
+from reviewboard.avatars import avatar_services
 from reviewboard.changedescs.models import ChangeDescription
+from reviewboard.diffviewer import precompute
+from reviewboard.diffviewer.renderers import DiffRenderer
+from reviewboard.diffviewer.views import DiffFragmentView
 from reviewboard.reviews.actions import (BaseReviewRequestAction,
                                          BaseReviewRequestMenuAction,
                                          clear_all_actions,
@@ -30,8 +39,11 @@ from reviewboard.reviews.errors import (DepthLimitExceededError,
                                         NotModifiedError,
                                         PublishError)
 from reviewboard.reviews.forms import DefaultReviewerForm, GroupForm
-from reviewboard.reviews.markdown_utils import (markdown_render_conditional,
-                                                normalize_text_for_edit)
+from reviewboard.reviews import markdown_utils
+from reviewboard.reviews.markdown_utils import (clear_markdown_render_cache,
+                                                markdown_render_conditional,
+                                                normalize_text_for_edit,
+                                                render_markdown)
 from reviewboard.reviews.models import (Comment,
                                         DefaultReviewer,
                                         GeneralComment,
@@ -39,7 +51,8 @@ from reviewboard.reviews.models import (Comment,
                                         ReviewRequest,
                                         ReviewRequestDraft,
                                         Review)
-from reviewboard.scmtools.core import ChangeSet, Commit
+from reviewboard.reviews.views import ReviewsDiffFragmentView
+from reviewboard.scmtools.core import ChangeSet, Commit, PRE_CREATION
 from reviewboard.scmtools.errors import ChangeNumberInUseError
 from reviewboard.scmtools.models import Repository, Tool
 from reviewboard.site.models import LocalSite
@@ -980,6 +993,87 @@ class ReviewRequestTests(SpyAgency, TestCase):
         with self.assertRaises(ChangeDescription.DoesNotExist):
             review_request.changedescs.filter(public=True).latest()
 
+    @add_fixtures(['test_scmtools'])
+    def test_publish_queues_diff_precompute(self):
+        """Testing ReviewRequest.publish with a new diff queues precomputing
+        the diff
+        """
+        review_request = self.create_review_request(create_repository=True,
+                                                    publish=True)
+        self.create_diffset(review_request, draft=True)
+
+        self.spy_on(precompute.queue_diff_precompute, call_original=False)
+
+        review_request.publish(review_request.submitter)
+
+        self.assertTrue(precompute.queue_diff_precompute.spy.called_with(
+            review_request.diffset_history_id))
+
+    @add_fixtures(['test_scmtools'])
+    def test_publish_precomputes_diff_fragments(self):
+        """Testing ReviewRequest.publish with a new diff precomputes the
+        fragments the diff viewer shows
+        """
+        def _queue_background_task(func, args=(), kwargs=None, **task_kwargs):
+            func(*args, **(kwargs or {}))
+
+        self.spy_on(precompute.queue_background_task,
+                    call_fake=_queue_background_task)
+        cache.clear()
+
+        review_request = self.create_review_request(create_repository=True,
+                                                    publish=True)
+        diffset = self.create_diffset(review_request, draft=True)
+        filediff = self.create_filediff(
+            diffset,
+            source_file='foo.txt',
+            dest_file='foo.txt',
+            source_revision=PRE_CREATION,
+            diff=(b'diff --git a/foo.txt b/foo.txt\n'
+                  b'new file mode 100644\n'
+                  b'--- /dev/null\n'
+                  b'+++ b/foo.txt\n'
+                  b'@@ -0,0 +1 @@\n'
+                  b'+This is foo!\n'))
+
+        review_request.publish(review_request.submitter)
+
+        self.spy_on(DiffRenderer.render_to_string_uncached,
+                    owner=DiffRenderer)
+
+        url = '/r/%d/diff/1/fragment/%s/?index=0' % (review_request.pk,
+                                                     filediff.pk)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'This is foo!', response.content)
+        self.assertFalse(DiffRenderer.render_to_string_uncached.spy.called)
+
+        # The precomputed fragment is the same as a fresh render.
+        cache.clear()
+
+        fresh_response = self.client.get(url)
+        self.assertTrue(DiffRenderer.render_to_string_uncached.spy.called)
+        self.assertEqual(response.content, fresh_response.content)
+
+    @add_fixtures(['test_scmtools'])
+    def test_publish_without_diff_skips_diff_precompute(self):
+        """Testing ReviewRequest.publish without a new diff doesn't queue
+        precomputing the diff
+        """
+        review_request = self.create_review_request(create_repository=True,
+                                                    publish=True)
+        self.create_diffset(review_request)
+
+        self.spy_on(precompute.queue_diff_precompute, call_original=False)
+
+        draft = ReviewRequestDraft.create(review_request)
+        draft.summary = 'New summary'
+        draft.save()
+
+        review_request.publish(review_request.submitter)
+
+        self.assertFalse(precompute.queue_diff_precompute.spy.called)
+
     def test_submit_nonpublic(self):
         """ Testing ReviewRequest.close with non-public requests to ensure state
         transitions to SUBMITTED from non-public review request is not allowed
@@ -1637,7 +1731,7 @@ class DefaultActionTests(SpyAgency, TestCase):
                              '%s should not have rendered' % action_id)
 
 
-class ViewTests(TestCase):
+class ViewTests(SpyAgency, TestCase):
     """Tests for views in reviewboard.reviews.views"""
     fixtures = ['test_users', 'test_scmtools', 'test_site']
 
@@ -1942,6 +2036,172 @@ class ViewTests(TestCase):
         self.assertEqual(comments[0].text, comment_text_1)
         self.assertEqual(comments[1].text, comment_text_2)
 
+    def test_review_detail_with_older_entries(self):
+        """Testing review_detail only renders the newest entries"""
+        review_request = self.create_review_request(create_repository=True,
+                                                    publish=True)
+        diffset = self.create_diffset(review_request)
+        filediff = self.create_filediff(diffset)
+        reviews = self._create_reviews_for_entries(review_request, filediff)
+
+        old_value = settings.REVIEW_REQUEST_ENTRIES_PAGE_SIZE
+        settings.REVIEW_REQUEST_ENTRIES_PAGE_SIZE = 2
+
+        try:
+            response = self.client.get('/r/%d/' % review_request.pk)
+        finally:
+            settings.REVIEW_REQUEST_ENTRIES_PAGE_SIZE = old_value
+
+        self.assertEqual(response.status_code, 200)
+
+        entries = response.context['entries']
+        self.assertEqual([entry['review'] for entry in entries], reviews[1:])
+        self.assertEqual(len(entries[0]['comments']['diff_comments']), 2)
+        self.assertEqual(response.context['older_entries_count'], 1)
+        self.assertEqual(response.context['older_entries_url'],
+                         '/r/%d/entries/?end=1' % review_request.pk)
+        self.assertContains(response, 'data-url="/r/%d/entries/?end=1"'
+                            % review_request.pk)
+        self.assertNotContains(response, 'id="review%d"' % reviews[0].pk)
+
+        # Only the comments opening issues are loaded for older reviews.
+        review_entries = response.context['review_entries']
+        self.assertEqual(len(review_entries), 3)
+        self.assertEqual(review_entries[0]['review'], reviews[0])
+
+        comments = review_entries[0]['comments']['diff_comments']
+        self.assertEqual(len(comments), 1)
+        self.assertTrue(comments[0].issue_opened)
+
+        issues = response.context['issues']
+        self.assertEqual(issues['total'], 3)
+        self.assertEqual(issues['open'], 3)
+
+    def test_review_entries(self):
+        """Testing review_entries view"""
+        review_request = self.create_review_request(create_repository=True,
+                                                    publish=True)
+        diffset = self.create_diffset(review_request)
+        filediff = self.create_filediff(diffset)
+        reviews = self._create_reviews_for_entries(review_request, filediff)
+
+        old_value = settings.REVIEW_REQUEST_ENTRIES_PAGE_SIZE
+        settings.REVIEW_REQUEST_ENTRIES_PAGE_SIZE = 2
+
+        try:
+            response = self.client.get('/r/%d/entries/?end=2'
+                                       % review_request.pk)
+        finally:
+            settings.REVIEW_REQUEST_ENTRIES_PAGE_SIZE = old_value
+
+        self.assertEqual(response.status_code, 200)
+
+        entries = response.context['entries']
+        self.assertEqual([entry['review'] for entry in entries], reviews[:2])
+        self.assertEqual(len(entries[0]['comments']['diff_comments']), 2)
+        self.assertIsNone(response.context['older_entries_url'])
+        self.assertContains(response, 'id="review%d"' % reviews[0].pk)
+        self.assertContains(response, 'id="review%d"' % reviews[1].pk)
+        self.assertNotContains(response, 'id="review%d"' % reviews[2].pk)
+        self.assertNotContains(response, 'name="last-review"')
+
+    def test_review_entries_with_last_visited(self):
+        """Testing review_entries view with last_visited from before the
+        review request page was loaded
+        """
+        review_request = self.create_review_request(create_repository=True,
+                                                    publish=True)
+        diffset = self.create_diffset(review_request)
+        filediff = self.create_filediff(diffset)
+        reviews = self._create_reviews_for_entries(review_request, filediff)
+        now = timezone.now()
+
+        # The reviews are older than the latest change, so they start
+        # collapsed unless they have a reply newer than the last visit.
+        changedesc = ChangeDescription.objects.create(
+            public=True,
+            timestamp=now + timedelta(hours=1))
+        review_request.changedescs.add(changedesc)
+
+        reply = self.create_reply(reviews[0], publish=True)
+        Review.objects.filter(pk=reply.pk).update(
+            timestamp=now + timedelta(minutes=30))
+
+        self.client.login(username='grumpy', password='grumpy')
+
+        # Loading the review request page would have already moved the
+        # stored visit past the reply.
+        ReviewRequestVisit.objects.create(
+            user=User.objects.get(username='grumpy'),
+            review_request=review_request,
+            timestamp=now + timedelta(hours=2))
+
+        old_value = settings.REVIEW_REQUEST_ENTRIES_PAGE_SIZE
+        settings.REVIEW_REQUEST_ENTRIES_PAGE_SIZE = 1
+
+        try:
+            response = self.client.get('/r/%d/entries/?end=1'
+                                       % review_request.pk)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.context['entries'][0]['collapsed'])
+
+            response = self.client.get(
+                '/r/%d/entries/?end=2&last_visited=%s'
+                % (review_request.pk, urlquote(now.isoformat())))
+        finally:
+            settings.REVIEW_REQUEST_ENTRIES_PAGE_SIZE = old_value
+
+        self.assertEqual(response.status_code, 200)
+
+        entries = response.context['entries']
+        self.assertEqual([entry['review'] for entry in entries],
+                         [reviews[1]])
+        self.assertTrue(entries[0]['collapsed'])
+        self.assertEqual(response.context['older_entries_url'],
+                         '/r/%d/entries/?end=1&last_visited=%s'
+                         % (review_request.pk, urlquote(now.isoformat())))
+
+        response = self.client.get(response.context['older_entries_url'])
+        self.assertEqual(response.status_code, 200)
+
+        entries = response.context['entries']
+        self.assertEqual([entry['review'] for entry in entries],
+                         [reviews[0]])
+        self.assertFalse(entries[0]['collapsed'])
+
+    def test_review_entries_with_invalid_end(self):
+        """Testing review_entries view with an invalid end"""
+        review_request = self.create_review_request(publish=True)
+
+        for end in ('', 'abc', '-1'):
+            response = self.client.get('/r/%d/entries/?end=%s'
+                                       % (review_request.pk, end))
+            self.assertEqual(response.status_code, 400)
+
+        response = self.client.get('/r/%d/entries/' % review_request.pk)
+        self.assertEqual(response.status_code, 400)
+
+    def _create_reviews_for_entries(self, review_request, filediff):
+        """Create reviews for testing entries on the review request page.
+
+        Each review has a diff comment opening an issue and another that
+        doesn't. The reviews are returned from oldest to newest.
+        """
+        reviews = []
+
+        for i in range(3):
+            review = self.create_review(review_request)
+            self.create_diff_comment(review, filediff, issue_opened=True)
+            self.create_diff_comment(review, filediff, first_line=10)
+            review.publish()
+            reviews.append(review)
+
+        for i, review in enumerate(reviews):
+            Review.objects.filter(pk=review.pk).update(
+                timestamp=review.timestamp + timedelta(minutes=i))
+
+        return reviews
+
     def test_review_detail_sitewide_login(self):
         """Testing review_detail view with site-wide login enabled"""
         self.siteconfig.set("auth_require_sitewide_login", True)
@@ -2221,6 +2481,162 @@ class ViewTests(TestCase):
         self.assertEqual(response['Content-Disposition'],
                          'attachment; filename=diffset')
 
+    def test_diff_raw_content(self):
+        """Testing /diff/raw/ streams the diffs of all files"""
+        review_request = self.create_review_request(create_repository=True,
+                                                    publish=True)
+        diffset = self.create_diffset(review_request=review_request)
+        filediff1 = self.create_filediff(diffset, source_file='/file1',
+                                         dest_file='/file1')
+        filediff2 = self.create_filediff(
+            diffset,
+            source_file='/file2',
+            dest_file='/file2',
+            diff=b'--- file2\n+++ file2\n@@ -1 +1 @@\n-a\n+b\n')
+
+        response = self.client.get('/r/%d/diff/raw/' % review_request.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content),
+                         filediff1.diff + filediff2.diff)
+
+    def test_diff_fragments(self):
+        """Testing /diff/<revision>/fragments/ renders each file"""
+        review_request = self.create_review_request(create_repository=True,
+                                                    publish=True)
+        diffset = self.create_diffset(review_request=review_request)
+        filediff1 = self.create_filediff(
+            diffset,
+            source_file='/file1',
+            dest_file='/file1',
+            source_revision=PRE_CREATION,
+            diff=b'--- file1\n+++ file1\n@@ -0,0 +1 @@\n+Hello, world!\n')
+        filediff2 = self.create_filediff(
+            diffset,
+            source_file='/file2',
+            dest_file='/file2',
+            source_revision=PRE_CREATION,
+            diff=b'--- file2\n+++ file2\n@@ -0,0 +1 @@\n+Goodbye!\n')
+
+        url = '/r/%d/diff/1/fragments/' % review_request.pk
+        response = self.client.get(url, {
+            'ids': '%s,%s' % (filediff2.pk, filediff1.pk),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+        files = json.loads(response.content)['files']
+        self.assertEqual(len(files), 2)
+        self.assertEqual(files[0]['filediff_id'], filediff2.pk)
+        self.assertIsNone(files[0]['interfilediff_id'])
+        self.assertEqual(files[0]['index'], 1)
+        self.assertIn('Goodbye!', files[0]['html'])
+        self.assertEqual(files[1]['filediff_id'], filediff1.pk)
+        self.assertEqual(files[1]['index'], 0)
+        self.assertIn('Hello, world!', files[1]['html'])
+
+        # Each file has the ETag it would have when fetched on its own.
+        single_response = self.client.get(
+            '/r/%d/diff/1/fragment/%s/' % (review_request.pk, filediff1.pk))
+        self.assertEqual(files[1]['etag'], single_response['ETag'])
+
+        response = self.client.get(
+            url,
+            {'ids': '%s,%s' % (filediff2.pk, filediff1.pk)},
+            HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_diff_fragments_with_separate_contexts(self):
+        """Testing /diff/<revision>/fragments/ renders each file with its own
+        context
+        """
+        review_request = self.create_review_request(create_repository=True,
+                                                    publish=True)
+        diffset = self.create_diffset(review_request=review_request)
+        filediff1 = self.create_filediff(
+            diffset,
+            source_file='/file1',
+            dest_file='/file1',
+            source_revision=PRE_CREATION,
+            diff=b'--- file1\n+++ file1\n@@ -0,0 +1 @@\n+Hello, world!\n')
+        filediff2 = self.create_filediff(
+            diffset,
+            source_file='/file2',
+            dest_file='/file2',
+            source_revision=PRE_CREATION,
+            diff=b'--- file2\n+++ file2\n@@ -0,0 +1 @@\n+Goodbye!\n')
+
+        self.spy_on(ReviewsDiffFragmentView.create_renderer,
+                    owner=ReviewsDiffFragmentView)
+
+        response = self.client.get(
+            '/r/%d/diff/1/fragments/' % review_request.pk,
+            {'ids': '%s,%s' % (filediff1.pk, filediff2.pk)})
+        self.assertEqual(response.status_code, 200)
+
+        calls = ReviewsDiffFragmentView.create_renderer.spy.calls
+        self.assertEqual(len(calls), 2)
+
+        context1 = calls[0].kwargs['context']
+        context2 = calls[1].kwargs['context']
+        self.assertIsNot(context1, context2)
+        self.assertEqual(context1['review_request'], review_request)
+        self.assertEqual(context2['review_request'], review_request)
+
+    def test_diff_fragments_with_interdiff(self):
+        """Testing /diff/<revision>-<revision>/fragments/ renders each file
+        in the interdiff
+        """
+        review_request = self.create_review_request(create_repository=True,
+                                                    publish=True)
+        diffset1 = self.create_diffset(review_request=review_request)
+        filediff1 = self.create_filediff(
+            diffset1,
+            source_file='/file1',
+            dest_file='/file1',
+            source_revision=PRE_CREATION,
+            diff=b'--- file1\n+++ file1\n@@ -0,0 +1 @@\n+Hello, world!\n')
+
+        diffset2 = self.create_diffset(review_request=review_request,
+                                       revision=2)
+        filediff2 = self.create_filediff(
+            diffset2,
+            source_file='/file1',
+            dest_file='/file1',
+            source_revision=PRE_CREATION,
+            diff=b'--- file1\n+++ file1\n@@ -0,0 +1 @@\n+Goodbye!\n')
+
+        response = self.client.get(
+            '/r/%d/diff/1-2/fragments/' % review_request.pk,
+            {'ids': '%s-%s' % (filediff1.pk, filediff2.pk)})
+        self.assertEqual(response.status_code, 200)
+
+        files = json.loads(response.content)['files']
+        self.assertEqual(len(files), 1)
+        self.assertEqual(files[0]['filediff_id'], filediff1.pk)
+        self.assertEqual(files[0]['interfilediff_id'], filediff2.pk)
+        self.assertIn('Goodbye!', files[0]['html'])
+
+    def test_diff_fragments_with_invalid_ids(self):
+        """Testing /diff/<revision>/fragments/ with invalid file IDs"""
+        review_request = self.create_review_request(create_repository=True,
+                                                    publish=True)
+        diffset = self.create_diffset(review_request=review_request)
+        filediff = self.create_filediff(diffset)
+
+        url = '/r/%d/diff/1/fragments/' % review_request.pk
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(url, {'ids': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(url, {
+            'ids': '%s,%s' % (filediff.pk, filediff.pk + 1),
+        })
+        self.assertEqual(response.status_code, 404)
+
     # Bug #3704
     def test_diff_raw_multiple_content_disposition(self):
         """Testing /diff/raw/ multiple Content-Disposition issue."""
@@ -2904,12 +3320,16 @@ class PostCommitTests(SpyAgency, TestCase):
 
             return commit
 
-        def get_file_exists(repository, path, revision, base_commit_id=None,
-                            request=None):
-            return (path, revision) in [('/readme', 'd6613f5')]
+        def get_files_exist(repository, paths_and_revisions,
+                            base_commit_id=None, request=None):
+            return [
+                path_and_revision in [('/readme', 'd6613f5')]
+                for path_and_revision in paths_and_revisions
+            ]
 
         self.spy_on(self.repository.get_change, call_fake=get_change)
-        self.spy_on(self.repository.get_file_exists, call_fake=get_file_exists)
+        self.spy_on(self.repository.get_files_exist,
+                    call_fake=get_files_exist)
 
         review_request = ReviewRequest.objects.create(self.user,
                                                       self.repository)
@@ -2940,12 +3360,16 @@ class PostCommitTests(SpyAgency, TestCase):
 
             return commit
 
-        def get_file_exists(repository, path, revision, base_commit_id=None,
-                            request=None):
-            return (path, revision) in [('/readme', 'd6613f5')]
+        def get_files_exist(repository, paths_and_revisions,
+                            base_commit_id=None, request=None):
+            return [
+                path_and_revision in [('/readme', 'd6613f5')]
+                for path_and_revision in paths_and_revisions
+            ]
 
         self.spy_on(self.repository.get_change, call_fake=get_change)
-        self.spy_on(self.repository.get_file_exists, call_fake=get_file_exists)
+        self.spy_on(self.repository.get_files_exist,
+                    call_fake=get_files_exist)
 
         review_request = ReviewRequest.objects.create(self.user,
                                                       self.repository)
@@ -2990,6 +3414,345 @@ class PostCommitTests(SpyAgency, TestCase):
                           lambda: review_request.update_from_commit_id('4'))
 
 
+class DiffFragmentETagMiddlewareTests(SpyAgency, TestCase):
+    """Unit tests for reviewboard.reviews.middleware."""
+    fixtures = ['test_users', 'test_scmtools']
+
+    def setUp(self):
+        super(DiffFragmentETagMiddlewareTests, self).setUp()
+
+        self.review_request = self.create_review_request(
+            create_repository=True,
+            publish=True)
+        diffset = self.create_diffset(review_request=self.review_request)
+        filediff = self.create_filediff(
+            diffset,
+            source_revision=PRE_CREATION,
+            diff=b'--- file1\n+++ file1\n@@ -0,0 +1 @@\n+Hello, world!\n')
+
+        self.url = '/r/%d/diff/1/fragment/%s/?index=0' % (
+            self.review_request.pk, filediff.pk)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.etag = response['ETag']
+
+        self.spy_on(DiffFragmentView.get, owner=DiffFragmentView)
+
+    def test_not_modified(self):
+        """Testing DiffFragmentETagMiddleware responds to a matching ETag
+        without queries
+        """
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url,
+                                       HTTP_IF_NONE_MATCH=self.etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertFalse(DiffFragmentView.get.spy.called)
+
+    def test_with_other_etag(self):
+        """Testing DiffFragmentETagMiddleware with a different ETag"""
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='foo')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(DiffFragmentView.get.spy.called)
+
+    def test_with_other_session(self):
+        """Testing DiffFragmentETagMiddleware with a different session"""
+        self.assertTrue(self.client.login(username='doc', password='doc'))
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertTrue(DiffFragmentView.get.spy.called)
+
+    def test_invalidated_on_review_save(self):
+        """Testing DiffFragmentETagMiddleware after saving a review"""
+        self.create_review(self.review_request)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(DiffFragmentView.get.spy.calls), 1)
+
+        # The view's response was stored again.
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(DiffFragmentView.get.spy.calls), 1)
+
+    def test_invalidated_on_settings_save(self):
+        """Testing DiffFragmentETagMiddleware after saving site settings"""
+        SiteConfiguration.objects.get_current().save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertTrue(DiffFragmentView.get.spy.called)
+
+    def test_invalidated_on_profile_settings_change(self):
+        """Testing DiffFragmentETagMiddleware after changing diff settings
+        in a profile
+        """
+        profile = Profile.objects.get_or_create(
+            user=User.objects.get(username='doc'))[0]
+        profile.syntax_highlighting = False
+        profile.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertTrue(DiffFragmentView.get.spy.called)
+
+    def test_not_invalidated_on_other_profile_change(self):
+        """Testing DiffFragmentETagMiddleware after changing profile fields
+        that don't affect fragments
+        """
+        profile = Profile.objects.get_or_create(
+            user=User.objects.get(username='doc'))[0]
+        profile.sort_dashboard_columns = 'summary'
+        profile.save()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url,
+                                       HTTP_IF_NONE_MATCH=self.etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(DiffFragmentView.get.spy.called)
+
+
+class EntryCacheTests(TestCase):
+    """Unit tests for reviewboard.reviews.entry_cache."""
+    fixtures = ['test_users']
+
+    def setUp(self):
+        super(EntryCacheTests, self).setUp()
+
+        # Populating the avatar services saves the site configuration, which
+        # would invalidate the cached entries during the first render.
+        avatar_services.populate()
+        cache.clear()
+
+        self.review_request = self.create_review_request(publish=True)
+        self.review = self.create_review(self.review_request)
+        self.comment = self.create_general_comment(self.review,
+                                                   issue_opened=True)
+        self.review.publish()
+
+        self.url = '/r/%d/' % self.review_request.pk
+
+    def test_review_detail_caches_entries(self):
+        """Testing review_detail caches the rendered entries"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, '<!-- entry-class -->')
+
+        entry = response.context['entries'][0]
+        self.assertNotIn('cached_html', entry)
+
+        html = cache.get(entry['cache_key'])[1]
+        self.assertIn('<!-- entry-class -->', html)
+
+        response2 = self.client.get(self.url)
+        self.assertEqual(response2.status_code, 200)
+        self.assertEqual(response2.context['entries'][0]['cached_html'],
+                         html)
+        self.assertEqual(response2.content, response.content)
+
+    def test_review_detail_with_collapsed_entry(self):
+        """Testing review_detail applies the collapsed state to cached
+        entries
+        """
+        draft = ReviewRequestDraft.create(self.review_request)
+        draft.summary = 'New summary'
+        draft.publish()
+
+        for i in range(2):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+
+            entries = response.context['entries']
+            self.assertEqual(len(entries), 2)
+            self.assertEqual(entries[0]['review'], self.review)
+            self.assertTrue(entries[0]['collapsed'])
+            self.assertEqual('cached_html' in entries[0], i == 1)
+
+            self.assertContains(response, '<div class="box collapsed">', 1)
+            self.assertContains(response, 'rb-icon-expand-review', 1)
+            self.assertContains(response, 'rb-icon-collapse-review', 1)
+
+    def test_review_detail_with_issue_status_change(self):
+        """Testing review_detail renders entries again after changing an
+        issue status
+        """
+        response = self.client.get(self.url)
+        cache_key = response.context['entries'][0]['cache_key']
+
+        self.comment.issue_status = GeneralComment.RESOLVED
+        self.comment.save()
+
+        response = self.client.get(self.url)
+        entry = response.context['entries'][0]
+        self.assertNotEqual(entry['cache_key'], cache_key)
+        self.assertNotIn('cached_html', entry)
+
+    def test_review_detail_with_draft_reply(self):
+        """Testing review_detail doesn't cache entries with draft replies"""
+        reply = self.create_reply(self.review, user='grumpy')
+        reply.body_top_reply_to = self.review
+        reply.save()
+
+        self.assertTrue(self.client.login(username='grumpy',
+                                          password='grumpy'))
+
+        response = self.client.get(self.url)
+        self.assertNotIn('cache_key', response.context['entries'][0])
+
+    def test_review_detail_after_settings_save(self):
+        """Testing review_detail renders entries again after saving site
+        settings
+        """
+        self.client.get(self.url)
+
+        SiteConfiguration.objects.get_current().save()
+
+        response = self.client.get(self.url)
+        self.assertNotIn('cached_html', response.context['entries'][0])
+
+    def test_review_detail_after_profile_privacy_change(self):
+        """Testing review_detail renders entries again after a user makes
+        their profile private
+        """
+        profile = Profile.objects.get_or_create(user=self.review.user)[0]
+        self.client.get(self.url)
+
+        profile.is_private = True
+        profile.save()
+
+        response = self.client.get(self.url)
+        self.assertNotIn('cached_html', response.context['entries'][0])
+
+    def test_review_detail_after_other_profile_change(self):
+        """Testing review_detail uses cached entries after changing profile
+        fields that don't affect entries
+        """
+        profile = Profile.objects.get_or_create(user=self.review.user)[0]
+        self.client.get(self.url)
+
+        profile.sort_dashboard_columns = 'summary'
+        profile.syntax_highlighting = False
+        profile.save()
+
+        response = self.client.get(self.url)
+        self.assertIn('cached_html', response.context['entries'][0])
+
+    def test_review_detail_after_user_name_change(self):
+        """Testing review_detail renders entries again after a user changes
+        their name
+        """
+        self.client.get(self.url)
+
+        user = self.review.user
+        user.first_name = 'New'
+        user.last_name = 'Name'
+        user.save()
+
+        response = self.client.get(self.url)
+        self.assertNotIn('cached_html', response.context['entries'][0])
+        self.assertContains(response, 'New Name')
+
+    def test_review_detail_after_other_user_change(self):
+        """Testing review_detail uses cached entries after changing user
+        fields that don't affect entries
+        """
+        self.client.get(self.url)
+
+        user = self.review.user
+        user.last_login = timezone.now()
+        user.save(update_fields=['last_login'])
+
+        user.is_staff = True
+        user.save()
+
+        response = self.client.get(self.url)
+        self.assertIn('cached_html', response.context['entries'][0])
+
+
+class CommentManagerTests(TestCase):
+    """Unit tests for reviewboard.reviews.managers.CommentManager."""
+    fixtures = ['test_users']
+
+    def setUp(self):
+        super(CommentManagerTests, self).setUp()
+
+        self.review_request = self.create_review_request(publish=True)
+        self.review = self.create_review(self.review_request)
+
+    def test_add_comment_stores_review_ids(self):
+        """Testing adding a comment to a review stores the review IDs"""
+        comment = self.create_general_comment(self.review)
+
+        comment = GeneralComment.objects.get(pk=comment.pk)
+        self.assertEqual(comment.review_id, self.review.pk)
+        self.assertEqual(comment.review_request_id, self.review_request.pk)
+
+    def test_remove_comment_clears_review_ids(self):
+        """Testing removing a comment from a review clears the review IDs"""
+        comment = self.create_general_comment(self.review)
+        self.review.general_comments.remove(comment)
+
+        comment = GeneralComment.objects.get(pk=comment.pk)
+        self.assertIsNone(comment.review_id)
+        self.assertIsNone(comment.review_request_id)
+
+    def test_save_comment_keeps_review_ids(self):
+        """Testing saving a comment loaded before it was added to a review
+        keeps the review IDs
+        """
+        comment = self.create_general_comment(self.review)
+        comment.text = 'New text'
+        comment.save()
+
+        comment = GeneralComment.objects.get(pk=comment.pk)
+        self.assertEqual(comment.review_id, self.review.pk)
+        self.assertEqual(comment.review_request_id, self.review_request.pk)
+
+    def test_backfill_review_ids(self):
+        """Testing CommentManager.backfill_review_ids"""
+        review2 = self.create_review(self.review_request, user='grumpy')
+
+        comments = [
+            self.create_general_comment(self.review),
+            self.create_general_comment(self.review),
+            self.create_general_comment(review2),
+        ]
+
+        GeneralComment.objects.update(review_id=None, review_request_id=None)
+
+        self.assertEqual(
+            GeneralComment.objects.backfill_review_ids(batch_size=2), 3)
+
+        self.assertEqual(
+            list(GeneralComment.objects.order_by('pk')
+                 .values_list('pk', 'review_id', 'review_request_id')),
+            [
+                (comments[0].pk, self.review.pk, self.review_request.pk),
+                (comments[1].pk, self.review.pk, self.review_request.pk),
+                (comments[2].pk, review2.pk, self.review_request.pk),
+            ])
+
+    def test_add_review_to_comment_stores_review_ids(self):
+        """Testing adding a review to a comment's reviews stores the review
+        IDs
+        """
+        comment = GeneralComment.objects.create(text='My comment')
+        comment.review.add(self.review)
+
+        self.assertEqual(comment.review_id, self.review.pk)
+        self.assertEqual(comment.review_request_id, self.review_request.pk)
+
+        comment = GeneralComment.objects.get(pk=comment.pk)
+        self.assertEqual(comment.review_id, self.review.pk)
+        self.assertEqual(comment.review_request_id, self.review_request.pk)
+
+
 class ConcurrencyTests(TestCase):
     fixtures = ['test_users', 'test_scmtools']
 
@@ -4060,6 +4823,158 @@ class IssueCounterTests(TestCase):
         self.assertEqual(self.review_request.issue_resolved_count, 0)
         self.assertEqual(self.review_request.issue_dropped_count, 0)
 
+    def test_save_comment_after_status_change(self):
+        """Testing ReviewRequest issue counter when saving a comment again
+        after changing its issue status
+        """
+        review = self.create_review(self.review_request)
+        comment = self.create_general_comment(review, issue_opened=True)
+        review.publish()
+
+        self._reload_object(clear_counters=True)
+        self.assertEqual(self.review_request.issue_open_count, 1)
+
+        comment.issue_status = Comment.RESOLVED
+        comment.save()
+        comment.save()
+
+        self._reload_object()
+        self.assertEqual(self.review_request.issue_open_count, 0)
+        self.assertEqual(self.review_request.issue_resolved_count, 1)
+        self.assertEqual(self.review_request.issue_dropped_count, 0)
+
+    def test_add_comment_to_published_review(self):
+        """Testing ReviewRequest issue counter when adding a comment to a
+        published review
+        """
+        review = self.create_review(self.review_request, publish=True)
+
+        self._reload_object(clear_counters=True)
+        self.assertEqual(self.review_request.issue_open_count, 0)
+
+        self.create_general_comment(review, issue_opened=True)
+        self.create_general_comment(review, issue_opened=False)
+
+        self._reload_object()
+        self.assertEqual(self.review_request.issue_open_count, 1)
+        self.assertEqual(self.review_request.issue_resolved_count, 0)
+        self.assertEqual(self.review_request.issue_dropped_count, 0)
+
+    def test_delete_comment(self):
+        """Testing ReviewRequest issue counter when deleting a comment"""
+        review = self.create_review(self.review_request)
+        comment = self.create_general_comment(review, issue_opened=True)
+        self.create_general_comment(review, issue_opened=True)
+        review.publish()
+
+        self._reload_object(clear_counters=True)
+        self.assertEqual(self.review_request.issue_open_count, 2)
+
+        comment.delete()
+
+        self._reload_object()
+        self.assertEqual(self.review_request.issue_open_count, 1)
+        self.assertEqual(self.review_request.issue_resolved_count, 0)
+        self.assertEqual(self.review_request.issue_dropped_count, 0)
+
+    def test_delete_review(self):
+        """Testing ReviewRequest issue counter when deleting a review"""
+        review1 = self.create_review(self.review_request)
+        self.create_general_comment(review1, issue_opened=True)
+        review1.publish()
+
+        review2 = self.create_review(self.review_request, user='grumpy')
+        self.create_general_comment(review2, issue_opened=True)
+        comment = self.create_general_comment(review2, issue_opened=True)
+        review2.publish()
+
+        comment.issue_status = Comment.DROPPED
+        comment.save()
+
+        self._reload_object(clear_counters=True)
+        self.assertEqual(self.review_request.issue_open_count, 2)
+        self.assertEqual(self.review_request.issue_dropped_count, 1)
+
+        review2.delete()
+
+        self._reload_object()
+        self.assertEqual(self.review_request.issue_open_count, 1)
+        self.assertEqual(self.review_request.issue_resolved_count, 0)
+        self.assertEqual(self.review_request.issue_dropped_count, 0)
+
+    def test_recalculate_issue_counts(self):
+        """Testing ReviewRequestManager.recalculate_issue_counts"""
+        review_request2 = self.create_review_request(publish=True)
+        review_request3 = self.create_review_request(publish=True)
+
+        review = self.create_review(self.review_request)
+        comment = self.create_general_comment(review, issue_opened=True)
+        self.create_general_comment(review, issue_opened=True)
+        self.create_general_comment(review, issue_opened=False)
+        review.publish()
+
+        comment.issue_status = Comment.RESOLVED
+        comment.save()
+
+        # Issues on replies and unpublished reviews aren't counted.
+        reply = self.create_reply(review)
+        self.create_general_comment(reply, issue_opened=True,
+                                    reply_to=comment)
+        reply.publish()
+
+        self.create_general_comment(
+            self.create_review(self.review_request, user='grumpy'),
+            issue_opened=True)
+
+        review = self.create_review(review_request2)
+        self.create_general_comment(review, issue_opened=True)
+        review.publish()
+
+        ReviewRequest.objects.update(issue_open_count=10,
+                                     issue_resolved_count=10,
+                                     issue_dropped_count=10)
+
+        self.assertEqual(ReviewRequest.objects.recalculate_issue_counts(), 3)
+
+        self.assertEqual(
+            list(ReviewRequest.objects.order_by('pk').values_list(
+                'pk', 'issue_open_count', 'issue_resolved_count',
+                'issue_dropped_count')),
+            [
+                (self.review_request.pk, 1, 1, 0),
+                (review_request2.pk, 1, 0, 0),
+                (review_request3.pk, 0, 0, 0),
+            ])
+
+    def test_recalculate_issue_counts_with_ids(self):
+        """Testing ReviewRequestManager.recalculate_issue_counts with
+        review request IDs
+        """
+        review_request2 = self.create_review_request(publish=True)
+
+        for review_request in (self.review_request, review_request2):
+            review = self.create_review(review_request)
+            self.create_general_comment(review, issue_opened=True)
+            review.publish()
+
+        ReviewRequest.objects.update(issue_open_count=10,
+                                     issue_resolved_count=10,
+                                     issue_dropped_count=10)
+
+        self.assertEqual(
+            ReviewRequest.objects.recalculate_issue_counts(
+                [self.review_request.pk]),
+            1)
+
+        self.assertEqual(
+            list(ReviewRequest.objects.order_by('pk').values_list(
+                'pk', 'issue_open_count', 'issue_resolved_count',
+                'issue_dropped_count')),
+            [
+                (self.review_request.pk, 1, 0, 0),
+                (review_request2.pk, 10, 10, 10),
+            ])
+
     def _test_issue_counts(self, create_comment_func):
         review = self.create_review(self.review_request)
 
@@ -4480,6 +5395,84 @@ class MarkdownUtilsTests(TestCase):
         self.assertTrue(isinstance(text, SafeText))
 
 
+class MarkdownRenderCacheTests(SpyAgency, TestCase):
+    """Unit tests for caching rendered Markdown."""
+
+    def setUp(self):
+        super(MarkdownRenderCacheTests, self).setUp()
+
+        cache.clear()
+        clear_markdown_render_cache()
+
+    def tearDown(self):
+        super(MarkdownRenderCacheTests, self).tearDown()
+
+        clear_markdown_render_cache()
+
+    def test_render_markdown_caches_in_memory(self):
+        """Testing render_markdown caches rendered HTML in memory"""
+        self.spy_on(markdown_utils.markdown)
+
+        self.assertEqual(render_markdown('**foo**'),
+                         '<p><strong>foo</strong></p>')
+
+        cache.clear()
+
+        self.assertEqual(render_markdown('**foo**'),
+                         '<p><strong>foo</strong></p>')
+        self.assertEqual(len(markdown_utils.markdown.spy.calls), 1)
+
+    def test_render_markdown_caches_in_shared_cache(self):
+        """Testing render_markdown caches rendered HTML in the main cache"""
+        self.spy_on(markdown_utils.markdown)
+
+        self.assertEqual(render_markdown(b'**foo**'),
+                         '<p><strong>foo</strong></p>')
+
+        clear_markdown_render_cache()
+
+        self.assertEqual(render_markdown('**foo**'),
+                         '<p><strong>foo</strong></p>')
+        self.assertEqual(len(markdown_utils.markdown.spy.calls), 1)
+
+    def test_render_markdown_with_different_kwargs(self):
+        """Testing render_markdown doesn't share cached HTML between
+        different Markdown options
+        """
+        self.spy_on(markdown_utils.markdown)
+
+        self.assertEqual(render_markdown('foo\nbar'),
+                         '<p>foo<br />\nbar</p>')
+        self.assertEqual(render_markdown('foo\nbar', {}),
+                         '<p>foo\nbar</p>')
+        self.assertEqual(len(markdown_utils.markdown.spy.calls), 2)
+
+    def test_render_markdown_evicts_least_recently_used(self):
+        """Testing render_markdown removes the least recently used HTML from
+        memory
+        """
+        old_value = settings.MARKDOWN_RENDER_CACHE_LOCAL_SIZE
+        settings.MARKDOWN_RENDER_CACHE_LOCAL_SIZE = 25
+
+        try:
+            self.spy_on(markdown_utils.markdown)
+
+            render_markdown('foo')
+            render_markdown('bar')
+            render_markdown('foo')
+            render_markdown('baz')
+
+            cache.clear()
+
+            render_markdown('foo')
+            self.assertEqual(len(markdown_utils.markdown.spy.calls), 3)
+
+            render_markdown('bar')
+            self.assertEqual(len(markdown_utils.markdown.spy.calls), 4)
+        finally:
+            settings.MARKDOWN_RENDER_CACHE_LOCAL_SIZE = old_value
+
+
 class MarkdownTemplateTagsTests(TestCase):
     """Unit tests for Markdown-related template tags."""
     def setUp(self):
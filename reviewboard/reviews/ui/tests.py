@@ -8,6 +8,7 @@ from reviewboard.reviews.templatetags.reviewtags import has_usable_review_ui
 from reviewboard.reviews.ui.base import (FileAttachmentReviewUI,
                                          register_ui,
                                          unregister_ui)
+from reviewboard.reviews.ui.text import TextBasedReviewUI
 from reviewboard.testing import TestCase
 
 
@@ -212,3 +213,72 @@ class SandboxTests(SpyAgency, TestCase):
         self.assertEqual(len(serial_comments), 0)
 
         self.assertTrue(review_ui.serialize_comment.called)
+
+
+class TextBasedReviewUITests(SpyAgency, TestCase):
+    """Unit tests for reviewboard.reviews.ui.text.TextBasedReviewUI."""
+    fixtures = ['test_users']
+
+    def setUp(self):
+        super(TextBasedReviewUITests, self).setUp()
+
+        lines = []
+
+        for i in range(400):
+            lines += [
+                'def func%d():' % i,
+                '    return %d' % i,
+                '',
+            ]
+
+        old = '\n'.join(lines).encode('utf-8')
+        new = old.replace(b'return 200', b'return -200')
+
+        review_request = self.create_review_request()
+        self.old_attachment = self.create_file_attachment(
+            review_request, orig_filename='a.py')
+        self.old_attachment.mimetype = 'text/x-python'
+
+        self.new_attachment = self.create_file_attachment(
+            review_request, orig_filename='a.py')
+        self.new_attachment.mimetype = 'text/x-python'
+
+        texts = {
+            self.old_attachment.pk: old,
+            self.new_attachment.pk: new,
+        }
+
+        self.spy_on(TextBasedReviewUI._get_text_uncached,
+                    owner=TextBasedReviewUI,
+                    call_fake=lambda review_ui: texts[review_ui.obj.pk])
+
+        self.review_ui = self.new_attachment.review_ui
+        self.review_ui.set_diff_against(self.old_attachment)
+
+    def test_get_extra_context_with_diff_highlights_all_lines(self):
+        """Testing TextBasedReviewUI.get_extra_context highlights all lines
+        in diffs of large files
+        """
+        context = self.review_ui.get_extra_context(
+            RequestFactory().get('/'))
+        chunks = context['source_chunks']
+
+        self.assertTrue(any(chunk['collapsable'] for chunk in chunks))
+
+        for chunk in chunks:
+            for line in chunk['lines']:
+                if line[2]:
+                    self.assertIn('<span', line[2])
+
+                if line[5]:
+                    self.assertIn('<span', line[5])
+
+    def test_render_comment_thumbnail_with_diff_highlights_lines(self):
+        """Testing TextBasedReviewUI.render_comment_thumbnail highlights lines
+        in diffs of large files
+        """
+        html = self.review_ui.render_comment_thumbnail(None, 4, 5, 'source')
+
+        self.assertIn('<span class="k">def</span> '
+                      '<span class="nf">func1</span>',
+                      html)
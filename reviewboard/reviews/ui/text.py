@@ -66,11 +66,10 @@ class TextBasedReviewUI(FileAttachmentReviewUI):
             if type(self) != type(diff_against_review_ui):
                 diff_type_mismatch = True
             else:
-                chunk_generator = self._get_source_diff_chunk_generator()
-                context['source_chunks'] = chunk_generator.get_chunks()
-
-                chunk_generator = self._get_rendered_diff_chunk_generator()
-                context['rendered_chunks'] = chunk_generator.get_chunks()
+                context['source_chunks'] = self._get_diff_chunks(
+                    self._get_source_diff_chunk_generator())
+                context['rendered_chunks'] = self._get_diff_chunks(
+                    self._get_rendered_diff_chunk_generator())
         else:
             file_line_list = [
                 mark_safe(line)
@@ -250,9 +249,13 @@ class TextBasedReviewUI(FileAttachmentReviewUI):
             elif view_mode == 'rendered':
                 chunk_generator = self._get_rendered_diff_chunk_generator()
 
-            chunks = get_chunks_in_range(chunk_generator.get_chunks(),
-                                         begin_line_num,
-                                         end_line_num - begin_line_num + 1)
+            chunks = list(get_chunks_in_range(
+                chunk_generator.get_chunks(),
+                begin_line_num,
+                end_line_num - begin_line_num + 1))
+
+            # Large files may not have had these lines syntax-highlighted.
+            chunk_generator.highlight_chunks(chunks)
 
             context.update({
                 'chunks': chunks,
@@ -321,6 +324,17 @@ class TextBasedReviewUI(FileAttachmentReviewUI):
             self.obj.filename,
             self.diff_against_obj.filename)
 
+    def _get_diff_chunks(self, chunk_generator):
+        """Return all the chunks from a chunk generator, ready to render.
+
+        All of the chunks are shown, so any lines that weren't
+        syntax-highlighted when generating the chunks are highlighted.
+        """
+        chunks = list(chunk_generator.get_chunks())
+        chunk_generator.highlight_chunks(chunks)
+
+        return chunks
+
     def _get_source_diff_chunk_generator(self):
         """Return a chunk generator for diffing source text."""
         return self._get_diff_chunk_generator(
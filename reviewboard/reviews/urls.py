@@ -2,7 +2,8 @@ from __future__ import unicode_literals
 
 from django.conf.urls import include, patterns, url
 
-from reviewboard.reviews.views import (ReviewsDiffFragmentView,
+from reviewboard.reviews.views import (ReviewsDiffFragmentBatchView,
+                                       ReviewsDiffFragmentView,
                                        ReviewsDiffViewerView)
 
 
@@ -28,6 +29,9 @@ diffviewer_revision_urls = patterns(
         r'(chunk/(?P<chunk_index>[0-9]+)/)?$',
         ReviewsDiffFragmentView.as_view()),
 
+    url(r'^fragments/$',
+        ReviewsDiffFragmentBatchView.as_view()),
+
     url(r'^download/(?P<filediff_id>[0-9]+)/', include(download_diff_urls)),
 )
 
@@ -41,6 +45,9 @@ diffviewer_interdiff_urls = patterns(
     url(r'^fragment/(?P<filediff_id>[0-9]+)(-(?P<interfilediff_id>[0-9]+))?/'
         r'(chunk/(?P<chunk_index>[0-9]+)/)?$',
         ReviewsDiffFragmentView.as_view()),
+
+    url(r'^fragments/$',
+        ReviewsDiffFragmentBatchView.as_view()),
 )
 
 diffviewer_urls = patterns(
@@ -70,6 +77,9 @@ review_request_urls = patterns(
     # Review request diffs
     url(r'^diff/', include(diffviewer_urls)),
 
+    # Older reviews and changes
+    url(r'^entries/$', 'review_entries', name='review-request-entries'),
+
     # Fragments
     url(r'^fragments/diff-comments/(?P<comment_ids>[0-9,]+)/$',
         'comment_diff_fragments'),
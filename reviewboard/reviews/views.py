@@ -11,17 +11,20 @@ from django.core.exceptions import MultipleObjectsReturned, ObjectDoesNotExist
 from django.db.models import Q
 from django.http import (Http404,
                          HttpResponse,
+                         HttpResponseBadRequest,
                          HttpResponseNotFound,
                          HttpResponseNotModified,
-                         HttpResponseRedirect)
+                         HttpResponseRedirect,
+                         StreamingHttpResponse)
 from django.shortcuts import (get_object_or_404, get_list_or_404,
                               render_to_response)
 from django.template.context import RequestContext
 from django.template.loader import render_to_string
 from django.utils import six, timezone
+from django.utils.dateparse import parse_datetime
 from django.utils.decorators import method_decorator
 from django.utils.html import escape
-from django.utils.http import http_date
+from django.utils.http import http_date, urlquote
 from django.utils.safestring import mark_safe
 from django.utils.timezone import utc
 from django.utils.translation import ugettext_lazy as _
@@ -43,7 +46,8 @@ from reviewboard.diffviewer.diffutils import (convert_to_unicode,
                                               get_original_file,
                                               get_patched_file)
 from reviewboard.diffviewer.models import DiffSet
-from reviewboard.diffviewer.views import (DiffFragmentView, DiffViewerView,
+from reviewboard.diffviewer.views import (DiffFragmentBatchView,
+                                          DiffFragmentView, DiffViewerView,
                                           exception_traceback_string)
 from reviewboard.hostingsvcs.bugtracker import BugTracker
 from reviewboard.reviews.ui.screenshot import LegacyScreenshotReviewUI
@@ -52,6 +56,7 @@ from reviewboard.reviews.context import (comment_counts,
                                          has_comments_in_diffsets_excluding,
                                          interdiffs_with_comments,
                                          make_review_request_context)
+from reviewboard.reviews.entry_cache import load_cached_entries
 from reviewboard.reviews.fields import get_review_request_fieldsets
 from reviewboard.reviews.markdown_utils import is_rich_text_default_for_user
 from reviewboard.reviews.models import (BaseComment, Comment,
@@ -323,52 +328,52 @@ def _get_latest_file_attachments(file_attachments):
     ]
 
 
-@check_login_required
-@check_local_site_access
-def review_detail(request,
-                  review_request_id,
-                  local_site=None,
-                  template_name="reviews/review_detail.html"):
-    """
-    Main view for review requests. This covers the review request information
-    and all the reviews on it.
-    """
-    # If there's a local_site passed in the URL, we want to look up the review
-    # request based on the local_id instead of the pk. This allows each
-    # local_site configured to have its own review request ID namespace
-    # starting from 1.
-    review_request, response = _find_review_request(
-        request, review_request_id, local_site)
+def _get_review_request_reviews(request, review_request):
+    """Return the reviews on a review request that can be shown to a user.
 
-    if not review_request:
-        return response
+    This loads every review on the review request, including drafts, and
+    sorts out the public reviews, replies and the user's own drafts. Each
+    review is linked up with the replies to its body fields.
 
-    # The review request detail page needs a lot of data from the database,
-    # and going through standard model relations will result in far too many
-    # queries. So we'll be optimizing quite a bit by prefetching and
-    # re-associating data.
-    #
-    # We will start by getting the list of reviews. We'll filter this out into
-    # some other lists, build some ID maps, and later do further processing.
-    entries = []
+    Args:
+        request (django.http.HttpRequest):
+            The HTTP request from the client.
+
+        review_request (reviewboard.reviews.models.ReviewRequest):
+            The review request.
+
+    Returns:
+        dict:
+        A dictionary with the following keys:
+
+        ``public_reviews``:
+            The list of public reviews, including replies.
+
+        ``reviews_id_map``:
+            A mapping of IDs to the reviews that can be shown to the user.
+            This includes the user's own drafts.
+
+        ``reply_timestamps``:
+            A mapping of review IDs to the timestamp of their latest reply.
+
+        ``review_timestamp``:
+            The timestamp of the user's latest draft, or 0 if there isn't
+            one.
+    """
     public_reviews = []
     body_top_replies = {}
     body_bottom_replies = {}
     replies = {}
     reply_timestamps = {}
-    reviews_entry_map = {}
     reviews_id_map = {}
     review_timestamp = 0
-    visited = None
 
     # Start by going through all reviews that point to this review request.
     # This includes draft reviews. We'll be separating these into a list of
     # public reviews and a mapping of replies.
     #
     # We'll also compute the latest review timestamp early, for the ETag
-    # generation below.
-    #
-    # The second pass will come after the ETag calculation.
+    # generation.
     all_reviews = list(review_request.reviews.select_related('user'))
 
     for review in all_reviews:
@@ -418,82 +423,97 @@ def review_detail(request,
                     else:
                         reply_list[reply_id].append(review)
 
-    pending_review = review_request.get_pending_review(request.user)
-    review_ids = list(reviews_id_map.keys())
-    last_visited = 0
-    starred = False
+    # Link up all the review body replies.
+    for key, reply_list in (('_body_top_replies', body_top_replies),
+                            ('_body_bottom_replies', body_bottom_replies)):
+        for reply_id, replies in six.iteritems(reply_list):
+            setattr(reviews_id_map[reply_id], key, replies)
 
-    if request.user.is_authenticated():
-        try:
-            visited, visited_is_new = \
-                ReviewRequestVisit.objects.get_or_create(
-                    user=request.user, review_request=review_request)
-            last_visited = visited.timestamp.replace(tzinfo=utc)
-        except ReviewRequestVisit.DoesNotExist:
-            # Somehow, this visit was seen as created but then not
-            # accessible. We need to log this and then continue on.
-            logging.error('Unable to get or create ReviewRequestVisit '
-                          'for user "%s" on review request at %s',
-                          request.user.username,
-                          review_request.get_absolute_url())
+    return {
+        'public_reviews': public_reviews,
+        'reviews_id_map': reviews_id_map,
+        'reply_timestamps': reply_timestamps,
+        'review_timestamp': review_timestamp,
+    }
 
-        # If the review request is public and pending review and if the user
-        # is logged in, mark that they've visited this review request.
-        if (review_request.public and
-            review_request.status == review_request.PENDING_REVIEW):
-            visited.timestamp = timezone.now()
-            visited.save()
 
-        try:
-            profile = request.user.get_profile()
-            starred_review_requests = \
-                profile.starred_review_requests.filter(pk=review_request.pk)
-            starred = (starred_review_requests.count() > 0)
-        except Profile.DoesNotExist:
-            pass
+def _get_review_entries(request, review_request, draft, reviews_info,
+                        changedescs, diffsets, last_visited, end=None):
+    """Return the entries for the reviews and changes on a review request.
 
-    draft = review_request.get_draft(request.user)
-    review_request_details = draft or review_request
+    Entries are sorted from oldest to newest. Only a window of them, the
+    newest ones up to ``settings.REVIEW_REQUEST_ENTRIES_PAGE_SIZE``, are
+    returned for rendering. Older entries can be rendered in batches with
+    :py:func:`review_entries`.
 
-    # Map diffset IDs to their object.
-    diffsets = review_request.get_diffsets()
-    diffsets_by_id = {}
+    All comments are loaded for the reviews in the window and their replies.
+    For older reviews, only the comments needed elsewhere on the page are
+    loaded. These are comments that open issues, for the issue summary
+    table, and comments on file attachments and screenshots, for their
+    thumbnails.
 
-    for diffset in diffsets:
-        diffsets_by_id[diffset.pk] = diffset
+    Entries in the window that are found in the cache of rendered entries
+    (see :py:mod:`reviewboard.reviews.entry_cache`) aren't filled in with
+    anything else needed for rendering.
 
-    # Find out if we can bail early. Generate an ETag for this.
-    last_activity_time, updated_object = \
-        review_request.get_last_activity(diffsets, public_reviews)
+    Args:
+        request (django.http.HttpRequest):
+            The HTTP request from the client.
 
-    if draft:
-        draft_timestamp = draft.last_updated
-    else:
-        draft_timestamp = ""
+        review_request (reviewboard.reviews.models.ReviewRequest):
+            The review request.
 
-    if visited:
-        visibility = visited.visibility
-    else:
-        visibility = None
+        draft (reviewboard.reviews.models.ReviewRequestDraft):
+            The user's draft of the review request, if any.
 
-    blocks = review_request.get_blocks()
+        reviews_info (dict):
+            The reviews on the review request, as returned by
+            :py:func:`_get_review_request_reviews`.
 
-    etag = encode_etag(
-       '%s:%s:%s:%s:%s:%s:%s:%s:%s:%s' %
-       (request.user, last_activity_time, draft_timestamp,
-        review_timestamp, review_request.last_review_activity_timestamp,
-        is_rich_text_default_for_user(request.user),
-        [r.pk for r in blocks],
-        starred, visibility, settings.AJAX_SERIAL))
+        changedescs (list of reviewboard.changedescs.models.ChangeDescription):
+            The public change descriptions, from newest to oldest.
 
-    if etag_if_none_match(request, etag):
-        return HttpResponseNotModified()
+        diffsets (list of reviewboard.diffviewer.models.DiffSet):
+            The diffsets on the review request.
 
-    # Get the list of public ChangeDescriptions.
-    #
-    # We want to get the latest ChangeDescription along with this. This is
-    # best done here and not in a separate SQL query.
-    changedescs = list(review_request.changedescs.filter(public=True))
+        last_visited (datetime.datetime):
+            When the user last visited the review request, or 0.
+
+        end (int, optional):
+            The index after the last entry in the window. Defaults to the
+            number of entries.
+
+    Returns:
+        dict:
+        A dictionary with the following keys:
+
+        ``entries``:
+            The list of entries in the window.
+
+        ``start``:
+            The index of the first entry in the window.
+
+        ``review_entries``:
+            The list of all entries for reviews, for the issue summary
+            table.
+
+        ``issues``:
+            The number of issues in each state.
+
+        ``file_attachments``:
+            The list of active file attachments.
+
+        ``screenshots``:
+            The list of active screenshots.
+    """
+    review_request_details = draft or review_request
+    public_reviews = reviews_info['public_reviews']
+    reviews_id_map = reviews_info['reviews_id_map']
+    reply_timestamps = reviews_info['reply_timestamps']
+    review_ids = list(reviews_id_map.keys())
+    entries = []
+    review_entries = []
+    reviews_entry_map = {}
 
     if changedescs:
         # We sort from newest to oldest, so the latest one is the first.
@@ -501,11 +521,9 @@ def review_detail(request,
     else:
         latest_timestamp = None
 
-    # Now that we have the list of public reviews and all that metadata,
-    # being processing them and adding entries for display in the page.
-    #
-    # We do this here and not above because we don't want to build *too* much
-    # before the ETag check.
+    # Add entries for all the public reviews and ChangeDescriptions. These
+    # are cheap to build. Only the ones in the window will be filled in
+    # with the rest of the data needed to render them.
     for review in public_reviews:
         if not review.is_reply():
             state = ''
@@ -536,13 +554,55 @@ def review_detail(request,
                 'has_issues': False,
             }
             reviews_entry_map[review.pk] = entry
+            review_entries.append(entry)
             entries.append(entry)
 
-    # Link up all the review body replies.
-    for key, reply_list in (('_body_top_replies', body_top_replies),
-                            ('_body_bottom_replies', body_bottom_replies)):
-        for reply_id, replies in six.iteritems(reply_list):
-            setattr(reviews_id_map[reply_id], key, replies)
+    for changedesc in changedescs:
+        # Mark as collapsed if the change is older than a newer change
+        if latest_timestamp and changedesc.timestamp < latest_timestamp:
+            state = 'collapsed'
+            collapsed = True
+        else:
+            state = ''
+            collapsed = False
+
+        entries.append({
+            'changedesc': changedesc,
+            'timestamp': changedesc.timestamp,
+            'class': state,
+            'collapsed': collapsed,
+        })
+
+    entries.sort(key=lambda item: item['timestamp'])
+
+    if end is None or end > len(entries):
+        end = len(entries)
+
+    page_size = settings.REVIEW_REQUEST_ENTRIES_PAGE_SIZE
+
+    if page_size:
+        start = max(0, end - page_size)
+    else:
+        start = 0
+
+    entries = entries[start:end]
+
+    # Sort out the reviews in the window, along with their replies, from the
+    # rest.
+    window_review_ids = set(
+        entry['review'].pk
+        for entry in entries
+        if 'review' in entry
+    )
+    shown_review_ids = []
+    hidden_review_ids = []
+
+    for review in six.itervalues(reviews_id_map):
+        if (review.pk in window_review_ids or
+            review.base_reply_to_id in window_review_ids):
+            shown_review_ids.append(review.pk)
+        else:
+            hidden_review_ids.append(review.pk)
 
     # Get all the file attachments and screenshots and build a couple maps,
     # so we can easily associate those objects in comments.
@@ -584,47 +644,43 @@ def review_detail(request,
         'dropped': 0
     }
 
-    # Get all the comments and attach them to the reviews.
+    # Get all the comments and attach them to the reviews. Comments store
+    # the IDs of their reviews, so these can be fetched directly.
     for model, key, ordering in (
-        (Comment, 'diff_comments',
-         ('comment__filediff', 'comment__first_line', 'comment__timestamp')),
+        (Comment, 'diff_comments', ('filediff', 'first_line', 'timestamp')),
         (ScreenshotComment, 'screenshot_comments', None),
         (FileAttachmentComment, 'file_attachment_comments', None),
         (GeneralComment, 'general_comments', None)):
-        # Due to how we initially made the schema, we have a ManyToManyField
-        # inbetween comments and reviews, instead of comments having a
-        # ForeignKey to the review. This makes it difficult to easily go
-        # from a comment to a review ID.
-        #
-        # The solution to this is to not query the comment objects, but rather
-        # the through table. This will let us grab the review and comment in
-        # one go, using select_related.
-        related_field = model.review.related.field
-        comment_field_name = related_field.m2m_reverse_field_name()
-        through = related_field.rel.through
-        q = through.objects.filter(review__in=review_ids).select_related()
+        q = model.objects.filter(review_id__in=review_ids)
+
+        if model not in (ScreenshotComment, FileAttachmentComment):
+            # Screenshot and file attachment comments are shown with the
+            # thumbnails for the file attachments and screenshots, so they're
+            # needed for every review. Other comments are only needed for
+            # the reviews being shown, and for the issue summary table.
+            q = q.filter(Q(review_id__in=shown_review_ids) |
+                         Q(issue_opened=True))
+
+        q = q.select_related()
 
         if ordering:
             q = q.order_by(*ordering)
 
-        objs = list(q)
+        comments = list(q)
 
         # Two passes. One to build a mapping, and one to actually process
         # comments.
         comment_map = {}
 
-        for obj in objs:
-            comment = getattr(obj, comment_field_name)
+        for comment in comments:
             comment_map[comment.pk] = comment
             comment._replies = []
 
-        for obj in objs:
-            comment = getattr(obj, comment_field_name)
-
+        for comment in comments:
             # Short-circuit some object fetches for the comment by setting
             # some internal state on them.
-            assert obj.review_id in reviews_id_map
-            parent_review = reviews_id_map[obj.review_id]
+            assert comment.review_id in reviews_id_map
+            parent_review = reviews_id_map[comment.review_id]
             comment._review = parent_review
             comment._review_request = review_request
 
@@ -652,7 +708,7 @@ def review_detail(request,
 
             if parent_review.is_reply():
                 # This is a reply to a comment. Add it to the list of replies.
-                assert obj.review_id not in reviews_entry_map
+                assert comment.review_id not in reviews_entry_map
                 assert parent_review.base_reply_to_id in reviews_entry_map
 
                 # If there's an entry that isn't a reply, then it's
@@ -666,8 +722,8 @@ def review_detail(request,
             elif parent_review.public:
                 # This is a comment on a public review we're going to show.
                 # Add it to the list.
-                assert obj.review_id in reviews_entry_map
-                entry = reviews_entry_map[obj.review_id]
+                assert comment.review_id in reviews_entry_map
+                entry = reviews_entry_map[comment.review_id]
                 entry['comments'][key].append(comment)
 
                 if comment.issue_opened:
@@ -688,9 +744,24 @@ def review_detail(request,
                 entry['class'] = ''
                 entry['collapsed'] = False
 
-    # Sort all the reviews and ChangeDescriptions into a single list, for
-    # display.
-    for changedesc in changedescs:
+    # Look up the rendered entries in the window. The rest only needs to be
+    # filled in for the ones that weren't found.
+    load_cached_entries(request, review_request, draft, entries)
+
+    # Fill in the changed fields for the ChangeDescriptions in the window.
+    diffsets_by_id = _build_id_map(diffsets)
+    locals_vars = {
+        'diffsets_by_id': diffsets_by_id,
+        'file_attachment_id_map': file_attachment_id_map,
+        'screenshot_id_map': screenshot_id_map,
+    }
+
+    for entry in entries:
+        changedesc = entry.get('changedesc')
+
+        if changedesc is None or 'cached_html' in entry:
+            continue
+
         # Process the list of fields, in order by fieldset. These will be
         # put into groups composed of inline vs. full-width field values,
         # for render into the box.
@@ -721,7 +792,7 @@ def review_detail(request,
 
                 if hasattr(field_cls, 'locals_vars'):
                     field = field_cls(review_request, request=request,
-                                      locals_vars=locals())
+                                      locals_vars=locals_vars)
                 else:
                     field = field_cls(review_request, request=request)
 
@@ -738,28 +809,177 @@ def review_detail(request,
         else:
             new_status = None
 
-        # Mark as collapsed if the change is older than a newer change
-        if latest_timestamp and changedesc.timestamp < latest_timestamp:
-            state = 'collapsed'
-            collapsed = True
-        else:
-            state = ''
-            collapsed = False
-
-        entries.append({
+        entry.update({
             'new_status': new_status,
             'fields_changed_groups': fields_changed_groups,
-            'changedesc': changedesc,
-            'timestamp': changedesc.timestamp,
-            'class': state,
-            'collapsed': collapsed,
         })
 
-    entries.sort(key=lambda item: item['timestamp'])
+    return {
+        'entries': entries,
+        'start': start,
+        'review_entries': review_entries,
+        'issues': issues,
+        'file_attachments': file_attachments,
+        'screenshots': screenshots,
+    }
+
+
+def _get_older_entries_url(review_request, local_site, end,
+                           last_visited=None):
+    """Return the URL for rendering a batch of older entries.
+
+    The review request page updates the user's visit timestamp when it's
+    rendered, so the time of the previous visit is passed along in the URL.
+    This lets the older batches show which entries are new to the user.
+
+    Args:
+        review_request (reviewboard.reviews.models.ReviewRequest):
+            The review request.
+
+        local_site (reviewboard.site.models.LocalSite):
+            The Local Site the review request is on, if any.
+
+        end (int):
+            The index after the last entry in the batch.
+
+        last_visited (datetime.datetime, optional):
+            The time the user last visited the review request, before the
+            current page load.
+
+    Returns:
+        unicode:
+        The URL, or ``None`` if there are no older entries.
+    """
+    if end <= 0:
+        return None
+
+    url = '%s?end=%d' % (
+        local_site_reverse('review-request-entries',
+                           local_site=local_site,
+                           args=[review_request.display_id]),
+        end)
+
+    if last_visited:
+        url += '&last_visited=%s' % urlquote(last_visited.isoformat())
+
+    return url
+
+
+@check_login_required
+@check_local_site_access
+def review_detail(request,
+                  review_request_id,
+                  local_site=None,
+                  template_name="reviews/review_detail.html"):
+    """
+    Main view for review requests. This covers the review request information
+    and all the reviews on it.
+    """
+    # If there's a local_site passed in the URL, we want to look up the review
+    # request based on the local_id instead of the pk. This allows each
+    # local_site configured to have its own review request ID namespace
+    # starting from 1.
+    review_request, response = _find_review_request(
+        request, review_request_id, local_site)
+
+    if not review_request:
+        return response
+
+    # The review request detail page needs a lot of data from the database,
+    # and going through standard model relations will result in far too many
+    # queries. So we'll be optimizing quite a bit by prefetching and
+    # re-associating data.
+    #
+    # We will start by getting the list of reviews. The rest of the
+    # processing comes after the ETag calculation.
+    reviews_info = _get_review_request_reviews(request, review_request)
+    visited = None
+    pending_review = review_request.get_pending_review(request.user)
+    last_visited = 0
+    starred = False
+
+    if request.user.is_authenticated():
+        try:
+            visited, visited_is_new = \
+                ReviewRequestVisit.objects.get_or_create(
+                    user=request.user, review_request=review_request)
+            last_visited = visited.timestamp.replace(tzinfo=utc)
+        except ReviewRequestVisit.DoesNotExist:
+            # Somehow, this visit was seen as created but then not
+            # accessible. We need to log this and then continue on.
+            logging.error('Unable to get or create ReviewRequestVisit '
+                          'for user "%s" on review request at %s',
+                          request.user.username,
+                          review_request.get_absolute_url())
+
+        # If the review request is public and pending review and if the user
+        # is logged in, mark that they've visited this review request.
+        if (review_request.public and
+            review_request.status == review_request.PENDING_REVIEW):
+            visited.timestamp = timezone.now()
+            visited.save()
+
+        try:
+            profile = request.user.get_profile()
+            starred_review_requests = \
+                profile.starred_review_requests.filter(pk=review_request.pk)
+            starred = (starred_review_requests.count() > 0)
+        except Profile.DoesNotExist:
+            pass
+
+    draft = review_request.get_draft(request.user)
+    review_request_details = draft or review_request
+    diffsets = review_request.get_diffsets()
+
+    # Find out if we can bail early. Generate an ETag for this.
+    last_activity_time, updated_object = \
+        review_request.get_last_activity(diffsets,
+                                         reviews_info['public_reviews'])
+
+    if draft:
+        draft_timestamp = draft.last_updated
+    else:
+        draft_timestamp = ""
+
+    if visited:
+        visibility = visited.visibility
+    else:
+        visibility = None
+
+    blocks = review_request.get_blocks()
+
+    etag = encode_etag(
+       '%s:%s:%s:%s:%s:%s:%s:%s:%s:%s' %
+       (request.user, last_activity_time, draft_timestamp,
+        reviews_info['review_timestamp'],
+        review_request.last_review_activity_timestamp,
+        is_rich_text_default_for_user(request.user),
+        [r.pk for r in blocks],
+        starred, visibility, settings.AJAX_SERIAL))
+
+    if etag_if_none_match(request, etag):
+        return HttpResponseNotModified()
+
+    # Get the list of public ChangeDescriptions.
+    #
+    # We want to get the latest ChangeDescription along with this. This is
+    # best done here and not in a separate SQL query.
+    changedescs = list(review_request.changedescs.filter(public=True))
+
+    # Now that we have the list of public reviews and all that metadata,
+    # being processing them and building the newest entries for display in
+    # the page.
+    #
+    # We do this here and not above because we don't want to build *too* much
+    # before the ETag check.
+    entries_info = _get_review_entries(
+        request, review_request, draft, reviews_info, changedescs, diffsets,
+        last_visited)
 
     close_description, close_description_rich_text = \
         review_request.get_close_description()
 
+    file_attachments = entries_info['file_attachments']
     latest_file_attachments = _get_latest_file_attachments(file_attachments)
 
     siteconfig = SiteConfiguration.objects.get_current()
@@ -770,17 +990,22 @@ def review_detail(request,
         'review_request_details': review_request_details,
         'review_request_visit': visited,
         'send_email': siteconfig.get('mail_send_review_mail'),
-        'entries': entries,
+        'entries': entries_info['entries'],
+        'review_entries': entries_info['review_entries'],
+        'older_entries_count': entries_info['start'],
+        'older_entries_url': _get_older_entries_url(
+            review_request, local_site, entries_info['start'],
+            last_visited),
         'last_activity_time': last_activity_time,
         'review': pending_review,
         'request': request,
         'close_description': close_description,
         'close_description_rich_text': close_description_rich_text,
-        'issues': issues,
+        'issues': entries_info['issues'],
         'has_diffs': (draft and draft.diffset_id) or len(diffsets) > 0,
         'file_attachments': latest_file_attachments,
         'all_file_attachments': file_attachments,
-        'screenshots': screenshots,
+        'screenshots': entries_info['screenshots'],
     })
 
     response = render_to_response(template_name,
@@ -790,6 +1015,98 @@ def review_detail(request,
     return response
 
 
+@check_login_required
+@check_local_site_access
+def review_entries(request,
+                   review_request_id,
+                   local_site=None,
+                   template_name='reviews/review_entries.html'):
+    """Render a batch of older entries for a review request.
+
+    The review request page only renders the newest entries. This renders
+    the batch of entries before them, up to the index in the ``end`` query
+    argument, along with a link to load the batch before that.
+
+    The optional ``last_visited`` query argument holds the time of the
+    user's previous visit, as recorded before the review request page
+    updated it. Without it, the stored visit time is used.
+
+    Args:
+        request (django.http.HttpRequest):
+            The HTTP request from the client.
+
+        review_request_id (int):
+            The ID of the review request.
+
+        local_site (reviewboard.site.models.LocalSite, optional):
+            The Local Site the review request is on, if any.
+
+        template_name (unicode, optional):
+            The template to render the entries with.
+
+    Returns:
+        django.http.HttpResponse:
+        The rendered entries.
+    """
+    review_request, response = _find_review_request(
+        request, review_request_id, local_site)
+
+    if not review_request:
+        return response
+
+    try:
+        end = int(request.GET['end'])
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest()
+
+    if end < 0:
+        return HttpResponseBadRequest()
+
+    reviews_info = _get_review_request_reviews(request, review_request)
+    last_visited = 0
+
+    if request.user.is_authenticated():
+        try:
+            last_visited = parse_datetime(request.GET['last_visited'])
+        except (KeyError, ValueError):
+            last_visited = None
+
+        if last_visited and timezone.is_naive(last_visited):
+            last_visited = last_visited.replace(tzinfo=utc)
+
+        if not last_visited:
+            try:
+                visited = ReviewRequestVisit.objects.get(
+                    user=request.user, review_request=review_request)
+                last_visited = visited.timestamp.replace(tzinfo=utc)
+            except ReviewRequestVisit.DoesNotExist:
+                last_visited = 0
+
+    draft = review_request.get_draft(request.user)
+    review_request_details = draft or review_request
+    changedescs = list(review_request.changedescs.filter(public=True))
+
+    entries_info = _get_review_entries(
+        request, review_request, draft, reviews_info, changedescs,
+        review_request.get_diffsets(), last_visited, end=end)
+
+    context_data = make_review_request_context(request, review_request, {
+        'draft': draft,
+        'review_request_details': review_request_details,
+        'entries': entries_info['entries'],
+        'older_entries_batch': True,
+        'older_entries_count': entries_info['start'],
+        'older_entries_url': _get_older_entries_url(
+            review_request, local_site, entries_info['start'],
+            last_visited),
+        'review': review_request.get_pending_review(request.user),
+        'request': request,
+    })
+
+    return render_to_response(template_name,
+                              RequestContext(request, context_data))
+
+
 class ReviewsDiffViewerView(DiffViewerView):
     """Renders the diff viewer for a review request.
 
@@ -888,16 +1205,21 @@ class ReviewsDiffViewerView(DiffViewerView):
             _get_latest_file_attachments(file_attachments)
 
         # Compute the lists of comments based on filediffs and interfilediffs.
-        # We do this using the 'through' table so that we can select_related
-        # the reviews and comments.
+        # Comments store the IDs of their reviews, so the comments and their
+        # reviews can each be fetched in one query.
         comments = {}
-        q = Comment.review.related.field.rel.through.objects.filter(
-            review__review_request=self.review_request)
-        q = q.select_related()
-
-        for obj in q:
-            comment = obj.comment
-            comment._review = obj.review
+        diff_comments = list(
+            Comment.objects
+            .filter(review_request_id=self.review_request.pk)
+            .select_related())
+        reviews_id_map = dict(
+            (review.pk, review)
+            for review in Review.objects.filter(
+                pk__in=set(comment.review_id for comment in diff_comments))
+            .select_related())
+
+        for comment in diff_comments:
+            comment._review = reviews_id_map[comment.review_id]
             key = (comment.filediff_id, comment.interfilediff_id)
             comments.setdefault(key, []).append(comment)
 
@@ -1016,9 +1338,9 @@ def raw_diff(request, review_request_id, revision=None, local_site=None):
     diffset = _query_for_diff(review_request, request.user, revision, draft)
 
     tool = review_request.repository.get_scmtool()
-    data = tool.get_parser('').raw_diff(diffset)
+    data = tool.get_parser('').iter_raw_diff(diffset)
 
-    resp = HttpResponse(data, content_type='text/x-patch')
+    resp = StreamingHttpResponse(data, content_type='text/x-patch')
 
     if diffset.name == 'diff':
         filename = "rb%d.patch" % review_request.display_id
@@ -1282,6 +1604,45 @@ class ReviewsDiffFragmentView(DiffFragmentView):
             'review_request': self.review_request,
         }
 
+    @classmethod
+    def create_precompute_renderer(cls, review_request, diff_file,
+                                   highlighting):
+        """Create the renderer for precomputing a file's fragment.
+
+        This creates the renderer that the view would use for a file when
+        first showing it in the diff viewer, but outside of any request, so
+        that the fragment can be rendered and cached ahead of time.
+
+        Args:
+            review_request (reviewboard.reviews.models.ReviewRequest):
+                The review request owning the diff.
+
+            diff_file (dict):
+                The file to render, as returned by
+                :py:func:`~reviewboard.diffviewer.diffutils.get_diff_files`.
+
+            highlighting (bool):
+                Whether to syntax-highlight the file.
+
+        Returns:
+            reviewboard.diffviewer.renderers.DiffRenderer:
+            The renderer for the file.
+        """
+        view = cls()
+        view.request = None
+        view.review_request = review_request
+
+        return view.create_renderer(
+            context=view.get_context_data(),
+            renderer_settings={
+                'chunk_index': None,
+                'collapse_all': True,
+                'highlighting': highlighting,
+                'lines_of_context': None,
+                'show_deleted': False,
+            },
+            diff_file=diff_file)
+
     def _get_download_links(self, renderer, diff_file):
         if diff_file['binary']:
             orig_attachment = \
@@ -1312,23 +1673,29 @@ class ReviewsDiffFragmentView(DiffFragmentView):
                 modified_revision = diffset.revision
                 modified_filediff_id = filediff.pk
 
+            if self.request is not None:
+                url_kwargs = {'request': self.request}
+            else:
+                # We're rendering ahead of time, outside of a request.
+                url_kwargs = {'local_site': self.review_request.local_site}
+
             download_orig_url = local_site_reverse(
                 orig_url_name,
-                request=self.request,
                 kwargs={
                     'review_request_id': self.review_request.display_id,
                     'revision': diffset.revision,
                     'filediff_id': filediff.pk,
-                })
+                },
+                **url_kwargs)
 
             download_modified_url = local_site_reverse(
                 'download-modified-file',
-                request=self.request,
                 kwargs={
                     'review_request_id': self.review_request.display_id,
                     'revision': modified_revision,
                     'filediff_id': modified_filediff_id,
-                })
+                },
+                **url_kwargs)
 
         return {
             'download_orig_url': download_orig_url,
@@ -1374,6 +1741,19 @@ class ReviewsDiffFragmentView(DiffFragmentView):
             return None
 
 
+class ReviewsDiffFragmentBatchView(ReviewsDiffFragmentView,
+                                   DiffFragmentBatchView):
+    """Renders the fragments for several files in the diff viewer at once.
+
+    This accepts the same parameters as :py:class:`ReviewsDiffFragmentView`,
+    except for ``filediff_id`` and ``chunkindex``. The review request and
+    DiffSets are looked up, and access checked, once for all the files.
+
+    See DiffFragmentBatchView's documentation for the accepted query
+    parameters and the format of the response.
+    """
+
+
 @check_login_required
 @check_local_site_access
 def preview_review_request_email(
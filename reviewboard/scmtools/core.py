@@ -17,6 +17,7 @@ from django.utils.six.moves.urllib.request import (Request as URLRequest,
 from django.utils.translation import ugettext_lazy as _
 
 import reviewboard.diffviewer.parser as diffparser
+from reviewboard.concurrency import map_concurrently
 from reviewboard.scmtools.errors import (AuthenticationError,
                                          FileNotFoundError,
                                          SCMError)
@@ -132,6 +133,12 @@ class SCMTool(object):
     supports_post_commit = False
     supports_raw_file_urls = False
     supports_ticket_auth = False
+
+    #: The maximum number of files that get_files_exist() will check at
+    #: once, and that Repository.prefetch_files() will fetch at once. Tools
+    #: whose clients are safe to use from multiple threads can raise this.
+    max_concurrent_file_checks = 1
+
     field_help_text = {
         'path': _('The path to the repository. This will generally be the URL '
                   'you would use to check out the repository.'),
@@ -170,6 +177,36 @@ class SCMTool(object):
         except FileNotFoundError:
             return False
 
+    def get_files_exist(self, paths_and_revisions, base_commit_id=None,
+                        **kwargs):
+        """Return whether each of a list of files exists.
+
+        By default, this calls :py:meth:`file_exists` for each file, running
+        up to :py:attr:`max_concurrent_file_checks` checks at once.
+        Subclasses can override this to check all the files in a single
+        operation.
+
+        Args:
+            paths_and_revisions (list of tuple):
+                A list of ``(path, revision)`` tuples for the files to check.
+
+            base_commit_id (unicode, optional):
+                The ID of the commit the files are relative to.
+
+            **kwargs (dict):
+                Additional keyword arguments, for future expansion.
+
+        Returns:
+            list of bool:
+            Whether each file exists, in the same order as
+            ``paths_and_revisions``.
+        """
+        return map_concurrently(
+            lambda path_and_revision: self.file_exists(
+                *path_and_revision, base_commit_id=base_commit_id),
+            paths_and_revisions,
+            self.max_concurrent_file_checks)
+
     def parse_diff_revision(self, file_str, revision_str, moved=False,
                             copied=False, **kwargs):
         raise NotImplementedError
@@ -233,12 +270,15 @@ class SCMTool(object):
         return patch
 
     @classmethod
-    def popen(cls, command, local_site_name=None):
+    def popen(cls, command, local_site_name=None, **kwargs):
         """Launches an application, capturing output.
 
         This wraps subprocess.Popen to provide some common parameters and
         to pass environment variables that may be needed by rbssh, if
         indirectly invoked.
+
+        Any additional keyword arguments are passed to subprocess.Popen,
+        overriding the defaults.
         """
         env = os.environ.copy()
 
@@ -247,11 +287,15 @@ class SCMTool(object):
 
         env[b'PYTHONPATH'] = (':'.join(sys.path)).encode('utf-8')
 
-        return subprocess.Popen(command,
-                                env=env,
-                                stderr=subprocess.PIPE,
-                                stdout=subprocess.PIPE,
-                                close_fds=(os.name != 'nt'))
+        popen_kwargs = {
+            'env': env,
+            'stderr': subprocess.PIPE,
+            'stdout': subprocess.PIPE,
+            'close_fds': (os.name != 'nt'),
+        }
+        popen_kwargs.update(kwargs)
+
+        return subprocess.Popen(command, **popen_kwargs)
 
     @classmethod
     def check_repository(cls, path, username=None, password=None,
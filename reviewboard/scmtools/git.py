@@ -1,9 +1,12 @@
 from __future__ import unicode_literals
 
+import atexit
 import logging
 import os
 import re
 import platform
+import subprocess
+import threading
 
 from django.utils import six
 from django.utils.six.moves.urllib.parse import (quote as urlquote,
@@ -61,6 +64,11 @@ class GitTool(SCMTool):
     """
     name = "Git"
     supports_raw_file_urls = True
+
+    # Both raw file URLs and the git cat-file process pool are safe to use
+    # from multiple threads.
+    max_concurrent_file_checks = 8
+
     field_help_text = {
         'path': _('For local Git repositories, this should be the path to a '
                   '.git directory that Review Board can read from. For remote '
@@ -100,6 +108,20 @@ class GitTool(SCMTool):
         except (FileNotFoundError, InvalidRevisionFormatError):
             return False
 
+    def get_files_exist(self, paths_and_revisions, base_commit_id=None,
+                        **kwargs):
+        # Raw file URLs need a separate HTTP request for each file, and
+        # subclasses overriding file_exists() expect it to be called.
+        if (self.client.raw_file_url or
+            six.get_unbound_function(type(self).file_exists) is not
+            six.get_unbound_function(GitTool.file_exists)):
+            return super(GitTool, self).get_files_exist(
+                paths_and_revisions,
+                base_commit_id=base_commit_id,
+                **kwargs)
+
+        return self.client.get_files_exist(paths_and_revisions)
+
     def parse_diff_revision(self, file_str, revision_str, moved=False,
                             copied=False, *args, **kwargs):
         revision = revision_str
@@ -224,7 +246,7 @@ class GitDiffParser(DiffParser):
         """
         self.files = []
         i = 0
-        preamble = b''
+        preamble = []
 
         while i < len(self.lines):
             next_i, file_info, new_diff = self._parse_diff(i)
@@ -233,20 +255,20 @@ class GitDiffParser(DiffParser):
                 self._ensure_file_has_required_fields(file_info)
 
                 if preamble:
-                    file_info.data = preamble + file_info.data
-                    preamble = b''
+                    file_info.prepend_data(self.join_lines(preamble))
+                    preamble = []
 
                 self.files.append(file_info)
             elif new_diff:
                 # We found a diff, but it was empty and has no file entry.
                 # Reset the preamble.
-                preamble = b''
+                preamble = []
             else:
-                preamble += self.lines[i] + b'\n'
+                preamble.append(self.lines[i])
 
             i = next_i
 
-        if not self.files and preamble.strip() != b'':
+        if not self.files and self.join_lines(preamble).strip() != b'':
             # This is probably not an actual git diff file.
             raise DiffParserError('This does not appear to be a git diff', 0)
 
@@ -293,14 +315,14 @@ class GitDiffParser(DiffParser):
         headers, linenum = self._parse_extended_headers(linenum)
 
         if self._is_new_file(headers):
-            file_info.data += headers[b'new file mode'][1]
+            file_info.append_data(headers[b'new file mode'][1])
             file_info.origInfo = PRE_CREATION
         elif self._is_deleted_file(headers):
-            file_info.data += headers[b'deleted file mode'][1]
+            file_info.append_data(headers[b'deleted file mode'][1])
             file_info.deleted = True
         elif self._is_mode_change(headers):
-            file_info.data += headers[b'old mode'][1]
-            file_info.data += headers[b'new mode'][1]
+            file_info.append_data(headers[b'old mode'][1])
+            file_info.append_data(headers[b'new mode'][1])
 
         if self._is_moved_file(headers):
             file_info.origFile = headers[b'rename from'][0]
@@ -308,20 +330,20 @@ class GitDiffParser(DiffParser):
             file_info.moved = True
 
             if b'similarity index' in headers:
-                file_info.data += headers[b'similarity index'][1]
+                file_info.append_data(headers[b'similarity index'][1])
 
-            file_info.data += headers[b'rename from'][1]
-            file_info.data += headers[b'rename to'][1]
+            file_info.append_data(headers[b'rename from'][1])
+            file_info.append_data(headers[b'rename to'][1])
         elif self._is_copied_file(headers):
             file_info.origFile = headers[b'copy from'][0]
             file_info.newFile = headers[b'copy to'][0]
             file_info.copied = True
 
             if b'similarity index' in headers:
-                file_info.data += headers[b'similarity index'][1]
+                file_info.append_data(headers[b'similarity index'][1])
 
-            file_info.data += headers[b'copy from'][1]
-            file_info.data += headers[b'copy to'][1]
+            file_info.append_data(headers[b'copy from'][1])
+            file_info.append_data(headers[b'copy to'][1])
 
         # Assume by default that the change is empty. If we find content
         # later, we'll clear this.
@@ -336,7 +358,7 @@ class GitDiffParser(DiffParser):
             if self.pre_creation_regexp.match(file_info.origInfo):
                 file_info.origInfo = PRE_CREATION
 
-            file_info.data += headers[b'index'][1]
+            file_info.append_data(headers[b'index'][1])
 
         # Get the changes
         while linenum < len(self.lines):
@@ -344,7 +366,7 @@ class GitDiffParser(DiffParser):
                 break
             elif self._is_binary_patch(linenum):
                 file_info.binary = True
-                file_info.data += self.lines[linenum] + b"\n"
+                file_info.append_data(self.lines[linenum] + b"\n")
                 empty_change = False
                 linenum += 1
                 break
@@ -385,8 +407,8 @@ class GitDiffParser(DiffParser):
                 else:
                     file_info.newFile = new_filename
 
-                file_info.data += orig_line + b'\n'
-                file_info.data += new_line + b'\n'
+                file_info.append_data(orig_line + b'\n')
+                file_info.append_data(new_line + b'\n')
                 linenum += 2
             else:
                 empty_change = False
@@ -493,6 +515,406 @@ class GitDiffParser(DiffParser):
                 setattr(file_info, attr, b'')
 
 
+class GitCatFileProcess(object):
+    """A long-running git cat-file process for looking up objects.
+
+    This wraps either ``git cat-file --batch`` (for fetching object types and
+    contents) or ``git cat-file --batch-check`` (for fetching only object
+    types). Object names are written to the process one per line, and the
+    results are streamed back over the same pipe, saving us from starting
+    a new process for every lookup.
+    """
+
+    MODE_BATCH = 'batch'
+    MODE_BATCH_CHECK = 'batch-check'
+
+    #: The number of object names written at a time by lookup_types().
+    LOOKUP_BATCH_SIZE = 100
+
+    def __init__(self, git_dir, mode, local_site_name=None):
+        """Initialize the process.
+
+        Args:
+            git_dir (unicode):
+                The path to the Git repository.
+
+            mode (unicode):
+                Either :py:attr:`MODE_BATCH` or :py:attr:`MODE_BATCH_CHECK`.
+
+            local_site_name (unicode, optional):
+                The name of the Local Site owning the repository.
+        """
+        self.mode = mode
+
+        # Errors for ambiguous object names are written to stderr for every
+        # lookup. Nothing reads them, so they must not fill up a pipe.
+        with open(os.devnull, 'wb') as devnull:
+            self.process = SCMTool.popen(
+                ['git', '--git-dir=%s' % git_dir, 'cat-file', '--%s' % mode],
+                local_site_name=local_site_name,
+                stdin=subprocess.PIPE,
+                stderr=devnull)
+
+    def is_alive(self):
+        """Return whether the process is still running."""
+        return self.process.poll() is None
+
+    def lookup(self, object_name):
+        """Look up an object in the repository.
+
+        Args:
+            object_name (unicode):
+                The name of the object (a SHA1 or other revision expression
+                understood by Git). This cannot contain newlines.
+
+        Returns:
+            tuple:
+            A 2-tuple of the object type and its contents. The contents will
+            be ``None`` for :py:attr:`MODE_BATCH_CHECK` processes.
+
+        Raises:
+            reviewboard.scmtools.errors.FileNotFoundError:
+                The object does not exist or is ambiguous.
+
+            IOError:
+                There was an error communicating with the process. It can no
+                longer be used.
+        """
+        stdin = self.process.stdin
+        stdout = self.process.stdout
+
+        stdin.write(object_name.encode('utf-8') + b'\n')
+        stdin.flush()
+
+        header = stdout.readline()
+
+        if not header.endswith(b'\n'):
+            raise IOError('git cat-file exited unexpectedly')
+
+        header = header.rstrip(b'\n')
+
+        if header.endswith((b' missing', b' ambiguous')):
+            raise FileNotFoundError(object_name)
+
+        try:
+            obj_type, size = header.split(b' ')[1:]
+            size = int(size)
+        except ValueError:
+            raise IOError('Unexpected output from git cat-file: %r' % header)
+
+        if self.mode == self.MODE_BATCH:
+            # The contents are followed by a newline.
+            contents = stdout.read(size + 1)
+
+            if len(contents) != size + 1:
+                raise IOError('git cat-file exited unexpectedly')
+
+            contents = contents[:-1]
+        else:
+            contents = None
+
+        return obj_type, contents
+
+    def lookup_types(self, object_names):
+        """Look up the types of several objects in the repository.
+
+        This is only supported for :py:attr:`MODE_BATCH_CHECK` processes.
+        Object names are written in batches of :py:attr:`LOOKUP_BATCH_SIZE`
+        before the results are read, so that the process never blocks on a
+        full pipe.
+
+        Args:
+            object_names (list of unicode):
+                The names of the objects. These cannot contain newlines.
+
+        Returns:
+            list of bytes:
+            The type of each object, in the same order as ``object_names``.
+            Objects that don't exist or are ambiguous will be ``None``.
+
+        Raises:
+            IOError:
+                There was an error communicating with the process. It can no
+                longer be used.
+        """
+        assert self.mode == self.MODE_BATCH_CHECK
+
+        stdin = self.process.stdin
+        stdout = self.process.stdout
+        results = []
+
+        for i in range(0, len(object_names), self.LOOKUP_BATCH_SIZE):
+            batch = object_names[i:i + self.LOOKUP_BATCH_SIZE]
+
+            stdin.write(b''.join(
+                object_name.encode('utf-8') + b'\n'
+                for object_name in batch))
+            stdin.flush()
+
+            for object_name in batch:
+                header = stdout.readline()
+
+                if not header.endswith(b'\n'):
+                    raise IOError('git cat-file exited unexpectedly')
+
+                header = header.rstrip(b'\n')
+
+                if header.endswith((b' missing', b' ambiguous')):
+                    results.append(None)
+                    continue
+
+                try:
+                    results.append(header.split(b' ')[1])
+                except IndexError:
+                    raise IOError('Unexpected output from git cat-file: %r'
+                                  % header)
+
+        return results
+
+    def close(self):
+        """Shut down the process."""
+        try:
+            self.process.stdin.close()
+        except (IOError, OSError):
+            pass
+
+        if self.is_alive():
+            try:
+                self.process.kill()
+            except OSError:
+                pass
+
+        self.process.wait()
+
+
+class GitCatFilePool(object):
+    """A pool of long-running git cat-file processes for a repository.
+
+    Processes are checked out for the duration of a lookup, so that
+    multiple threads can perform lookups at once. Idle processes are kept
+    around for the next lookup. Processes that have died or that fail
+    during a lookup are discarded and replaced.
+    """
+
+    #: The maximum number of idle processes to keep around for each mode.
+    max_idle_processes = 4
+
+    def __init__(self, git_dir, local_site_name=None):
+        """Initialize the pool.
+
+        Args:
+            git_dir (unicode):
+                The path to the Git repository.
+
+            local_site_name (unicode, optional):
+                The name of the Local Site owning the repository.
+        """
+        self.git_dir = git_dir
+        self.local_site_name = local_site_name
+        self._lock = threading.Lock()
+        self._idle = {
+            GitCatFileProcess.MODE_BATCH: [],
+            GitCatFileProcess.MODE_BATCH_CHECK: [],
+        }
+
+    def get_object(self, object_name):
+        """Return the type and contents of an object.
+
+        Args:
+            object_name (unicode):
+                The name of the object.
+
+        Returns:
+            tuple:
+            A 2-tuple of the object type and contents.
+
+        Raises:
+            reviewboard.scmtools.errors.FileNotFoundError:
+                The object does not exist.
+
+            reviewboard.scmtools.errors.SCMError:
+                Git could not be communicated with.
+        """
+        return self._lookup(object_name, GitCatFileProcess.MODE_BATCH)
+
+    def get_object_type(self, object_name):
+        """Return the type of an object.
+
+        Args:
+            object_name (unicode):
+                The name of the object.
+
+        Returns:
+            bytes:
+            The type of the object.
+
+        Raises:
+            reviewboard.scmtools.errors.FileNotFoundError:
+                The object does not exist.
+
+            reviewboard.scmtools.errors.SCMError:
+                Git could not be communicated with.
+        """
+        return self._lookup(object_name,
+                            GitCatFileProcess.MODE_BATCH_CHECK)[0]
+
+    def get_object_types(self, object_names):
+        """Return the types of several objects.
+
+        All the objects are looked up through a single process.
+
+        Args:
+            object_names (list of unicode):
+                The names of the objects.
+
+        Returns:
+            list of bytes:
+            The type of each object, in the same order as ``object_names``.
+            Objects that don't exist will be ``None``.
+
+        Raises:
+            reviewboard.scmtools.errors.SCMError:
+                Git could not be communicated with.
+        """
+        for attempt in range(2):
+            process = self._acquire(GitCatFileProcess.MODE_BATCH_CHECK)
+
+            try:
+                result = process.lookup_types(object_names)
+            except (IOError, OSError) as e:
+                logging.warning('Restarting git cat-file --%s for %s after '
+                                'error: %s',
+                                process.mode, self.git_dir, e)
+                process.close()
+            else:
+                self._release(process)
+
+                return result
+
+        raise SCMError('Unable to look up %d objects using git cat-file'
+                       % len(object_names))
+
+    def close(self):
+        """Shut down all idle processes in the pool."""
+        with self._lock:
+            processes = [
+                process
+                for processes in six.itervalues(self._idle)
+                for process in processes
+            ]
+
+            for processes in six.itervalues(self._idle):
+                del processes[:]
+
+        for process in processes:
+            process.close()
+
+    def _lookup(self, object_name, mode):
+        """Look up an object using a process from the pool.
+
+        If the process fails, it will be replaced and the lookup retried
+        once.
+        """
+        for attempt in range(2):
+            process = self._acquire(mode)
+
+            try:
+                result = process.lookup(object_name)
+            except FileNotFoundError:
+                self._release(process)
+                raise
+            except (IOError, OSError) as e:
+                logging.warning('Restarting git cat-file --%s for %s after '
+                                'error: %s',
+                                mode, self.git_dir, e)
+                process.close()
+            else:
+                self._release(process)
+
+                return result
+
+        raise SCMError('Unable to look up %s using git cat-file'
+                       % object_name)
+
+    def _acquire(self, mode):
+        """Check out a healthy process from the pool, starting one if needed.
+        """
+        with self._lock:
+            idle = self._idle[mode]
+
+            while idle:
+                process = idle.pop()
+
+                if process.is_alive():
+                    return process
+
+                process.close()
+
+        return GitCatFileProcess(self.git_dir, mode,
+                                 local_site_name=self.local_site_name)
+
+    def _release(self, process):
+        """Return a process to the pool."""
+        with self._lock:
+            idle = self._idle[process.mode]
+
+            if process.is_alive() and len(idle) < self.max_idle_processes:
+                idle.append(process)
+                return
+
+        process.close()
+
+
+_cat_file_pools = {}
+_cat_file_pools_lock = threading.Lock()
+_cat_file_pools_pid = None
+
+
+def get_cat_file_pool(git_dir, local_site_name=None):
+    """Return the git cat-file process pool for a repository.
+
+    Pools are shared by all clients for the repository within this process.
+    A forked process gets its own pools.
+
+    Args:
+        git_dir (unicode):
+            The path to the Git repository.
+
+        local_site_name (unicode, optional):
+            The name of the Local Site owning the repository.
+
+    Returns:
+        GitCatFilePool:
+        The pool for the repository.
+    """
+    global _cat_file_pools_pid
+
+    key = (git_dir, local_site_name)
+
+    with _cat_file_pools_lock:
+        if _cat_file_pools_pid != os.getpid():
+            # Any pools we have were inherited from the parent process, and
+            # their processes belong to it.
+            _cat_file_pools.clear()
+            _cat_file_pools_pid = os.getpid()
+
+        try:
+            return _cat_file_pools[key]
+        except KeyError:
+            pool = GitCatFilePool(git_dir, local_site_name=local_site_name)
+            _cat_file_pools[key] = pool
+
+            return pool
+
+
+@atexit.register
+def _close_cat_file_pools():
+    """Shut down all git cat-file processes on exit."""
+    if _cat_file_pools_pid == os.getpid():
+        for pool in list(six.itervalues(_cat_file_pools)):
+            pool.close()
+
+
 class GitClient(SCMClient):
     FULL_SHA1_LENGTH = 40
 
@@ -596,6 +1018,34 @@ class GitClient(SCMClient):
             contents = self._cat_file(path, revision, "-t")
             return contents and contents.strip() == "blob"
 
+    def get_files_exist(self, paths_and_revisions):
+        """Return whether each of a list of files exists in the repository.
+
+        All the files are checked through a single git-cat-file --batch-check
+        process. This doesn't support raw file URLs.
+        """
+        object_names = [
+            self._resolve_head(revision, path)
+            for path, revision in paths_and_revisions
+        ]
+        valid_names = [
+            object_name
+            for object_name in object_names
+            if '\n' not in object_name
+        ]
+
+        if valid_names:
+            pool = get_cat_file_pool(self.git_dir, self.local_site_name)
+            obj_types = dict(zip(valid_names,
+                                 pool.get_object_types(valid_names)))
+        else:
+            obj_types = {}
+
+        return [
+            obj_types.get(object_name) == b'blob'
+            for object_name in object_names
+        ]
+
     def validate_sha1_format(self, path, sha1):
         """Validates that a SHA1 is of the right length for this repository."""
         if self.raw_file_url and len(sha1) != self.FULL_SHA1_LENGTH:
@@ -622,9 +1072,27 @@ class GitClient(SCMClient):
 
         Otherwise, "option" can be used to pass a switch to git-cat-file,
         e.g. to test or existence or get the type of "commit".
+
+        Blob contents and types are looked up through a shared pool of
+        long-running git-cat-file processes (see get_cat_file_pool), rather
+        than starting a new process each time.
         """
         commit = self._resolve_head(revision, path)
 
+        if option in ('blob', '-t') and '\n' not in commit:
+            pool = get_cat_file_pool(self.git_dir, self.local_site_name)
+
+            if option == 'blob':
+                obj_type, contents = pool.get_object(commit)
+
+                if obj_type != b'blob':
+                    raise SCMError('fatal: git cat-file %s: bad file'
+                                   % commit)
+
+                return contents
+            else:
+                return pool.get_object_type(commit)
+
         p = self._run_git(['--git-dir=%s' % self.git_dir, 'cat-file',
                            option, commit])
         contents = p.stdout.read()
@@ -21,8 +21,10 @@ from djblets.cache.backend import cache_memoize, make_cache_key
 from djblets.db.fields import JSONField
 from djblets.log import log_timed
 
+from reviewboard.concurrency import map_concurrently
 from reviewboard.hostingsvcs.models import HostingServiceAccount
-from reviewboard.hostingsvcs.service import get_hosting_service
+from reviewboard.hostingsvcs.service import (HostingService,
+                                             get_hosting_service)
 from reviewboard.scmtools.crypto_utils import (decrypt_password,
                                                encrypt_password)
 from reviewboard.scmtools.managers import RepositoryManager, ToolManager
@@ -358,6 +360,73 @@ class Repository(models.Model):
                                              request)],
             large_data=True)[0]
 
+    def prefetch_files(self, files, request=None):
+        """Fetches several files from the repository into the cache.
+
+        Files that aren't already in the cache are fetched concurrently, up
+        to the limit set by the hosting service or SCMTool
+        (``max_concurrent_file_checks``), so that later calls to get_file
+        for them don't need to wait on the repository. The SCMTool's limit
+        is used when the hosting service leaves fetching files to it.
+
+        Errors fetching a file are logged and otherwise ignored. They'll be
+        raised again when the file is next fetched through get_file.
+
+        Args:
+            files (list of tuple):
+                A list of ``(path, revision, base_commit_id)`` tuples for
+                the files to fetch.
+
+            request (django.http.HttpRequest, optional):
+                The HTTP request from the client.
+
+        Returns:
+            int:
+            The number of files that had to be fetched.
+        """
+        files = list(set(files))
+        cache_keys = [
+            make_cache_key(self._make_file_cache_key(*file_info))
+            for file_info in files
+        ]
+        cached = cache.get_many(cache_keys)
+        uncached_files = [
+            file_info
+            for file_info, cache_key in zip(files, cache_keys)
+            if cache_key not in cached
+        ]
+
+        if not uncached_files:
+            return 0
+
+        hosting_service = self.hosting_service
+
+        # Hosting services that don't implement get_file hand each fetch
+        # to the SCMTool, so the SCMTool's limit applies.
+        if (hosting_service and
+            six.get_unbound_function(type(hosting_service).get_file) is not
+            six.get_unbound_function(HostingService.get_file)):
+            max_workers = hosting_service.max_concurrent_file_checks
+        else:
+            max_workers = \
+                self.tool.get_scmtool_class().max_concurrent_file_checks
+
+        def _fetch_file(file_info):
+            path, revision, base_commit_id = file_info
+
+            try:
+                self.get_file(path, revision, base_commit_id=base_commit_id,
+                              request=request)
+            except Exception as e:
+                logging.warning('Unable to prefetch file "%s" (revision %s, '
+                                'base commit ID %s) from repository %s: %s',
+                                path, revision, base_commit_id, self.pk, e,
+                                request=request)
+
+        map_concurrently(_fetch_file, uncached_files, max_workers)
+
+        return len(uncached_files)
+
     def get_file_exists(self, path, revision, base_commit_id=None,
                         request=None):
         """Returns whether or not a file exists in the repository.
@@ -382,6 +451,113 @@ class Repository(models.Model):
 
         return exists
 
+    def get_files_exist(self, paths_and_revisions, base_commit_id=None,
+                        request=None):
+        """Returns whether each of a list of files exists in the repository.
+
+        This works like get_file_exists, but checks all the files at once.
+        Any results already in the cache are looked up together, and the
+        remaining files are handed to the hosting service or SCMTool in a
+        single call, which may check them concurrently or using a single
+        request to the repository.
+
+        The checking_file_exists and checked_file_exists signals are still
+        emitted for each file that isn't in the cache.
+
+        Args:
+            paths_and_revisions (list of tuple):
+                A list of ``(path, revision)`` tuples for the files to check.
+
+            base_commit_id (unicode, optional):
+                The ID of the commit the files are relative to.
+
+            request (django.http.HttpRequest, optional):
+                The HTTP request from the client.
+
+        Returns:
+            list of bool:
+            Whether each file exists, in the same order as
+            ``paths_and_revisions``.
+        """
+        paths_and_revisions = list(paths_and_revisions)
+        exists_keys = []
+        file_keys = []
+
+        for path, revision in paths_and_revisions:
+            exists_keys.append(self._make_file_exists_cache_key(
+                path, revision, base_commit_id))
+            file_keys.append(make_cache_key(
+                self._make_file_cache_key(path, revision, base_commit_id)))
+
+        cached = cache.get_many(
+            [make_cache_key(key) for key in exists_keys] + file_keys)
+        results = []
+        uncached = []
+
+        for i, (exists_key, file_key) in enumerate(zip(exists_keys,
+                                                       file_keys)):
+            # If we've fetched the file before, it exists.
+            exists = (cached.get(make_cache_key(exists_key)) == '1' or
+                      file_key in cached)
+            results.append(exists)
+
+            if not exists:
+                uncached.append(i)
+
+        if not uncached:
+            return results
+
+        uncached_paths_and_revisions = [
+            paths_and_revisions[i]
+            for i in uncached
+        ]
+
+        for path, revision in uncached_paths_and_revisions:
+            checking_file_exists.send(sender=self,
+                                      path=path,
+                                      revision=revision,
+                                      base_commit_id=base_commit_id,
+                                      request=request)
+
+        hosting_service = self.hosting_service
+
+        if hosting_service:
+            checked = hosting_service.get_files_exist(
+                self,
+                uncached_paths_and_revisions,
+                base_commit_id=base_commit_id)
+        else:
+            tool = self.get_scmtool()
+            argspec = inspect.getargspec(tool.file_exists)
+
+            if argspec.keywords is None:
+                warnings.warn('SCMTool.file_exists() must take keyword '
+                              'arguments, signature for %s is deprecated.'
+                              % tool.name, DeprecationWarning)
+                checked = [
+                    tool.file_exists(path, revision)
+                    for path, revision in uncached_paths_and_revisions
+                ]
+            else:
+                checked = tool.get_files_exist(uncached_paths_and_revisions,
+                                               base_commit_id=base_commit_id)
+
+        for i, exists in zip(uncached, checked):
+            path, revision = paths_and_revisions[i]
+            results[i] = exists
+
+            checked_file_exists.send(sender=self,
+                                     path=path,
+                                     revision=revision,
+                                     base_commit_id=base_commit_id,
+                                     request=request,
+                                     exists=exists)
+
+            if exists:
+                cache_memoize(exists_keys[i], lambda: '1')
+
+        return results
+
     def get_branches(self):
         """Returns a list of branches."""
         hosting_service = self.hosting_service
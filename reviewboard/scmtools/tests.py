@@ -16,6 +16,7 @@ from djblets.util.filesystem import is_exe_in_path
 from kgb import SpyAgency
 import nose
 
+from reviewboard import concurrency
 from reviewboard.diffviewer.diffutils import patch
 from reviewboard.diffviewer.parser import DiffParserError
 from reviewboard.hostingsvcs.models import HostingServiceAccount
@@ -23,12 +24,13 @@ from reviewboard.hostingsvcs.service import (register_hosting_service,
                                              unregister_hosting_service)
 from reviewboard.reviews.models import Group
 from reviewboard.scmtools.core import (Branch, ChangeSet, Commit, Revision,
-                                       HEAD, PRE_CREATION)
+                                       SCMTool, HEAD, PRE_CREATION)
 from reviewboard.scmtools.errors import (SCMError, FileNotFoundError,
                                          RepositoryNotFoundError,
                                          AuthenticationError)
 from reviewboard.scmtools.forms import RepositoryForm
-from reviewboard.scmtools.git import ShortSHA1Error, GitClient
+from reviewboard.scmtools.git import (ShortSHA1Error, GitCatFilePool,
+                                      GitClient, get_cat_file_pool)
 from reviewboard.scmtools.hg import HgDiffParser, HgGitDiffParser
 from reviewboard.scmtools.models import Repository, Tool
 from reviewboard.scmtools.perforce import STunnelProxy, STUNNEL_SERVER
@@ -156,7 +158,7 @@ class CoreTests(TestCase):
         self.assertTrue(len(cs.files) == 0)
 
 
-class RepositoryTests(TestCase):
+class RepositoryTests(SpyAgency, TestCase):
     fixtures = ['test_scmtools']
 
     def setUp(self):
@@ -172,6 +174,7 @@ class RepositoryTests(TestCase):
         self.scmtool_cls = self.repository.get_scmtool().__class__
         self.old_get_file = self.scmtool_cls.get_file
         self.old_file_exists = self.scmtool_cls.file_exists
+        self.old_get_files_exist = self.scmtool_cls.get_files_exist
 
     def tearDown(self):
         super(RepositoryTests, self).tearDown()
@@ -180,6 +183,7 @@ class RepositoryTests(TestCase):
 
         self.scmtool_cls.get_file = self.old_get_file
         self.scmtool_cls.file_exists = self.old_file_exists
+        self.scmtool_cls.get_files_exist = self.old_get_files_exist
 
     def test_archive(self):
         """Testing Repository.archive"""
@@ -371,6 +375,78 @@ class RepositoryTests(TestCase):
         self.assertEqual(found_signals[1],
                          ('checked_file_exists', path, revision, request))
 
+    def test_prefetch_files(self):
+        """Testing Repository.prefetch_files"""
+        def get_file(self, path, revision, **kwargs):
+            fetched.append((path, revision))
+
+            if revision == '12345':
+                raise FileNotFoundError(path, revision)
+
+            return 'file data'
+
+        fetched = []
+        self.scmtool_cls.get_file = get_file
+
+        self.repository.get_file('readme', 'e965047')
+        del fetched[:]
+
+        num_fetched = self.repository.prefetch_files([
+            ('readme', 'e965047', None),
+            ('readme', 'd6613f5', None),
+            ('readme', 'd6613f5', None),
+            ('readme', 'd6613f5', 'abc123'),
+            ('readme', '12345', None),
+        ])
+
+        self.assertEqual(num_fetched, 3)
+        self.assertEqual(sorted(fetched), [
+            ('readme', '12345'),
+            ('readme', 'd6613f5'),
+            ('readme', 'd6613f5'),
+        ])
+
+        # The files should now come from the cache.
+        del fetched[:]
+        self.assertEqual(self.repository.get_file('readme', 'd6613f5'),
+                         'file data')
+        self.assertEqual(
+            self.repository.get_file('readme', 'd6613f5',
+                                     base_commit_id='abc123'),
+            'file data')
+        self.assertEqual(fetched, [])
+
+    def test_prefetch_files_with_hosting_service(self):
+        """Testing Repository.prefetch_files with a hosting service that
+        fetches files itself uses the hosting service's limit
+        """
+        self.repository.hosting_account = \
+            HostingServiceAccount.objects.create(service_name='github',
+                                                 username='myuser')
+        hosting_service = self.repository.hosting_service
+        self.spy_on(concurrency.map_concurrently, call_original=False)
+
+        self.repository.prefetch_files([('readme', 'd6613f5', None)])
+
+        self.assertEqual(len(concurrency.map_concurrently.spy.calls), 1)
+        self.assertEqual(concurrency.map_concurrently.spy.calls[0].args[2],
+                         hosting_service.max_concurrent_file_checks)
+
+    def test_prefetch_files_with_hosting_service_using_scmtool(self):
+        """Testing Repository.prefetch_files with a hosting service that
+        leaves fetching files to the SCMTool uses the SCMTool's limit
+        """
+        self.repository.hosting_account = \
+            HostingServiceAccount.objects.create(service_name='gitorious',
+                                                 username='myuser')
+        self.spy_on(concurrency.map_concurrently, call_original=False)
+
+        self.repository.prefetch_files([('readme', 'd6613f5', None)])
+
+        self.assertEqual(len(concurrency.map_concurrently.spy.calls), 1)
+        self.assertEqual(concurrency.map_concurrently.spy.calls[0].args[2],
+                         self.scmtool_cls.max_concurrent_file_checks)
+
     def test_get_file_signature_warning(self):
         """Test old SCMTool.get_file signature triggers warning"""
         def get_file(self, path, revision):
@@ -407,6 +483,89 @@ class RepositoryTests(TestCase):
         with self.assert_warns(message=warn_msg):
             self.repository.get_file_exists(path, revision, request=request)
 
+    def test_get_files_exist(self):
+        """Testing Repository.get_files_exist"""
+        def get_files_exist(self, paths_and_revisions, **kwargs):
+            checked.append(paths_and_revisions)
+
+            return [
+                revision != '12345'
+                for path, revision in paths_and_revisions
+            ]
+
+        checked = []
+        paths_and_revisions = [
+            ('readme', 'e965047'),
+            ('readme', '12345'),
+            ('newfile', 'd6613f5'),
+        ]
+
+        self.scmtool_cls.get_files_exist = get_files_exist
+
+        self.assertEqual(
+            self.repository.get_files_exist(paths_and_revisions),
+            [True, False, True])
+        self.assertEqual(
+            self.repository.get_files_exist(paths_and_revisions),
+            [True, False, True])
+
+        # Only the file that didn't exist should be checked again.
+        self.assertEqual(checked, [
+            paths_and_revisions,
+            [('readme', '12345')],
+        ])
+
+    def test_get_files_exist_with_fetched_file(self):
+        """Testing Repository.get_files_exist uses get_file's cached result
+        """
+        def get_file(self, path, revision, **kwargs):
+            return 'file data'
+
+        def get_files_exist(self, paths_and_revisions, **kwargs):
+            checked.append(paths_and_revisions)
+
+            return [True] * len(paths_and_revisions)
+
+        checked = []
+
+        self.scmtool_cls.get_file = get_file
+        self.scmtool_cls.get_files_exist = get_files_exist
+
+        self.repository.get_file('readme', 'e965047')
+
+        self.assertEqual(
+            self.repository.get_files_exist([('readme', 'e965047')]),
+            [True])
+        self.assertEqual(checked, [])
+
+    def test_get_files_exist_signals(self):
+        """Testing Repository.get_files_exist emits signals"""
+        def on_checking(sender, path, revision, request, **kwargs):
+            found_signals.append(('checking_file_exists', path,
+                                  revision, request))
+
+        def on_checked(sender, path, revision, request, exists, **kwargs):
+            found_signals.append(('checked_file_exists', path,
+                                  revision, request, exists))
+
+        found_signals = []
+
+        checking_file_exists.connect(on_checking, sender=self.repository)
+        checked_file_exists.connect(on_checked, sender=self.repository)
+
+        request = {}
+
+        self.repository.get_files_exist(
+            [('readme', 'e965047'), ('readme', '0000000')],
+            request=request)
+
+        self.assertEqual(found_signals, [
+            ('checking_file_exists', 'readme', 'e965047', request),
+            ('checking_file_exists', 'readme', '0000000', request),
+            ('checked_file_exists', 'readme', 'e965047', request, True),
+            ('checked_file_exists', 'readme', '0000000', request, False),
+        ])
+
 
 class BZRTests(SCMTestCase):
     """Unit tests for bzr."""
@@ -2807,6 +2966,105 @@ class GitTests(SpyAgency, SCMTestCase):
         self.assertRaises(FileNotFoundError,
                           lambda: self.tool.get_file("readme", "0000000"))
 
+    def test_get_file_reuses_cat_file_process(self):
+        """Testing GitTool.get_file reuses a git cat-file process"""
+        get_cat_file_pool(self.tool.client.git_dir).close()
+        self.spy_on(SCMTool.popen)
+
+        self.assertEqual(self.tool.get_file("readme", "e965047"), b'Hello\n')
+        self.assertEqual(self.tool.get_file("readme", "d6613f5"),
+                         b'Hello there\n')
+        self.assertEqual(self.tool.get_file("readme"), b'Hello there\n')
+
+        self.assertEqual(len(SCMTool.popen.spy.calls), 1)
+
+    def test_get_file_with_non_blob(self):
+        """Testing GitTool.get_file with a commit SHA1"""
+        self.assertRaises(SCMError,
+                          lambda: self.tool.get_file("readme", "a62df6c"))
+
+    def test_cat_file_pool_with_dead_process(self):
+        """Testing GitCatFilePool replaces processes that have exited"""
+        pool = GitCatFilePool(self.tool.client.git_dir)
+
+        try:
+            self.assertEqual(pool.get_object('e965047'), (b'blob', b'Hello\n'))
+
+            process = pool._idle['batch'][0]
+            process.process.kill()
+            process.process.wait()
+
+            self.assertEqual(pool.get_object('e965047'), (b'blob', b'Hello\n'))
+            self.assertNotIn(process, pool._idle['batch'])
+        finally:
+            pool.close()
+
+    def test_cat_file_pool_get_object_type(self):
+        """Testing GitCatFilePool.get_object_type"""
+        pool = GitCatFilePool(self.tool.client.git_dir)
+
+        try:
+            self.assertEqual(pool.get_object_type('e965047'), b'blob')
+            self.assertEqual(pool.get_object_type('a62df6c'), b'commit')
+            self.assertRaises(FileNotFoundError,
+                              lambda: pool.get_object_type('0000000'))
+
+            # The process should still be usable after a missing object.
+            self.assertEqual(len(pool._idle['batch-check']), 1)
+            self.assertEqual(pool.get_object_type('ccffbb4'), b'tree')
+        finally:
+            pool.close()
+
+    def test_get_files_exist(self):
+        """Testing GitTool.get_files_exist"""
+        get_cat_file_pool(self.tool.client.git_dir).close()
+        self.spy_on(SCMTool.popen)
+
+        self.assertEqual(
+            self.tool.get_files_exist([
+                ('readme', 'e965047'),
+                ('readme', '0000000'),
+                ('readme', 'a62df6c'),
+                ('readme', PRE_CREATION),
+                ('readme', HEAD),
+                ('readme', 'd6613f5'),
+            ]),
+            [True, False, False, False, True, True])
+
+        # All the files should have been checked by a single process.
+        self.assertEqual(len(SCMTool.popen.spy.calls), 1)
+
+    def test_get_files_exist_with_remote(self):
+        """Testing GitTool.get_files_exist with raw file URLs"""
+        def get_file(client, path, revision):
+            if revision == 'ffffffffffffffffffffffffffffffffffffffff':
+                raise FileNotFoundError(path, revision)
+
+            return b'data'
+
+        self.spy_on(self.remote_tool.client.get_file, call_fake=get_file)
+
+        self.assertEqual(
+            self.remote_tool.get_files_exist([
+                ('README', 'e965047e965047e965047e965047e965047e9650'),
+                ('README', 'ffffffffffffffffffffffffffffffffffffffff'),
+                ('NEWS', 'd6613f5d6613f5d6613f5d6613f5d6613f5d6613'),
+            ]),
+            [True, False, True])
+        self.assertEqual(len(self.remote_tool.client.get_file.spy.calls), 3)
+
+    def test_cat_file_pool_get_object_types(self):
+        """Testing GitCatFilePool.get_object_types"""
+        pool = GitCatFilePool(self.tool.client.git_dir)
+        object_names = ['e965047', '0000000', 'a62df6c', 'ccffbb4'] * 60
+
+        try:
+            self.assertEqual(pool.get_object_types(object_names),
+                             [b'blob', None, b'commit', b'tree'] * 60)
+            self.assertEqual(len(pool._idle['batch-check']), 1)
+        finally:
+            pool.close()
+
     def test_parse_diff_revision_with_remote_and_short_SHA1_error(self):
         """Testing GitTool.parse_diff_revision with remote files and short
         SHA1 error
@@ -70,6 +70,7 @@ MIDDLEWARE_CLASSES = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.doc.XViewMiddleware',
     'django.middleware.http.ConditionalGetMiddleware',
+    'reviewboard.reviews.middleware.DiffFragmentETagMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -235,6 +236,18 @@ TEST_RUNNER = 'reviewboard.test.RBTestRunner'
 
 RUNNING_TEST = (os.environ.get('RB_RUNNING_TESTS') == '1')
 
+# Whether to run background tasks, such as precomputing data for newly
+# uploaded diffs. These only speed up later requests, so they're skipped when
+# running tests.
+RUN_BACKGROUND_TASKS = not RUNNING_TEST
+
+# The number of threads in each process used to run background tasks.
+BACKGROUND_TASK_WORKERS = 2
+
+# The number of files from the same repository whose diffs can be precomputed
+# in the background at once, in each process.
+DIFF_PRECOMPUTE_MAX_PER_REPOSITORY = 1
+
 # Dependency checker functionality.  Gives our users nice errors when they
 # start out, instead of encountering them later on.  Most of the magic for this
 # happens in manage.py, not here.
@@ -287,6 +300,50 @@ SVNTOOL_BACKENDS = [
     'reviewboard.scmtools.svn.subvertpy',
 ]
 
+# Whether to compress new diffs and cached diff chunks with Zstandard instead
+# of zlib. This requires the zstandard module on every server, since content
+# compressed with it can't be read without it. Running the reencode-diffs
+# management command after turning this off re-compresses diffs with zlib.
+DIFF_COMPRESSION_USE_ZSTD = False
+
+# The path to a Zstandard dictionary used to compress small diffs, trained
+# with the reencode-diffs management command. Diffs compressed with it can only
+# be read while the file is available. This is only used to compress diffs if
+# DIFF_COMPRESSION_USE_ZSTD is enabled.
+DIFF_ZSTD_DICTIONARY_FILE = None
+
+# The paths to dictionaries that DIFF_ZSTD_DICTIONARY_FILE previously pointed
+# to. These are only used to read the diffs compressed with them.
+DIFF_ZSTD_OLD_DICTIONARY_FILES = []
+
+# The most memory, in bytes, each process uses to keep recently used diff
+# chunks. These are compressed, and are checked before the main cache.
+DIFF_CHUNK_CACHE_LOCAL_SIZE = 32 * 1024 * 1024
+
+# A directory for storing diff chunks on disk, behind the main cache. Chunks
+# stored there are kept for CACHE_EXPIRATION_TIME, even if they're evicted from
+# the main cache. This is disabled by default.
+DIFF_CHUNK_CACHE_DIR = None
+
+# The most space, in bytes, used by the diff chunks in DIFF_CHUNK_CACHE_DIR.
+# The oldest chunks are removed when it's exceeded. Set this to None to only
+# remove chunks once they expire.
+DIFF_CHUNK_CACHE_DIR_MAX_SIZE = 1024 * 1024 * 1024
+
+# The number of the newest reviews and changes rendered on the review request
+# page. Older ones are loaded in batches of this size when requested. Set this
+# to None to render them all.
+REVIEW_REQUEST_ENTRIES_PAGE_SIZE = 50
+
+# The most memory, in characters, each process uses to keep recently rendered
+# Markdown. This is checked before the main cache.
+MARKDOWN_RENDER_CACHE_LOCAL_SIZE = 4 * 1024 * 1024
+
+# Whether to use the accelerated implementation of the Myers diff algorithm.
+# This produces the same results as the reference implementation, which can be
+# used instead by setting this to False.
+DIFF_USE_FAST_MYERS_DIFFER = True
+
 # Gravatar configuration.
 GRAVATAR_DEFAULT = 'mm'
 
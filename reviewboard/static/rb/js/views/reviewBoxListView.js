@@ -6,11 +6,15 @@
  *
  * This will also begin loading each section of a diff that contains comments,
  * and rendering them in the appropriate boxes.
+ *
+ * Only the newest boxes are rendered with the page. Older ones are loaded in
+ * batches when requested.
  */
 RB.ReviewBoxListView = Backbone.View.extend({
     events: {
         'click #collapse-all': '_onCollapseAllClicked',
-        'click #expand-all': '_onExpandAllClicked'
+        'click #expand-all': '_onExpandAllClicked',
+        'click .older-entries-link': '_onOlderEntriesClicked'
     },
 
     /*
@@ -40,10 +44,22 @@ RB.ReviewBoxListView = Backbone.View.extend({
      * rendered into the appropriate review boxes.
      */
     render: function() {
+        this._renderBoxes(this.$el.children('.review'),
+                          this.$el.children('.changedesc'));
+
+        this.diffFragmentQueue.loadFragments();
+
+        return this;
+    },
+
+    /*
+     * Sets up the review boxes and change boxes from the given elements.
+     */
+    _renderBoxes: function($reviews, $changes) {
         var pageEditState = this.options.pageEditState,
             reviewRequest = this.options.reviewRequest;
 
-        _.each(this.$el.children('.review'), function(reviewEl) {
+        _.each($reviews, function(reviewEl) {
             var $review = $(reviewEl),
                 $body = $review.find('.body'),
                 reviewID = $review.data('review-id'),
@@ -67,7 +83,7 @@ RB.ReviewBoxListView = Backbone.View.extend({
             this._boxes.push(box);
         }, this);
 
-        _.each(this.$el.children('.changedesc'), function(changeBoxEl) {
+        _.each($changes, function(changeBoxEl) {
             var box = new RB.ChangeBoxView({
                 el: changeBoxEl,
                 reviewRequest: reviewRequest,
@@ -78,10 +94,6 @@ RB.ReviewBoxListView = Backbone.View.extend({
 
             this._boxes.push(box);
         }, this);
-
-        this.diffFragmentQueue.loadFragments();
-
-        return this;
     },
 
     /*
@@ -132,6 +144,45 @@ RB.ReviewBoxListView = Backbone.View.extend({
             box.expand();
         });
 
+        return false;
+    },
+
+    /*
+     * Handler for when the link for older reviews and changes is clicked.
+     *
+     * Loads the batch of older boxes from the server, replacing the link
+     * with them, and begins loading their diff fragments.
+     */
+    _onOlderEntriesClicked: function(e) {
+        var $olderEntries = $(e.target).closest('.older-entries');
+
+        e.preventDefault();
+
+        if ($olderEntries.hasClass('loading')) {
+            return false;
+        }
+
+        $olderEntries.addClass('loading');
+
+        $.ajax($olderEntries.data('url')).done(_.bind(function(html) {
+            var $entries = $($.parseHTML(html));
+
+            $olderEntries.replaceWith($entries);
+
+            this._renderBoxes($entries.filter('.review'),
+                              $entries.filter('.changedesc'));
+
+            _.each($entries.find('.comment_container'), function(el) {
+                this.diffFragmentQueue.queueLoad(
+                    el.id.replace('comment_container_', ''),
+                    $(el).attr('data-fragment-key'));
+            }, this);
+
+            this.diffFragmentQueue.loadFragments();
+        }, this)).fail(function() {
+            $olderEntries.removeClass('loading');
+        });
+
         return false;
     }
 });
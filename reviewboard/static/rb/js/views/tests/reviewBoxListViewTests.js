@@ -76,6 +76,45 @@ suite('rb/views/ReviewBoxListView', function() {
             expect($el1.hasClass('collapsed')).toBe(false);
             expect($el2.hasClass('collapsed')).toBe(false);
         });
+
+        it('Load older entries', function() {
+            var $olderEntries = $([
+                    '<div class="older-entries"',
+                    '     data-url="/r/1/entries/?end=1">',
+                    ' <a href="#" class="older-entries-link"></a>',
+                    '</div>'
+                ].join('')).prependTo(view.$el);
+
+            spyOn($, 'ajax').and.callFake(function(url) {
+                expect(url).toBe('/r/1/entries/?end=1');
+
+                return $.Deferred().resolve([
+                    '<div class="review" data-review-id="122" ',
+                    '     data-ship-it="false">',
+                    ' <div class="box">',
+                    '  <div class="body">',
+                    '   <pre class="body_top">Older Body Top</pre>',
+                    '   <div class="comment-section" ',
+                    '        data-context-type="body_top">',
+                    '   </div>',
+                    '   <pre class="body_bottom">Older Body Bottom</pre>',
+                    '   <div class="comment-section" ',
+                    '        data-context-type="body_bottom">',
+                    '   </div>',
+                    '  </div>',
+                    ' </div>',
+                    '</div>'
+                ].join('')).promise();
+            });
+
+            $olderEntries.children('.older-entries-link').click();
+
+            expect($.ajax).toHaveBeenCalled();
+            expect(view.$('.older-entries').length).toBe(0);
+            expect(view._boxes.length).toBe(3);
+            expect(view._boxes[2].model.id).toBe(122);
+            expect(view._boxes[2].model.get('bodyTop')).toBe('Older Body Top');
+        });
     });
 
     describe('Loading', function() {
@@ -3,7 +3,7 @@ from __future__ import unicode_literals
 import logging
 
 from django.core.exceptions import PermissionDenied, ObjectDoesNotExist
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils import six
 from djblets.util.http import get_http_requested_mimetype, set_last_modified
 from djblets.webapi.decorators import (webapi_login_required,
@@ -163,6 +163,35 @@ class DiffResource(WebAPIResource):
         else:
             return super(DiffResource, self).get(request, *args, **kwargs)
 
+    def __call__(self, request, *args, **kwargs):
+        """Handle an HTTP request to the resource.
+
+        If the method view returned a streaming patch (see
+        :py:meth:`call_method_view`), that's returned as the response.
+        """
+        response = super(DiffResource, self).__call__(request, *args,
+                                                      **kwargs)
+
+        return getattr(request, '_rb_streaming_patch_response', response)
+
+    def call_method_view(self, request, method, view, *args, **kwargs):
+        """Call the method view for an HTTP request.
+
+        Patches are returned as a
+        :py:class:`~django.http.StreamingHttpResponse`, but the resource
+        only passes along responses that are
+        :py:class:`~django.http.HttpResponse` instances. The streaming
+        response is set aside here for :py:meth:`__call__` to return.
+        """
+        result = super(DiffResource, self).call_method_view(
+            request, method, view, *args, **kwargs)
+
+        if isinstance(result, StreamingHttpResponse):
+            request._rb_streaming_patch_response = result
+            result = HttpResponse()
+
+        return result
+
     def _get_patch(self, request, *args, **kwargs):
         try:
             review_request = \
@@ -172,9 +201,9 @@ class DiffResource(WebAPIResource):
             return DOES_NOT_EXIST
 
         tool = review_request.repository.get_scmtool()
-        data = tool.get_parser('').raw_diff(diffset)
+        data = tool.get_parser('').iter_raw_diff(diffset)
 
-        resp = HttpResponse(data, content_type='text/x-patch')
+        resp = StreamingHttpResponse(data, content_type='text/x-patch')
 
         if diffset.name == 'diff':
             filename = 'bug%s.patch' % \
@@ -15,6 +15,7 @@ from djblets.webapi.responses import WebAPIResponse
 
 from reviewboard.attachments.models import FileAttachment
 from reviewboard.diffviewer.diffutils import (get_diff_files,
+                                              highlight_pending_chunks,
                                               populate_diff_chunks)
 from reviewboard.diffviewer.models import FileDiff
 from reviewboard.webapi.base import CUSTOM_MIMETYPE_BASE, WebAPIResource
@@ -421,6 +422,8 @@ class FileDiffResource(WebAPIResource):
         assert len(files) == 1
         f = files[0]
 
+        highlight_pending_chunks(f, f['chunks'], request)
+
         payload = {
             'diff_data': {
                 'binary': f['binary'],
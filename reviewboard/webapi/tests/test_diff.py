@@ -268,6 +268,31 @@ class ResourceItemTests(ExtraDataItemMixin, ReviewRequestChildItemMixin,
             get_diff_item_url(review_request, diffset.revision),
             check_etags=True)
 
+    def test_get_patch(self):
+        """Testing the GET review-requests/<id>/diffs/<revision>/ API
+        with Accept: text/x-patch
+        """
+        review_request = self.create_review_request(create_repository=True,
+                                                    publish=True)
+        diffset = self.create_diffset(review_request)
+        filediff1 = self.create_filediff(diffset, source_file='/file1',
+                                         dest_file='/file1')
+        filediff2 = self.create_filediff(
+            diffset,
+            source_file='/file2',
+            dest_file='/file2',
+            diff=b'--- file2\n+++ file2\n@@ -1 +1 @@\n-a\n+b\n')
+
+        response = self.client.get(
+            get_diff_item_url(review_request, diffset.revision),
+            HTTP_ACCEPT='text/x-patch')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/x-patch')
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response.streaming_content),
+                         filediff1.diff + filediff2.diff)
+
     #
     # HTTP PUT tests
     #
@@ -213,6 +213,9 @@ setup(name=PACKAGE_NAME,
           'pytz',
           'Whoosh>=2.6',
       ],
+      extras_require={
+          'zstd': ['zstandard'],
+      },
       dependency_links=[
           'http://downloads.reviewboard.org/mirror/',
           'http://downloads.reviewboard.org/releases/Djblets/0.9/',